@@ -17,7 +17,7 @@ class ChatLogAdmin(admin.ModelAdmin):
             'fields': ('user_message', 'response_text')
         }),
         ('Chart Data', {
-            'fields': ('response_chart_json', 'document_ids')
+            'fields': ('response_chart_json', 'document_ids', 'corpus_snapshot')
         }),
         ('Timestamp', {
             'fields': ('created_at',)
@@ -0,0 +1,109 @@
+"""
+Arsip ChatLog: file JSONL terkompresi zlib, dipartisi per tanggal
+
+Layout: CHAT_LOG_ARCHIVE_DIR/YYYY/MM/chat_logs_YYYY-MM-DD.jsonl.zz
+
+Setiap batch arsip ditambahkan (append) sebagai satu stream zlib lengkap, sehingga
+file bisa ditulis bertahap tanpa membaca ulang isinya. Pembacaan menggabungkan
+semua stream di dalam file.
+"""
+import json
+import os
+import re
+import zlib
+from datetime import date, datetime
+from typing import Dict, Iterator, List
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import ChatLog
+
+
+ARCHIVE_SUFFIX = '.jsonl.zz'
+ARCHIVE_NAME_RE = re.compile(r'^chat_logs_(\d{4}-\d{2}-\d{2})\.jsonl\.zz$')
+
+# Kolom ChatLog yang disimpan di arsip (FK disimpan sebagai *_id)
+ARCHIVE_FIELDS = (
+    'id',
+    'owner_user_id',
+    'user_message',
+    'response_text',
+    'response_chart_json',
+    'document_ids',
+    'corpus_snapshot_id',
+    'conversation_id',
+    'created_at',
+)
+
+
+class ArchiveJSONEncoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder memotong datetime ke milidetik; arsip menyimpan presisi penuh"""
+    
+    def default(self, o):
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def archive_path(day: date, directory: str = None) -> str:
+    directory = directory or settings.CHAT_LOG_ARCHIVE_DIR
+    return os.path.join(
+        str(directory), f'{day:%Y}', f'{day:%m}', f'chat_logs_{day.isoformat()}{ARCHIVE_SUFFIX}'
+    )
+
+
+def partition_day(created_at: datetime) -> date:
+    """Tanggal partisi (zona waktu TIME_ZONE)"""
+    if timezone.is_aware(created_at):
+        return timezone.localtime(created_at).date()
+    return created_at.date()
+
+
+def append_rows(path: str, rows: List[Dict]):
+    """Tambahkan rows sebagai satu stream zlib baru di akhir file (fsync sebelum return)"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    payload = ''.join(json.dumps(row, cls=ArchiveJSONEncoder, ensure_ascii=False) + '\n' for row in rows)
+    with open(path, 'ab') as f:
+        f.write(zlib.compress(payload.encode('utf-8'), 6))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def read_rows(path: str) -> Iterator[Dict]:
+    """Baca semua row dari file arsip (menggabungkan seluruh stream zlib)"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    while data:
+        decompressor = zlib.decompressobj()
+        text = decompressor.decompress(data) + decompressor.flush()
+        # Hanya '\n' yang memisahkan row: splitlines() juga memotong di U+2028/U+2029/\x85
+        # yang tidak di-escape di dalam string JSON (ensure_ascii=False)
+        for line in text.decode('utf-8').split('\n'):
+            if line:
+                yield json.loads(line)
+        data = decompressor.unused_data
+
+
+def archive_files(since: date = None, until: date = None, directory: str = None) -> List[tuple]:
+    """Daftar (tanggal, path) file arsip dalam rentang [since, until], urut tanggal"""
+    directory = str(directory or settings.CHAT_LOG_ARCHIVE_DIR)
+    found = []
+    for root, _, filenames in os.walk(directory):
+        for filename in filenames:
+            match = ARCHIVE_NAME_RE.match(filename)
+            if not match:
+                continue
+            day = date.fromisoformat(match.group(1))
+            if (since and day < since) or (until and day > until):
+                continue
+            found.append((day, os.path.join(root, filename)))
+    return sorted(found)
+
+
+def row_to_chat_log(row: Dict) -> ChatLog:
+    values = {field: row.get(field) for field in ARCHIVE_FIELDS}
+    values['created_at'] = parse_datetime(values['created_at'])
+    return ChatLog(**values)
@@ -0,0 +1,142 @@
+"""
+Penulis ChatLog di background: request chat cukup memasukkan log ke antrian
+"""
+import atexit
+import os
+import queue
+import threading
+import time
+from typing import List
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+
+from core.metrics import CHAT_LOG_BACKPRESSURE, CHAT_LOG_QUEUE_DEPTH, CHAT_LOG_WRITES
+from .models import ChatLog
+
+
+class ChatLogWriter:
+    """
+    Antrian ChatLog terbatas (per proses) + thread yang menulis dengan bulk_create
+    
+    - Batch ditulis jika sudah CHAT_LOG_BATCH_SIZE log atau CHAT_LOG_FLUSH_INTERVAL
+      detik sejak log pertama di batch
+    - Antrian penuh (CHAT_LOG_QUEUE_SIZE): request menunggu maksimal
+      CHAT_LOG_ENQUEUE_TIMEOUT detik (backpressure), setelah itu log dibuang (dropped)
+    - Saat worker berhenti (atexit, hook worker_exit gunicorn / uwsgi.atexit di
+      config/wsgi.py) sisa antrian di-flush, maksimal CHAT_LOG_SHUTDOWN_TIMEOUT detik
+    - Log dengan conversation_id ditulis langsung di request: turn berikutnya membaca
+      history percakapan dari database dan bisa datang sebelum batch di-flush
+    - CHAT_LOG_ASYNC=False: semua log ditulis langsung di request (perilaku lama)
+    
+    created_at diisi saat log masuk antrian sehingga urutan history tetap sesuai
+    waktu request. Log tanpa conversation_id baru terlihat di history setelah
+    batch-nya di-flush.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._stopping = threading.Event()
+    
+    def submit(self, chat_log: ChatLog):
+        """Masukkan ChatLog (belum disimpan) ke antrian tulis"""
+        if not settings.CHAT_LOG_ASYNC or chat_log.conversation_id:
+            self._write([chat_log])
+            return
+        
+        log_queue = self._ensure_started()
+        try:
+            log_queue.put_nowait(chat_log)
+        except queue.Full:
+            CHAT_LOG_BACKPRESSURE.inc()
+            try:
+                log_queue.put(chat_log, timeout=settings.CHAT_LOG_ENQUEUE_TIMEOUT)
+            except queue.Full:
+                CHAT_LOG_WRITES.inc(result='dropped')
+                return
+        CHAT_LOG_QUEUE_DEPTH.set(log_queue.qsize())
+    
+    def _ensure_started(self) -> queue.Queue:
+        # Thread dan antrian dibuat per proses (setelah fork worker, bukan di master)
+        if self._pid == os.getpid() and self._thread is not None:
+            return self._queue
+        with self._lock:
+            if self._pid != os.getpid() or self._thread is None:
+                self._queue = queue.Queue(maxsize=settings.CHAT_LOG_QUEUE_SIZE)
+                self._stopping = threading.Event()
+                self._thread = threading.Thread(
+                    target=self._run, args=(self._queue, self._stopping),
+                    name='chat-log-writer', daemon=True
+                )
+                self._pid = os.getpid()
+                self._thread.start()
+        return self._queue
+    
+    def _run(self, log_queue: queue.Queue, stopping: threading.Event):
+        try:
+            while not (stopping.is_set() and log_queue.empty()):
+                try:
+                    first = log_queue.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+                
+                batch = [first]
+                deadline = time.monotonic() + settings.CHAT_LOG_FLUSH_INTERVAL
+                while len(batch) < settings.CHAT_LOG_BATCH_SIZE:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or stopping.is_set():
+                        break
+                    try:
+                        batch.append(log_queue.get(timeout=remaining))
+                    except queue.Empty:
+                        break
+                # Saat shutdown: ambil semua yang tersisa tanpa menunggu interval
+                while stopping.is_set() and len(batch) < settings.CHAT_LOG_BATCH_SIZE:
+                    try:
+                        batch.append(log_queue.get_nowait())
+                    except queue.Empty:
+                        break
+                
+                close_old_connections()
+                self._write(batch)
+                CHAT_LOG_QUEUE_DEPTH.set(log_queue.qsize())
+        finally:
+            connection.close()
+    
+    @staticmethod
+    def _write(batch: List[ChatLog]):
+        # atomic: bulk_create yang gagal di tengah tidak meninggalkan sebagian batch
+        # (yang akan tertulis dua kali oleh fallback di bawah)
+        try:
+            with transaction.atomic():
+                ChatLog.objects.bulk_create(batch)
+            CHAT_LOG_WRITES.inc(len(batch), result='written')
+            return
+        except Exception:
+            pass
+        # Satu log bermasalah tidak boleh membuang seluruh batch
+        for chat_log in batch:
+            try:
+                chat_log.pk = None
+                with transaction.atomic():
+                    chat_log.save(force_insert=True)
+                CHAT_LOG_WRITES.inc(result='written')
+            except Exception:
+                CHAT_LOG_WRITES.inc(result='error')
+    
+    def stop(self, timeout: float = None):
+        """Flush sisa antrian dan hentikan thread (dipanggil saat worker berhenti)"""
+        thread = self._thread
+        if thread is None or self._pid != os.getpid():
+            return
+        self._stopping.set()
+        thread.join(settings.CHAT_LOG_SHUTDOWN_TIMEOUT if timeout is None else timeout)
+        if not thread.is_alive():
+            self._thread = None
+
+
+chat_log_writer = ChatLogWriter()
+atexit.register(chat_log_writer.stop)
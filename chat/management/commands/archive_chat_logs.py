@@ -0,0 +1,223 @@
+"""
+Django management command untuk retensi ChatLog: arsip ke file JSONL+zlib, hapus, dan restore
+"""
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from chat.archive import (
+    ARCHIVE_FIELDS,
+    append_rows,
+    archive_files,
+    archive_path,
+    partition_day,
+    read_rows,
+    row_to_chat_log,
+)
+from chat.models import ChatLog
+from documents.models import CorpusSnapshot
+
+
+class Command(BaseCommand):
+    help = (
+        'Pindahkan ChatLog yang lebih tua dari N hari ke arsip JSONL terkompresi '
+        '(per tanggal) lalu hapus dari tabel, atau restore rentang tanggal dari arsip'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=None,
+            help='Arsipkan log yang lebih tua dari N hari (default: settings CHAT_LOG_RETENTION_DAYS)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Jumlah log per batch (default: 1000)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Hitung log yang akan diarsipkan/di-restore tanpa menulis apa pun'
+        )
+        parser.add_argument(
+            '--vacuum',
+            action='store_true',
+            help='Jalankan VACUUM (SQLite) / VACUUM ANALYZE chat_logs (PostgreSQL) setelah arsip'
+        )
+        parser.add_argument(
+            '--restore',
+            action='store_true',
+            help='Restore log dari arsip ke tabel (gunakan dengan --since/--until)'
+        )
+        parser.add_argument(
+            '--since',
+            type=str,
+            default=None,
+            help='Tanggal awal restore (YYYY-MM-DD, inklusif)'
+        )
+        parser.add_argument(
+            '--until',
+            type=str,
+            default=None,
+            help='Tanggal akhir restore (YYYY-MM-DD, inklusif)'
+        )
+        parser.add_argument(
+            '--owner',
+            type=str,
+            default=None,
+            help='Restore hanya log milik owner_user_id ini'
+        )
+    
+    def handle(self, *args, **options):
+        if options['batch_size'] <= 0:
+            raise CommandError('--batch-size harus > 0')
+        
+        if options['restore']:
+            self._restore(options)
+        else:
+            self._archive(options)
+    
+    def _archive(self, options):
+        days = options['days'] if options['days'] is not None else settings.CHAT_LOG_RETENTION_DAYS
+        if days <= 0:
+            raise CommandError('--days harus > 0')
+        
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+        cutoff = timezone.now() - timedelta(days=days)
+        started = time.monotonic()
+        last_id = 0
+        archived = 0
+        partitions = defaultdict(int)
+        
+        while True:
+            # Keyset pagination by id: log lama punya id kecil, batch berikutnya tidak scan ulang
+            rows = list(
+                ChatLog.objects.filter(created_at__lt=cutoff, id__gt=last_id)
+                .order_by('id')
+                .values(*ARCHIVE_FIELDS)[:batch_size]
+            )
+            if not rows:
+                break
+            last_id = rows[-1]['id']
+            
+            by_day = defaultdict(list)
+            for row in rows:
+                by_day[partition_day(row['created_at'])].append(row)
+            
+            if not dry_run:
+                # Tulis (dan fsync) arsip dulu, baru hapus dari tabel: jika proses berhenti
+                # di tengah, log paling buruk terarsip dua kali (restore men-dedup berdasarkan id)
+                for day, day_rows in by_day.items():
+                    append_rows(archive_path(day), day_rows)
+                ChatLog.objects.filter(id__in=[row['id'] for row in rows]).delete()
+            
+            for day, day_rows in by_day.items():
+                partitions[day] += len(day_rows)
+            archived += len(rows)
+            self.stdout.write(f'  {archived} log diproses (id <= {last_id})')
+        
+        elapsed = time.monotonic() - started
+        verb = 'akan diarsipkan' if dry_run else 'diarsipkan'
+        self.stdout.write(self.style.SUCCESS(
+            f'{archived} log lebih tua dari {days} hari {verb} ke {len(partitions)} partisi '
+            f'di {settings.CHAT_LOG_ARCHIVE_DIR} ({elapsed:.1f} detik)'
+        ))
+        if partitions and options['verbosity'] > 1:
+            for day in sorted(partitions):
+                self.stdout.write(f'  {day.isoformat()}: {partitions[day]} log')
+        
+        if options['vacuum'] and not dry_run:
+            self._vacuum()
+    
+    def _vacuum(self):
+        vendor = connection.vendor
+        if vendor == 'sqlite':
+            sql = 'VACUUM'
+        elif vendor == 'postgresql':
+            sql = f'VACUUM ANALYZE {ChatLog._meta.db_table}'
+        else:
+            self.stdout.write(self.style.WARNING(f'VACUUM tidak didukung untuk database {vendor}'))
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(sql)
+        self.stdout.write(self.style.SUCCESS(f'{sql} selesai'))
+    
+    def _restore(self, options):
+        since = self._parse_date(options['since'], '--since')
+        until = self._parse_date(options['until'], '--until')
+        if not since and not until:
+            raise CommandError('Restore membutuhkan --since dan/atau --until')
+        
+        owner = options['owner']
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+        files = archive_files(since, until)
+        seen = set()
+        restored = skipped = 0
+        
+        for day, path in files:
+            pending = []
+            for row in read_rows(path):
+                if owner and row.get('owner_user_id') != owner:
+                    continue
+                if row['id'] in seen:
+                    continue
+                seen.add(row['id'])
+                pending.append(row)
+                if len(pending) >= batch_size:
+                    count = self._restore_batch(pending, dry_run)
+                    restored += count
+                    skipped += len(pending) - count
+                    pending = []
+            if pending:
+                count = self._restore_batch(pending, dry_run)
+                restored += count
+                skipped += len(pending) - count
+            self.stdout.write(f'  {day.isoformat()}: {restored} log di-restore sejauh ini')
+        
+        verb = 'akan di-restore' if dry_run else 'di-restore'
+        self.stdout.write(self.style.SUCCESS(
+            f'{restored} log {verb} dari {len(files)} file arsip '
+            f'({skipped} dilewati karena sudah ada di tabel)'
+        ))
+    
+    @staticmethod
+    def _restore_batch(rows, dry_run: bool) -> int:
+        ids = [row['id'] for row in rows]
+        existing = set(ChatLog.objects.filter(id__in=ids).values_list('id', flat=True))
+        rows = [row for row in rows if row['id'] not in existing]
+        if dry_run or not rows:
+            return len(rows)
+        
+        # Snapshot corpus yang sudah dihapus tidak boleh membuat restore gagal (FK)
+        snapshot_ids = {row['corpus_snapshot_id'] for row in rows if row.get('corpus_snapshot_id')}
+        valid_snapshots = set(
+            CorpusSnapshot.objects.filter(id__in=snapshot_ids).values_list('id', flat=True)
+        )
+        chat_logs = []
+        for row in rows:
+            if row.get('corpus_snapshot_id') not in valid_snapshots:
+                row['corpus_snapshot_id'] = None
+            chat_logs.append(row_to_chat_log(row))
+        
+        with transaction.atomic():
+            ChatLog.objects.bulk_create(chat_logs)
+        return len(chat_logs)
+    
+    @staticmethod
+    def _parse_date(value, option):
+        if not value:
+            return None
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            raise CommandError(f'{option} harus berformat YYYY-MM-DD')
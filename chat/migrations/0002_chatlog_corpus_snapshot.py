@@ -0,0 +1,25 @@
+# Generated by Django 5.0.14 on 2026-10-19 10:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0001_initial'),
+        ('documents', '0006_corpus_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatlog',
+            name='corpus_snapshot',
+            field=models.ForeignKey(blank=True, help_text='Snapshot corpus yang dipakai sebagai konteks (pengganti daftar document_ids)', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='chat_logs', to='documents.corpussnapshot'),
+        ),
+        migrations.AlterField(
+            model_name='chatlog',
+            name='document_ids',
+            field=models.JSONField(blank=True, help_text='Array of document IDs yang digunakan (hanya jika bukan seluruh corpus)', null=True),
+        ),
+    ]
@@ -15,7 +15,15 @@ class ChatLog(models.Model):
     document_ids = models.JSONField(
         blank=True,
         null=True,
-        help_text="Array of document IDs yang digunakan sebagai konteks"
+        help_text="Array of document IDs yang digunakan (hanya jika bukan seluruh corpus)"
+    )
+    corpus_snapshot = models.ForeignKey(
+        'documents.CorpusSnapshot',
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name='chat_logs',
+        help_text="Snapshot corpus yang dipakai sebagai konteks (pengganti daftar document_ids)"
     )
     conversation_id = models.CharField(
         max_length=100,
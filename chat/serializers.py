@@ -2,6 +2,7 @@
 Serializers untuk Chat API
 """
 from rest_framework import serializers
+from documents.models import Tag
 from .models import ChatLog
 
 
@@ -21,6 +22,41 @@ class ChatRequestSerializer(serializers.Serializer):
         max_length=100,
         help_text="ID untuk mempertahankan konteks percakapan (opsional)"
     )
+    document_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        required=False,
+        allow_empty=False,
+        max_length=200,
+        help_text="Batasi konteks ke dokumen dengan ID ini (opsional)"
+    )
+    tags = serializers.ListField(
+        child=serializers.CharField(max_length=Tag.MAX_LENGTH),
+        required=False,
+        allow_empty=False,
+        max_length=Tag.MAX_PER_DOCUMENT,
+        help_text="Batasi konteks ke dokumen yang memiliki salah satu tag ini (opsional)"
+    )
+    date_from = serializers.DateField(
+        required=False,
+        help_text="Hanya dokumen yang di-upload sejak tanggal ini, YYYY-MM-DD (opsional)"
+    )
+    date_to = serializers.DateField(
+        required=False,
+        help_text="Hanya dokumen yang di-upload sampai tanggal ini (inklusif), YYYY-MM-DD (opsional)"
+    )
+    
+    # Field filter dokumen konteks (lihat ChatViewSet._document_scope)
+    SCOPE_FIELDS = ('document_ids', 'tags', 'date_from', 'date_to')
+    
+    def validate_tags(self, value):
+        return Tag.parse(value)
+    
+    def validate(self, attrs):
+        date_from = attrs.get('date_from')
+        date_to = attrs.get('date_to')
+        if date_from and date_to and date_from > date_to:
+            raise serializers.ValidationError({"date_to": "date_to harus >= date_from"})
+        return attrs
 
 
 class ChatResponseSerializer(serializers.Serializer):
@@ -45,7 +81,33 @@ class ChatLogSerializer(serializers.ModelSerializer):
             'response_text',
             'response_chart_json',
             'document_ids',
+            'corpus_snapshot',
+            'conversation_id',
+            'created_at'
+        ]
+        read_only_fields = fields
+
+
+class ChatLogListSerializer(serializers.ModelSerializer):
+    """Serializer ringkas untuk list history (tanpa response_text & chart)"""
+    
+    user_message_preview = serializers.SerializerMethodField()
+    has_chart = serializers.BooleanField(read_only=True)
+    
+    class Meta:
+        model = ChatLog
+        fields = [
+            'id',
+            'user_message_preview',
+            'has_chart',
             'conversation_id',
             'created_at'
         ]
         read_only_fields = fields
+    
+    def get_user_message_preview(self, obj):
+        """Return preview pesan user (200 karakter pertama)"""
+        preview = obj.user_message[:200]
+        if len(obj.user_message) > 200:
+            preview += "..."
+        return preview
@@ -1,3 +1,308 @@
-from django.test import TestCase
+import os
+import queue
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from core.metrics import CHAT_LOG_BACKPRESSURE, CHAT_LOG_WRITES
+from documents.models import Document, Tag
+
+from .archive import archive_files, read_rows
+from .log_writer import ChatLogWriter
+from .models import ChatLog
+
+
+class ArchiveChatLogsTests(TestCase):
+    """Arsip lalu restore ChatLog (management command archive_chat_logs)"""
+    
+    def setUp(self):
+        self.archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.archive_dir.cleanup)
+        settings_override = override_settings(CHAT_LOG_ARCHIVE_DIR=self.archive_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+    
+    def _run(self, *args):
+        call_command('archive_chat_logs', *args, stdout=StringIO())
+    
+    def test_round_trip_keeps_line_separator_characters(self):
+        message = 'baris satu\u2028baris dua\u2029paragraf\x85akhir\r\nlagi'
+        created_at = timezone.now() - timedelta(days=120)
+        log = ChatLog.objects.create(
+            owner_user_id='u1',
+            user_message=message,
+            response_text=f'jawaban: {message}',
+            response_chart_json={'label': 'a b'},
+            conversation_id='conv-1',
+            created_at=created_at,
+        )
+        
+        self._run('--days', '30')
+        self.assertFalse(ChatLog.objects.exists())
+        files = archive_files(directory=self.archive_dir.name)
+        self.assertEqual(len(files), 1)
+        self.assertEqual([row['id'] for row in read_rows(files[0][1])], [log.id])
+        
+        day = files[0][0].isoformat()
+        self._run('--restore', '--since', day, '--until', day)
+        restored = ChatLog.objects.get(id=log.id)
+        self.assertEqual(restored.user_message, message)
+        self.assertEqual(restored.response_text, f'jawaban: {message}')
+        self.assertEqual(restored.response_chart_json, {'label': 'a b'})
+        self.assertEqual(restored.created_at, created_at)
+    
+    def test_restore_skips_rows_already_in_table(self):
+        log = ChatLog.objects.create(
+            owner_user_id='u1', user_message='halo', response_text='hai',
+            created_at=timezone.now() - timedelta(days=120),
+        )
+        self._run('--days', '30')
+        day = archive_files(directory=self.archive_dir.name)[0][0].isoformat()
+        
+        self._run('--restore', '--since', day)
+        self._run('--restore', '--since', day)
+        self.assertEqual(ChatLog.objects.filter(id=log.id).count(), 1)
+    
+    def test_recent_logs_are_not_archived(self):
+        ChatLog.objects.create(owner_user_id='u1', user_message='baru', response_text='ok')
+        self._run('--days', '30')
+        self.assertEqual(ChatLog.objects.count(), 1)
+        self.assertEqual(os.listdir(self.archive_dir.name), [])
+
+
+@override_settings(ADMISSION_ENABLED=False, REQUEST_TIMING_LOG=False)
+class ChatHistoryTests(TestCase):
+    """GET /api/chat/history: keyset cursor (created_at, id) dan filter percakapan"""
+    
+    def setUp(self):
+        auth = mock.patch('core.authentication.SharedTokenCache.get_or_verify', return_value='user-1')
+        auth.start()
+        self.addCleanup(auth.stop)
+        self.client = Client(HTTP_AUTHORIZATION='Bearer token')
+        now = timezone.now()
+        self.logs = [
+            ChatLog.objects.create(
+                owner_user_id='user-1', user_message=f'pertanyaan {i}', response_text='jawaban',
+                response_chart_json={'type': 'bar'} if i == 0 else None,
+                conversation_id='conv-a' if i % 2 else 'conv-b',
+                # Dua log dengan created_at sama: urutan ditentukan id
+                created_at=now - timedelta(minutes=min(i, 3)),
+            )
+            for i in range(5)
+        ]
+        ChatLog.objects.create(owner_user_id='user-2', user_message='lain', response_text='x')
+    
+    def _pages(self, **params):
+        ids, cursor = [], None
+        while True:
+            query = dict(params, **({'cursor': cursor} if cursor else {}))
+            body = self.client.get('/api/chat/history', query).json()
+            ids.extend(item['id'] for item in body['history'])
+            cursor = body['next_cursor']
+            if cursor is None:
+                return ids
+    
+    def test_cursor_walks_all_logs_newest_first(self):
+        expected = [
+            log.id for log in sorted(self.logs, key=lambda log: (log.created_at, log.id), reverse=True)
+        ]
+        self.assertEqual(self._pages(limit=2), expected)
+    
+    def test_conversation_filter_and_slim_default_list(self):
+        self.assertEqual(
+            sorted(self._pages(limit=1, conversation_id='conv-b')),
+            [log.id for log in self.logs if log.conversation_id == 'conv-b'],
+        )
+        history = self.client.get('/api/chat/history').json()['history']
+        self.assertNotIn('response_text', history[0])
+        self.assertEqual([item['has_chart'] for item in history].count(True), 1)
+        
+        history = self.client.get('/api/chat/history', {'full': '1'}).json()['history']
+        self.assertIn('response_text', history[0])
+        self.assertEqual([item['response_chart_json'] is not None for item in history].count(True), 1)
+    
+    def test_invalid_cursor_or_limit_returns_400(self):
+        for params in ({'cursor': 'bukan-cursor'}, {'limit': '0'}, {'limit': 'abc'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get('/api/chat/history', params).status_code, 400)
+
+
+def metric_value(metric, *labels):
+    return metric.values.get(tuple(labels), 0)
+
+
+def chat_log(message='Halo', **fields):
+    return ChatLog(owner_user_id='user-1', user_message=message, response_text='ok', **fields)
+
+
+@override_settings(CHAT_LOG_ASYNC=True, CHAT_LOG_FLUSH_INTERVAL=0.05, CHAT_LOG_BATCH_SIZE=50)
+class ChatLogWriterFlushTests(TransactionTestCase):
+    """Thread writer menulis batch ke database (koneksi terpisah, jadi bukan TestCase)"""
+    
+    def test_queued_logs_are_flushed_on_stop(self):
+        writer = ChatLogWriter()
+        self.addCleanup(writer.stop)
+        written = metric_value(CHAT_LOG_WRITES, 'written')
+        for i in range(3):
+            writer.submit(chat_log(f'Pesan {i}'))
+        writer.stop(timeout=5)
+        
+        self.assertIsNone(writer._thread)
+        self.assertEqual(
+            sorted(ChatLog.objects.values_list('user_message', flat=True)),
+            ['Pesan 0', 'Pesan 1', 'Pesan 2'],
+        )
+        self.assertEqual(metric_value(CHAT_LOG_WRITES, 'written') - written, 3)
+    
+    @override_settings(CHAT_LOG_BATCH_SIZE=2)
+    def test_batches_are_written_without_stop(self):
+        writer = ChatLogWriter()
+        self.addCleanup(writer.stop)
+        writer.submit(chat_log('a'))
+        writer.submit(chat_log('b'))
+        for _ in range(100):
+            if ChatLog.objects.count() == 2:
+                break
+            time.sleep(0.02)
+        self.assertEqual(ChatLog.objects.count(), 2)
+
+
+class ChatLogWriterTests(TestCase):
+    """Fallback per row, backpressure / drop, dan penulisan langsung"""
+    
+    def test_failed_bulk_create_falls_back_per_row(self):
+        written = metric_value(CHAT_LOG_WRITES, 'written')
+        errors = metric_value(CHAT_LOG_WRITES, 'error')
+        batch = [chat_log('a'), chat_log(None), chat_log('c')]
+        ChatLogWriter._write(batch)
+        
+        self.assertEqual(sorted(ChatLog.objects.values_list('user_message', flat=True)), ['a', 'c'])
+        self.assertEqual(metric_value(CHAT_LOG_WRITES, 'written') - written, 2)
+        self.assertEqual(metric_value(CHAT_LOG_WRITES, 'error') - errors, 1)
+    
+    @override_settings(CHAT_LOG_ASYNC=True, CHAT_LOG_ENQUEUE_TIMEOUT=0.01)
+    def test_full_queue_applies_backpressure_then_drops(self):
+        full = queue.Queue(maxsize=1)
+        full.put(chat_log('antri'))
+        writer = ChatLogWriter()
+        backpressure = metric_value(CHAT_LOG_BACKPRESSURE)
+        dropped = metric_value(CHAT_LOG_WRITES, 'dropped')
+        with mock.patch.object(writer, '_ensure_started', return_value=full):
+            writer.submit(chat_log('dibuang'))
+        
+        self.assertEqual(metric_value(CHAT_LOG_BACKPRESSURE) - backpressure, 1)
+        self.assertEqual(metric_value(CHAT_LOG_WRITES, 'dropped') - dropped, 1)
+        self.assertEqual(full.qsize(), 1)
+        self.assertFalse(ChatLog.objects.exists())
+    
+    @override_settings(CHAT_LOG_ASYNC=True)
+    def test_conversation_log_is_written_immediately(self):
+        writer = ChatLogWriter()
+        writer.submit(chat_log('Lanjutan', conversation_id='room-1'))
+        self.assertIsNone(writer._thread)
+        self.assertTrue(ChatLog.objects.filter(conversation_id='room-1').exists())
+
+
+@override_settings(ADMISSION_ENABLED=False, REQUEST_TIMING_LOG=False, CHAT_LOG_ASYNC=False,
+                   CHAT_LOCAL_INTENTS=[])
+class ChatScopeTests(TestCase):
+    """POST /api/chat/ dengan filter document_ids / tags / rentang tanggal upload"""
+    
+    def setUp(self):
+        auth = mock.patch('core.authentication.SharedTokenCache.get_or_verify', return_value='user-1')
+        auth.start()
+        self.addCleanup(auth.stop)
+        self.client = Client(HTTP_AUTHORIZATION='Bearer token')
+        
+        now = timezone.now()
+        self.docs = {}
+        for title, tags, days_ago in (('jabar', ['laporan', 'q3'], 40), ('jatim', ['laporan'], 10), ('memo', [], 1)):
+            document = Document.objects.create(
+                owner_user_id='user-1', title=title, content=f'Isi dokumen {title}.',
+                source_filename=f'{title}.txt',
+            )
+            document.tags.set(Tag.resolve(tags))
+            Document.objects.filter(pk=document.pk).update(created_at=now - timedelta(days=days_ago))
+            self.docs[title] = document
+        self.today = timezone.localdate()
+    
+    def _chat(self, **scope):
+        payload = {'message': 'Jelaskan isi dokumen', **scope}
+        with mock.patch(
+            'chat.views.DeepSeekService.call_deepseek', return_value=({'text': 'ok', 'chart': None}, None)
+        ) as call:
+            response = self.client.post('/api/chat/', payload, content_type='application/json')
+        titles = sorted(doc['title'] for doc in call.call_args.kwargs['documents']) if call.called else None
+        return response, titles
+    
+    def test_document_ids_filter(self):
+        response, titles = self._chat(document_ids=[self.docs['memo'].id, self.docs['jatim'].id])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(titles, ['jatim', 'memo'])
+    
+    def test_tags_filter_matches_any_tag(self):
+        self.assertEqual(self._chat(tags=['Q3'])[1], ['jabar'])
+        self.assertEqual(self._chat(tags=['q3', 'laporan'])[1], ['jabar', 'jatim'])
+    
+    def test_date_range_is_inclusive(self):
+        date_from = (self.today - timedelta(days=10)).isoformat()
+        self.assertEqual(self._chat(date_from=date_from)[1], ['jatim', 'memo'])
+        date_to = (self.today - timedelta(days=10)).isoformat()
+        self.assertEqual(self._chat(date_to=date_to)[1], ['jabar', 'jatim'])
+    
+    def test_filters_are_combined(self):
+        date_from = (self.today - timedelta(days=20)).isoformat()
+        self.assertEqual(self._chat(tags=['laporan'], date_from=date_from)[1], ['jatim'])
+    
+    def test_scope_without_documents_returns_404_without_llm(self):
+        response, titles = self._chat(tags=['tidak-ada'], document_ids=[self.docs['memo'].id])
+        self.assertEqual(response.status_code, 404)
+        self.assertIsNone(titles)
+        self.assertEqual(response.json()['details'], {
+            'document_ids': [self.docs['memo'].id], 'tags': ['tidak-ada'],
+        })
+        self.assertFalse(ChatLog.objects.exists())
+    
+    def test_invalid_date_range_returns_400(self):
+        response, titles = self._chat(date_from=self.today.isoformat(), date_to='2020-01-01')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('date_to', response.json()['details'])
+        self.assertIsNone(titles)
+    
+    def test_without_scope_all_documents_are_used(self):
+        with override_settings(CHAT_RETRIEVAL='all'):
+            self.assertEqual(self._chat()[1], ['jabar', 'jatim', 'memo'])
+
+    def test_dry_run_plans_without_calling_deepseek_or_logging(self):
+        with mock.patch('core.deepseek_service.requests.post') as post:
+            response = self.client.post(
+                '/api/chat/?dry_run=1&include_messages=1',
+                {'message': 'Jelaskan isi dokumen', 'tags': ['laporan']},
+                content_type='application/json',
+            )
+        post.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual((body['dry_run'], body['llm_call']), (True, True))
+        self.assertEqual(
+            sorted(doc['id'] for doc in body['context']['documents']),
+            sorted([self.docs['jabar'].id, self.docs['jatim'].id]),
+        )
+        self.assertEqual(body['context']['documents'][0]['source_tokens'], self.docs['jatim'].token_count)
+        self.assertIn(f"CORPUS_SNAPSHOT: {body['corpus_snapshot_id']}", body['messages'][-1]['content'])
+        self.assertFalse(body['cache']['prefix_recently_sent'])
+        self.assertEqual(set(body['cost']), {'currency', 'prompt', 'completion_max', 'total_max'})
+        self.assertFalse(ChatLog.objects.exists())
+    
+    @override_settings(CHAT_LOCAL_INTENTS=['smalltalk'])
+    def test_dry_run_of_local_answer_reports_no_llm_call(self):
+        response = self.client.post('/api/chat/?dry_run=1', {'message': 'Halo'}, content_type='application/json')
+        self.assertEqual(response.json(), {'dry_run': True, 'llm_call': False, 'intent': 'smalltalk'})
+        self.assertFalse(ChatLog.objects.exists())
 
-# Create your tests here.
@@ -7,4 +7,5 @@ from .views import ChatViewSet, ChatHistoryViewSet
 urlpatterns = [
     path('', ChatViewSet.as_view({'post': 'create'}), name='chat'),
     path('history', ChatHistoryViewSet.as_view({'get': 'list'}), name='chat-history'),
+    path('history/<int:pk>', ChatHistoryViewSet.as_view({'get': 'retrieve'}), name='chat-history-detail'),
 ]
@@ -1,18 +1,39 @@
 """
 Views untuk Chat API
 """
+from datetime import date, datetime, time, timedelta
+from typing import Optional
+
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from django.conf import settings
+from django.db.models import BooleanField, ExpressionWrapper, Q
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
 
+from .log_writer import chat_log_writer
 from .models import ChatLog
-from .serializers import ChatRequestSerializer, ChatResponseSerializer, ChatLogSerializer
+from .serializers import (
+    ChatRequestSerializer,
+    ChatResponseSerializer,
+    ChatLogSerializer,
+    ChatLogListSerializer
+)
+from core.admission import UserRequestThrottle, admit_llm_call, estimate_prompt_tokens
 from core.authentication import SSOAuthentication
+from core.chart_builder import ChartBuilder
+from core.deadline import DeadlineExceeded
 from core.deepseek_service import DeepSeekService
-from core.chat_helper import detect_chart_needed
-from documents.models import Document
-from core.swagger_schemas import chat_create_schema, chat_history_schema
+from core.downsampling import downsample_chart
+from core.llm_routing import select_route
+from core.chat_helper import answer_locally, classify_intent
+from documents.models import CorpusSnapshot, Document
+from core.pagination import InvalidPaginationParam, paginate_keyset, parse_limit
+from core.search import retrieve_document_ids
+from core.timing import phase
+from core.swagger_schemas import chat_create_schema, chat_history_schema, chat_history_detail_schema
 
 
 class ChatViewSet(viewsets.ViewSet):
@@ -21,10 +42,16 @@ class ChatViewSet(viewsets.ViewSet):
     
     Endpoints:
     - POST /api/chat - Kirim pesan dan terima response
+    - POST /api/chat?dry_run=1 - Rencana prompt (token, alokasi dokumen, biaya) tanpa memanggil LLM
     """
     
     authentication_classes = [SSOAuthentication]
     permission_classes = [IsAuthenticated]
+    # Token bucket request per user (ADMISSION_REQUEST_*), hanya untuk endpoint chat
+    throttle_classes = [UserRequestThrottle]
+    
+    # Perkiraan konservatif berapa lama prefix prompt tetap ada di context cache DeepSeek
+    PROMPT_CACHE_WINDOW = timedelta(hours=1)
     
     @chat_create_schema
     def create(self, request):
@@ -34,8 +61,15 @@ class ChatViewSet(viewsets.ViewSet):
         POST /api/chat
         
         Sistem akan otomatis:
-        - Mengambil semua dokumen dari database (global RAG POC)
+        - Mengambil semua dokumen dari database (global RAG POC), atau hanya dokumen
+          paling relevan menurut full-text search jika CHAT_RETRIEVAL=search
+        - Jika request berisi document_ids / tags / date_from / date_to, konteks
+          dibatasi ke dokumen yang cocok (menggantikan retrieval)
         - Mendeteksi apakah perlu chart berdasarkan kata kunci di message
+        
+        Dengan query param dry_run=1 seluruh pipeline dijalankan sampai sebelum
+        panggilan DeepSeek, dan response berisi rencana prompt (lihat
+        DeepSeekService.plan_call); tidak ada LLM call dan tidak ada ChatLog.
         """
         serializer = ChatRequestSerializer(data=request.data)
         
@@ -47,9 +81,50 @@ class ChatViewSet(viewsets.ViewSet):
         
         message = serializer.validated_data['message']
         conversation_id = serializer.validated_data.get('conversation_id')
+        dry_run = request.query_params.get('dry_run', '').lower() in ('1', 'true', 'yes')
+        
+        # Filter dokumen konteks dari client; cek lebih dulu agar filter yang tidak
+        # cocok dengan dokumen apa pun tidak sampai memanggil LLM
+        scope = self._document_scope(serializer.validated_data)
+        if scope is not None and not Document.objects.filter(scope).exists():
+            return Response(
+                {
+                    "error": "Tidak ada dokumen yang cocok dengan filter",
+                    "details": {
+                        name: serializer.validated_data[name]
+                        for name in ChatRequestSerializer.SCOPE_FIELDS
+                        if name in serializer.validated_data
+                    }
+                },
+                status=status.HTTP_404_NOT_FOUND
+            )
         
-        # Auto-detect apakah perlu chart dari message
-        include_chart = detect_chart_needed(message)
+        # Klasifikasi intent (termasuk auto-detect chart) dari message
+        with phase('intent'):
+            routed = classify_intent(message)
+            include_chart = routed.include_chart
+        
+            # Intent sederhana (daftar dokumen, salam, agregasi satu kolom sheet)
+            # dijawab langsung dari database tanpa memanggil LLM
+            local_answer = None
+            if routed.intent in settings.CHAT_LOCAL_INTENTS:
+                local_answer = answer_locally(
+                    routed, message, Document.objects.filter(scope) if scope is not None else None
+                )
+        
+        if local_answer is not None and dry_run:
+            return Response(
+                {"dry_run": True, "llm_call": False, "intent": routed.intent},
+                status=status.HTTP_200_OK
+            )
+        
+        if local_answer is not None:
+            # Jawaban lokal hanya memakai sedikit dokumen: simpan id yang dipakai saja
+            response_data, document_ids = local_answer
+            self._save_chat_log(
+                request, message, response_data, conversation_id, document_ids=document_ids
+            )
+            return Response(response_data, status=status.HTTP_200_OK)
 
         # Ambil history percakapan jika conversation_id ada (multi-turn context)
         # Ambil beberapa turn terakhir agar follow-up seperti "tampilkan dalam bentuk chart"
@@ -57,55 +132,123 @@ class ChatViewSet(viewsets.ViewSet):
         conversation_messages = []
         if conversation_id:
             try:
-                # Ambil 10 chat terakhir dalam room ini (ascending agar urut)
-                recent_logs = list(
-                    ChatLog.objects.filter(
-                        owner_user_id=request.user.user_id,
-                        conversation_id=conversation_id
-                    ).order_by('-created_at')[:10]
-                )
-                recent_logs.reverse()
+                with phase('history'):
+                    # Ambil 10 chat terakhir dalam room ini (ascending agar urut)
+                    recent_logs = list(
+                        ChatLog.objects.filter(
+                            owner_user_id=request.user.user_id,
+                            conversation_id=conversation_id
+                        ).order_by('-created_at')[:10]
+                    )
+                    recent_logs.reverse()
 
-                for log in recent_logs:
-                    if log.user_message:
-                        conversation_messages.append(
-                            {"role": "user", "content": log.user_message}
-                        )
-                    if log.response_text:
-                        # Simpan jawaban AI sebagai assistant message (tanpa chart config)
-                        conversation_messages.append(
-                            {"role": "assistant", "content": log.response_text}
-                        )
+                    for log in recent_logs:
+                        if log.user_message:
+                            conversation_messages.append(
+                                {"role": "user", "content": log.user_message}
+                            )
+                        if log.response_text:
+                            # Simpan jawaban AI sebagai assistant message (tanpa chart config)
+                            conversation_messages.append(
+                                {"role": "assistant", "content": log.response_text}
+                            )
+            except DeadlineExceeded:
+                raise
             except Exception:
                 # Jika gagal ambil history, lanjut tanpa history
                 conversation_messages = []
         
-        # Ambil SEMUA dokumen dari database (POC: dokumen global, bukan per-user)
-        documents = Document.objects.all().order_by('-created_at')
-        
-        # Konversi ke format yang dibutuhkan DeepSeek service
-        documents_data = [
-            {
-                'id': doc.id,
-                'title': doc.title,
-                'content': doc.content,
-                'structured_data': doc.structured_data
-            }
-            for doc in documents
-        ]
-        
-        # Extract document IDs untuk logging
-        document_ids = [doc.id for doc in documents]
-        
-        # Panggil DeepSeek
-        response_data, error_msg = DeepSeekService.call_deepseek(
+        with phase('documents'):
+            # Ambil SEMUA dokumen dari database (POC: dokumen global, bukan per-user)
+            documents = Document.objects.all().order_by('-created_at')
+        
+            if scope is not None:
+                # Dokumen dipilih client (lookup index id / relasi tag / created_at)
+                documents = documents.filter(scope)
+            elif settings.CHAT_RETRIEVAL == 'search':
+                # CHAT_RETRIEVAL=search: hanya dokumen paling relevan (full-text search
+                # di database), urut skor; tanpa hasil tetap memakai semua dokumen
+                with phase('retrieval'):
+                    ranked_ids = retrieve_document_ids(message, settings.CHAT_RETRIEVAL_LIMIT)
+                if ranked_ids:
+                    rank = {doc_id: index for index, doc_id in enumerate(ranked_ids)}
+                    documents = sorted(
+                        Document.objects.filter(id__in=ranked_ids), key=lambda doc: rank[doc.id]
+                    )
+        
+            # Konversi ke format yang dibutuhkan DeepSeek service
+            documents_data = [
+                {
+                    'id': doc.id,
+                    'title': doc.title,
+                    'content': doc.content,
+                    'structured_data': doc.structured_data,
+                    'token_count': doc.token_count,
+                    'structured_token_count': doc.structured_token_count,
+                }
+                for doc in documents
+            ]
+        
+            # Snapshot corpus (content-hashed) untuk logging, pengganti daftar semua document ID
+            snapshot = CorpusSnapshot.for_documents(documents)
+        
+        # Chart dari dokumen XLSX dibangun di server (lihat CHART_BUILDER_MODE):
+        # LLM cukup memilih kolom (spec) atau tidak dilibatkan sama sekali (heuristic)
+        chart_mode = settings.CHART_BUILDER_MODE
+        chart_sources = ''
+        if include_chart and chart_mode in ('spec', 'heuristic'):
+            chart_sources = ChartBuilder.describe_sources(documents_data)
+        
+        llm_include_chart = include_chart and not (chart_mode == 'heuristic' and chart_sources)
+        llm_arguments = dict(
             message=message,
             documents=documents_data,
-            include_chart=include_chart,
-            document_ids=document_ids,
+            include_chart=llm_include_chart,
+            corpus_snapshot_id=snapshot.id,
             conversation_messages=conversation_messages,
+            chart_sources=chart_sources if chart_mode == 'spec' else '',
+            # Model / max_tokens / temperature per kelas query (LLM_ROUTES)
+            route=select_route(
+                message, llm_include_chart, len(conversation_messages), intent=routed.intent
+            ),
         )
         
+        if dry_run:
+            # Prefix konteks snapshot yang sama kemungkinan masih di cache DeepSeek
+            # jika baru saja dikirim (ChatLog menyimpan snapshot setiap panggilan LLM)
+            prefix_recently_sent = ChatLog.objects.filter(
+                corpus_snapshot=snapshot,
+                created_at__gte=timezone.now() - self.PROMPT_CACHE_WINDOW
+            ).exists()
+            plan = DeepSeekService.plan_call(
+                **llm_arguments,
+                prefix_recently_sent=prefix_recently_sent,
+                include_messages=request.query_params.get('include_messages', '').lower() in ('1', 'true', 'yes'),
+            )
+            return Response(
+                {
+                    "dry_run": True,
+                    "llm_call": True,
+                    "intent": routed.intent,
+                    "include_chart": llm_arguments['include_chart'],
+                    "chart_mode": chart_mode if chart_sources else None,
+                    "corpus_snapshot_id": snapshot.id,
+                    **plan,
+                },
+                status=status.HTTP_200_OK
+            )
+        
+        # Admission control: kuota token LLM user lalu slot global panggilan LLM;
+        # melewati batas = 429 + Retry-After (AdmissionRejected) tanpa memanggil DeepSeek
+        estimated_tokens = estimate_prompt_tokens(documents_data, conversation_messages, message)
+        with admit_llm_call(
+            request.user.user_id, estimated_tokens, llm_arguments['route'].name
+        ) as admission:
+            # Panggil DeepSeek
+            response_data, error_msg = DeepSeekService.call_deepseek(
+                **llm_arguments, on_usage=admission.charge
+            )
+        
         if error_msg:
             return Response(
                 {
@@ -115,22 +258,60 @@ class ChatViewSet(viewsets.ViewSet):
                 status=status.HTTP_502_BAD_GATEWAY
             )
         
-        # Simpan ke chat log (opsional)
-        try:
-            ChatLog.objects.create(
-                owner_user_id=request.user.user_id,
-                user_message=message,
-                response_text=response_data.get('text', ''),
-                response_chart_json=response_data.get('chart'),
-                document_ids=document_ids,
-                conversation_id=conversation_id
-            )
-        except Exception:
-            # Jika gagal save log, tidak perlu error ke user
-            pass
+        with phase('chart'):
+            if chart_sources:
+                response_data['chart'] = ChartBuilder.resolve_chart(
+                    response_data.get('chart'), message, documents_data, chart_mode
+                )
+        
+            # Batasi jumlah titik chart (LTTB / time-bucket) agar payload dan render tetap ringan
+            if response_data.get('chart'):
+                response_data['chart'] = downsample_chart(
+                    response_data['chart'], settings.CHART_MAX_POINTS
+                )
+        
+        # Simpan ke chat log (opsional, asynchronous)
+        self._save_chat_log(
+            request, message, response_data, conversation_id, corpus_snapshot=snapshot
+        )
         
         # Return response
         return Response(response_data, status=status.HTTP_200_OK)
+    
+    @staticmethod
+    def _document_scope(data) -> Optional[Q]:
+        """Filter dokumen konteks dari request chat, None jika tidak ada filter"""
+        scope = Q()
+        if data.get('document_ids'):
+            scope &= Q(id__in=data['document_ids'])
+        if data.get('tags'):
+            scope &= Q(id__in=Document.ids_with_any_tag(data['tags']))
+        # Rentang tanggal upload (zona waktu TIME_ZONE), date_to inklusif
+        if data.get('date_from'):
+            scope &= Q(created_at__gte=ChatViewSet._start_of_day(data['date_from']))
+        if data.get('date_to'):
+            scope &= Q(created_at__lt=ChatViewSet._start_of_day(data['date_to'] + timedelta(days=1)))
+        return scope or None
+    
+    @staticmethod
+    def _start_of_day(day: date) -> datetime:
+        return timezone.make_aware(datetime.combine(day, time.min))
+    
+    @staticmethod
+    @phase('chatlog')
+    def _save_chat_log(request, message, response_data, conversation_id,
+                       document_ids=None, corpus_snapshot=None):
+        # Ditulis batch oleh background writer (lihat CHAT_LOG_ASYNC), bukan di jalur response;
+        # gagal simpan log tidak perlu error ke user
+        chat_log_writer.submit(ChatLog(
+            owner_user_id=request.user.user_id,
+            user_message=message,
+            response_text=response_data.get('text', ''),
+            response_chart_json=response_data.get('chart'),
+            document_ids=document_ids,
+            corpus_snapshot=corpus_snapshot,
+            conversation_id=conversation_id
+        ))
 
 
 class ChatHistoryViewSet(viewsets.ViewSet):
@@ -138,27 +319,77 @@ class ChatHistoryViewSet(viewsets.ViewSet):
     ViewSet untuk melihat history chat (opsional)
     
     Endpoints:
-    - GET /api/chat/history - List chat history
+    - GET /api/chat/history - List chat history (cursor pagination)
+    - GET /api/chat/history/{id} - Detail satu chat (full response + chart)
     """
     
     authentication_classes = [SSOAuthentication]
     permission_classes = [IsAuthenticated]
     
+    DEFAULT_LIMIT = 50
+    MAX_LIMIT = 200
+    
     @chat_history_schema
     def list(self, request):
         """
         List chat history untuk user
         
-        GET /api/chat/history
+        GET /api/chat/history?limit=50&cursor=...&conversation_id=...&full=1
         """
+        try:
+            limit = parse_limit(
+                request.query_params.get('limit'), self.DEFAULT_LIMIT, self.MAX_LIMIT
+            )
+        except InvalidPaginationParam as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
         # Filter berdasarkan owner_user_id
-        chat_logs = ChatLog.objects.filter(
-            owner_user_id=request.user.user_id
-        ).order_by('-created_at')[:50]  # Ambil 50 terakhir
+        chat_logs = ChatLog.objects.filter(owner_user_id=request.user.user_id)
+        
+        # Filter per percakapan (memakai index conversation_id, -created_at)
+        conversation_id = request.query_params.get('conversation_id')
+        if conversation_id:
+            chat_logs = chat_logs.filter(conversation_id=conversation_id)
+        
+        # Default ringkas: body lengkap (response_text + chart) hanya jika diminta full=1
+        full = request.query_params.get('full', '').lower() in ('1', 'true', 'yes')
+        slim = not full
+        if slim:
+            # Jangan ambil response_text dan chart JSON; body diambil via detail endpoint
+            chat_logs = chat_logs.only(
+                'id', 'user_message', 'conversation_id', 'created_at'
+            ).annotate(
+                has_chart=ExpressionWrapper(
+                    Q(response_chart_json__isnull=False), output_field=BooleanField()
+                )
+            )
         
-        serializer = ChatLogSerializer(chat_logs, many=True)
+        try:
+            page, next_cursor = paginate_keyset(
+                chat_logs, request.query_params.get('cursor'), limit
+            )
+        except InvalidPaginationParam as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        serializer_class = ChatLogListSerializer if slim else ChatLogSerializer
+        serializer = serializer_class(page, many=True)
         
         return Response({
-            "count": chat_logs.count(),
+            "count": len(page),
+            "next_cursor": next_cursor,
             "history": serializer.data
         })
+    
+    @chat_history_detail_schema
+    def retrieve(self, request, pk=None):
+        """
+        Detail satu chat history milik user
+        
+        GET /api/chat/history/{id}
+        """
+        chat_log = get_object_or_404(
+            ChatLog, pk=pk, owner_user_id=request.user.user_id
+        )
+        
+        serializer = ChatLogSerializer(chat_log)
+        return Response(serializer.data)
@@ -10,7 +10,9 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
 from pathlib import Path
+from corsheaders.defaults import default_headers
 from decouple import config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -49,6 +51,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.timing.RequestTimingMiddleware',
+    'core.metrics.MetricsMiddleware',
+    'core.profiling.ProfilingMiddleware',
+    'core.deadline.DeadlineMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -179,6 +185,51 @@ SWAGGER_SETTINGS = {
     'VALIDATOR_URL': None,
 }
 
+# Instrumentasi per request (core/timing.py): durasi fase (auth, db, history, llm, ...)
+# dikirim sebagai header Server-Timing dan/atau satu baris log JSON ke logger 'core.timing'
+REQUEST_TIMING_HEADER = config('REQUEST_TIMING_HEADER', default=True, cast=bool)
+REQUEST_TIMING_LOG = config('REQUEST_TIMING_LOG', default=True, cast=bool)
+
+# Metrics Prometheus di GET /metrics (core/metrics.py)
+METRICS_ENABLED = config('METRICS_ENABLED', default=True, cast=bool)
+# Direktori bersama untuk snapshot metrics per worker (wajib untuk gunicorn/uWSGI multi-proses;
+# kosongkan = hanya proses yang melayani /metrics). gunicorn_config.py membersihkannya saat start.
+METRICS_DIR = config('METRICS_DIR', default='')
+METRICS_FLUSH_INTERVAL = config('METRICS_FLUSH_INTERVAL', default=1.0, cast=float)
+# Jika diisi, /metrics mewajibkan header Authorization: Bearer <token>
+METRICS_AUTH_TOKEN = config('METRICS_AUTH_TOKEN', default='')
+
+# Profiling sampling per request (cProfile, core/profiling.py), opt-in.
+# Request diprofil secara acak (PROFILING_SAMPLE_RATE, 0.01 = 1%) atau jika membawa header
+# X-Profile-Token yang cocok dengan PROFILING_HEADER_TOKEN. Ringkas: python manage.py merge_profiles
+PROFILING_ENABLED = config('PROFILING_ENABLED', default=False, cast=bool)
+PROFILING_SAMPLE_RATE = config('PROFILING_SAMPLE_RATE', default=0.0, cast=float)
+PROFILING_HEADER_TOKEN = config('PROFILING_HEADER_TOKEN', default='')
+PROFILING_DIR = config('PROFILING_DIR', default='/tmp/noc_rag_profiles')
+# Profil baru tidak ditulis lagi jika direktori sudah berisi sebanyak ini (batas disk)
+PROFILING_MAX_FILES = config('PROFILING_MAX_FILES', default=500, cast=int)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json_line': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'timing_console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'json_line',
+        },
+    },
+    'loggers': {
+        'core.timing': {
+            'handlers': ['timing_console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
 # CORS Configuration
 # Allow all origins (untuk dev/demo; di production sebaiknya gunakan CORS_ALLOWED_ORIGINS)
 CORS_ALLOW_ALL_ORIGINS = config('CORS_ALLOW_ALL_ORIGINS', default=True, cast=bool)
@@ -190,6 +241,10 @@ CORS_ALLOW_ALL_ORIGINS = config('CORS_ALLOW_ALL_ORIGINS', default=True, cast=boo
 # ).split(',')
 
 CORS_ALLOW_CREDENTIALS = True
+# Agar frontend lintas origin bisa membaca header Server-Timing
+CORS_EXPOSE_HEADERS = ['Server-Timing', 'Retry-After']
+# Header deadline dari client (core/deadline.py)
+CORS_ALLOW_HEADERS = (*default_headers, 'x-request-timeout')
 
 # Cache Configuration (untuk SSO token caching)
 CACHES = {
@@ -204,11 +259,152 @@ CACHES = {
 SSO_BASE_URL = config('SSO_BASE_URL', default='https://sso.arnatech.id/api')
 SSO_VERIFY_TOKEN_ENDPOINT = config('SSO_VERIFY_TOKEN_ENDPOINT', default='/auth/token/verify/')
 
+# Mode verifikasi token: 'remote' (POST ke SSO verify endpoint per token baru),
+# 'local' (validasi signature/exp/aud lokal), atau 'hybrid' (local, fallback ke remote
+# jika kunci verifikasi tidak tersedia)
+SSO_VERIFY_MODE = config('SSO_VERIFY_MODE', default='remote')
+SSO_JWT_ALGORITHMS = [
+    alg.strip()
+    for alg in config('SSO_JWT_ALGORITHMS', default='HS256,RS256').split(',')
+    if alg.strip()
+]
+# Shared secret untuk token HS* (SIGNING_KEY SSO)
+SSO_JWT_SIGNING_KEY = config('SSO_JWT_SIGNING_KEY', default='')
+# Public key PEM untuk token RS*/ES* (alternatif dari JWKS)
+SSO_JWT_PUBLIC_KEY = config('SSO_JWT_PUBLIC_KEY', default='').replace('\\n', '\n')
+SSO_JWKS_URL = config('SSO_JWKS_URL', default='')
+SSO_JWKS_CACHE_TTL = config('SSO_JWKS_CACHE_TTL', default=300, cast=int)
+# Jarak minimal antar refresh paksa JWKS (saat kid tidak dikenal)
+SSO_JWKS_MIN_REFRESH_INTERVAL = config('SSO_JWKS_MIN_REFRESH_INTERVAL', default=30, cast=int)
+SSO_JWT_AUDIENCE = config('SSO_JWT_AUDIENCE', default='')
+SSO_JWT_ISSUER = config('SSO_JWT_ISSUER', default='')
+SSO_JWT_LEEWAY = config('SSO_JWT_LEEWAY', default=10, cast=int)
+
+# Direktori privat (0700, milik user proses) untuk file state SQLite yang dibagi antar
+# worker (core/shared_state.py). Jangan arahkan ke direktori yang bisa ditulis user lain
+# seperti /tmp: file yang tidak aman ditolak dan fiturnya berjalan tanpa state bersama
+SHARED_STATE_DIR = config('SHARED_STATE_DIR', default=str(BASE_DIR / 'var'))
+
+# Cache hasil verifikasi token: L1 LocMemCache per worker + L2 SQLite shared antar worker
+# (kosongkan SSO_TOKEN_SHARED_CACHE_PATH untuk menonaktifkan tier shared)
+SSO_TOKEN_SHARED_CACHE_PATH = config(
+    'SSO_TOKEN_SHARED_CACHE_PATH',
+    default=os.path.join(SHARED_STATE_DIR, 'sso_tokens.sqlite3')
+)
+# TTL token valid (detik), selalu dibatasi claim exp token
+SSO_TOKEN_CACHE_TTL = config('SSO_TOKEN_CACHE_TTL', default=60, cast=int)
+# TTL negative cache untuk token invalid (detik)
+SSO_TOKEN_NEGATIVE_TTL = config('SSO_TOKEN_NEGATIVE_TTL', default=10, cast=int)
+# Maksimal waktu menunggu verifikasi token yang sama oleh request/worker lain (detik)
+SSO_TOKEN_SINGLE_FLIGHT_WAIT = config('SSO_TOKEN_SINGLE_FLIGHT_WAIT', default=6, cast=float)
+
 # DeepSeek API Configuration
 DEEPSEEK_API_KEY = config('DEEPSEEK_API_KEY', default='')
 DEEPSEEK_API_URL = config('DEEPSEEK_API_URL', default='https://api.deepseek.com/v1/chat/completions')
 DEEPSEEK_MODEL = config('DEEPSEEK_MODEL', default='deepseek-chat')
 DEEPSEEK_TIMEOUT = config('DEEPSEEK_TIMEOUT', default=60, cast=int)
+# Estimasi dry-run chat (POST /api/chat/?dry_run=1): context window model (token) dan
+# harga per 1 juta token (USD) untuk input cache miss, input cache hit, dan output
+DEEPSEEK_CONTEXT_TOKENS = config('DEEPSEEK_CONTEXT_TOKENS', default=128000, cast=int)
+DEEPSEEK_PRICE_INPUT_PER_M = config('DEEPSEEK_PRICE_INPUT_PER_M', default=0.28, cast=float)
+DEEPSEEK_PRICE_CACHED_INPUT_PER_M = config('DEEPSEEK_PRICE_CACHED_INPUT_PER_M', default=0.028, cast=float)
+DEEPSEEK_PRICE_OUTPUT_PER_M = config('DEEPSEEK_PRICE_OUTPUT_PER_M', default=0.42, cast=float)
+
+# Routing LLM per kelas query (core/llm_routing.py): short (pertanyaan singkat), standard,
+# analysis (pesan panjang / permintaan analisis) dan chart. Format tiap rute:
+# "model,max_tokens,temperature" (model kosong = DEEPSEEK_MODEL). Jawaban yang terpotong
+# max_tokens diulang sekali dengan rute analysis. LLM_ROUTING_ENABLED=False: semua request
+# memakai DEEPSEEK_MODEL, max_tokens 8000, temperature 0.7
+LLM_ROUTING_ENABLED = config('LLM_ROUTING_ENABLED', default=True, cast=bool)
+LLM_ROUTES = {
+    'short': config('LLM_ROUTE_SHORT', default=',1024,0.3'),
+    'standard': config('LLM_ROUTE_STANDARD', default=',4000,0.7'),
+    'analysis': config('LLM_ROUTE_ANALYSIS', default=',8000,0.7'),
+    'chart': config('LLM_ROUTE_CHART', default=',8000,0.3'),
+}
+# Pesan <= LLM_SHORT_MAX_WORDS kata dengan history < LLM_DEEP_HISTORY_MESSAGES message = short;
+# pesan >= LLM_ANALYSIS_MIN_WORDS kata = analysis
+LLM_SHORT_MAX_WORDS = config('LLM_SHORT_MAX_WORDS', default=12, cast=int)
+LLM_ANALYSIS_MIN_WORDS = config('LLM_ANALYSIS_MIN_WORDS', default=60, cast=int)
+LLM_DEEP_HISTORY_MESSAGES = config('LLM_DEEP_HISTORY_MESSAGES', default=6, cast=int)
+
+# Admission control (core/admission.py), state dibagi antar worker lewat file SQLite
+# ADMISSION_SHARED_PATH. Melewati batas = 429 + Retry-After.
+# - Request chat per user (throttle ChatViewSet): bucket ADMISSION_REQUEST_BURST, isi ulang
+#   ADMISSION_REQUEST_RATE per detik
+# - Token LLM per user: bucket ADMISSION_LLM_TOKEN_BURST, isi ulang ADMISSION_LLM_TOKEN_RATE per detik
+# - Maksimal ADMISSION_LLM_MAX_CONCURRENCY panggilan LLM bersamaan (semua worker); sisanya
+#   menunggu di antrian berprioritas (maks ADMISSION_LLM_QUEUE_SIZE, ADMISSION_LLM_QUEUE_TIMEOUT detik)
+ADMISSION_ENABLED = config('ADMISSION_ENABLED', default=True, cast=bool)
+ADMISSION_SHARED_PATH = config(
+    'ADMISSION_SHARED_PATH',
+    default=os.path.join(SHARED_STATE_DIR, 'admission.sqlite3')
+)
+ADMISSION_REQUEST_BURST = config('ADMISSION_REQUEST_BURST', default=60, cast=int)
+ADMISSION_REQUEST_RATE = config('ADMISSION_REQUEST_RATE', default=2.0, cast=float)
+ADMISSION_LLM_TOKEN_BURST = config('ADMISSION_LLM_TOKEN_BURST', default=300000, cast=int)
+ADMISSION_LLM_TOKEN_RATE = config('ADMISSION_LLM_TOKEN_RATE', default=1000.0, cast=float)
+ADMISSION_LLM_MAX_CONCURRENCY = config('ADMISSION_LLM_MAX_CONCURRENCY', default=8, cast=int)
+ADMISSION_LLM_QUEUE_SIZE = config('ADMISSION_LLM_QUEUE_SIZE', default=16, cast=int)
+ADMISSION_LLM_QUEUE_TIMEOUT = config('ADMISSION_LLM_QUEUE_TIMEOUT', default=5.0, cast=float)
+# Lease slot LLM (detik): slot milik worker yang mati dilepas otomatis setelah ini.
+# Cukup untuk dua panggilan (eskalasi rute) ditambah buffer
+ADMISSION_LLM_SLOT_TTL = DEEPSEEK_TIMEOUT * 2 + 10
+
+# Deadline end-to-end per request (core/deadline.py): verifikasi SSO, query database,
+# antrian slot LLM dan panggilan DeepSeek hanya memakai sisa waktu deadline; lewat deadline = 504.
+# REQUEST_DEADLINES: "nama_url=detik" per endpoint (selain itu REQUEST_DEADLINE_DEFAULT).
+# Client bisa meminta deadline sendiri lewat header X-Request-Timeout (detik), maksimal
+# REQUEST_DEADLINE_MAX (di bawah timeout gunicorn 120 detik)
+REQUEST_DEADLINE_ENABLED = config('REQUEST_DEADLINE_ENABLED', default=True, cast=bool)
+REQUEST_DEADLINE_DEFAULT = config('REQUEST_DEADLINE_DEFAULT', default=30.0, cast=float)
+REQUEST_DEADLINE_MAX = config('REQUEST_DEADLINE_MAX', default=110.0, cast=float)
+REQUEST_DEADLINES = {
+    name.strip(): float(seconds)
+    for name, _, seconds in (
+        entry.partition('=')
+        for entry in config(
+            'REQUEST_DEADLINES', default='chat=90,document-list=60,document-bulk-upload=110'
+        ).split(',')
+    )
+    if name.strip() and seconds.strip()
+}
+
+# Pembuatan chart untuk dokumen XLSX (structured_data):
+# 'spec' (LLM memilih kolom lewat chart spec kecil, chart dibangun di server),
+# 'heuristic' (chart dibangun di server tanpa bantuan LLM), atau
+# 'llm' (LLM menulis konfigurasi Chart.js lengkap, perilaku lama)
+CHART_BUILDER_MODE = config('CHART_BUILDER_MODE', default='spec')
+
+# Intent chat yang boleh dijawab lokal tanpa LLM (kosongkan untuk selalu memakai LLM):
+# listing (daftar dokumen), smalltalk (salam/terima kasih), aggregate (total/rata-rata kolom sheet)
+CHAT_LOCAL_INTENTS = [
+    intent.strip()
+    for intent in config('CHAT_LOCAL_INTENTS', default='listing,smalltalk,aggregate').split(',')
+    if intent.strip()
+]
+
+# ChatLog ditulis oleh background writer per proses (chat/log_writer.py) dengan bulk_create
+# per CHAT_LOG_BATCH_SIZE log atau per CHAT_LOG_FLUSH_INTERVAL detik. Antrian penuh:
+# request menunggu maksimal CHAT_LOG_ENQUEUE_TIMEOUT detik lalu log dibuang. Log dengan
+# conversation_id selalu ditulis langsung (dibaca turn berikutnya sebagai history).
+# CHAT_LOG_ASYNC=False untuk menulis langsung di request.
+CHAT_LOG_ASYNC = config('CHAT_LOG_ASYNC', default=True, cast=bool)
+CHAT_LOG_QUEUE_SIZE = config('CHAT_LOG_QUEUE_SIZE', default=1000, cast=int)
+CHAT_LOG_BATCH_SIZE = config('CHAT_LOG_BATCH_SIZE', default=50, cast=int)
+CHAT_LOG_FLUSH_INTERVAL = config('CHAT_LOG_FLUSH_INTERVAL', default=0.25, cast=float)
+CHAT_LOG_ENQUEUE_TIMEOUT = config('CHAT_LOG_ENQUEUE_TIMEOUT', default=0.05, cast=float)
+CHAT_LOG_SHUTDOWN_TIMEOUT = config('CHAT_LOG_SHUTDOWN_TIMEOUT', default=5.0, cast=float)
+
+# Retensi ChatLog: python manage.py archive_chat_logs memindahkan log lebih tua dari
+# CHAT_LOG_RETENTION_DAYS hari ke CHAT_LOG_ARCHIVE_DIR (JSONL + zlib per tanggal)
+CHAT_LOG_RETENTION_DAYS = config('CHAT_LOG_RETENTION_DAYS', default=90, cast=int)
+CHAT_LOG_ARCHIVE_DIR = config('CHAT_LOG_ARCHIVE_DIR', default=str(BASE_DIR / 'archive' / 'chat_logs'))
+
+# Budget titik chart: config chart di response chat direduksi (LTTB / time-bucket)
+# ke CHART_MAX_POINTS; rows sheet di prompt chart dibatasi CHART_PROMPT_MAX_ROWS per sheet
+CHART_MAX_POINTS = config('CHART_MAX_POINTS', default=500, cast=int)
+CHART_PROMPT_MAX_ROWS = config('CHART_PROMPT_MAX_ROWS', default=200, cast=int)
 
 # Upload Settings
 MAX_UPLOAD_SIZE_MB = config('MAX_UPLOAD_SIZE_MB', default=10, cast=int)
@@ -216,6 +412,43 @@ MAX_UPLOAD_SIZE_MB = config('MAX_UPLOAD_SIZE_MB', default=10, cast=int)
 # DeepSeek context: 64k tokens (~192k chars). Set 150k untuk aman dengan buffer.
 DOCUMENT_CONTEXT_MAX_LENGTH = config('DOCUMENT_CONTEXT_MAX_LENGTH', default=150000, cast=int)
 
+# Full-text search dokumen (core/search.py): FTS5 di SQLite, tsvector di PostgreSQL.
+# SEARCH_TS_CONFIG: text search config PostgreSQL ('simple' atau 'indonesian' jika tersedia);
+# setelah diganti jalankan python manage.py rebuild_search_index
+SEARCH_TS_CONFIG = config('SEARCH_TS_CONFIG', default='simple')
+
+# Dokumen konteks chat: 'all' = semua dokumen, 'search' = CHAT_RETRIEVAL_LIMIT dokumen
+# paling relevan menurut full-text search (fallback ke semua dokumen jika tidak ada hasil)
+CHAT_RETRIEVAL = config('CHAT_RETRIEVAL', default='all')
+CHAT_RETRIEVAL_LIMIT = config('CHAT_RETRIEVAL_LIMIT', default=5, cast=int)
+
+# Kompresi Document.content at rest: 'none', 'zlib' atau 'lzma'
+# Baris lama dikonversi via: python manage.py compress_documents
+DOCUMENT_CONTENT_COMPRESSION = config('DOCUMENT_CONTENT_COMPRESSION', default='none')
+# Teks lebih pendek dari ini disimpan tanpa kompresi (overhead > manfaat)
+DOCUMENT_CONTENT_COMPRESSION_MIN_LENGTH = config('DOCUMENT_CONTENT_COMPRESSION_MIN_LENGTH', default=512, cast=int)
+
+# Cache payload GET /api/documents/{id} per proses (LRU, divalidasi dengan updated_at)
+DOCUMENT_DETAIL_CACHE_SIZE = config('DOCUMENT_DETAIL_CACHE_SIZE', default=128, cast=int)
+DOCUMENT_DETAIL_CACHE_MAX_MB = config('DOCUMENT_DETAIL_CACHE_MAX_MB', default=64, cast=int)
+# Cache sheet structured_data (sudah di-parse) untuk GET /api/documents/{id}/rows per proses;
+# ukuran dihitung dari panjang JSON di database
+DOCUMENT_ROWS_CACHE_SIZE = config('DOCUMENT_ROWS_CACHE_SIZE', default=16, cast=int)
+DOCUMENT_ROWS_CACHE_MAX_MB = config('DOCUMENT_ROWS_CACHE_MAX_MB', default=128, cast=int)
+
 # File Upload Settings
 DATA_UPLOAD_MAX_MEMORY_SIZE = MAX_UPLOAD_SIZE_MB * 1024 * 1024  # MB to bytes
 FILE_UPLOAD_MAX_MEMORY_SIZE = MAX_UPLOAD_SIZE_MB * 1024 * 1024
+
+# Bulk Upload Settings (POST /api/documents/bulk/)
+BULK_UPLOAD_MAX_FILES = config('BULK_UPLOAD_MAX_FILES', default=500, cast=int)
+BULK_UPLOAD_MAX_ARCHIVE_SIZE_MB = config('BULK_UPLOAD_MAX_ARCHIVE_SIZE_MB', default=200, cast=int)
+# Jumlah worker ekstraksi paralel (default: jumlah CPU)
+BULK_UPLOAD_MAX_WORKERS = config('BULK_UPLOAD_MAX_WORKERS', default=os.cpu_count() or 1, cast=int)
+# Pool ekstraksi per worker, dibuat sekali dan dipakai ulang semua request:
+# 'thread' (default) atau 'process' (ekstraksi CPU-bound paralel antar core,
+# proses ekstraksi dijalankan lewat forkserver/spawn, bukan fork dari worker)
+BULK_UPLOAD_EXECUTOR = config('BULK_UPLOAD_EXECUTOR', default='thread')
+BULK_UPLOAD_BATCH_SIZE = config('BULK_UPLOAD_BATCH_SIZE', default=100, cast=int)
+# Django default hanya 100 file per request
+DATA_UPLOAD_MAX_NUMBER_FILES = BULK_UPLOAD_MAX_FILES
@@ -7,6 +7,8 @@ from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 
+from core.views import metrics_view
+
 # Swagger/OpenAPI Schema
 schema_view = get_schema_view(
     openapi.Info(
@@ -73,6 +75,9 @@ urlpatterns = [
     path('api/documents/', include('documents.urls')),
     path('api/chat/', include('chat.urls')),
     
+    # Metrics Prometheus (lihat core/metrics.py)
+    path('metrics', metrics_view, name='metrics'),
+    
     # Swagger/OpenAPI Documentation
     re_path(r'^swagger(?P<format>\.json|\.yaml)$', schema_view.without_ui(cache_timeout=0), name='schema-json'),
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
@@ -14,3 +14,21 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_wsgi_application()
+
+try:
+    import uwsgi
+except ImportError:
+    # Bukan di bawah uWSGI (gunicorn memakai hook worker_exit di gunicorn_config.py)
+    uwsgi = None
+
+
+def worker_exit():
+    """Flush antrian ChatLog dan hentikan pool ekstraksi saat worker uWSGI berhenti"""
+    from chat.log_writer import chat_log_writer
+    from core.bulk_ingest import BulkIngestService
+    chat_log_writer.stop()
+    BulkIngestService.shutdown()
+
+
+if uwsgi is not None:
+    uwsgi.atexit = worker_exit
@@ -0,0 +1,420 @@
+"""
+Admission control: token bucket per user dan batas panggilan LLM bersamaan
+
+State disimpan di file SQLite (WAL) ADMISSION_SHARED_PATH sehingga berlaku untuk
+semua worker gunicorn di host yang sama:
+
+- Token bucket request per user (UserRequestThrottle, DRF throttle endpoint chat)
+- Token bucket token LLM per user: estimasi token prompt didebit sebelum panggilan
+  DeepSeek, lalu disesuaikan dengan usage sebenarnya setelah response
+- Slot global panggilan LLM in-flight (ADMISSION_LLM_MAX_CONCURRENCY) dengan antrian
+  tunggu terbatas berprioritas: pertanyaan singkat didahulukan dari analisis panjang
+
+Request yang melewati batas langsung ditolak dengan 429 + Retry-After (exception
+Throttled DRF), bukan menunggu sampai timeout. Jika file SQLite tidak bisa dipakai
+(termasuk file / direktori yang bisa ditulis user lain, lihat core/shared_state.py),
+admission control fail-open (request tetap dilayani).
+"""
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+from django.conf import settings
+from rest_framework.exceptions import Throttled
+from rest_framework.throttling import BaseThrottle
+
+from core import shared_state
+from core.deadline import DeadlineExceeded, budget
+from core.metrics import ADMISSION_DECISIONS, LLM_QUEUE_WAIT
+from core.text_stats import estimate_tokens
+from core.timing import phase
+
+
+logger = logging.getLogger('core.admission')
+
+# Prioritas antrian slot LLM per rute (core/llm_routing.py), angka kecil didahulukan
+LLM_PRIORITIES = {
+    'short': 0,
+    'standard': 1,
+    'chart': 1,
+    'default': 1,
+    'analysis': 2,
+}
+
+# Interval polling antrian slot (detik), ditambah jitter agar worker tidak serempak
+QUEUE_POLL_INTERVAL = 0.02
+QUEUE_POLL_JITTER = 0.02
+
+
+class AdmissionRejected(Throttled):
+    """429 Too Many Requests dengan header Retry-After"""
+    
+    default_detail = 'Terlalu banyak request, coba lagi nanti.'
+    
+    def __init__(self, wait: float, detail: Optional[str] = None, reason: str = ''):
+        super().__init__(wait=max(wait, 1), detail=detail)
+        self.reason = reason
+
+
+class AdmissionStore:
+    """Token bucket dan slot LLM di file SQLite bersama (koneksi per thread, dibuat ulang setelah fork)"""
+    
+    _local = threading.local()
+    
+    @classmethod
+    def _conn(cls) -> Optional[sqlite3.Connection]:
+        path = settings.ADMISSION_SHARED_PATH
+        if not path:
+            return None
+        
+        if getattr(cls._local, 'pid', None) == os.getpid() and getattr(cls._local, 'path', None) == path:
+            return cls._local.conn
+        
+        try:
+            conn = shared_state.connect(path, timeout=2.0)
+        except OSError as e:
+            # File yang bisa ditulis user lain tidak dipakai (kuota / slot bisa dimanipulasi)
+            logger.warning('Admission control dinonaktifkan: %s', e)
+            conn = None
+        else:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS admission_buckets ('
+                'key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)'
+            )
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS admission_llm_slots ('
+                'ticket TEXT PRIMARY KEY, expires_at REAL NOT NULL)'
+            )
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS admission_llm_waiters ('
+                'ticket TEXT PRIMARY KEY, priority INTEGER NOT NULL, '
+                'enqueued_at REAL NOT NULL, expires_at REAL NOT NULL)'
+            )
+        cls._local.conn = conn
+        cls._local.pid = os.getpid()
+        cls._local.path = path
+        return conn
+    
+    @staticmethod
+    @contextmanager
+    def _immediate(conn: sqlite3.Connection) -> Iterator[sqlite3.Connection]:
+        """Transaksi write (BEGIN IMMEDIATE): baca-ubah-tulis atomik antar worker"""
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+    
+    @staticmethod
+    def _refill(row, capacity: float, rate: float, now: float) -> float:
+        if row is None:
+            return capacity
+        tokens, updated_at = row
+        return min(capacity, tokens + max(0.0, now - updated_at) * rate)
+    
+    @classmethod
+    def take(cls, key: str, cost: float, capacity: float, rate: float) -> float:
+        """
+        Ambil cost token dari bucket key (kapasitas capacity, isi ulang rate token/detik)
+        
+        Returns:
+            0 jika diterima (token didebit), atau detik sampai token cukup (tidak didebit)
+        """
+        cost = min(cost, capacity)
+        try:
+            conn = cls._conn()
+            if conn is None:
+                return 0.0
+            now = time.time()
+            with cls._immediate(conn):
+                row = conn.execute(
+                    'SELECT tokens, updated_at FROM admission_buckets WHERE key = ?', (key,)
+                ).fetchone()
+                tokens = cls._refill(row, capacity, rate, now)
+                if tokens >= cost:
+                    tokens -= cost
+                    wait = 0.0
+                else:
+                    wait = (cost - tokens) / rate if rate > 0 else 3600.0
+                conn.execute(
+                    'INSERT OR REPLACE INTO admission_buckets (key, tokens, updated_at) VALUES (?, ?, ?)',
+                    (key, tokens, now)
+                )
+                # Bucket yang sudah lama penuh tidak perlu disimpan
+                if random.random() < 0.001:
+                    conn.execute('DELETE FROM admission_buckets WHERE updated_at < ?', (now - 86400,))
+            return wait
+        except sqlite3.Error:
+            return 0.0
+    
+    @classmethod
+    def adjust(cls, key: str, amount: float, capacity: float, rate: float):
+        """Debit (amount > 0) atau kembalikan (amount < 0) token; saldo boleh negatif (utang)"""
+        if not amount:
+            return
+        try:
+            conn = cls._conn()
+            if conn is None:
+                return
+            now = time.time()
+            with cls._immediate(conn):
+                row = conn.execute(
+                    'SELECT tokens, updated_at FROM admission_buckets WHERE key = ?', (key,)
+                ).fetchone()
+                tokens = min(capacity, cls._refill(row, capacity, rate, now) - amount)
+                conn.execute(
+                    'INSERT OR REPLACE INTO admission_buckets (key, tokens, updated_at) VALUES (?, ?, ?)',
+                    (key, tokens, now)
+                )
+        except sqlite3.Error:
+            pass
+    
+    @classmethod
+    def _try_acquire(cls, conn: sqlite3.Connection, ticket: str, priority: int,
+                     enqueued_at: float, now: float) -> bool:
+        """Ambil slot jika ada yang kosong dan tidak ada waiter yang lebih didahulukan"""
+        conn.execute('DELETE FROM admission_llm_slots WHERE expires_at < ?', (now,))
+        conn.execute('DELETE FROM admission_llm_waiters WHERE expires_at < ?', (now,))
+        active = conn.execute('SELECT COUNT(*) FROM admission_llm_slots').fetchone()[0]
+        if active >= settings.ADMISSION_LLM_MAX_CONCURRENCY:
+            return False
+        ahead = conn.execute(
+            'SELECT COUNT(*) FROM admission_llm_waiters WHERE ticket != ? AND '
+            '(priority < ? OR (priority = ? AND enqueued_at < ?))',
+            (ticket, priority, priority, enqueued_at)
+        ).fetchone()[0]
+        if ahead:
+            return False
+        conn.execute('DELETE FROM admission_llm_waiters WHERE ticket = ?', (ticket,))
+        conn.execute(
+            'INSERT INTO admission_llm_slots (ticket, expires_at) VALUES (?, ?)',
+            (ticket, now + settings.ADMISSION_LLM_SLOT_TTL)
+        )
+        return True
+    
+    @classmethod
+    def acquire_slot(cls, priority: int) -> Optional[str]:
+        """
+        Ambil slot panggilan LLM, menunggu di antrian maksimal ADMISSION_LLM_QUEUE_TIMEOUT
+        (atau sisa deadline request jika lebih pendek)
+        
+        Returns:
+            Ticket slot (lepas dengan release_slot), None jika store tidak tersedia (fail-open)
+        
+        Raises:
+            AdmissionRejected: Antrian penuh atau waktu tunggu habis
+            DeadlineExceeded: Deadline request habis sebelum slot didapat
+        """
+        ticket = uuid.uuid4().hex
+        timeout = budget(settings.ADMISSION_LLM_QUEUE_TIMEOUT, 'queue')
+        deadline_limited = timeout < settings.ADMISSION_LLM_QUEUE_TIMEOUT
+        try:
+            conn = cls._conn()
+            if conn is None:
+                return None
+            enqueued_at = time.time()
+            deadline = enqueued_at + timeout
+            with cls._immediate(conn):
+                if cls._try_acquire(conn, ticket, priority, enqueued_at, enqueued_at):
+                    return ticket
+                waiting = conn.execute('SELECT COUNT(*) FROM admission_llm_waiters').fetchone()[0]
+                if waiting >= settings.ADMISSION_LLM_QUEUE_SIZE:
+                    raise AdmissionRejected(
+                        timeout, 'Layanan LLM sedang penuh, coba lagi nanti.', reason='queue_full'
+                    )
+                conn.execute(
+                    'INSERT INTO admission_llm_waiters (ticket, priority, enqueued_at, expires_at) '
+                    'VALUES (?, ?, ?, ?)',
+                    (ticket, priority, enqueued_at, deadline + 1)
+                )
+            
+            while True:
+                time.sleep(QUEUE_POLL_INTERVAL + random.random() * QUEUE_POLL_JITTER)
+                now = time.time()
+                with cls._immediate(conn):
+                    if cls._try_acquire(conn, ticket, priority, enqueued_at, now):
+                        return ticket
+                    if now < deadline:
+                        continue
+                    conn.execute('DELETE FROM admission_llm_waiters WHERE ticket = ?', (ticket,))
+                # Dilempar setelah COMMIT agar penghapusan waiter tidak ikut di-rollback
+                if deadline_limited:
+                    raise DeadlineExceeded('queue')
+                raise AdmissionRejected(
+                    timeout, 'Layanan LLM sedang penuh, coba lagi nanti.', reason='queue_timeout'
+                )
+        except sqlite3.Error:
+            return None
+    
+    @classmethod
+    def release_slot(cls, ticket: Optional[str]):
+        if ticket is None:
+            return
+        try:
+            conn = cls._conn()
+            if conn is not None:
+                conn.execute('DELETE FROM admission_llm_slots WHERE ticket = ?', (ticket,))
+        except sqlite3.Error:
+            pass
+    
+    @classmethod
+    def llm_status(cls) -> Dict[str, int]:
+        """Jumlah slot LLM terpakai dan waiter di antrian (untuk observability)"""
+        try:
+            conn = cls._conn()
+            if conn is None:
+                return {'active': 0, 'waiting': 0}
+            now = time.time()
+            active = conn.execute(
+                'SELECT COUNT(*) FROM admission_llm_slots WHERE expires_at >= ?', (now,)
+            ).fetchone()[0]
+            waiting = conn.execute(
+                'SELECT COUNT(*) FROM admission_llm_waiters WHERE expires_at >= ?', (now,)
+            ).fetchone()[0]
+            return {'active': active, 'waiting': waiting}
+        except sqlite3.Error:
+            return {'active': 0, 'waiting': 0}
+
+
+def llm_status_metrics() -> Dict[str, Dict]:
+    """
+    Slot LLM terpakai dan waiter antrian dalam format MetricsRegistry.collect()
+    
+    Nilainya dibaca langsung dari store bersama (sudah mencakup semua worker) saat
+    /metrics di-scrape, sehingga tidak ikut dijumlahkan per proses.
+    """
+    if not settings.ADMISSION_ENABLED:
+        return {}
+    status = AdmissionStore.llm_status()
+    return {
+        'noc_rag_llm_slots_active': {
+            'type': 'gauge',
+            'help': 'Slot panggilan LLM yang sedang dipakai (admission control, semua worker)',
+            'labelnames': [],
+            'samples': [[[], status['active']]],
+        },
+        'noc_rag_llm_queue_waiting': {
+            'type': 'gauge',
+            'help': 'Request yang menunggu slot panggilan LLM (admission control, semua worker)',
+            'labelnames': [],
+            'samples': [[[], status['waiting']]],
+        },
+    }
+
+
+class UserRequestThrottle(BaseThrottle):
+    """
+    Token bucket request per user (ADMISSION_REQUEST_BURST, isi ulang ADMISSION_REQUEST_RATE/detik)
+    
+    Request tanpa user (mis. swagger) dibatasi per IP.
+    """
+    
+    def __init__(self):
+        self._wait = None
+    
+    def allow_request(self, request, view):
+        if not settings.ADMISSION_ENABLED:
+            return True
+        user_id = getattr(request.user, 'user_id', None)
+        key = f'req:{user_id}' if user_id else f'req-ip:{self.get_ident(request)}'
+        wait = AdmissionStore.take(
+            key, 1, settings.ADMISSION_REQUEST_BURST, settings.ADMISSION_REQUEST_RATE
+        )
+        ADMISSION_DECISIONS.inc(check='request', result='rejected' if wait else 'admitted')
+        self._wait = wait or None
+        return not wait
+    
+    def wait(self):
+        return self._wait
+
+
+def estimate_prompt_tokens(documents: List[Dict], conversation_messages: List[Dict[str, str]],
+                           message: str) -> int:
+    """
+    Estimasi token prompt dari statistik dokumen yang tersimpan (token_count), tanpa
+    menyusun prompt
+    
+    Token dokumen diskalakan turun jika total content melebihi DOCUMENT_CONTEXT_MAX_LENGTH
+    (prepare_documents_context memotong konteks ke batas tersebut).
+    """
+    document_tokens = sum(
+        (doc.get('token_count') or 0) + (doc.get('structured_token_count') or 0) for doc in documents
+    )
+    document_chars = sum(len(doc.get('content') or '') for doc in documents)
+    max_chars = settings.DOCUMENT_CONTEXT_MAX_LENGTH
+    if document_chars > max_chars:
+        document_tokens = int(document_tokens * max_chars / document_chars)
+    history_tokens = sum(estimate_tokens(m.get('content')) for m in conversation_messages or [])
+    return document_tokens + history_tokens + estimate_tokens(message)
+
+
+class LLMAdmission:
+    """Tiket satu panggilan LLM yang sudah diterima; charge() dipanggil dengan usage DeepSeek"""
+    
+    def __init__(self, user_id: str, reserved: int):
+        self.user_id = user_id
+        self.reserved = reserved
+        self.used = 0
+    
+    def charge(self, usage: Dict):
+        for key in ('prompt_tokens', 'completion_tokens'):
+            value = usage.get(key)
+            if isinstance(value, int) and value > 0:
+                self.used += value
+
+
+@contextmanager
+def admit_llm_call(user_id: str, estimated_tokens: int, route_name: str = 'default') -> Iterator[LLMAdmission]:
+    """
+    Admission satu panggilan LLM: token bucket user lalu slot global
+    
+    Estimasi token didebit di awal; setelah selesai selisih dengan usage sebenarnya
+    (prompt + completion, dari LLMAdmission.charge) didebit / dikembalikan.
+    
+    Raises:
+        AdmissionRejected: Kuota token user habis, antrian slot penuh, atau waktu tunggu habis
+        DeadlineExceeded: Deadline request habis selama menunggu slot
+    """
+    admission = LLMAdmission(user_id, max(0, int(estimated_tokens)))
+    if not settings.ADMISSION_ENABLED:
+        yield admission
+        return
+    
+    bucket = f'llm:{user_id}'
+    capacity = settings.ADMISSION_LLM_TOKEN_BURST
+    rate = settings.ADMISSION_LLM_TOKEN_RATE
+    wait = AdmissionStore.take(bucket, admission.reserved, capacity, rate)
+    if wait:
+        ADMISSION_DECISIONS.inc(check='llm_tokens', result='rejected')
+        raise AdmissionRejected(wait, 'Kuota token LLM per user habis, coba lagi nanti.', reason='llm_tokens')
+    ADMISSION_DECISIONS.inc(check='llm_tokens', result='admitted')
+    
+    started = time.perf_counter()
+    try:
+        with phase('queue'):
+            ticket = AdmissionStore.acquire_slot(LLM_PRIORITIES.get(route_name, 1))
+    except (AdmissionRejected, DeadlineExceeded) as e:
+        # Token dikembalikan: panggilan LLM tidak terjadi
+        AdmissionStore.adjust(bucket, -min(admission.reserved, capacity), capacity, rate)
+        ADMISSION_DECISIONS.inc(check='llm_slot', result=getattr(e, 'reason', 'deadline_exceeded'))
+        raise
+    finally:
+        LLM_QUEUE_WAIT.observe(time.perf_counter() - started)
+    ADMISSION_DECISIONS.inc(check='llm_slot', result='admitted')
+    
+    try:
+        yield admission
+    finally:
+        AdmissionStore.release_slot(ticket)
+        if admission.used:
+            AdmissionStore.adjust(
+                bucket, admission.used - min(admission.reserved, capacity), capacity, rate
+            )
@@ -1,18 +1,149 @@
 """
 Authentication middleware dan utilities untuk integrasi dengan SSO
 """
+import threading
+import time
+
 import requests
 import jwt
 from django.conf import settings
 from rest_framework import authentication, exceptions
-from django.core.cache import cache
+
+from core.deadline import DeadlineExceeded, budget, expired
+from core.timing import phase
+from core.token_cache import SharedTokenCache, VerificationUnavailable
+
+
+class LocalVerificationUnavailable(Exception):
+    """
+    Kunci untuk verifikasi lokal tidak tersedia (JWKS tidak bisa diambil,
+    kid tidak dikenal, atau algoritma tidak dikonfigurasi)
+    """
+
+
+class SSOKeyStore:
+    """
+    Cache kunci verifikasi JWT SSO (per proses)
+    
+    Sumber kunci:
+    - HS*: shared secret SSO_JWT_SIGNING_KEY
+    - RS*/ES*/PS*: SSO_JWT_PUBLIC_KEY (PEM) atau JWKS dari SSO_JWKS_URL
+    
+    JWKS di-refresh setelah SSO_JWKS_CACHE_TTL. Setelah expired, kunci lama tetap
+    dipakai sambil di-refresh di background agar tidak ada request yang menunggu.
+    """
+    
+    _lock = threading.Lock()
+    _keys = {}
+    _fetched_at = 0.0
+    _last_attempt = 0.0
+    _refreshing = False
+    
+    @classmethod
+    def get_key(cls, header):
+        alg = header.get('alg', '')
+        
+        if alg.startswith('HS'):
+            if not settings.SSO_JWT_SIGNING_KEY:
+                raise LocalVerificationUnavailable('SSO_JWT_SIGNING_KEY tidak diset')
+            return settings.SSO_JWT_SIGNING_KEY
+        
+        if settings.SSO_JWT_PUBLIC_KEY:
+            return settings.SSO_JWT_PUBLIC_KEY
+        
+        if not settings.SSO_JWKS_URL:
+            raise LocalVerificationUnavailable('SSO_JWKS_URL / SSO_JWT_PUBLIC_KEY tidak diset')
+        
+        kid = header.get('kid')
+        keys = cls._get_jwks()
+        key = cls._select_key(keys, kid)
+        if key is not None:
+            return key
+        
+        # kid tidak dikenal: kemungkinan rotasi kunci, paksa refresh (dibatasi interval)
+        keys = cls._get_jwks(force=True)
+        key = cls._select_key(keys, kid)
+        if key is None:
+            raise LocalVerificationUnavailable(f'Kunci JWKS untuk kid={kid} tidak ditemukan')
+        return key
+    
+    @staticmethod
+    def _select_key(keys, kid):
+        if kid is not None:
+            return keys.get(kid)
+        # Token tanpa kid hanya bisa diverifikasi jika JWKS berisi tepat 1 kunci
+        if len(keys) == 1:
+            return next(iter(keys.values()))
+        return None
+    
+    @classmethod
+    def _get_jwks(cls, force=False):
+        now = time.monotonic()
+        expired = now - cls._fetched_at > settings.SSO_JWKS_CACHE_TTL
+        
+        if cls._keys and not force:
+            if expired:
+                cls._refresh_in_background()
+            return cls._keys
+        
+        with cls._lock:
+            # Cegah refresh beruntun (mis. token dengan kid acak)
+            if now - cls._last_attempt < settings.SSO_JWKS_MIN_REFRESH_INTERVAL:
+                return cls._keys
+            cls._fetch()
+        return cls._keys
+    
+    @classmethod
+    def _refresh_in_background(cls):
+        with cls._lock:
+            if cls._refreshing:
+                return
+            cls._refreshing = True
+        
+        def run():
+            try:
+                with cls._lock:
+                    cls._fetch()
+            finally:
+                cls._refreshing = False
+        
+        threading.Thread(target=run, name='sso-jwks-refresh', daemon=True).start()
+    
+    @classmethod
+    def _fetch(cls):
+        """Ambil JWKS dari SSO (dipanggil dengan _lock dipegang)"""
+        # Refresh di background tidak punya deadline request (timeout 5 detik penuh)
+        timeout = budget(5, 'sso')
+        cls._last_attempt = time.monotonic()
+        try:
+            response = requests.get(settings.SSO_JWKS_URL, timeout=timeout)
+            response.raise_for_status()
+            jwk_set = jwt.PyJWKSet.from_dict(response.json())
+        except (requests.RequestException, ValueError, jwt.PyJWKSetError, jwt.PyJWKError):
+            # Pertahankan kunci lama jika SSO tidak bisa dihubungi
+            return
+        
+        cls._keys = {jwk.key_id: jwk.key for jwk in jwk_set.keys}
+        cls._fetched_at = time.monotonic()
 
 
 class SSOAuthentication(authentication.BaseAuthentication):
     """
     Custom authentication class untuk memverifikasi Bearer token via SSO
+    
+    Mode verifikasi (SSO_VERIFY_MODE):
+    - remote: setiap token baru diverifikasi ke endpoint SSO (default)
+    - local: signature, exp, aud (dan iss) divalidasi lokal dengan kunci ter-cache
+    - hybrid: seperti local, fallback ke endpoint SSO jika kunci tidak tersedia
+    
+    Hanya token yang pasti ditolak (401/403 dari SSO, signature / claim invalid)
+    yang di-cache sebagai invalid; gangguan SSO tidak mengunci token valid.
     """
     
+    # Status dari endpoint verify SSO yang berarti token ditolak
+    SSO_REJECTED_STATUSES = (401, 403)
+    
+    @phase('auth')
     def authenticate(self, request):
         auth_header = request.META.get('HTTP_AUTHORIZATION', '')
         
@@ -26,32 +157,95 @@ class SSOAuthentication(authentication.BaseAuthentication):
         
         token = parts[1]
         
-        # Cek cache untuk menghindari pemanggilan SSO berulang
-        cache_key = f'sso_token_{token[:20]}'  # Gunakan prefix token sebagai cache key
-        cached_user_id = cache.get(cache_key)
-        
-        if cached_user_id:
-            # Token valid dari cache
-            return (MockUser(cached_user_id), token)
-        
-        # Verifikasi token ke SSO
-        user_id = self.verify_token_with_sso(token)
+        # Cek cache (per proses + shared antar worker) untuk menghindari verifikasi berulang;
+        # token baru diverifikasi sekali meskipun datang bersamaan di beberapa request
+        user_id = SharedTokenCache.get_or_verify(token, self.verify_token_with_sso)
         
         if not user_id:
             raise exceptions.AuthenticationFailed('Token tidak valid atau expired')
         
-        # Cache hasil verifikasi untuk 60 detik
-        cache.set(cache_key, user_id, 60)
-        
         return (MockUser(user_id), token)
     
     def verify_token_with_sso(self, token):
         """
-        Verifikasi token ke SSO service dan ekstrak user_id
+        Verifikasi token sesuai SSO_VERIFY_MODE dan ekstrak user_id
         
         Returns:
             user_id (str) jika valid, None jika tidak valid
+        
+        Raises:
+            VerificationUnavailable: Token tidak bisa diverifikasi saat ini (tidak di-cache)
+        """
+        mode = settings.SSO_VERIFY_MODE
+        
+        if mode in ('local', 'hybrid'):
+            try:
+                return self.verify_token_locally(token)
+            except LocalVerificationUnavailable as e:
+                if mode == 'local':
+                    raise VerificationUnavailable('kunci verifikasi lokal tidak tersedia') from e
+                # hybrid: lanjut verifikasi ke SSO
+        
+        return self.verify_token_remote(token)
+    
+    def verify_token_locally(self, token):
+        """
+        Verifikasi signature, exp, aud dan iss JWT tanpa network call
+        
+        Returns:
+            user_id (str) jika valid, None jika tidak valid
+        
+        Raises:
+            LocalVerificationUnavailable jika kunci verifikasi tidak tersedia
         """
+        try:
+            header = jwt.get_unverified_header(token)
+        except jwt.DecodeError:
+            return None
+        
+        alg = header.get('alg')
+        if alg not in settings.SSO_JWT_ALGORITHMS:
+            return None
+        
+        key = SSOKeyStore.get_key(header)
+        audience = settings.SSO_JWT_AUDIENCE or None
+        
+        try:
+            decoded = jwt.decode(
+                token,
+                key,
+                algorithms=[alg],
+                audience=audience,
+                issuer=settings.SSO_JWT_ISSUER or None,
+                leeway=settings.SSO_JWT_LEEWAY,
+                options={
+                    'require': ['exp'],
+                    'verify_aud': audience is not None,
+                },
+            )
+        except jwt.InvalidTokenError:
+            return None
+        
+        # Tolak refresh token yang dipakai sebagai Bearer token
+        token_type = decoded.get('token_type')
+        if token_type and token_type != 'access':
+            return None
+        
+        return self._extract_user_id(decoded)
+    
+    def verify_token_remote(self, token):
+        """
+        Verifikasi token ke SSO service dan ekstrak user_id
+        
+        Returns:
+            user_id (str) jika valid, None jika ditolak SSO (401/403) atau bukan JWT
+        
+        Raises:
+            VerificationUnavailable: SSO tidak bisa dihubungi atau menjawab selain
+                200/401/403 (mis. 5xx); token tidak di-cache sebagai invalid
+            DeadlineExceeded: Deadline request habis sebelum SSO menjawab (hasil tidak di-cache)
+        """
+        timeout = budget(5, 'sso')
         try:
             # Coba decode JWT untuk mendapatkan user_id tanpa verifikasi signature
             # (karena kita akan verifikasi via SSO endpoint)
@@ -64,25 +258,40 @@ class SSOAuthentication(authentication.BaseAuthentication):
                 'Content-Type': 'application/json'
             }
             
-            response = requests.post(sso_url, headers=headers, json={'token': token}, timeout=5)
+            response = requests.post(sso_url, headers=headers, json={'token': token}, timeout=timeout)
             
             if response.status_code == 200:
                 # Token valid, ekstrak user_id dari JWT payload
-                # Coba beberapa claim standar
-                user_id = decoded.get('user_id') or decoded.get('sub') or decoded.get('id')
-                
-                if user_id:
-                    return str(user_id)
+                return self._extract_user_id(decoded)
             
-            return None
+            if response.status_code in self.SSO_REJECTED_STATUSES:
+                return None
             
+            # Gangguan SSO (5xx, 429, ...): tetap reject request ini, tapi jangan di-cache
+            raise VerificationUnavailable(f'SSO menjawab HTTP {response.status_code}')
+        
         except jwt.DecodeError:
             return None
-        except requests.RequestException:
+        except requests.Timeout as e:
+            if expired():
+                raise DeadlineExceeded('sso')
+            raise VerificationUnavailable('timeout ke SSO') from e
+        except requests.RequestException as e:
             # Jika SSO tidak bisa dihubungi, sebaiknya reject untuk keamanan
-            return None
-        except Exception:
-            return None
+            raise VerificationUnavailable(f'SSO tidak bisa dihubungi: {e}') from e
+        except VerificationUnavailable:
+            raise
+        except Exception as e:
+            raise VerificationUnavailable(f'error tidak terduga saat verifikasi: {e}') from e
+    
+    @staticmethod
+    def _extract_user_id(decoded):
+        """Ambil user_id dari JWT payload (coba beberapa claim standar)"""
+        user_id = decoded.get('user_id') or decoded.get('sub') or decoded.get('id')
+        
+        if user_id:
+            return str(user_id)
+        return None
 
 
 class MockUser:
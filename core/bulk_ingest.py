@@ -0,0 +1,292 @@
+"""
+Service untuk bulk ingestion dokumen (multi-file dan ZIP archive)
+"""
+import atexit
+import multiprocessing
+import os
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+
+from core.document_extractor import DocumentExtractor
+from core.search import get_search_backend
+from documents.models import CorpusVersion, Document, Tag
+
+
+class BulkIngestService:
+    """
+    Service untuk meng-ingest banyak dokumen dalam satu request
+    
+    Alur:
+    1. Setiap file (atau member ZIP) di-stream ke direktori temporary
+    2. Ekstraksi dijalankan paralel di pool dengan jumlah worker terbatas
+    3. Hasil disimpan dengan bulk_create per batch
+    
+    Pool ekstraksi dibuat sekali per worker (saat bulk upload pertama) dan dipakai
+    ulang oleh semua request di worker itu, sehingga jumlah thread/proses ekstraksi
+    tetap dibatasi BULK_UPLOAD_MAX_WORKERS walaupun ada beberapa upload bersamaan.
+    """
+    
+    COPY_CHUNK_SIZE = 64 * 1024
+    
+    _pool: Optional[Executor] = None
+    _pool_key = None
+    _pool_lock = threading.Lock()
+    
+    @staticmethod
+    def _max_file_size() -> int:
+        return settings.MAX_UPLOAD_SIZE_MB * 1024 * 1024
+    
+    @staticmethod
+    def _stage_path(workdir: str, index: int, filename: str) -> str:
+        """
+        Path temporary untuk file ke-N; ekstensi asli dipertahankan
+        agar fallback deteksi MIME (mis. XLSX) tetap bekerja
+        """
+        _, ext = os.path.splitext(filename)
+        return os.path.join(workdir, f"{index:05d}{ext.lower()}")
+    
+    @staticmethod
+    def _is_skipped_member(info: zipfile.ZipInfo) -> bool:
+        """Lewati direktori dan metadata OS (mis. __MACOSX, .DS_Store)"""
+        if info.is_dir():
+            return True
+        parts = info.filename.replace('\\', '/').split('/')
+        if '__MACOSX' in parts:
+            return True
+        return os.path.basename(info.filename).startswith('.')
+    
+    @staticmethod
+    def stage_files(files, archive, workdir: str) -> Tuple[List[Dict], List[Dict]]:
+        """
+        Tulis file upload dan member ZIP ke disk secara streaming
+        
+        Returns:
+            Tuple (staged, failures)
+            staged: list dict {index, filename, path}
+            failures: list dict hasil gagal {index, filename, status, error}
+        """
+        staged = []
+        failures = []
+        max_size = BulkIngestService._max_file_size()
+        max_files = settings.BULK_UPLOAD_MAX_FILES
+        index = 0
+        
+        def fail(filename, error):
+            failures.append({
+                "index": index,
+                "filename": filename,
+                "status": "failed",
+                "error": error,
+            })
+        
+        for uploaded_file in files or []:
+            path = BulkIngestService._stage_path(workdir, index, uploaded_file.name)
+            with open(path, 'wb') as out:
+                for chunk in uploaded_file.chunks(BulkIngestService.COPY_CHUNK_SIZE):
+                    out.write(chunk)
+            staged.append({"index": index, "filename": uploaded_file.name, "path": path})
+            index += 1
+        
+        if archive is not None:
+            try:
+                archive.seek(0)
+                with zipfile.ZipFile(archive) as zf:
+                    for info in zf.infolist():
+                        if BulkIngestService._is_skipped_member(info):
+                            continue
+                        
+                        if index >= max_files:
+                            fail(info.filename, f"Melebihi batas {max_files} file per request")
+                            index += 1
+                            continue
+                        
+                        if info.file_size > max_size:
+                            fail(
+                                info.filename,
+                                f"Ukuran file melebihi batas maksimal {settings.MAX_UPLOAD_SIZE_MB} MB"
+                            )
+                            index += 1
+                            continue
+                        
+                        path = BulkIngestService._stage_path(workdir, index, info.filename)
+                        written = 0
+                        with zf.open(info) as src, open(path, 'wb') as out:
+                            while True:
+                                chunk = src.read(BulkIngestService.COPY_CHUNK_SIZE)
+                                if not chunk:
+                                    break
+                                written += len(chunk)
+                                # Jangan percaya file_size di header ZIP (zip bomb)
+                                if written > max_size:
+                                    break
+                                out.write(chunk)
+                        
+                        if written > max_size:
+                            os.remove(path)
+                            fail(
+                                info.filename,
+                                f"Ukuran file melebihi batas maksimal {settings.MAX_UPLOAD_SIZE_MB} MB"
+                            )
+                        else:
+                            staged.append({"index": index, "filename": info.filename, "path": path})
+                        index += 1
+            except zipfile.BadZipFile:
+                fail(archive.name, "File ZIP tidak valid")
+        
+        return staged, failures
+    
+    @classmethod
+    def _executor(cls) -> Executor:
+        """
+        Pool ekstraksi milik worker ini: thread pool (default) atau process pool
+        
+        Process pool memakai start method forkserver/spawn, bukan fork dari worker
+        gunicorn yang sudah punya thread (ChatLog writer, metrics, dll.).
+        Pool dibuat ulang jika proses berganti (fork) atau setting berubah.
+        """
+        key = (os.getpid(), settings.BULK_UPLOAD_EXECUTOR, max(1, settings.BULK_UPLOAD_MAX_WORKERS))
+        if cls._pool_key == key:
+            return cls._pool
+        with cls._pool_lock:
+            if cls._pool_key != key:
+                previous = cls._pool if cls._pool_key and cls._pool_key[0] == key[0] else None
+                _, mode, max_workers = key
+                if mode == 'process':
+                    methods = multiprocessing.get_all_start_methods()
+                    context = multiprocessing.get_context(
+                        'forkserver' if 'forkserver' in methods else 'spawn'
+                    )
+                    cls._pool = ProcessPoolExecutor(
+                        max_workers=max_workers, mp_context=context,
+                        initializer=DocumentExtractor.init_worker_process,
+                    )
+                else:
+                    cls._pool = ThreadPoolExecutor(
+                        max_workers=max_workers, thread_name_prefix='bulk-extract'
+                    )
+                cls._pool_key = key
+                if previous is not None:
+                    previous.shutdown(wait=False)
+        return cls._pool
+    
+    @classmethod
+    def shutdown(cls):
+        """Hentikan pool ekstraksi worker ini (atexit / hook worker_exit gunicorn)"""
+        with cls._pool_lock:
+            pool, key = cls._pool, cls._pool_key
+            cls._pool = cls._pool_key = None
+        if pool is not None and key[0] == os.getpid():
+            pool.shutdown(wait=True, cancel_futures=True)
+    
+    @staticmethod
+    def ingest(files, archive, owner_user_id: str, tags: Optional[List[str]] = None) -> List[Dict]:
+        """
+        Ekstrak dan simpan banyak dokumen
+        
+        Args:
+            files: List UploadedFile (boleh kosong)
+            archive: UploadedFile ZIP (opsional)
+            owner_user_id: User ID dari SSO token
+            tags: Nama tag yang dipasang ke semua dokumen yang berhasil disimpan
+        
+        Returns:
+            List hasil per file sesuai urutan input. Item sukses berisi
+            key "document" (instance Document), item gagal berisi "error".
+        """
+        results: Dict[int, Dict] = {}
+        batch_size = settings.BULK_UPLOAD_BATCH_SIZE
+        tag_objects = Tag.resolve(tags or [])
+        TagLink = Document.tags.through
+        
+        with tempfile.TemporaryDirectory(prefix='bulk_ingest_') as workdir:
+            staged, failures = BulkIngestService.stage_files(files, archive, workdir)
+            for failure in failures:
+                results[failure["index"]] = failure
+            
+            pending: List[Tuple[Dict, Document]] = []
+            
+            def flush():
+                if not pending:
+                    return
+                # Dokumen, versi corpus, index pencarian, dan tag satu batch
+                # tersimpan bersama atau tidak sama sekali
+                with transaction.atomic():
+                    created = Document.objects.bulk_create(
+                        [document for _, document in pending],
+                        batch_size=batch_size,
+                    )
+                    # bulk_create tidak memicu post_save
+                    CorpusVersion.bump()
+                    get_search_backend().index_documents(created)
+                    if tag_objects:
+                        TagLink.objects.bulk_create(
+                            [
+                                TagLink(document_id=document.id, tag_id=tag.id)
+                                for document in created for tag in tag_objects
+                            ],
+                            batch_size=batch_size,
+                        )
+                for (item, _), document in zip(pending, created):
+                    results[item["index"]] = {
+                        "index": item["index"],
+                        "filename": item["filename"],
+                        "status": "success",
+                        "document": document,
+                    }
+                pending.clear()
+            
+            if staged:
+                # Pool dipakai bersama request lain di worker ini: jangan di-shutdown di sini
+                extracted = BulkIngestService._executor().map(
+                    DocumentExtractor.extract_path,
+                    [item["path"] for item in staged],
+                )
+                for item, (mime_type, text, error_msg, structured_data) in zip(staged, extracted):
+                    error = BulkIngestService._validate_extraction(mime_type, text, error_msg)
+                    if error:
+                        results[item["index"]] = {
+                            "index": item["index"],
+                            "filename": item["filename"],
+                            "status": "failed",
+                            "mime_type": mime_type,
+                            "error": error,
+                        }
+                        continue
+                    
+                    filename = item["filename"]
+                    document = Document(
+                        owner_user_id=owner_user_id,
+                        title=os.path.basename(filename)[:500],
+                        content=text,
+                        source_filename=filename[:500],
+                        mime_type=mime_type,
+                        structured_data=structured_data,
+                    )
+                    # bulk_create tidak memanggil save(): preview + statistik teks dihitung di sini
+                    document.refresh_stats()
+                    pending.append((item, document))
+                    if len(pending) >= batch_size:
+                        flush()
+                flush()
+        
+        return [results[key] for key in sorted(results)]
+    
+    @staticmethod
+    def _validate_extraction(mime_type: str, text: str, error_msg: Optional[str]) -> Optional[str]:
+        """Aturan validasi yang sama dengan upload satu file"""
+        if not DocumentExtractor.is_supported(mime_type):
+            return f"Format file tidak didukung ({mime_type})"
+        if error_msg:
+            return f"Gagal mengekstrak dokumen: {error_msg}"
+        if not text or len(text.strip()) == 0:
+            return "Dokumen tidak mengandung teks yang bisa diekstrak"
+        return None
+
+
+atexit.register(BulkIngestService.shutdown)
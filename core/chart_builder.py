@@ -0,0 +1,480 @@
+"""
+Builder konfigurasi Chart.js dari structured_data (XLSX) di server
+
+LLM cukup memilih sumber data lewat chart spec kecil (JSON), atau spec
+ditentukan heuristik dari message. Angka diambil langsung dari sheet
+sehingga persis sama dengan dokumen dan tidak perlu diketik ulang oleh LLM.
+
+Format chart spec:
+    {
+        "doc_id": 3,                  # ID dokumen XLSX
+        "sheet": "Revenue",           # nama sheet (default: sheet pertama)
+        "type": "bar",                # line | bar | pie | doughnut
+        "x": "Bulan",                 # kolom label
+        "y": ["Target", "Actual"],    # kolom angka (1 atau lebih)
+        "agg": "sum",                 # none | sum | avg | count | min | max
+        "sort": "desc",               # opsional: asc | desc (berdasarkan series pertama)
+        "limit": 10,                  # opsional: ambil N label pertama setelah sort
+        "stacked": false,             # opsional (bar/line)
+        "title": "Revenue per Bulan"  # opsional
+    }
+"""
+import re
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+CHART_TYPES = ('line', 'bar', 'pie', 'doughnut')
+AGGREGATIONS = ('none', 'sum', 'avg', 'count', 'min', 'max')
+
+COLUMN_NUMBER = 'number'
+COLUMN_TEXT = 'text'
+
+PALETTE = [
+    '#4e79a7', '#f28e2b', '#e15759', '#76b7b2', '#59a14f',
+    '#edc948', '#b07aa1', '#ff9da7', '#9c755f', '#bab0ac',
+]
+
+# Kata kunci untuk heuristik tipe chart dan agregasi
+PIE_KEYWORDS = ('pie', 'proporsi', 'komposisi', 'distribusi', 'market share', 'porsi')
+DOUGHNUT_KEYWORDS = ('doughnut', 'donut', 'donat')
+LINE_KEYWORDS = ('line', 'tren', 'trend', 'perkembangan', 'dari waktu ke waktu', 'time series')
+AVG_KEYWORDS = ('rata-rata', 'rata rata', 'average', 'avg', 'mean')
+COUNT_KEYWORDS = ('jumlah data', 'banyaknya', 'count', 'frekuensi')
+
+DATE_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}')
+
+
+class ChartSpecError(ValueError):
+    """Chart spec tidak valid atau tidak cocok dengan data dokumen"""
+
+
+def is_number(value: Any) -> bool:
+    """True untuk int/float (bool tidak dihitung angka)"""
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def aggregate(values: List, agg: str):
+    """
+    Agregasi nilai angka satu kelompok (sum | avg | count | min | max)
+    
+    Returns:
+        Hasil agregasi (float dibulatkan 6 desimal), None jika values kosong
+        (kecuali count)
+    """
+    if agg == 'count':
+        return len(values)
+    if not values:
+        return None
+    if agg == 'sum':
+        result = sum(values)
+    elif agg == 'avg':
+        result = sum(values) / len(values)
+    elif agg == 'min':
+        result = min(values)
+    else:
+        result = max(values)
+    return round(result, 6) if isinstance(result, float) else result
+
+
+def mentioned(name: Any, msg: str) -> int:
+    """1 jika nama kolom/sheet (atau salah satu katanya, >= 3 huruf) disebut di message (lowercase)"""
+    name = str(name or '').strip().lower()
+    if not name:
+        return 0
+    if name in msg:
+        return 1
+    words = [word for word in re.split(r'[\W_]+', name) if len(word) >= 3]
+    return int(any(re.search(rf'\b{re.escape(word)}\b', msg) for word in words))
+
+
+class ChartBuilder:
+    """
+    Service untuk membangun konfigurasi Chart.js dari structured_data dokumen
+    """
+    
+    MAX_SOURCE_SHEETS = 20
+    MAX_DEFAULT_SERIES = 3
+    
+    @staticmethod
+    def iter_sheets(documents: List[Dict]) -> Iterator[Tuple[Dict, Dict]]:
+        """Yield (document, sheet) untuk setiap sheet yang punya kolom"""
+        for doc in documents:
+            structured_data = doc.get('structured_data') or {}
+            for sheet in structured_data.get('sheets') or []:
+                if sheet.get('columns'):
+                    yield doc, sheet
+    
+    @staticmethod
+    def column_types(sheet: Dict) -> List[str]:
+        """
+        Tipe setiap kolom: COLUMN_NUMBER jika >= 80% nilai non-kosong berupa angka
+        """
+        columns = sheet.get('columns') or []
+        numeric = [0] * len(columns)
+        filled = [0] * len(columns)
+        
+        for row in sheet.get('rows') or []:
+            for i, value in enumerate(row[:len(columns)]):
+                if value is None or value == '':
+                    continue
+                filled[i] += 1
+                if is_number(value):
+                    numeric[i] += 1
+        
+        return [
+            COLUMN_NUMBER if filled[i] and numeric[i] >= 0.8 * filled[i] else COLUMN_TEXT
+            for i in range(len(columns))
+        ]
+    
+    @staticmethod
+    def column_index(structured_data: Optional[Dict]) -> Optional[List[Dict]]:
+        """
+        Indeks kolom per sheet tanpa rows: [{"sheet", "columns", "numeric": [index kolom angka]}]
+        
+        Disimpan di Document.structured_columns agar sheet/kolom yang disebut user bisa
+        dicari tanpa me-load structured_data lengkap. None jika tidak ada sheet berkolom.
+        """
+        index = []
+        for _, sheet in ChartBuilder.iter_sheets([{'structured_data': structured_data}]):
+            types = ChartBuilder.column_types(sheet)
+            index.append({
+                'sheet': sheet.get('name'),
+                'columns': sheet['columns'],
+                'numeric': [i for i, kind in enumerate(types) if kind == COLUMN_NUMBER],
+            })
+        return index or None
+    
+    @staticmethod
+    def describe_sources(documents: List[Dict]) -> str:
+        """
+        Ringkasan sheet yang bisa dipakai untuk chart spec (untuk prompt LLM)
+        
+        Returns:
+            Satu baris per sheet, atau string kosong jika tidak ada structured_data
+        """
+        lines = []
+        for doc, sheet in ChartBuilder.iter_sheets(documents):
+            if len(lines) >= ChartBuilder.MAX_SOURCE_SHEETS:
+                break
+            types = ChartBuilder.column_types(sheet)
+            columns = ', '.join(
+                f'{name} ({kind})' for name, kind in zip(sheet['columns'], types)
+            )
+            lines.append(
+                f'- doc_id={doc.get("id")} sheet="{sheet.get("name")}" '
+                f'rows={len(sheet.get("rows") or [])} columns=[{columns}]'
+            )
+        return '\n'.join(lines)
+    
+    @staticmethod
+    def is_spec(chart: Any) -> bool:
+        """Cek apakah `chart` dari LLM berupa chart spec (bukan config Chart.js)"""
+        return isinstance(chart, dict) and 'data' not in chart and ('y' in chart or 'sheet' in chart)
+    
+    @staticmethod
+    def build(spec: Dict, documents: List[Dict]) -> Dict:
+        """
+        Bangun konfigurasi Chart.js dari chart spec
+        
+        Args:
+            spec: Chart spec (lihat docstring modul)
+            documents: List dokumen dengan keys id, title, structured_data
+        
+        Returns:
+            Dict konfigurasi Chart.js (type, data, options)
+        
+        Raises:
+            ChartSpecError jika spec tidak valid
+        """
+        doc, sheet = ChartBuilder._find_sheet(spec, documents)
+        columns = sheet['columns']
+        types = ChartBuilder.column_types(sheet)
+        
+        chart_type = str(spec.get('type') or 'bar').lower()
+        if chart_type not in CHART_TYPES:
+            raise ChartSpecError(f'Tipe chart tidak didukung: {chart_type}')
+        
+        agg = str(spec.get('agg') or 'none').lower()
+        if agg not in AGGREGATIONS:
+            raise ChartSpecError(f'Agregasi tidak didukung: {agg}')
+        
+        x_index = None
+        if spec.get('x') not in (None, ''):
+            x_index = ChartBuilder._column_index(columns, spec['x'])
+        
+        y_names = spec.get('y') or []
+        if isinstance(y_names, str):
+            y_names = [y_names]
+        y_indexes = [ChartBuilder._column_index(columns, name) for name in y_names]
+        for index in y_indexes:
+            if types[index] != COLUMN_NUMBER and agg != 'count':
+                raise ChartSpecError(f'Kolom "{columns[index]}" bukan kolom angka')
+        if not y_indexes and agg != 'count':
+            raise ChartSpecError('Spec harus memiliki minimal satu kolom y')
+        
+        rows = sheet.get('rows') or []
+        labels, series = ChartBuilder._collect(rows, x_index, y_indexes, agg)
+        if agg == 'count':
+            series_labels = ['Jumlah']
+        else:
+            series_labels = [columns[index] for index in y_indexes]
+        
+        labels, series = ChartBuilder._sort_and_limit(
+            labels, series, spec.get('sort'), spec.get('limit')
+        )
+        if not labels:
+            raise ChartSpecError('Tidak ada data untuk chart')
+        
+        title = spec.get('title') or ''
+        return ChartBuilder.to_chartjs(
+            chart_type, labels, list(zip(series_labels, series)), title, bool(spec.get('stacked'))
+        )
+    
+    @staticmethod
+    def to_chartjs(
+        chart_type: str,
+        labels: List[str],
+        datasets: List[Tuple[str, List]],
+        title: str = '',
+        stacked: bool = False
+    ) -> Dict:
+        """Susun konfigurasi Chart.js dari labels dan (label, data) per series"""
+        chart_datasets = []
+        if chart_type in ('pie', 'doughnut'):
+            # Pie/doughnut hanya menampilkan series pertama, warna per slice
+            label, data = datasets[0]
+            chart_datasets.append({
+                "label": label,
+                "data": data,
+                "backgroundColor": [PALETTE[i % len(PALETTE)] for i in range(len(data))],
+            })
+        else:
+            for i, (label, data) in enumerate(datasets):
+                color = PALETTE[i % len(PALETTE)]
+                chart_datasets.append({
+                    "label": label,
+                    "data": data,
+                    "backgroundColor": color,
+                    "borderColor": color,
+                })
+        
+        options = {
+            "responsive": True,
+            "plugins": {
+                "legend": {"display": len(chart_datasets) > 1 or chart_type in ('pie', 'doughnut')},
+                "title": {"display": bool(title), "text": title},
+            },
+        }
+        if chart_type in ('line', 'bar'):
+            options["scales"] = {
+                "x": {"stacked": stacked},
+                "y": {"stacked": stacked, "beginAtZero": chart_type == 'bar'},
+            }
+        
+        return {
+            "type": chart_type,
+            "data": {"labels": labels, "datasets": chart_datasets},
+            "options": options,
+        }
+    
+    @staticmethod
+    def infer_spec(message: str, documents: List[Dict]) -> Optional[Dict]:
+        """
+        Tentukan chart spec secara heuristik dari message dan kolom sheet
+        
+        Returns:
+            Chart spec, atau None jika tidak ada sheet dengan kolom angka
+        """
+        msg = message.lower()
+        best = None
+        best_score = -1
+        
+        for doc, sheet in ChartBuilder.iter_sheets(documents):
+            types = ChartBuilder.column_types(sheet)
+            if COLUMN_NUMBER not in types:
+                continue
+            score = sum(
+                mentioned(name, msg)
+                for name in [sheet.get('name', ''), doc.get('title', ''), *sheet['columns']]
+            )
+            if score > best_score:
+                best, best_score = (doc, sheet, types), score
+        
+        if best is None:
+            return None
+        
+        doc, sheet, types = best
+        columns = sheet['columns']
+        
+        text_columns = [i for i, kind in enumerate(types) if kind == COLUMN_TEXT and columns[i]]
+        x_index = next(
+            (i for i in text_columns if mentioned(columns[i], msg)),
+            text_columns[0] if text_columns else None
+        )
+        
+        number_columns = [i for i, kind in enumerate(types) if kind == COLUMN_NUMBER and i != x_index]
+        y_indexes = [i for i in number_columns if mentioned(columns[i], msg)]
+        if not y_indexes:
+            y_indexes = number_columns[:ChartBuilder.MAX_DEFAULT_SERIES]
+        
+        if any(keyword in msg for keyword in DOUGHNUT_KEYWORDS):
+            chart_type = 'doughnut'
+        elif any(keyword in msg for keyword in PIE_KEYWORDS):
+            chart_type = 'pie'
+        elif any(keyword in msg for keyword in LINE_KEYWORDS) or ChartBuilder._is_date_column(sheet, x_index):
+            chart_type = 'line'
+        else:
+            chart_type = 'bar'
+        
+        agg = 'none'
+        if x_index is not None:
+            labels = [row[x_index] if x_index < len(row) else None for row in sheet.get('rows') or []]
+            if len(set(map(str, labels))) < len(labels):
+                if any(keyword in msg for keyword in AVG_KEYWORDS):
+                    agg = 'avg'
+                elif any(keyword in msg for keyword in COUNT_KEYWORDS):
+                    agg = 'count'
+                else:
+                    agg = 'sum'
+        
+        return {
+            "doc_id": doc.get('id'),
+            "sheet": sheet.get('name'),
+            "type": chart_type,
+            "x": columns[x_index] if x_index is not None else None,
+            "y": [columns[i] for i in y_indexes],
+            "agg": agg,
+            "title": sheet.get('name') or doc.get('title') or '',
+        }
+    
+    @staticmethod
+    def resolve_chart(chart: Any, message: str, documents: List[Dict], mode: str) -> Optional[Dict]:
+        """
+        Tentukan chart final untuk response
+        
+        - Spec dari LLM dibangun di server (fallback ke heuristik jika spec tidak valid)
+        - Mode "heuristic": chart selalu dibangun dari heuristik
+        - Config Chart.js lengkap dari LLM (mode "llm" / dokumen tanpa sheet) dipakai apa adanya
+        
+        Returns:
+            Dict konfigurasi Chart.js atau None
+        """
+        if mode == 'heuristic' or ChartBuilder.is_spec(chart):
+            specs = [chart] if ChartBuilder.is_spec(chart) else []
+            inferred = ChartBuilder.infer_spec(message, documents)
+            if inferred is not None:
+                specs.append(inferred)
+            
+            for spec in specs:
+                try:
+                    return ChartBuilder.build(spec, documents)
+                except ChartSpecError:
+                    continue
+            return None
+        
+        return chart if isinstance(chart, dict) else None
+    
+    @staticmethod
+    def _find_sheet(spec: Dict, documents: List[Dict]) -> Tuple[Dict, Dict]:
+        sources = list(ChartBuilder.iter_sheets(documents))
+        if not sources:
+            raise ChartSpecError('Tidak ada dokumen dengan data tabel')
+        
+        doc_id = spec.get('doc_id')
+        if doc_id not in (None, ''):
+            try:
+                doc_id = int(doc_id)
+            except (TypeError, ValueError):
+                raise ChartSpecError(f'doc_id tidak valid: {doc_id}')
+            sources = [(doc, sheet) for doc, sheet in sources if doc.get('id') == doc_id]
+            if not sources:
+                raise ChartSpecError(f'Dokumen {doc_id} tidak memiliki data tabel')
+        
+        sheet_name = spec.get('sheet')
+        if sheet_name:
+            for doc, sheet in sources:
+                if str(sheet.get('name', '')).lower() == str(sheet_name).lower():
+                    return doc, sheet
+            raise ChartSpecError(f'Sheet tidak ditemukan: {sheet_name}')
+        
+        return sources[0]
+    
+    @staticmethod
+    def _column_index(columns: List[str], name: Any) -> int:
+        target = str(name).strip().lower()
+        for i, column in enumerate(columns):
+            if str(column).strip().lower() == target:
+                return i
+        raise ChartSpecError(f'Kolom tidak ditemukan: {name}')
+    
+    @staticmethod
+    def _collect(rows: List[List], x_index: Optional[int], y_indexes: List[int], agg: str):
+        """Ambil labels dan data per series (dengan agregasi per label jika diminta)"""
+        def cell(row, index):
+            return row[index] if index is not None and index < len(row) else None
+        
+        if agg == 'none':
+            labels = []
+            series = [[] for _ in y_indexes]
+            for n, row in enumerate(rows):
+                label = cell(row, x_index)
+                labels.append(str(label) if label is not None else str(n + 1))
+                for values, index in zip(series, y_indexes):
+                    value = cell(row, index)
+                    values.append(value if is_number(value) else None)
+            return labels, series
+        
+        groups: Dict[str, List[List]] = {}
+        for n, row in enumerate(rows):
+            label = cell(row, x_index)
+            key = str(label) if label is not None else '(kosong)'
+            group = groups.setdefault(key, [[] for _ in (y_indexes or [None])])
+            if agg == 'count':
+                group[0].append(1)
+                continue
+            for values, index in zip(group, y_indexes):
+                value = cell(row, index)
+                if is_number(value):
+                    values.append(value)
+        
+        labels = list(groups)
+        series_count = 1 if agg == 'count' else len(y_indexes)
+        series = [
+            [aggregate(groups[label][i], agg) for label in labels]
+            for i in range(series_count)
+        ]
+        return labels, series
+    
+    
+    @staticmethod
+    def _sort_and_limit(labels: List[str], series: List[List], sort: Any, limit: Any):
+        order = list(range(len(labels)))
+        sort = str(sort or '').strip().lower()
+        if sort in ('asc', 'desc') and series:
+            # Urutkan berdasarkan series pertama, nilai kosong selalu di akhir
+            first = series[0]
+            present = sorted(
+                (i for i in order if first[i] is not None),
+                key=lambda i: first[i],
+                reverse=sort == 'desc'
+            )
+            order = present + [i for i in order if first[i] is None]
+        
+        try:
+            limit = int(limit) if limit not in (None, '') else None
+        except (TypeError, ValueError):
+            raise ChartSpecError(f'limit tidak valid: {limit}')
+        if limit is not None and limit > 0:
+            order = order[:limit]
+        
+        return [labels[i] for i in order], [[values[i] for i in order] for values in series]
+    
+    @staticmethod
+    def _is_date_column(sheet: Dict, index: Optional[int]) -> bool:
+        if index is None:
+            return False
+        for row in (sheet.get('rows') or [])[:5]:
+            if index < len(row) and isinstance(row[index], str) and DATE_PATTERN.match(row[index]):
+                return True
+        return False
+    
\ No newline at end of file
@@ -1,6 +1,153 @@
 """
 Helper functions untuk chat service
+
+Intent router: satu regex gabungan (named group per intent) yang dikompilasi
+sekali saat import, lalu dipakai untuk mengklasifikasikan setiap message:
+
+- chart: user meminta visualisasi (INCLUDE_CHART ke LLM)
+- aggregate: total/rata-rata/maks/min/jumlah baris atas satu kolom sheet
+- listing: daftar dokumen yang tersedia
+- smalltalk: salam / terima kasih
+- general: selain di atas (diteruskan ke LLM)
+
+Intent aggregate, listing dan smalltalk bisa dijawab lokal tanpa LLM, tetapi
+hanya jika semua kata di message dikenali (kata kunci intent, stopword, atau
+nama sheet/kolom/dokumen). Message yang lebih spesifik (mis. ada filter
+"di Jawa Barat") tetap diteruskan ke LLM agar jawabannya tidak salah.
 """
+import re
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+
+INTENT_CHART = 'chart'
+INTENT_AGGREGATE = 'aggregate'
+INTENT_LISTING = 'listing'
+INTENT_SMALLTALK = 'smalltalk'
+INTENT_GENERAL = 'general'
+
+# Urutan = prioritas saat beberapa intent cocok
+INTENT_KEYWORDS = {
+    INTENT_CHART: [
+        'chart', 'grafik', 'graph',
+        'visualisasi', 'visualkan', 'visualisasikan',
+        'diagram', 'plot',
+        'perbandingan', 'bandingkan',
+        'tren', 'trend',
+        'tampilkan data', 'tampilkan angka',
+        'buatkan chart', 'buatkan grafik',
+        'lihat chart', 'lihat grafik',
+        'perkembangan',
+        'vs', 'versus',
+        'bar chart', 'line chart', 'pie chart',
+    ],
+    INTENT_AGGREGATE: [
+        'total', 'jumlah', 'jumlahkan', 'sum',
+        'rata-rata', 'rata rata', 'rerata', 'average', 'avg',
+        'tertinggi', 'terbesar', 'maksimum', 'maksimal', 'max',
+        'terendah', 'terkecil', 'minimum', 'minimal',
+        'berapa baris', 'jumlah baris', 'jumlah data', 'jumlah row', 'banyak baris',
+    ],
+    INTENT_LISTING: [
+        'dokumen apa saja', 'dokumen apa aja', 'file apa saja', 'file apa aja',
+        'daftar dokumen', 'list dokumen', 'daftar file',
+        'dokumen yang ada', 'dokumen yang tersedia', 'ada dokumen apa',
+        'berapa dokumen', 'berapa banyak dokumen', 'jumlah dokumen',
+    ],
+    INTENT_SMALLTALK: [
+        'halo', 'hallo', 'hai', 'hi', 'hello', 'hey',
+        'selamat pagi', 'selamat siang', 'selamat sore', 'selamat malam',
+        'assalamualaikum', 'apa kabar',
+        'terima kasih', 'terimakasih', 'makasih', 'thanks', 'thank you',
+    ],
+}
+
+# Kata kunci chart dicocokkan sebagai substring (perilaku lama detect_chart_needed),
+# intent lain harus berupa kata utuh
+_WORD_BOUNDARY_INTENTS = {INTENT_AGGREGATE, INTENT_LISTING, INTENT_SMALLTALK}
+
+# Urutan group di regex: frasa yang lebih spesifik dulu ("jumlah dokumen" = listing,
+# bukan aggregate "jumlah")
+_PATTERN_ORDER = [INTENT_LISTING, INTENT_AGGREGATE, INTENT_SMALLTALK, INTENT_CHART]
+
+
+def _compile_router() -> re.Pattern:
+    groups = []
+    for intent in _PATTERN_ORDER:
+        keywords = INTENT_KEYWORDS[intent]
+        # Keyword lebih panjang dulu agar alternation mengambil match terpanjang
+        alternation = '|'.join(
+            re.escape(keyword).replace(r'\ ', r'\s+')
+            for keyword in sorted(keywords, key=len, reverse=True)
+        )
+        if intent in _WORD_BOUNDARY_INTENTS:
+            alternation = rf'\b(?:{alternation})\b'
+        groups.append(f'(?P<{intent}>{alternation})')
+    return re.compile('|'.join(groups), re.IGNORECASE)
+
+
+INTENT_PATTERN = _compile_router()
+
+AGGREGATE_FUNCTIONS = [
+    (re.compile(r'\b(?:berapa baris|jumlah (?:baris|data|row)|banyak baris)\b'), 'count'),
+    (re.compile(r'\b(?:rata-rata|rata rata|rerata|average|avg)\b'), 'avg'),
+    (re.compile(r'\b(?:tertinggi|terbesar|maksimum|maksimal|max)\b'), 'max'),
+    (re.compile(r'\b(?:terendah|terkecil|minimum|minimal)\b'), 'min'),
+    (re.compile(r'\b(?:total|jumlah|jumlahkan|sum)\b'), 'sum'),
+]
+
+AGGREGATE_LABELS = {
+    'sum': 'Total',
+    'avg': 'Rata-rata',
+    'max': 'Nilai tertinggi',
+    'min': 'Nilai terendah',
+}
+
+THANKS_PATTERN = re.compile(r'terima\s*kasih|makasih|thanks|thank\s+you', re.IGNORECASE)
+
+# Kata yang boleh muncul di message yang dijawab lokal
+STOPWORDS = {
+    'apa', 'saja', 'aja', 'yang', 'ada', 'dari', 'untuk', 'pada', 'dalam', 'dengan',
+    'berapa', 'banyak', 'semua', 'seluruh', 'tolong', 'dong', 'kak', 'min', 'bot',
+    'mohon', 'bisa', 'berikan', 'sebutkan', 'hitung', 'hitungkan', 'cek', 'lihat',
+    'sheet', 'kolom', 'dokumen', 'file', 'data', 'nilai', 'tersedia', 'sekarang',
+    'ini', 'itu', 'nya', 'kah', 'sih', 'the', 'what', 'how', 'many', 'please',
+    'baris', 'row', 'rows', 'list', 'daftar', 'kamu', 'semuanya', 'admin',
+    'pagi', 'siang', 'sore', 'malam', 'selamat', 'kabar', 'baik', 'sekali',
+}
+
+GREETING_REPLY = (
+    "Halo! Saya asisten analisis dokumen. Silakan tanyakan apa saja tentang dokumen "
+    "yang sudah di-upload, misalnya ringkasan, angka KPI, atau minta dibuatkan chart."
+)
+THANKS_REPLY = "Sama-sama! Silakan tanyakan lagi jika ada yang ingin dianalisis dari dokumen."
+
+LISTING_LIMIT = 20
+
+
+class RoutedIntent(NamedTuple):
+    """Hasil klasifikasi message"""
+    intent: str
+    include_chart: bool
+    matched: Tuple[str, ...]
+
+
+def classify_intent(message: str) -> RoutedIntent:
+    """
+    Klasifikasikan message dengan satu kali scan regex gabungan
+    
+    Args:
+        message: Pesan dari user
+    
+    Returns:
+        RoutedIntent (intent utama, flag chart, semua intent yang cocok)
+    """
+    matched = set()
+    for match in INTENT_PATTERN.finditer(message):
+        matched.add(match.lastgroup)
+    
+    ordered = tuple(intent for intent in INTENT_KEYWORDS if intent in matched)
+    intent = ordered[0] if ordered else INTENT_GENERAL
+    return RoutedIntent(intent, INTENT_CHART in matched, ordered)
 
 
 def detect_chart_needed(message: str) -> bool:
@@ -14,27 +161,153 @@ def detect_chart_needed(message: str) -> bool:
     Returns:
         True jika terdeteksi perlu chart, False jika tidak
     """
-    # Normalize message
-    msg_lower = message.lower()
+    return classify_intent(message).include_chart
+
+
+def answer_locally(routed: RoutedIntent, message: str, documents=None) -> Optional[Tuple[Dict, List[int]]]:
+    """
+    Jawab message tanpa LLM jika intent-nya bisa dijawab pasti dari database
     
-    # Keywords yang mengindikasikan user minta chart/visualisasi
-    chart_keywords = [
-        'chart', 'grafik', 'graph',
-        'visualisasi', 'visualkan', 'visualisasikan',
-        'diagram', 'plot',
-        'perbandingan', 'bandingkan',
-        'tren', 'trend',
-        'tampilkan data', 'tampilkan angka',
-        'buatkan chart', 'buatkan grafik',
-        'lihat chart', 'lihat grafik',
-        'perkembangan',
-        'vs', 'versus',
-        'bar chart', 'line chart', 'pie chart',
-    ]
+    Args:
+        documents: QuerySet Document yang boleh dipakai (default semua dokumen),
+            mis. hasil filter document_ids / tags / tanggal dari request chat
+    
+    Returns:
+        Tuple (response_data {"text", "chart"}, document_ids), atau None jika
+        message harus diteruskan ke LLM
+    """
+    if routed.include_chart:
+        return None
+    
+    if routed.intent == INTENT_SMALLTALK:
+        return _answer_smalltalk(message)
+    if documents is None:
+        from documents.models import Document
+        documents = Document.objects.all()
+    if routed.intent == INTENT_LISTING:
+        return _answer_listing(message, documents)
+    if routed.intent == INTENT_AGGREGATE:
+        return _answer_aggregate(message, documents)
+    return None
+
+
+def _tokens(text: str) -> List[str]:
+    return [token for token in re.findall(r'[a-z0-9]+', text.lower()) if len(token) >= 3]
+
+
+def _unknown_tokens(message: str, vocabulary: set) -> List[str]:
+    """Kata di message (selain keyword intent) yang tidak ada di vocabulary"""
+    remainder = INTENT_PATTERN.sub(' ', message)
+    return [token for token in _tokens(remainder) if token not in vocabulary and token not in STOPWORDS]
+
+
+def _answer_smalltalk(message: str):
+    if _unknown_tokens(message, set()):
+        return None
+    reply = THANKS_REPLY if THANKS_PATTERN.search(message) else GREETING_REPLY
+    return ({"text": reply, "chart": None}, [])
+
+
+def _answer_listing(message: str, documents):
+    if _unknown_tokens(message, set()):
+        return None
+    
+    queryset = documents
+    documents = list(
+        queryset.only('id', 'title', 'source_filename', 'created_at')
+        .order_by('-created_at', '-id')[:LISTING_LIMIT + 1]
+    )
+    if not documents:
+        return ({"text": "Belum ada dokumen yang di-upload.", "chart": None}, [])
+    
+    shown = documents[:LISTING_LIMIT]
+    if len(documents) > LISTING_LIMIT:
+        total = queryset.count()
+        header = f"Ada {total} dokumen yang tersedia. {LISTING_LIMIT} dokumen terbaru:"
+    else:
+        total = len(documents)
+        header = f"Ada {total} dokumen yang tersedia:"
+    
+    lines = [header]
+    for i, doc in enumerate(shown, start=1):
+        lines.append(f"{i}. {doc.title} ({doc.source_filename})")
+    if total > len(shown):
+        lines.append(f"...dan {total - len(shown)} dokumen lainnya.")
     
-    # Cek apakah ada keyword yang match
-    for keyword in chart_keywords:
-        if keyword in msg_lower:
-            return True
+    return ({"text": "\n".join(lines), "chart": None}, [doc.id for doc in shown])
+
+
+def _answer_aggregate(message: str, documents):
+    from core.chart_builder import ChartBuilder, aggregate, is_number, mentioned
+    
+    msg = message.lower()
+    agg = next((name for pattern, name in AGGREGATE_FUNCTIONS if pattern.search(msg)), None)
+    if agg is None:
+        return None
+    
+    # Tahap 1: cari (dokumen, sheet, kolom) yang disebut di message dari indeks kolom
+    # (Document.structured_columns), tanpa me-load rows dokumen mana pun
+    candidates = []
+    for doc in documents.filter(structured_columns__isnull=False).values('id', 'title', 'structured_columns'):
+        for position, sheet in enumerate(doc['structured_columns']):
+            sheet_mentioned = (
+                mentioned(sheet.get('sheet'), msg)
+                or mentioned(doc['title'], msg)
+            )
+            if agg == 'count':
+                if sheet_mentioned:
+                    candidates.append((doc, position, None, sheet_mentioned))
+                continue
+            for index in sheet['numeric']:
+                if mentioned(sheet['columns'][index], msg):
+                    candidates.append((doc, position, index, sheet_mentioned))
+    
+    # Jika ambigu, utamakan kandidat yang sheet/dokumennya juga disebut
+    if len(candidates) > 1:
+        candidates = [item for item in candidates if item[3]]
+    if len(candidates) != 1:
+        return None
     
-    return False
+    doc, position, index, _ = candidates[0]
+    entry = doc['structured_columns'][position]
+    vocabulary = set(_tokens(' '.join(
+        [str(entry.get('sheet', '')), str(doc['title']), *map(str, entry['columns'])]
+    )))
+    if _unknown_tokens(message, vocabulary):
+        return None
+    
+    # Tahap 2: rows hanya dari satu dokumen yang dituju
+    structured_data = documents.filter(pk=doc['id']).values_list('structured_data', flat=True).first()
+    sheets = [sheet for _, sheet in ChartBuilder.iter_sheets([{'structured_data': structured_data}])]
+    if position >= len(sheets) or sheets[position]['columns'] != entry['columns']:
+        # Indeks kolom tidak sesuai isi structured_data, serahkan ke LLM
+        return None
+    sheet = sheets[position]
+    
+    rows = sheet.get('rows') or []
+    where = f'sheet "{sheet.get("name")}" (dokumen "{doc["title"]}")'
+    if agg == 'count':
+        text = f"{where[0].upper()}{where[1:]} memiliki {_format_number(len(rows))} baris data."
+    else:
+        values = [
+            row[index] for row in rows
+            if index < len(row) and is_number(row[index])
+        ]
+        if not values:
+            return None
+        result = aggregate(values, agg)
+        text = (
+            f"{AGGREGATE_LABELS[agg]} {sheet['columns'][index]} pada {where}: "
+            f"{_format_number(result)} (dihitung dari {_format_number(len(values))} baris)."
+        )
+    
+    return ({"text": text, "chart": None}, [doc['id']])
+
+
+def _format_number(value) -> str:
+    """Format angka gaya Indonesia: 12.345 / 1.234,56"""
+    if isinstance(value, float) and not value.is_integer():
+        formatted = f"{value:,.2f}"
+    else:
+        formatted = f"{int(value):,}"
+    return formatted.replace(',', '_').replace('.', ',').replace('_', '.')
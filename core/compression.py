@@ -0,0 +1,99 @@
+"""
+Utilities untuk kompresi teks dokumen at rest (zlib / lzma dari stdlib)
+
+Format penyimpanan (tetap di kolom text):
+- Teks biasa (tidak dikompresi) disimpan apa adanya
+- Teks terkompresi: 1 karakter format + base85(payload terkompresi)
+
+Karakter format berupa karakter kontrol (\\x01, \\x02, ...) yang selalu dibuang
+oleh DocumentExtractor._normalize_text, sehingga tidak bentrok dengan teks biasa.
+Codec baru cukup ditambahkan ke CODECS dengan karakter format yang belum dipakai.
+"""
+import base64
+import lzma
+import zlib
+from typing import Optional
+
+from django.conf import settings
+
+
+CODEC_NONE = 'none'
+CODEC_ZLIB = 'zlib'
+CODEC_LZMA = 'lzma'
+
+# codec -> (format char, compress, decompress)
+CODECS = {
+    CODEC_ZLIB: ('\x01', lambda data: zlib.compress(data, 6), zlib.decompress),
+    CODEC_LZMA: ('\x02', lambda data: lzma.compress(data, preset=6), lzma.decompress),
+}
+
+FORMAT_CHARS = {fmt: codec for codec, (fmt, _, _) in CODECS.items()}
+
+
+class EncodedText(str):
+    """
+    Penanda bahwa string sudah dalam format penyimpanan (tidak di-encode ulang)
+    """
+
+
+def get_codec() -> str:
+    """Codec aktif dari settings DOCUMENT_CONTENT_COMPRESSION"""
+    return getattr(settings, 'DOCUMENT_CONTENT_COMPRESSION', CODEC_NONE)
+
+
+def detect_codec(value: Optional[str]) -> str:
+    """Codec yang dipakai oleh nilai tersimpan (CODEC_NONE jika teks biasa)"""
+    if value:
+        return FORMAT_CHARS.get(value[0], CODEC_NONE)
+    return CODEC_NONE
+
+
+def is_encoded(value) -> bool:
+    """Cek apakah nilai tersimpan dalam format terkompresi"""
+    return isinstance(value, str) and detect_codec(value) != CODEC_NONE
+
+
+def encode_text(text: Optional[str], codec: Optional[str] = None) -> Optional[str]:
+    """
+    Encode teks ke format penyimpanan
+
+    Args:
+        text: Teks asli
+        codec: 'none', 'zlib' atau 'lzma' (default: settings)
+
+    Returns:
+        EncodedText yang siap disimpan ke kolom text
+    """
+    if text is None:
+        return None
+    if isinstance(text, EncodedText):
+        return text
+
+    codec = codec or get_codec()
+    min_length = getattr(settings, 'DOCUMENT_CONTENT_COMPRESSION_MIN_LENGTH', 512)
+
+    if codec == CODEC_NONE or len(text) < min_length:
+        # Teks biasa yang kebetulan diawali karakter format tetap harus dikompresi
+        # agar tidak salah dibaca sebagai data terkompresi
+        if not is_encoded(text):
+            return EncodedText(text)
+        codec = CODEC_ZLIB
+
+    if codec not in CODECS:
+        raise ValueError(f"Codec kompresi tidak dikenal: {codec}")
+
+    fmt, compress, _ = CODECS[codec]
+    payload = base64.b85encode(compress(text.encode('utf-8'))).decode('ascii')
+    return EncodedText(fmt + payload)
+
+
+def decode_text(value: Optional[str]) -> Optional[str]:
+    """
+    Decode nilai tersimpan ke teks asli (teks biasa dikembalikan apa adanya)
+    """
+    codec = detect_codec(value)
+    if codec == CODEC_NONE:
+        return value
+
+    _, _, decompress = CODECS[codec]
+    return decompress(base64.b85decode(value[1:])).decode('utf-8')
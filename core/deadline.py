@@ -0,0 +1,203 @@
+"""
+Deadline end-to-end per request
+
+Setiap request API mendapat deadline (REQUEST_DEADLINES per nama URL, default
+REQUEST_DEADLINE_DEFAULT, bisa diganti client lewat header X-Request-Timeout dalam
+detik, maksimal REQUEST_DEADLINE_MAX). Setiap fase hanya memakai sisa waktunya:
+
+- Verifikasi SSO dan panggilan DeepSeek: timeout HTTP = min(timeout fase, sisa deadline);
+  panggilan DeepSeek juga dibatasi total (koneksi + membaca body), bukan hanya per operasi baca
+- Query database: ditolak jika deadline sudah lewat; PostgreSQL memakai
+  statement_timeout = sisa deadline, SQLite dihentikan lewat progress handler
+- Antrian slot LLM (core/admission.py): menunggu maksimal sisa deadline
+
+Pekerjaan yang melewati deadline dibatalkan dengan DeadlineExceeded (504) alih-alih
+tetap dijalankan untuk client yang sudah berhenti menunggu. View DRF menjawabnya lewat
+exception handler DRF, view Django lain lewat DeadlineMiddleware.process_exception.
+"""
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.http import JsonResponse
+from rest_framework.exceptions import APIException
+
+from core.metrics import DEADLINE_EXCEEDED
+from core.timing import annotate
+
+
+DEADLINE_HEADER = 'X-Request-Timeout'
+
+# PostgreSQL: statement_timeout di-set ulang jika nilainya melebihi sisa deadline lebih
+# dari ini (detik), sehingga tidak perlu SET sebelum setiap query
+STATEMENT_TIMEOUT_SLACK = 1.0
+
+# SQLite: deadline dicek setiap sekian instruksi VM
+SQLITE_PROGRESS_STEPS = 1000
+
+_deadline: ContextVar[Optional[float]] = ContextVar('request_deadline', default=None)
+
+
+class DeadlineExceeded(APIException):
+    """504: deadline request habis sebelum fase selesai"""
+    
+    status_code = 504
+    default_detail = 'Batas waktu request habis sebelum selesai diproses.'
+    default_code = 'deadline_exceeded'
+    
+    def __init__(self, phase: str = 'request'):
+        super().__init__()
+        self.phase = phase
+        DEADLINE_EXCEEDED.inc(phase=phase)
+        annotate(deadline_exceeded=phase)
+
+
+def remaining() -> Optional[float]:
+    """Sisa waktu deadline request (detik), None di luar request ber-deadline"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def expired() -> bool:
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def check(phase: str = 'request'):
+    """DeadlineExceeded jika deadline request sudah lewat"""
+    if expired():
+        raise DeadlineExceeded(phase)
+
+
+def budget(default: float, phase: str = 'request') -> float:
+    """
+    Timeout untuk satu fase: min(default, sisa deadline)
+    
+    Raises:
+        DeadlineExceeded: Deadline sudah lewat (fase tidak perlu dimulai)
+    """
+    left = remaining()
+    if left is None:
+        return default
+    if left <= 0:
+        raise DeadlineExceeded(phase)
+    return min(default, left)
+
+
+def parse_timeout(value) -> Optional[float]:
+    """Detik dari header X-Request-Timeout (None jika tidak valid)"""
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        return None
+    if not seconds > 0:
+        return None
+    return seconds
+
+
+def _set_statement_timeout(conn, cursor, left: float):
+    """PostgreSQL: pastikan statement_timeout tidak melebihi sisa deadline"""
+    current = getattr(conn, '_deadline_statement_timeout', None)
+    if current is not None and current <= left + STATEMENT_TIMEOUT_SLACK:
+        return
+    # Cursor DB-API langsung (bukan CursorWrapper) agar tidak melewati wrapper ini lagi
+    cursor.cursor.execute('SET statement_timeout = %s', [max(1, int(left * 1000))])
+    conn._deadline_statement_timeout = left
+
+
+def reset_statement_timeout(conn=connection):
+    """Kembalikan statement_timeout koneksi (persistent connection) ke default server"""
+    if getattr(conn, '_deadline_statement_timeout', None) is None:
+        return
+    conn._deadline_statement_timeout = None
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute('SET statement_timeout = DEFAULT')
+    except DatabaseError:
+        pass
+
+
+def _db_deadline(execute, sql, params, many, context):
+    left = remaining()
+    if left is None:
+        return execute(sql, params, many, context)
+    if left <= 0:
+        raise DeadlineExceeded('db')
+    
+    conn = context['connection']
+    raw = None
+    if conn.vendor == 'postgresql':
+        _set_statement_timeout(conn, context['cursor'], left)
+    elif conn.vendor == 'sqlite':
+        raw = conn.connection
+        deadline = _deadline.get()
+        # Nilai non-zero dari handler menghentikan query (OperationalError: interrupted)
+        raw.set_progress_handler(lambda: time.monotonic() >= deadline, SQLITE_PROGRESS_STEPS)
+    try:
+        return execute(sql, params, many, context)
+    except DatabaseError as e:
+        # Query dibatalkan statement_timeout / progress handler karena deadline
+        if expired():
+            raise DeadlineExceeded('db') from e
+        raise
+    finally:
+        if raw is not None:
+            raw.set_progress_handler(None, 0)
+
+
+class DeadlineMiddleware:
+    """
+    Pasang deadline untuk setiap request yang diarahkan ke view
+    
+    Deadline dihitung dari awal request; budget dipilih setelah URL di-resolve
+    (process_view) agar bisa per endpoint (nama URL, mis. 'chat', 'document-bulk-upload').
+    """
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+    
+    def __call__(self, request):
+        if not settings.REQUEST_DEADLINE_ENABLED:
+            return self.get_response(request)
+        
+        request._deadline_started = time.monotonic()
+        try:
+            with connection.execute_wrapper(_db_deadline):
+                return self.get_response(request)
+        finally:
+            token = getattr(request, '_deadline_token', None)
+            if token is not None:
+                _deadline.reset(token)
+            reset_statement_timeout()
+    
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not hasattr(request, '_deadline_started'):
+            return None
+        seconds = self.deadline_for(request)
+        request._deadline_token = _deadline.set(request._deadline_started + seconds)
+        annotate(deadline_s=seconds)
+        return None
+    
+    def process_exception(self, request, exception):
+        """
+        DeadlineExceeded di luar exception handler DRF (mis. query database dari admin
+        atau view Django biasa) tetap dijawab 504, bukan 500
+        """
+        if not isinstance(exception, DeadlineExceeded):
+            return None
+        return JsonResponse({'detail': str(exception.detail)}, status=exception.status_code)
+    
+    @staticmethod
+    def deadline_for(request) -> float:
+        """Budget request: header client, deadline endpoint, atau default (maks REQUEST_DEADLINE_MAX)"""
+        seconds = parse_timeout(request.headers.get(DEADLINE_HEADER))
+        if seconds is None:
+            match = request.resolver_match
+            seconds = settings.REQUEST_DEADLINES.get(
+                match.view_name if match else '', settings.REQUEST_DEADLINE_DEFAULT
+            )
+        return min(seconds, settings.REQUEST_DEADLINE_MAX)
@@ -2,10 +2,18 @@
 Service untuk integrasi dengan DeepSeek LLM API
 """
 import json
+import time
 import requests
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 from django.conf import settings
 
+from core.deadline import DeadlineExceeded, budget, expired, remaining
+from core.downsampling import downsample_structured_data
+from core.llm_routing import LLMRoute, escalate_route, record_route, select_route
+from core.metrics import LLM_INFLIGHT, LLM_LATENCY, LLM_TOKENS
+from core.text_stats import estimate_tokens
+from core.timing import phase
+
 
 class DeepSeekService:
     """
@@ -25,22 +33,51 @@ Aturan penting:
 Jika diminta chart:
 - "chart" harus mengikuti format konfigurasi Chart.js (type, data, options).
 - Pilih "type" yang sesuai: "line" untuk time-series, "bar" untuk perbandingan kategori, "pie/doughnut" untuk proporsi.
-- Pastikan data numerik berupa number (bukan string)."""
+- Pastikan data numerik berupa number (bukan string).
+
+Jika CHART_MODE: spec (data tabel tersedia di CHART_SOURCES):
+- JANGAN tulis konfigurasi Chart.js maupun angka chart; server membangun chart dari data asli.
+- Isi "chart" dengan chart spec: {"doc_id": <id>, "sheet": "<nama sheet>", "type": "line|bar|pie|doughnut", "x": "<kolom label>", "y": ["<kolom angka>"], "agg": "none|sum|avg|count|min|max", "sort": "asc|desc" (opsional), "limit": <angka> (opsional), "title": "<judul>"}.
+- Gunakan hanya doc_id, sheet dan nama kolom yang tercantum di CHART_SOURCES."""
+    
+    # Perkiraan overhead format chat per message (role + pemisah), untuk estimasi token
+    MESSAGE_OVERHEAD_TOKENS = 4
+    # Context caching DeepSeek bekerja per unit prefix 64 token
+    PROMPT_CACHE_MIN_TOKENS = 64
+    # Eskalasi jawaban terpotong dilewati jika sisa deadline request kurang dari ini (detik)
+    ESCALATION_MIN_SECONDS = 5.0
+    # Batas waktu membuka koneksi ke DeepSeek (detik); sisanya untuk membaca response
+    CONNECT_TIMEOUT = 10.0
+    # Ukuran potongan body response; deadline total dicek di antara potongan
+    READ_CHUNK_BYTES = 16 * 1024
     
     @staticmethod
     def create_user_prompt(
         message: str,
         documents_context: str,
         include_chart: bool,
-        document_ids: List[int]
+        corpus_snapshot_id: Optional[int] = None,
+        chart_sources: str = ''
     ) -> str:
         """
         Membuat user prompt dengan format konsisten
+        
+        Jika chart_sources diisi (ringkasan sheet dari ChartBuilder.describe_sources),
+        LLM diminta mengembalikan chart spec, bukan konfigurasi Chart.js lengkap.
+        Corpus direferensikan lewat id snapshot (id tiap dokumen sudah ada di blok <DOC>).
         """
+        chart_block = ""
+        if include_chart and chart_sources:
+            chart_block = f"""CHART_MODE: spec
+CHART_SOURCES:
+{chart_sources}
+
+"""
+        
         prompt = f"""INCLUDE_CHART: {str(include_chart).lower()}
-DOCUMENT_IDS: {document_ids}
+CORPUS_SNAPSHOT: {corpus_snapshot_id if corpus_snapshot_id is not None else '-'}
 
-CONTEXT (dokumen terlampir):
+{chart_block}CONTEXT (dokumen terlampir):
 {documents_context}
 
 USER_MESSAGE:
@@ -49,20 +86,36 @@ USER_MESSAGE:
         return prompt
     
     @staticmethod
-    def prepare_documents_context(documents: List[Dict]) -> str:
+    def prepare_documents_context(documents: List[Dict], max_sheet_rows: int = 0) -> str:
         """
         Menyiapkan konteks dokumen dengan format yang rapi
         
         Args:
             documents: List of dict dengan keys: id, title, content
+            max_sheet_rows: Jika > 0, rows setiap sheet structured_data direduksi
+                (LTTB) menjadi maksimal sejumlah ini
         
         Returns:
             String konteks yang siap dimasukkan ke prompt
         """
+        return DeepSeekService._build_documents_context(documents, max_sheet_rows)[0]
+    
+    @staticmethod
+    def _build_documents_context(documents: List[Dict], max_sheet_rows: int = 0) -> Tuple[str, List[Dict]]:
+        """
+        Konteks dokumen beserta alokasi karakter per dokumen
+        
+        Returns:
+            Tuple (context, allocation). Satu item allocation per dokumen: id, title,
+            source_chars, budget_chars, included_chars, truncated dan offset (posisi
+            isi dokumen di context, untuk estimasi token di plan_call).
+        """
         if not documents:
-            return "(Tidak ada dokumen konteks)"
+            return "(Tidak ada dokumen konteks)", []
         
         context_parts = []
+        allocation = []
+        position = 0
         max_length = settings.DOCUMENT_CONTEXT_MAX_LENGTH
         
         for doc in documents:
@@ -73,6 +126,7 @@ USER_MESSAGE:
             
             # Gabungkan structured data (jika ada) ke konten dokumen
             if structured_data:
+                structured_data = downsample_structured_data(structured_data, max_sheet_rows)
                 try:
                     structured_json = json.dumps(structured_data, ensure_ascii=True)
                 except Exception:
@@ -86,6 +140,7 @@ USER_MESSAGE:
             # Trim content jika terlalu panjang per dokumen
             # Alokasi proporsional untuk setiap dokumen
             max_per_doc = max_length // len(documents)
+            source_chars = len(content)
             if len(content) > max_per_doc:
                 # Ambil dari awal dan akhir dokumen untuk memastikan data penting tidak hilang
                 half = max_per_doc // 2
@@ -95,24 +150,210 @@ USER_MESSAGE:
                     content[-half:]
                 )
             
-            doc_context = f'<DOC id="{doc_id}" title="{title}">\n{content}\n</DOC>'
+            header = f'<DOC id="{doc_id}" title="{title}">\n'
+            doc_context = f'{header}{content}\n</DOC>'
             context_parts.append(doc_context)
+            allocation.append({
+                'id': doc_id,
+                'title': title,
+                'source_chars': source_chars,
+                'budget_chars': max_per_doc,
+                'included_chars': len(content),
+                'truncated': len(content) < source_chars,
+                'offset': position + len(header),
+            })
+            position += len(doc_context) + 2
         
         combined = "\n\n".join(context_parts)
         
         # Safety check: jika masih terlalu panjang, potong lagi
         if len(combined) > max_length:
             combined = combined[:max_length] + "...\n[Konteks total dipotong]"
+            for item in allocation:
+                kept = max(0, min(item['included_chars'], max_length - item['offset']))
+                if kept < item['included_chars']:
+                    item['included_chars'] = kept
+                    item['truncated'] = True
         
-        return combined
+        return combined, allocation
+    
+    @staticmethod
+    def build_messages(
+        message: str,
+        documents: List[Dict],
+        include_chart: bool = False,
+        corpus_snapshot_id: Optional[int] = None,
+        conversation_messages: Optional[List[Dict[str, str]]] = None,
+        chart_sources: str = '',
+    ) -> Tuple[List[Dict[str, str]], List[Dict]]:
+        """
+        Susun messages DeepSeek: system prompt, history, lalu user prompt berisi konteks
+        
+        Returns:
+            Tuple (messages, allocation); allocation dari _build_documents_context
+        """
+        with phase('context'):
+            # Siapkan konteks dokumen
+            # Untuk chart, rows sheet besar direduksi agar prompt tetap terbatas
+            documents_context, allocation = DeepSeekService._build_documents_context(
+                documents,
+                max_sheet_rows=settings.CHART_PROMPT_MAX_ROWS if include_chart else 0
+            )
+        
+            # Buat user prompt
+            user_prompt = DeepSeekService.create_user_prompt(
+                message=message,
+                documents_context=documents_context,
+                include_chart=include_chart,
+                corpus_snapshot_id=corpus_snapshot_id,
+                chart_sources=chart_sources
+            )
+        
+        # Siapkan rangkaian messages (multi-turn) jika ada history
+        messages: List[Dict[str, str]] = [
+            {"role": "system", "content": DeepSeekService.SYSTEM_PROMPT},
+        ]
+        if conversation_messages:
+            # Pastikan formatnya benar dan tidak terlalu besar
+            for m in conversation_messages:
+                role = (m or {}).get("role")
+                content = (m or {}).get("content")
+                if role in ("user", "assistant") and isinstance(content, str) and content.strip():
+                    messages.append({"role": role, "content": content})
+        
+        # Tambahkan prompt user terbaru (sudah termasuk konteks dokumen)
+        messages.append({"role": "user", "content": user_prompt})
+        return messages, allocation
+    
+    @staticmethod
+    def plan_call(
+        message: str,
+        documents: List[Dict],
+        include_chart: bool = False,
+        corpus_snapshot_id: Optional[int] = None,
+        conversation_messages: Optional[List[Dict[str, str]]] = None,
+        chart_sources: str = '',
+        route: Optional[LLMRoute] = None,
+        prefix_recently_sent: bool = False,
+        include_messages: bool = False,
+    ) -> Dict:
+        """
+        Dry-run call_deepseek: susun prompt yang sama persis tanpa memanggil API
+        
+        Token adalah estimasi heuristik (core/text_stats.estimate_tokens), bukan hasil
+        tokenizer DeepSeek; cukup untuk tuning budget dan mendeteksi prompt yang membengkak.
+        
+        Args:
+            message ... route: Sama seperti call_deepseek
+            prefix_recently_sent: Prompt dengan snapshot corpus yang sama baru saja dikirim
+                (prefix konteks kemungkinan masih ada di cache DeepSeek)
+            include_messages: Sertakan messages lengkap di hasil
+        """
+        messages, allocation = DeepSeekService.build_messages(
+            message=message,
+            documents=documents,
+            include_chart=include_chart,
+            corpus_snapshot_id=corpus_snapshot_id,
+            conversation_messages=conversation_messages,
+            chart_sources=chart_sources,
+        )
+        overhead = DeepSeekService.MESSAGE_OVERHEAD_TOKENS
+        system_tokens = estimate_tokens(messages[0]['content']) + overhead
+        history = messages[1:-1]
+        history_tokens = sum(estimate_tokens(m['content']) + overhead for m in history)
+        user_prompt = messages[-1]['content']
+        user_tokens = estimate_tokens(user_prompt) + overhead
+        prompt_tokens = system_tokens + history_tokens + user_tokens
+        
+        # Token per dokumen dihitung dari potongan yang benar-benar masuk context
+        context_start = user_prompt.find('CONTEXT (dokumen terlampir):\n') + len('CONTEXT (dokumen terlampir):\n')
+        source_tokens = {
+            doc.get('id'): doc['token_count'] + doc.get('structured_token_count', 0)
+            for doc in documents
+            if doc.get('token_count') is not None
+        }
+        documents_plan = []
+        for item in allocation:
+            start = context_start + item.pop('offset')
+            item['source_tokens'] = source_tokens.get(item['id'])
+            item['included_tokens'] = estimate_tokens(user_prompt[start:start + item['included_chars']])
+            documents_plan.append(item)
+        
+        # Prefix stabil (system + history + user prompt sampai USER_MESSAGE) bisa di-cache
+        # DeepSeek; history berubah setiap turn sehingga hanya system prompt yang pasti sama
+        message_start = user_prompt.rfind('USER_MESSAGE:\n')
+        prefix_tokens = system_tokens + history_tokens + estimate_tokens(user_prompt[:message_start])
+        cache_eligible = prefix_tokens >= DeepSeekService.PROMPT_CACHE_MIN_TOKENS
+        if cache_eligible and prefix_recently_sent and not history:
+            expected_cached = prefix_tokens
+        else:
+            expected_cached = system_tokens
+        
+        route = route or select_route(message, include_chart, len(messages) - 2)
+        max_tokens = route.max_tokens
+        prompt_cost = (
+            (prompt_tokens - expected_cached) * settings.DEEPSEEK_PRICE_INPUT_PER_M
+            + expected_cached * settings.DEEPSEEK_PRICE_CACHED_INPUT_PER_M
+        ) / 1_000_000
+        completion_cost = max_tokens * settings.DEEPSEEK_PRICE_OUTPUT_PER_M / 1_000_000
+        
+        context_truncated = any(item['truncated'] for item in documents_plan)
+        warnings = []
+        if context_truncated:
+            warnings.append('context_truncated')
+        if prompt_tokens + max_tokens > settings.DEEPSEEK_CONTEXT_TOKENS:
+            warnings.append('exceeds_context_window')
+        
+        plan = {
+            "model": route.model,
+            "max_tokens": max_tokens,
+            "route": route.as_log(),
+            "prompt": {
+                "estimated_tokens": prompt_tokens,
+                "characters": sum(len(m['content']) for m in messages),
+                "system_tokens": system_tokens,
+                "history_tokens": history_tokens,
+                "user_prompt_tokens": user_tokens,
+                "context_window_tokens": settings.DEEPSEEK_CONTEXT_TOKENS,
+            },
+            "history": {
+                "messages": len(history),
+                "tokens": history_tokens,
+            },
+            "context": {
+                "max_chars": settings.DOCUMENT_CONTEXT_MAX_LENGTH,
+                "documents_count": len(documents_plan),
+                "truncated": context_truncated,
+                "documents": documents_plan,
+            },
+            "cache": {
+                "eligible": cache_eligible,
+                "prefix_tokens": prefix_tokens,
+                "prefix_recently_sent": prefix_recently_sent,
+                "expected_cached_tokens": expected_cached,
+            },
+            "cost": {
+                "currency": "USD",
+                "prompt": round(prompt_cost, 6),
+                "completion_max": round(completion_cost, 6),
+                "total_max": round(prompt_cost + completion_cost, 6),
+            },
+            "warnings": warnings,
+        }
+        if include_messages:
+            plan["messages"] = messages
+        return plan
     
     @staticmethod
     def call_deepseek(
         message: str,
         documents: List[Dict],
         include_chart: bool = False,
-        document_ids: Optional[List[int]] = None,
+        corpus_snapshot_id: Optional[int] = None,
         conversation_messages: Optional[List[Dict[str, str]]] = None,
+        chart_sources: str = '',
+        route: Optional[LLMRoute] = None,
+        on_usage: Optional[Callable[[Dict], None]] = None,
     ) -> Tuple[Optional[Dict], Optional[str]]:
         """
         Memanggil DeepSeek API
@@ -121,92 +362,173 @@ USER_MESSAGE:
             message: Pesan user
             documents: List dokumen untuk konteks
             include_chart: Apakah user meminta chart
-            document_ids: List ID dokumen (untuk logging di prompt)
+            corpus_snapshot_id: ID CorpusSnapshot dokumen konteks (untuk logging di prompt)
             conversation_messages: List messages historis DeepSeek (role/content),
                 contoh: [{"role":"user","content":"..."},{"role":"assistant","content":"..."}]
+            chart_sources: Ringkasan sheet untuk chart spec (kosong = LLM menulis Chart.js lengkap)
+            route: Model / max_tokens / temperature (core/llm_routing.py); None = dipilih
+                dari message, include_chart dan jumlah history
+            on_usage: Dipanggil dengan dict usage DeepSeek setiap response (mis. admission
+                control yang menagih token sebenarnya)
         
         Returns:
             Tuple (response_dict, error_message)
             Jika sukses: ({"text": "...", "chart": {...}}, None)
             Jika gagal: (None, error_message)
+        
+        Raises:
+            DeadlineExceeded: Deadline request (core/deadline.py) habis sebelum DeepSeek menjawab
         """
         try:
-            # Siapkan konteks dokumen
-            documents_context = DeepSeekService.prepare_documents_context(documents)
-            
-            # Buat user prompt
-            user_prompt = DeepSeekService.create_user_prompt(
+            messages, _ = DeepSeekService.build_messages(
                 message=message,
-                documents_context=documents_context,
+                documents=documents,
                 include_chart=include_chart,
-                document_ids=document_ids or []
+                corpus_snapshot_id=corpus_snapshot_id,
+                conversation_messages=conversation_messages,
+                chart_sources=chart_sources,
             )
-            
-            # Siapkan rangkaian messages (multi-turn) jika ada history
-            messages: List[Dict[str, str]] = [
-                {"role": "system", "content": DeepSeekService.SYSTEM_PROMPT},
-            ]
-            if conversation_messages:
-                # Pastikan formatnya benar dan tidak terlalu besar
-                for m in conversation_messages:
-                    role = (m or {}).get("role")
-                    content = (m or {}).get("content")
-                    if role in ("user", "assistant") and isinstance(content, str) and content.strip():
-                        messages.append({"role": role, "content": content})
-
-            # Tambahkan prompt user terbaru (sudah termasuk konteks dokumen)
-            messages.append({"role": "user", "content": user_prompt})
-
-            # Siapkan payload untuk DeepSeek API
-            payload = {
-                "model": settings.DEEPSEEK_MODEL,
-                "messages": messages,
-                "temperature": 0.7,
-                "max_tokens": 8000,  # Maximum untuk response lebih detail (impress client)
-            }
-            
-            # Jika API mendukung response_format (untuk JSON mode)
-            # payload["response_format"] = {"type": "json_object"}
+            route = route or select_route(message, include_chart, len(messages) - 2)
+            record_route(route)
+            escalated_from = None
             
             headers = {
                 "Authorization": f"Bearer {settings.DEEPSEEK_API_KEY}",
                 "Content-Type": "application/json"
             }
             
-            # Panggil API
-            response = requests.post(
-                settings.DEEPSEEK_API_URL,
-                json=payload,
-                headers=headers,
-                timeout=settings.DEEPSEEK_TIMEOUT
-            )
+            while True:
+                # Deadline bisa habis di antara percobaan (mis. setelah jawaban terpotong)
+                if expired():
+                    raise DeadlineExceeded('llm')
+                
+                # Siapkan payload untuk DeepSeek API (model / budget dari rute)
+                payload = {
+                    "model": route.model,
+                    "messages": messages,
+                    "temperature": route.temperature,
+                    "max_tokens": route.max_tokens,
+                }
             
-            if response.status_code != 200:
-                return (None, f"DeepSeek API error: {response.status_code} - {response.text}")
+                # Jika API mendukung response_format (untuk JSON mode)
+                # payload["response_format"] = {"type": "json_object"}
             
-            # Parse response
-            response_data = response.json()
-            content = response_data.get('choices', [{}])[0].get('message', {}).get('content', '')
+                # Panggil API
+                with phase('llm'):
+                    response = DeepSeekService._post(payload, headers)
+                
+                if response.status_code != 200:
+                    return (None, f"DeepSeek API error: {response.status_code} - {response.text}")
+                
+                with phase('parse'):
+                    # Parse response
+                    response_data = response.json()
+                    usage = response_data.get('usage')
+                    DeepSeekService._record_usage(usage, route.model)
+                    if on_usage is not None and isinstance(usage, dict):
+                        on_usage(usage)
+                    choice = response_data.get('choices', [{}])[0]
+                    content = choice.get('message', {}).get('content', '')
+                    
+                    # Parse JSON dari content
+                    parsed = DeepSeekService.parse_llm_response(content) if content else None
+                
+                # JSON terpotong karena max_tokens rute pendek: ulangi sekali dengan budget
+                # rute analysis agar jawaban panjang tetap tersedia
+                longer = None
+                if parsed is None and choice.get('finish_reason') == 'length' and escalated_from is None:
+                    longer = escalate_route(route)
+                    # Sisa deadline request tidak cukup untuk panggilan kedua
+                    left = remaining()
+                    if left is not None and left < DeepSeekService.ESCALATION_MIN_SECONDS:
+                        longer = None
+                if longer is None:
+                    break
+                escalated_from = route.name
+                route = longer
+                record_route(route, escalated_from)
             
             if not content:
                 return (None, "DeepSeek tidak mengembalikan konten")
             
-            # Parse JSON dari content
-            parsed = DeepSeekService.parse_llm_response(content)
-            
             if parsed is None:
                 # Fallback: jika JSON invalid, kembalikan text saja
                 return ({"text": content, "chart": None}, None)
             
             return (parsed, None)
             
+        except DeadlineExceeded:
+            raise
         except requests.Timeout:
+            if expired():
+                raise DeadlineExceeded('llm')
             return (None, "Timeout saat memanggil DeepSeek API")
         except requests.RequestException as e:
             return (None, f"Error koneksi ke DeepSeek: {str(e)}")
         except Exception as e:
             return (None, f"Error tidak terduga: {str(e)}")
     
+    @staticmethod
+    def _post(payload: Dict, headers: Dict[str, str]) -> requests.Response:
+        """POST ke DeepSeek API sambil mencatat latensi, outcome dan panggilan in-flight"""
+        outcome = 'error'
+        start = time.perf_counter()
+        try:
+            # Timeout requests berlaku per operasi socket; total (koneksi + header + body)
+            # dibatasi sendiri agar satu panggilan tidak melewati sisa deadline
+            total = budget(settings.DEEPSEEK_TIMEOUT, 'llm')
+            give_up_at = time.monotonic() + total
+            with LLM_INFLIGHT.track_inprogress():
+                response = requests.post(
+                    settings.DEEPSEEK_API_URL,
+                    json=payload,
+                    headers=headers,
+                    timeout=(min(DeepSeekService.CONNECT_TIMEOUT, total), total),
+                    stream=True,
+                )
+                DeepSeekService._read_body(response, give_up_at)
+            outcome = 'ok' if response.status_code == 200 else f'http_{response.status_code}'
+            return response
+        except requests.Timeout:
+            outcome = 'timeout'
+            raise
+        finally:
+            LLM_LATENCY.observe(
+                time.perf_counter() - start, model=payload.get('model', ''), outcome=outcome
+            )
+    
+    @staticmethod
+    def _read_body(response: requests.Response, give_up_at: float):
+        """
+        Baca body response (stream=True) per potongan sampai give_up_at (time.monotonic)
+        
+        Raises:
+            requests.Timeout: Body belum selesai dibaca saat batas waktu total habis
+        """
+        chunks = []
+        try:
+            for chunk in response.iter_content(DeepSeekService.READ_CHUNK_BYTES):
+                chunks.append(chunk)
+                if time.monotonic() >= give_up_at:
+                    raise requests.Timeout('Batas waktu total membaca response DeepSeek habis')
+        finally:
+            response.close()
+        response._content = b''.join(chunks)
+    
+    @staticmethod
+    def _record_usage(usage: Optional[Dict], model: str):
+        """Catat usage token dari response DeepSeek (prompt/completion/cache hit)"""
+        if not isinstance(usage, dict):
+            return
+        for key, token_type in (
+            ('prompt_tokens', 'prompt'),
+            ('completion_tokens', 'completion'),
+            ('prompt_cache_hit_tokens', 'prompt_cache_hit'),
+        ):
+            value = usage.get(key)
+            if isinstance(value, int) and value > 0:
+                LLM_TOKENS.inc(value, model=model, type=token_type)
+    
     @staticmethod
     def parse_llm_response(content: str) -> Optional[Dict]:
         """
@@ -2,6 +2,8 @@
 Service untuk ekstraksi teks dari berbagai format dokumen
 """
 import re
+import time
+from multiprocessing import util as mp_util
 from typing import Tuple, Optional, Dict, Any
 from datetime import date, datetime
 import PyPDF2
@@ -10,6 +12,9 @@ import magic
 import openpyxl
 from openpyxl.utils import get_column_letter
 
+from core.metrics import EXTRACTION_DURATION, registry
+from core.timing import phase
+
 
 class DocumentExtractor:
     """
@@ -24,6 +29,7 @@ class DocumentExtractor:
     }
     
     @staticmethod
+    @phase('detect_mime')
     def detect_mime_type(file_obj) -> str:
         """
         Deteksi MIME type dari file object
@@ -56,6 +62,7 @@ class DocumentExtractor:
         return mime_type in DocumentExtractor.SUPPORTED_MIME_TYPES
     
     @staticmethod
+    @phase('extract')
     def extract(file_obj, mime_type: str) -> Tuple[str, Optional[str], Optional[Dict[str, Any]]]:
         """
         Ekstrak teks dari file
@@ -69,6 +76,17 @@ class DocumentExtractor:
             Jika berhasil: (text, None, structured_data or None)
             Jika gagal: ("", error_message, None)
         """
+        start = time.perf_counter()
+        result = DocumentExtractor._extract(file_obj, mime_type)
+        EXTRACTION_DURATION.observe(
+            time.perf_counter() - start,
+            mime_type=DocumentExtractor.SUPPORTED_MIME_TYPES.get(mime_type, 'other'),
+            outcome='error' if result[1] else 'ok',
+        )
+        return result
+    
+    @staticmethod
+    def _extract(file_obj, mime_type: str) -> Tuple[str, Optional[str], Optional[Dict[str, Any]]]:
         try:
             file_obj.seek(0)
             
@@ -88,7 +106,41 @@ class DocumentExtractor:
                 
         except Exception as e:
             return ("", f"Error saat ekstraksi: {str(e)}", None)
-    
+
+    @staticmethod
+    def init_worker_process():
+        """
+        Initializer process pool ekstraksi: flush metric sekali saat process berhenti
+
+        Thread flusher metric adalah daemon sehingga bisa mati sebelum sempat
+        menulis snapshot terakhir. Finalizer multiprocessing dijalankan saat
+        process worker keluar dengan normal (pool di-shutdown).
+        """
+        mp_util.Finalize(None, registry.flush, exitpriority=10)
+
+    @staticmethod
+    def extract_path(path: str) -> Tuple[str, str, Optional[str], Optional[Dict[str, Any]]]:
+        """
+        Deteksi MIME type dan ekstrak teks dari file yang sudah ada di disk
+
+        Hanya menerima path (picklable) sehingga bisa dijalankan di process pool
+        oleh bulk ingestion. Ekstensi path dipakai untuk fallback deteksi XLSX.
+
+        Returns:
+            Tuple (mime_type, extracted_text, error_message, structured_data)
+        """
+        try:
+            with open(path, 'rb') as file_obj:
+                mime_type = DocumentExtractor.detect_mime_type(file_obj)
+
+                if not DocumentExtractor.is_supported(mime_type):
+                    return (mime_type, "", "Format file tidak didukung", None)
+
+                text, err, structured_data = DocumentExtractor.extract(file_obj, mime_type)
+                return (mime_type, text, err, structured_data)
+        except Exception as e:
+            return ("application/octet-stream", "", f"Error saat ekstraksi: {str(e)}", None)
+
     @staticmethod
     def _extract_pdf(file_obj) -> Tuple[str, Optional[str]]:
         """Ekstrak teks dari PDF"""
@@ -173,6 +225,19 @@ class DocumentExtractor:
             return value.isoformat()
         return value
     
+    @staticmethod
+    def summarize_sheet(sheet_info: Dict[str, Any]) -> str:
+        """
+        Ringkasan teks satu sheet (nama, kolom, jumlah row, 5 row pertama)
+        """
+        rows = sheet_info["rows"]
+        return (
+            f"Sheet: {sheet_info['name']}\n"
+            f"Kolom: {', '.join(sheet_info['columns'])}\n"
+            f"Total Rows: {len(rows)}\n"
+            f"Contoh Rows (maks 5): {rows[:5]}\n"
+        )
+    
     @staticmethod
     def _extract_xlsx(file_obj) -> Tuple[str, Optional[str], Optional[Dict[str, Any]]]:
         """Ekstrak teks dan struktur dari XLSX"""
@@ -216,14 +281,7 @@ class DocumentExtractor:
                 sheets_data.append(sheet_info)
                 
                 # Summary text per sheet (untuk konteks LLM)
-                row_count = len(rows)
-                preview_rows = rows[:5]
-                summary_parts.append(
-                    f"Sheet: {ws.title}\n"
-                    f"Kolom: {', '.join(columns)}\n"
-                    f"Total Rows: {row_count}\n"
-                    f"Contoh Rows (maks 5): {preview_rows}\n"
-                )
+                summary_parts.append(DocumentExtractor.summarize_sheet(sheet_info))
             
             if not sheets_data:
                 return ("", "Dokumen XLSX kosong", None)
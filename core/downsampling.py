@@ -0,0 +1,339 @@
+"""
+Reduksi jumlah titik series chart dengan NumPy
+
+- LTTB (Largest-Triangle-Three-Buckets): memilih titik yang mempertahankan
+  bentuk visual series (puncak/lembah tetap ada), untuk line chart
+- Agregasi per time-bucket (mean/sum): untuk bar chart dengan label tanggal
+- Top-N + "Lainnya": untuk pie/doughnut
+
+Dipakai untuk config Chart.js di response chat (CHART_MAX_POINTS) dan untuk
+rows sheet yang dimasukkan ke prompt chart (CHART_PROMPT_MAX_ROWS).
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+OTHERS_LABEL = 'Lainnya'
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Index titik yang dipertahankan oleh LTTB (titik pertama dan terakhir selalu ikut)
+    
+    Args:
+        x: Koordinat x (float, urut naik)
+        y: Nilai series (float, tanpa NaN)
+        threshold: Jumlah titik output
+    
+    Returns:
+        Array index (int64) terurut
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    
+    # threshold - 2 bucket untuk titik di antara titik pertama dan terakhir
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    starts, ends = edges[:-1], edges[1:]
+    
+    # Rata-rata bucket berikutnya (bucket terakhir memakai titik terakhir)
+    cum_x = np.concatenate(([0.0], np.cumsum(x)))
+    cum_y = np.concatenate(([0.0], np.cumsum(y)))
+    next_starts = np.append(starts[1:], n - 1)
+    next_ends = np.append(ends[1:], n)
+    widths = next_ends - next_starts
+    avg_x = (cum_x[next_ends] - cum_x[next_starts]) / widths
+    avg_y = (cum_y[next_ends] - cum_y[next_starts]) / widths
+    
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(threshold - 2):
+        bx = x[starts[i]:ends[i]]
+        by = y[starts[i]:ends[i]]
+        # Luas segitiga (x2) antara titik terpilih sebelumnya, kandidat, dan rata-rata bucket berikutnya
+        area = np.abs((x[a] - avg_x[i]) * (by - y[a]) - (x[a] - bx) * (avg_y[i] - y[a]))
+        a = starts[i] + int(np.argmax(area))
+        selected[i + 1] = a
+    
+    return selected
+
+
+def select_indices(x: np.ndarray, series: Sequence[np.ndarray], max_points: int) -> np.ndarray:
+    """
+    Index bersama untuk beberapa series dengan label yang sama
+    
+    Budget dibagi rata antar series, LTTB dijalankan per series (NaN diabaikan),
+    lalu index digabung sehingga puncak setiap series tetap terlihat.
+    """
+    n = len(x)
+    if n <= max_points:
+        return np.arange(n)
+    
+    per_series = max(3, max_points // max(1, len(series)))
+    selected = [np.array([0, n - 1], dtype=np.int64)]
+    for y in series:
+        valid = np.flatnonzero(~np.isnan(y))
+        if len(valid) == 0:
+            continue
+        picked = lttb_indices(x[valid], y[valid], per_series)
+        selected.append(valid[picked])
+    
+    indices = np.unique(np.concatenate(selected))
+    if len(indices) > max_points:
+        # Union bisa sedikit melebihi budget: ambil merata
+        keep = np.linspace(0, len(indices) - 1, max_points).astype(np.int64)
+        indices = indices[keep]
+    return indices
+
+
+def bucket_aggregate(
+    t: np.ndarray,
+    series: Sequence[np.ndarray],
+    n_buckets: int,
+    agg: str = 'mean'
+):
+    """
+    Agregasi series ke n_buckets interval waktu yang sama lebar
+    
+    Args:
+        t: Timestamp (detik, float)
+        series: List array nilai (NaN = kosong)
+        n_buckets: Jumlah bucket
+        agg: 'mean' atau 'sum'
+    
+    Returns:
+        Tuple (first_index per bucket, list array hasil agregasi); bucket kosong dibuang
+    """
+    edges = np.linspace(t.min(), t.max(), n_buckets + 1)
+    bucket = np.clip(np.searchsorted(edges, t, side='right') - 1, 0, n_buckets - 1)
+    
+    # Bucket yang berisi data + index row pertama di bucket (untuk label)
+    present, first_index = np.unique(bucket, return_index=True)
+    
+    aggregated = []
+    for y in series:
+        valid = ~np.isnan(y)
+        sums = np.bincount(bucket[valid], weights=y[valid], minlength=n_buckets)
+        counts = np.bincount(bucket[valid], minlength=n_buckets)
+        if agg == 'sum':
+            values = np.where(counts > 0, sums, np.nan)
+        else:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                values = np.where(counts > 0, sums / counts, np.nan)
+        aggregated.append(values[present])
+    
+    return first_index, aggregated
+
+
+def parse_times(labels: Sequence[Any]) -> Optional[np.ndarray]:
+    """Timestamp (detik) jika semua label berupa tanggal ISO, None jika tidak"""
+    try:
+        return np.array(
+            [datetime.fromisoformat(label).timestamp() for label in labels],
+            dtype=np.float64
+        )
+    except (TypeError, ValueError):
+        return None
+
+
+def to_float_array(values: Sequence[Any], length: int) -> np.ndarray:
+    """Konversi data series ke float array (bukan angka -> NaN)"""
+    result = np.full(length, np.nan)
+    converted = [
+        value if isinstance(value, (int, float)) and not isinstance(value, bool) else np.nan
+        for value in list(values or [])[:length]
+    ]
+    result[:len(converted)] = converted
+    return result
+
+
+def downsample_chart(chart: Any, max_points: int) -> Any:
+    """
+    Batasi jumlah titik config Chart.js ke max_points
+    
+    - pie/doughnut: top (max_points - 1) + "Lainnya"
+    - bar dengan label tanggal: agregasi mean per time-bucket
+    - lainnya: LTTB dengan index bersama untuk semua dataset
+    - dataset format titik ({x, y}) di-LTTB per dataset
+    
+    Returns:
+        Config baru (input tidak diubah), atau input apa adanya jika tidak perlu direduksi
+    """
+    if not isinstance(chart, dict) or max_points <= 0:
+        return chart
+    data = chart.get('data')
+    if not isinstance(data, dict):
+        return chart
+    datasets = [ds for ds in data.get('datasets') or [] if isinstance(ds, dict)]
+    labels = data.get('labels')
+    
+    if not isinstance(labels, list) or len(labels) <= max_points:
+        if any(_is_point_series(ds.get('data'), max_points) for ds in datasets):
+            return _downsample_point_datasets(chart, max_points)
+        return chart
+    
+    n = len(labels)
+    series = [to_float_array(ds.get('data'), n) for ds in datasets]
+    chart_type = chart.get('type')
+    result = _copy_chart(chart)
+    result_datasets = [ds for ds in result['data']['datasets'] if isinstance(ds, dict)]
+    
+    if chart_type in ('pie', 'doughnut') and series:
+        keep = max(1, max_points - 1)
+        order = np.argsort(-np.nan_to_num(series[0], nan=-np.inf), kind='stable')
+        top, rest = np.sort(order[:keep]), order[keep:]
+        result['data']['labels'] = [labels[i] for i in top] + [OTHERS_LABEL]
+        for ds, y in zip(result_datasets, series):
+            ds['data'] = _to_list(y[top]) + [_to_number(np.nansum(y[rest]))]
+            _trim_point_options(ds, len(top) + 1)
+        return result
+    
+    times = parse_times(labels)
+    if chart_type == 'bar' and times is not None:
+        first_index, aggregated = bucket_aggregate(times, series, max_points)
+        result['data']['labels'] = [labels[i] for i in first_index]
+        for ds, values in zip(result_datasets, aggregated):
+            ds['data'] = _to_list(values)
+            _trim_point_options(ds, len(first_index))
+        return result
+    
+    x = times if times is not None else np.arange(n, dtype=np.float64)
+    indices = select_indices(x, series, max_points)
+    result['data']['labels'] = [labels[i] for i in indices]
+    for ds, y in zip(result_datasets, series):
+        ds['data'] = _to_list(y[indices])
+        _select_point_options(ds, indices, n)
+    return result
+
+
+def downsample_rows(
+    rows: List[List[Any]],
+    columns: List[str],
+    max_rows: int
+) -> List[List[Any]]:
+    """
+    Pilih maksimal max_rows rows sheet untuk prompt (row dipertahankan utuh)
+    
+    Index dipilih dengan LTTB atas semua kolom angka (x = kolom tanggal pertama
+    jika ada, selain itu nomor row); sheet tanpa kolom angka diambil merata.
+    """
+    n = len(rows)
+    if n <= max_rows:
+        return rows
+    
+    width = len(columns)
+    matrix = [
+        to_float_array([row[i] if i < len(row) else None for row in rows], n)
+        for i in range(width)
+    ]
+    numeric = [y for y in matrix if np.count_nonzero(~np.isnan(y)) >= 0.8 * n]
+    
+    x = None
+    for i in range(width):
+        x = parse_times([row[i] if i < len(row) else None for row in rows])
+        if x is not None and np.all(np.diff(x) >= 0):
+            break
+        x = None
+    if x is None:
+        x = np.arange(n, dtype=np.float64)
+    
+    if numeric:
+        indices = select_indices(x, numeric, max_rows)
+    else:
+        indices = np.unique(np.linspace(0, n - 1, max_rows).astype(np.int64))
+    return [rows[i] for i in indices]
+
+
+def downsample_structured_data(structured_data: Any, max_rows: int) -> Any:
+    """
+    Salinan structured_data dengan rows setiap sheet dibatasi max_rows
+    
+    Sheet yang direduksi diberi `total_rows` dan `downsampled: true` agar LLM
+    tahu bahwa rows adalah sampel.
+    """
+    if not isinstance(structured_data, dict) or max_rows <= 0:
+        return structured_data
+    sheets = structured_data.get('sheets')
+    if not isinstance(sheets, list) or all(len(s.get('rows') or []) <= max_rows for s in sheets):
+        return structured_data
+    
+    result = dict(structured_data)
+    result['sheets'] = []
+    for sheet in sheets:
+        rows = sheet.get('rows') or []
+        if len(rows) <= max_rows:
+            result['sheets'].append(sheet)
+            continue
+        reduced = dict(sheet)
+        reduced['rows'] = downsample_rows(rows, sheet.get('columns') or [], max_rows)
+        reduced['total_rows'] = len(rows)
+        reduced['downsampled'] = True
+        result['sheets'].append(reduced)
+    return result
+
+
+def _is_point_series(values: Any, max_points: int) -> bool:
+    return (
+        isinstance(values, list)
+        and len(values) > max_points
+        and all(isinstance(point, dict) and 'y' in point for point in values[:3])
+    )
+
+
+def _downsample_point_datasets(chart: Dict, max_points: int) -> Dict:
+    result = _copy_chart(chart)
+    for ds in result['data']['datasets']:
+        points = ds.get('data') if isinstance(ds, dict) else None
+        if not _is_point_series(points, max_points):
+            continue
+        n = len(points)
+        y = to_float_array([point.get('y') for point in points], n)
+        raw_x = [point.get('x') for point in points]
+        x = to_float_array(raw_x, n)
+        if np.isnan(x).any():
+            x = parse_times(raw_x)
+            if x is None:
+                x = np.arange(n, dtype=np.float64)
+        indices = select_indices(x, [y], max_points)
+        ds['data'] = [points[i] for i in indices]
+        _select_point_options(ds, indices, n)
+    return result
+
+
+def _copy_chart(chart: Dict) -> Dict:
+    """Salin chart sampai level dataset (list data diganti, bukan diubah in-place)"""
+    result = dict(chart)
+    result['data'] = dict(chart['data'])
+    result['data']['datasets'] = [
+        dict(ds) if isinstance(ds, dict) else ds
+        for ds in chart['data'].get('datasets') or []
+    ]
+    return result
+
+
+def _select_point_options(ds: Dict, indices: np.ndarray, n: int):
+    """Option per titik (mis. backgroundColor list) ikut dipilih sesuai index"""
+    for key, value in list(ds.items()):
+        if key != 'data' and isinstance(value, list) and len(value) == n:
+            ds[key] = [value[i] for i in indices]
+
+
+def _trim_point_options(ds: Dict, length: int):
+    for key, value in list(ds.items()):
+        if key != 'data' and isinstance(value, list) and len(value) > length:
+            ds[key] = value[:length]
+
+
+def _to_number(value):
+    if value is None or np.isnan(value):
+        return None
+    value = float(value)
+    return int(value) if value.is_integer() else round(value, 6)
+
+
+def _to_list(values: np.ndarray) -> List:
+    return [_to_number(value) for value in values]
@@ -0,0 +1,60 @@
+"""
+Custom model fields
+"""
+from django.db import models
+from django.db.models.query_utils import DeferredAttribute
+
+from core.compression import EncodedText, decode_text, encode_text, is_encoded
+
+
+class CompressedTextDescriptor(DeferredAttribute):
+    """
+    Descriptor yang menyimpan nilai mentah dari DB dan baru men-decompress
+    saat atribut pertama kali diakses (hasil decode di-cache di instance)
+    """
+
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        value = super().__get__(instance, cls)
+        if isinstance(value, EncodedText) and is_encoded(value):
+            value = decode_text(value)
+            instance.__dict__[self.field.attname] = value
+        return value
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = value
+
+
+class CompressedTextField(models.TextField):
+    """
+    TextField yang menyimpan teks terkompresi (zlib/lzma) sesuai
+    settings.DOCUMENT_CONTENT_COMPRESSION
+
+    Kolom database tetap bertipe text sehingga baris lama (teks biasa) dan
+    baris terkompresi bisa hidup berdampingan. Dekompresi terjadi lazily saat
+    atribut diakses, bukan saat row di-fetch.
+
+    Catatan: values()/values_list() mengembalikan format tersimpan; gunakan
+    core.compression.decode_text() jika membaca kolom ini tanpa model instance.
+    Lookup pattern (icontains, dll) hanya cocok untuk baris yang tidak dikompresi.
+    """
+
+    descriptor_class = CompressedTextDescriptor
+
+    def get_prep_value(self, value):
+        if isinstance(value, EncodedText):
+            return value
+        value = super().get_prep_value(value)
+        return encode_text(value)
+
+    def from_db_value(self, value, expression, connection):
+        # Hanya ditandai, belum di-decompress (lihat CompressedTextDescriptor)
+        if is_encoded(value):
+            return EncodedText(value)
+        return value
+
+    def to_python(self, value):
+        if isinstance(value, EncodedText):
+            return decode_text(value)
+        return super().to_python(value)
@@ -0,0 +1,110 @@
+"""
+Helper conditional GET (ETag / Last-Modified) dan cache response per proses
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from core.metrics import CACHE_REQUESTS
+
+
+def make_etag(*parts) -> str:
+    """Gabungkan beberapa bagian menjadi strong ETag, mis. "doc-1-1706609730123456" """
+    return quote_etag('-'.join(str(part) for part in parts))
+
+
+def conditional_response(request, etag: str, last_modified=None) -> Optional[HttpResponse]:
+    """
+    Cek If-None-Match / If-Modified-Since
+    
+    Args:
+        request: HTTP request
+        etag: ETag representasi saat ini
+        last_modified: datetime perubahan terakhir (opsional)
+    
+    Returns:
+        Response 304 (dengan validator) jika resource tidak berubah, None jika tidak
+    """
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response, etag: str, last_modified=None):
+    """Set header ETag, Last-Modified dan Cache-Control (wajib revalidasi)"""
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+class ResponseCache:
+    """
+    LRU cache per proses untuk body response yang sudah di-render (bytes)
+    
+    Setiap entry disimpan bersama versinya (mis. updated_at); get() hanya
+    mengembalikan body jika versinya sama, sehingga perubahan dari worker lain
+    tetap terdeteksi tanpa invalidasi lintas proses.
+    Hit/miss dicatat ke noc_rag_cache_requests_total{cache=name}.
+    
+    Nilai selain bytes (mis. data JSON yang sudah di-parse) bisa disimpan dengan
+    perkiraan ukurannya lewat argumen size.
+    """
+    
+    def __init__(self, max_entries: int, max_bytes: int, name: str = 'response'):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+    
+    def get(self, key: Hashable, version) -> Optional[Any]:
+        body = self._get(key, version)
+        CACHE_REQUESTS.inc(cache=self.name, result='miss' if body is None else 'hit')
+        return body
+    
+    def _get(self, key: Hashable, version) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] != version:
+                self._pop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+    
+    def set(self, key: Hashable, version, body: Any, size: Optional[int] = None):
+        size = len(body) if size is None else size
+        if self.max_entries <= 0 or size > self.max_bytes:
+            return
+        
+        with self._lock:
+            self._pop(key)
+            self._entries[key] = (version, body, size)
+            self._size += size
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._pop(oldest)
+    
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._pop(key)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+    
+    def _pop(self, key: Hashable):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= entry[2]
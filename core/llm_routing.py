@@ -0,0 +1,149 @@
+"""
+Routing model LLM per kelas query
+
+Setiap request chat yang diteruskan ke DeepSeek diklasifikasikan dari panjang
+pesan, intent, chart dan kedalaman history ke salah satu kelas:
+
+- short: pertanyaan singkat (ya/tidak, satu angka), jawaban pendek dan murah
+- standard: pertanyaan biasa
+- analysis: pesan panjang atau permintaan analisis / ringkasan / perbandingan
+- chart: LLM diminta menulis chart (spec atau konfigurasi Chart.js)
+
+Model, max_tokens dan temperature tiap kelas diambil dari tabel LLM_ROUTES di
+settings (format "model,max_tokens,temperature"; model kosong = DEEPSEEK_MODEL).
+"""
+import re
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from core.metrics import LLM_ROUTE_DECISIONS
+from core.timing import annotate
+
+
+ROUTE_SHORT = 'short'
+ROUTE_STANDARD = 'standard'
+ROUTE_ANALYSIS = 'analysis'
+ROUTE_CHART = 'chart'
+ROUTE_DEFAULT = 'default'
+
+# Parameter lama (satu model untuk semua request), dipakai jika LLM_ROUTING_ENABLED=False
+DEFAULT_MAX_TOKENS = 8000
+DEFAULT_TEMPERATURE = 0.7
+
+ANALYSIS_KEYWORDS = [
+    'analisis', 'analisa', 'analisalah', 'analyze', 'analyse',
+    'secara rinci', 'secara detail', 'secara lengkap', 'selengkapnya', 'uraikan',
+    'bandingkan', 'evaluasi', 'rekomendasi', 'strategi',
+    'ringkasan', 'ringkaskan', 'rangkum', 'rangkuman', 'summary', 'summarize', 'compare',
+]
+
+_ANALYSIS_RE = re.compile(
+    r'\b(?:' + '|'.join(re.escape(keyword) for keyword in ANALYSIS_KEYWORDS) + r')\b',
+    re.IGNORECASE
+)
+_WORD_RE = re.compile(r'\w+')
+
+
+class LLMRoute(NamedTuple):
+    name: str
+    model: str
+    max_tokens: int
+    temperature: float
+    reason: str = ''
+    
+    def as_log(self) -> Dict[str, object]:
+        return self._asdict()
+
+
+def parse_route(name: str, value: str) -> LLMRoute:
+    """Parse satu entri LLM_ROUTES: "model,max_tokens,temperature" (bagian kosong = default)"""
+    parts = [part.strip() for part in (value or '').split(',')]
+    parts += [''] * (3 - len(parts))
+    if len(parts) > 3:
+        raise ImproperlyConfigured(f'LLM_ROUTES["{name}"]: format harus "model,max_tokens,temperature"')
+    model, max_tokens, temperature = parts
+    try:
+        max_tokens = int(max_tokens) if max_tokens else DEFAULT_MAX_TOKENS
+        temperature = float(temperature) if temperature else DEFAULT_TEMPERATURE
+    except ValueError:
+        raise ImproperlyConfigured(f'LLM_ROUTES["{name}"]: max_tokens / temperature tidak valid: "{value}"')
+    if max_tokens <= 0 or not 0 <= temperature <= 2:
+        raise ImproperlyConfigured(
+            f'LLM_ROUTES["{name}"]: max_tokens harus > 0 dan temperature 0..2: "{value}"'
+        )
+    return LLMRoute(name, model or settings.DEEPSEEK_MODEL, max_tokens, temperature)
+
+
+def default_route(reason: str = 'routing dinonaktifkan') -> LLMRoute:
+    return LLMRoute(
+        ROUTE_DEFAULT, settings.DEEPSEEK_MODEL, DEFAULT_MAX_TOKENS, DEFAULT_TEMPERATURE, reason
+    )
+
+
+def get_route(name: str, reason: str = '') -> LLMRoute:
+    """Rute dari tabel LLM_ROUTES (kelas yang tidak dikonfigurasi memakai default_route)"""
+    value = settings.LLM_ROUTES.get(name)
+    if value is None:
+        return default_route(reason)._replace(name=name)
+    return parse_route(name, value)._replace(reason=reason)
+
+
+def classify_query(message: str, include_chart: bool, history_messages: int,
+                   intent: Optional[str] = None) -> Tuple[str, str]:
+    """
+    Kelas query dan alasannya (untuk log)
+    
+    Args:
+        message: Pesan user
+        include_chart: LLM diminta menulis chart
+        history_messages: Jumlah message history (user + assistant) yang ikut dikirim
+        intent: Intent dari chat_helper.classify_intent (opsional, untuk log)
+    """
+    words = len(_WORD_RE.findall(message or ''))
+    detail = f'words={words} history={history_messages}' + (f' intent={intent}' if intent else '')
+    
+    if include_chart:
+        return ROUTE_CHART, f'chart diminta; {detail}'
+    keyword = _ANALYSIS_RE.search(message or '')
+    if keyword:
+        return ROUTE_ANALYSIS, f'kata kunci "{keyword.group().lower()}"; {detail}'
+    if words >= settings.LLM_ANALYSIS_MIN_WORDS:
+        return ROUTE_ANALYSIS, f'pesan panjang; {detail}'
+    # Follow-up singkat di percakapan panjang ("kenapa?") tetap butuh jawaban normal
+    if words <= settings.LLM_SHORT_MAX_WORDS and history_messages < settings.LLM_DEEP_HISTORY_MESSAGES:
+        return ROUTE_SHORT, f'pertanyaan singkat; {detail}'
+    return ROUTE_STANDARD, detail
+
+
+def select_route(message: str, include_chart: bool = False, history_messages: int = 0,
+                 intent: Optional[str] = None) -> LLMRoute:
+    """Pilih model / max_tokens / temperature untuk satu request"""
+    if not settings.LLM_ROUTING_ENABLED:
+        return default_route()
+    name, reason = classify_query(message, include_chart, history_messages, intent)
+    return get_route(name, reason)
+
+
+def escalate_route(route: LLMRoute) -> Optional[LLMRoute]:
+    """
+    Rute jawaban panjang untuk mengulang jawaban yang terpotong max_tokens
+    
+    None jika rute analysis tidak memberi budget token lebih besar.
+    """
+    if not settings.LLM_ROUTING_ENABLED:
+        return None
+    longer = get_route(ROUTE_ANALYSIS, f'eskalasi dari {route.name}: jawaban terpotong max_tokens')
+    if longer.max_tokens <= route.max_tokens:
+        return None
+    return longer
+
+
+def record_route(route: LLMRoute, escalated_from: Optional[str] = None):
+    """Catat keputusan routing ke metrics dan log JSON request (core.timing)"""
+    LLM_ROUTE_DECISIONS.inc(route=route.name, model=route.model)
+    decision = route.as_log()
+    if escalated_from:
+        decision['escalated_from'] = escalated_from
+    annotate(llm_route=decision)
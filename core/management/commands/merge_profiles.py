@@ -0,0 +1,136 @@
+"""
+Django management command untuk menggabungkan dan meringkas profil dari ProfilingMiddleware
+"""
+import io
+import os
+import pstats
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.profiling import PROFILE_NAME_RE
+
+
+class Command(BaseCommand):
+    help = 'Gabungkan profil cProfile di PROFILING_DIR dan tampilkan fungsi terberat'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dir',
+            type=str,
+            default=None,
+            help='Direktori profil (default: settings PROFILING_DIR)'
+        )
+        parser.add_argument(
+            '--endpoint',
+            type=str,
+            default='',
+            help='Hanya profil yang nama endpoint-nya mengandung teks ini, mis. "POST-chat"'
+        )
+        parser.add_argument(
+            '--since',
+            type=int,
+            default=0,
+            help='Hanya profil N menit terakhir (default: semua)'
+        )
+        parser.add_argument(
+            '--min-duration',
+            type=int,
+            default=0,
+            help='Hanya request yang berjalan minimal N ms (mis. untuk melihat request lambat saja)'
+        )
+        parser.add_argument(
+            '--sort',
+            type=str,
+            default='cumulative',
+            choices=['cumulative', 'tottime', 'calls'],
+            help='Urutan fungsi di ringkasan (default: cumulative)'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=30,
+            help='Jumlah fungsi yang ditampilkan (default: 30)'
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            default='',
+            help='Simpan profil gabungan (pstats) ke file ini, mis. untuk snakeviz'
+        )
+        parser.add_argument(
+            '--delete',
+            action='store_true',
+            help='Hapus file profil yang sudah digabung'
+        )
+    
+    def handle(self, *args, **options):
+        directory = options['dir'] or settings.PROFILING_DIR
+        if not os.path.isdir(directory):
+            raise CommandError(f'Direktori profil tidak ditemukan: {directory}')
+        
+        min_ts = (time.time() - options['since'] * 60) * 1000 if options['since'] else 0
+        selected = []
+        for name in sorted(os.listdir(directory)):
+            match = PROFILE_NAME_RE.match(name)
+            if not match:
+                continue
+            if options['endpoint'] and options['endpoint'] not in match['endpoint']:
+                continue
+            if int(match['ts']) < min_ts or int(match['duration']) < options['min_duration']:
+                continue
+            selected.append((os.path.join(directory, name), match['endpoint'], int(match['duration'])))
+        
+        if not selected:
+            self.stdout.write(self.style.WARNING('Tidak ada profil yang cocok dengan filter'))
+            return
+        
+        stats = None
+        report = io.StringIO()
+        durations = defaultdict(list)
+        merged_paths = []
+        for path, endpoint, duration in selected:
+            try:
+                if stats is None:
+                    stats = pstats.Stats(path, stream=report)
+                else:
+                    stats.add(path)
+            except (OSError, EOFError, TypeError, ValueError) as e:
+                self.stderr.write(f'Lewati {os.path.basename(path)}: {e}')
+                continue
+            durations[endpoint].append(duration)
+            merged_paths.append(path)
+        
+        if stats is None:
+            raise CommandError('Semua file profil gagal dibaca')
+        
+        self.stdout.write(self.style.SUCCESS(f'{len(merged_paths)} profil digabung dari {directory}'))
+        self.stdout.write(f'{"endpoint":<40} {"n":>6} {"avg ms":>10} {"p95 ms":>10} {"max ms":>10}')
+        for endpoint, values in sorted(durations.items(), key=lambda item: -sum(item[1])):
+            values.sort()
+            p95 = values[min(len(values) - 1, int(len(values) * 0.95))]
+            self.stdout.write(
+                f'{endpoint:<40} {len(values):>6} {sum(values) / len(values):>10.1f} '
+                f'{p95:>10} {values[-1]:>10}'
+            )
+        self.stdout.write('')
+        
+        # strip_dirs() hanya pada salinan untuk dicetak: profil --output tetap berisi path
+        # lengkap (fungsi bernama sama di modul berbeda tidak tergabung)
+        printable = pstats.Stats(stream=report)
+        printable.add(stats)
+        # Daftar file sumber sudah diringkas di atas; jangan dicetak ulang oleh pstats
+        printable.files = []
+        printable.strip_dirs().sort_stats(options['sort']).print_stats(options['limit'])
+        self.stdout.write(report.getvalue())
+        
+        if options['output']:
+            stats.dump_stats(options['output'])
+            self.stdout.write(self.style.SUCCESS(f'Profil gabungan disimpan ke {options["output"]}'))
+        
+        if options['delete']:
+            for path in merged_paths:
+                os.remove(path)
+            self.stdout.write(f'{len(merged_paths)} file profil dihapus')
@@ -0,0 +1,473 @@
+"""
+Registry metrics format Prometheus (counter, gauge, histogram) untuk endpoint /metrics
+
+Setiap proses (worker gunicorn/uWSGI, process pool ekstraksi) menyimpan nilainya di
+memori. Jika METRICS_DIR diset, snapshot per proses ditulis ke METRICS_DIR/metrics_<pid>.json
+(atomic replace, oleh thread flusher tiap METRICS_FLUSH_INTERVAL detik), lalu /metrics
+menjumlahkan semua file. Snapshot proses yang sudah mati (worker di-restart oleh
+max_requests) dilipat ke metrics_archive.json agar counter tidak mundur; gauge
+proses mati diabaikan.
+"""
+import fcntl
+import glob
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+LLM_BUCKETS = (0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 45.0, 60.0, 90.0, 120.0)
+EXTRACTION_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+ARCHIVE_FILENAME = 'metrics_archive.json'
+LOCK_FILENAME = '.metrics.lock'
+
+
+class _Metric:
+    kind = ''
+    
+    def __init__(self, registry: 'MetricsRegistry', name: str, documentation: str,
+                 labelnames: Sequence[str]):
+        self._registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values: Dict[Tuple[str, ...], object] = {}
+    
+    def _key(self, labels: Dict[str, object]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'{self.name}: label harus {self.labelnames}, diberikan {tuple(labels)}')
+        return tuple(str(labels[name]) for name in self.labelnames)
+    
+    def describe(self) -> Dict:
+        return {'type': self.kind, 'help': self.documentation, 'labelnames': list(self.labelnames)}
+
+
+class Counter(_Metric):
+    kind = 'counter'
+    
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._registry.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+            self._registry.mark_dirty()
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+    
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._registry.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+            self._registry.mark_dirty()
+    
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+    
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._registry.lock:
+            self.values[key] = value
+            self._registry.mark_dirty()
+    
+    @contextmanager
+    def track_inprogress(self, **labels):
+        self.inc(1, **labels)
+        try:
+            yield
+        finally:
+            self.dec(1, **labels)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+    
+    def __init__(self, registry, name, documentation, labelnames, buckets: Sequence[float]):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+    
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._registry.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                # [jumlah per bucket (non-kumulatif, indeks terakhir = +Inf), sum, count]
+                entry = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self.values[key] = entry
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+            self._registry.mark_dirty()
+    
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+    
+    def describe(self) -> Dict:
+        description = super().describe()
+        description['buckets'] = list(self.buckets)
+        return description
+
+
+class MetricsRegistry:
+    """
+    Kumpulan metric milik satu proses
+    
+    Nilai di-reset setelah fork agar proses anak (worker pre-fork, process pool)
+    tidak ikut melaporkan ulang nilai milik induknya.
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+        self._dirty = False
+        self._flusher_pid = None
+        self._flush_lock = threading.Lock()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+    
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f'Metric {metric.name} sudah terdaftar')
+        self._metrics[metric.name] = metric
+        return metric
+    
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(self, name, documentation, labelnames))
+    
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(self, name, documentation, labelnames))
+    
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(self, name, documentation, labelnames, buckets))
+    
+    def _reset_after_fork(self):
+        self.lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flusher_pid = None
+        self._dirty = False
+        for metric in self._metrics.values():
+            metric.values = {}
+    
+    def mark_dirty(self):
+        """Dipanggil dengan lock registry dipegang"""
+        self._dirty = True
+        if self._flusher_pid != os.getpid() and settings.METRICS_DIR:
+            self._flusher_pid = os.getpid()
+            threading.Thread(target=self._flush_loop, name='metrics-flusher', daemon=True).start()
+    
+    def _flush_loop(self):
+        pid = os.getpid()
+        while self._flusher_pid == pid:
+            time.sleep(settings.METRICS_FLUSH_INTERVAL)
+            if self._dirty:
+                self.flush()
+    
+    def snapshot(self) -> Dict[str, Dict]:
+        """Salinan nilai semua metric (format JSON-able)"""
+        with self.lock:
+            self._dirty = False
+            snapshot = {}
+            for metric in self._metrics.values():
+                description = metric.describe()
+                description['samples'] = [
+                    [list(key), _copy_value(value)] for key, value in metric.values.items()
+                ]
+                snapshot[metric.name] = description
+            return snapshot
+    
+    def flush(self):
+        """Tulis snapshot proses ini ke METRICS_DIR (no-op jika METRICS_DIR kosong)"""
+        directory = settings.METRICS_DIR
+        if not directory:
+            return
+        with self._flush_lock:
+            try:
+                os.makedirs(directory, exist_ok=True)
+                path = os.path.join(directory, f'metrics_{os.getpid()}.json')
+                _write_json(path, self.snapshot())
+            except OSError:
+                # Metrics tidak boleh mengganggu request
+                self._dirty = True
+    
+    def collect(self) -> Dict[str, Dict]:
+        """
+        Gabungan metric semua proses (METRICS_DIR) atau proses ini saja
+        """
+        directory = settings.METRICS_DIR
+        if not directory:
+            return merge_snapshots([(self.snapshot(), True)])
+        
+        self.flush()
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, LOCK_FILENAME), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                return _collect_directory(directory)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _write_json(path: str, data: Dict):
+    tmp_path = f'{path}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+def _read_json(path: str) -> Optional[Dict]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _pid_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _collect_directory(directory: str) -> Dict[str, Dict]:
+    """Gabungkan snapshot per pid; snapshot pid mati dilipat ke archive (dipanggil dengan flock)"""
+    archive_path = os.path.join(directory, ARCHIVE_FILENAME)
+    archive = _read_json(archive_path) or {}
+    live = []
+    dead_paths = []
+    
+    for path in glob.glob(os.path.join(directory, 'metrics_*.json')):
+        if path == archive_path:
+            continue
+        try:
+            pid = int(os.path.basename(path)[len('metrics_'):-len('.json')])
+        except ValueError:
+            continue
+        snapshot = _read_json(path)
+        if snapshot is None:
+            continue
+        if _pid_alive(pid):
+            live.append((snapshot, True))
+        else:
+            dead_paths.append(path)
+            archive = merge_snapshots([(archive, False), (snapshot, False)])
+    
+    if dead_paths:
+        _write_json(archive_path, archive)
+        for path in dead_paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    
+    return merge_snapshots([(archive, False)] + live)
+
+
+def merge_snapshots(snapshots: Iterable[Tuple[Dict, bool]]) -> Dict[str, Dict]:
+    """
+    Jumlahkan beberapa snapshot
+    
+    Args:
+        snapshots: iterable (snapshot, include_gauges); gauge hanya diambil dari proses hidup
+    """
+    merged: Dict[str, Dict] = {}
+    for snapshot, include_gauges in snapshots:
+        for name, metric in snapshot.items():
+            if metric['type'] == 'gauge' and not include_gauges:
+                continue
+            target = merged.get(name)
+            if target is None:
+                target = {key: metric[key] for key in metric if key != 'samples'}
+                target['values'] = {}
+                merged[name] = target
+            if metric['type'] == 'histogram' and metric.get('buckets') != target.get('buckets'):
+                # Bucket berubah antar deploy: snapshot lama tidak bisa dijumlahkan
+                continue
+            values = target['values']
+            for labels, value in metric['samples']:
+                key = tuple(labels)
+                values[key] = _add(values.get(key), value)
+    # Simpan kembali dalam bentuk snapshot (samples) agar bisa ditulis ke archive
+    for metric in merged.values():
+        metric['samples'] = [[list(key), value] for key, value in metric.pop('values').items()]
+    return merged
+
+
+def _copy_value(value):
+    if isinstance(value, list):
+        return [list(value[0]), value[1], value[2]]
+    return value
+
+
+def _add(current, value):
+    if current is None:
+        return _copy_value(value)
+    if isinstance(value, list):
+        counts = [a + b for a, b in zip(current[0], value[0])]
+        return [counts, current[1] + value[1], current[2] + value[2]]
+    return current + value
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labelnames: List[str], labels: List[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labels)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == int(value):
+        return str(int(value))
+    return repr(float(value))
+
+
+def render_text(collected: Dict[str, Dict]) -> str:
+    """Render ke Prometheus text exposition format 0.0.4"""
+    lines = []
+    for name in sorted(collected):
+        metric = collected[name]
+        labelnames = metric['labelnames']
+        lines.append(f'# HELP {name} {metric["help"]}')
+        lines.append(f'# TYPE {name} {metric["type"]}')
+        for labels, value in sorted(metric['samples']):
+            if metric['type'] != 'histogram':
+                lines.append(f'{name}{_format_labels(labelnames, labels)} {_format_value(value)}')
+                continue
+            counts, total, count = value
+            cumulative = 0
+            for bound, bucket_count in zip(metric['buckets'] + ['+Inf'], counts):
+                cumulative += bucket_count
+                le = bound if bound == '+Inf' else repr(float(bound))
+                lines.append(f'{name}_bucket{_format_labels(labelnames, labels, ("le", le))} {cumulative}')
+            lines.append(f'{name}_sum{_format_labels(labelnames, labels)} {_format_value(total)}')
+            lines.append(f'{name}_count{_format_labels(labelnames, labels)} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+REQUEST_LATENCY = registry.histogram(
+    'noc_rag_http_request_duration_seconds',
+    'Latensi request HTTP per endpoint',
+    ('method', 'endpoint', 'status'),
+)
+LLM_LATENCY = registry.histogram(
+    'noc_rag_llm_request_duration_seconds',
+    'Latensi panggilan DeepSeek API',
+    ('model', 'outcome'),
+    buckets=LLM_BUCKETS,
+)
+LLM_TOKENS = registry.counter(
+    'noc_rag_llm_tokens_total',
+    'Jumlah token DeepSeek (usage) per jenis',
+    ('model', 'type'),
+)
+LLM_ROUTE_DECISIONS = registry.counter(
+    'noc_rag_llm_route_decisions_total',
+    'Keputusan routing LLM per kelas query dan model',
+    ('route', 'model'),
+)
+LLM_INFLIGHT = registry.gauge(
+    'noc_rag_llm_inflight_requests',
+    'Panggilan DeepSeek API yang sedang berjalan',
+)
+LLM_QUEUE_WAIT = registry.histogram(
+    'noc_rag_llm_queue_wait_seconds',
+    'Waktu tunggu slot panggilan LLM (admission control)',
+    buckets=LATENCY_BUCKETS,
+)
+DEADLINE_EXCEEDED = registry.counter(
+    'noc_rag_deadline_exceeded_total',
+    'Request yang dihentikan karena deadline habis, per fase',
+    ('phase',),
+)
+ADMISSION_DECISIONS = registry.counter(
+    'noc_rag_admission_decisions_total',
+    'Keputusan admission control per pemeriksaan dan hasil',
+    ('check', 'result'),
+)
+CACHE_REQUESTS = registry.counter(
+    'noc_rag_cache_requests_total',
+    'Lookup cache per hasil (hit/miss)',
+    ('cache', 'result'),
+)
+EXTRACTION_DURATION = registry.histogram(
+    'noc_rag_document_extraction_duration_seconds',
+    'Durasi ekstraksi dokumen per format',
+    ('mime_type', 'outcome'),
+    buckets=EXTRACTION_BUCKETS,
+)
+UPLOAD_BYTES = registry.counter(
+    'noc_rag_upload_bytes_total',
+    'Total byte file yang diupload',
+    ('endpoint',),
+)
+UPLOAD_FILES = registry.counter(
+    'noc_rag_upload_files_total',
+    'Total file yang diupload',
+    ('endpoint',),
+)
+
+CHAT_LOG_WRITES = registry.counter(
+    'noc_rag_chat_log_writes_total',
+    'ChatLog dari background writer per hasil (written/dropped/error)',
+    ('result',),
+)
+CHAT_LOG_BACKPRESSURE = registry.counter(
+    'noc_rag_chat_log_backpressure_total',
+    'Request yang harus menunggu karena antrian ChatLog penuh',
+)
+CHAT_LOG_QUEUE_DEPTH = registry.gauge(
+    'noc_rag_chat_log_queue_depth',
+    'Jumlah ChatLog di antrian yang belum ditulis',
+)
+
+
+class MetricsMiddleware:
+    """
+    Catat latensi setiap request ke noc_rag_http_request_duration_seconds
+    
+    Label endpoint memakai nama URL (mis. 'document-detail', 'chat-list') agar
+    kardinalitas tetap kecil; URL yang tidak cocok dicatat sebagai 'unmatched'.
+    """
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+    
+    def __call__(self, request):
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+        
+        start = time.perf_counter()
+        response = self.get_response(request)
+        match = getattr(request, 'resolver_match', None)
+        REQUEST_LATENCY.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            endpoint=(match.view_name or match.route) if match else 'unmatched',
+            status=response.status_code,
+        )
+        return response
@@ -0,0 +1,101 @@
+"""
+Helper untuk keyset (cursor) pagination berdasarkan (created_at, id)
+"""
+import base64
+import json
+from typing import List, Optional, Tuple
+
+from django.db.models import Q, QuerySet
+from django.utils.dateparse import parse_datetime
+
+
+class InvalidPaginationParam(ValueError):
+    """Cursor atau limit dari query param tidak valid"""
+
+
+def encode_cursor(created_at, pk) -> str:
+    """Encode posisi (created_at, id) item terakhir menjadi cursor opaque"""
+    raw = json.dumps([created_at.isoformat(), pk], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str):
+    """
+    Decode cursor menjadi (created_at, id)
+    
+    Raises:
+        InvalidPaginationParam jika cursor rusak
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at_raw, pk = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        created_at = parse_datetime(created_at_raw)
+        if created_at is None or not isinstance(pk, int):
+            raise ValueError
+        return created_at, pk
+    except (ValueError, TypeError, UnicodeError):
+        raise InvalidPaginationParam('Cursor tidak valid')
+
+
+def parse_limit(value: Optional[str], default: int, maximum: int) -> int:
+    """
+    Parse query param limit (1..maximum)
+    
+    Raises:
+        InvalidPaginationParam jika bukan angka positif
+    """
+    if value in (None, ''):
+        return default
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise InvalidPaginationParam('Parameter limit harus berupa angka')
+    if limit < 1:
+        raise InvalidPaginationParam('Parameter limit minimal 1')
+    return min(limit, maximum)
+
+
+def parse_offset(value: Optional[str], name: str = 'offset') -> int:
+    """
+    Parse query param offset (>= 0)
+    
+    Raises:
+        InvalidPaginationParam jika bukan angka >= 0
+    """
+    if value in (None, ''):
+        return 0
+    try:
+        offset = int(value)
+    except (TypeError, ValueError):
+        raise InvalidPaginationParam(f'Parameter {name} harus berupa angka')
+    if offset < 0:
+        raise InvalidPaginationParam(f'Parameter {name} minimal 0')
+    return offset
+
+
+def paginate_keyset(queryset: QuerySet, cursor: Optional[str], limit: int) -> Tuple[List, Optional[str]]:
+    """
+    Ambil satu halaman (urut created_at DESC, id DESC) setelah cursor
+    
+    Tidak menjalankan query COUNT: halaman berikutnya dideteksi dengan
+    mengambil limit + 1 row.
+    
+    Returns:
+        Tuple (items, next_cursor); next_cursor None jika halaman terakhir
+    """
+    queryset = queryset.order_by('-created_at', '-id')
+    
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+        )
+    
+    items = list(queryset[:limit + 1])
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        last = items[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+    
+    return items, next_cursor
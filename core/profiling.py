@@ -0,0 +1,103 @@
+"""
+Profiling sampling per request (cProfile) untuk investigasi hot path di production
+"""
+import cProfile
+import hmac
+import os
+import random
+import re
+import threading
+import time
+
+from django.conf import settings
+
+
+PROFILE_HEADER = 'HTTP_X_PROFILE_TOKEN'
+PROFILE_SUFFIX = '.prof'
+
+# Nama file: <endpoint>__<epoch_ms>_<pid>_<durasi_ms>.prof
+PROFILE_NAME_RE = re.compile(r'^(?P<endpoint>.+)__(?P<ts>\d+)_(?P<pid>\d+)_(?P<duration>\d+)\.prof$')
+
+# cProfile hanya bisa aktif satu per proses di Python 3.12+ (sys.monitoring);
+# request lain yang terpilih saat profiler sibuk dilewati saja
+_active = threading.Lock()
+
+
+def profile_filename(endpoint: str, duration_ms: float) -> str:
+    endpoint = re.sub(r'[^A-Za-z0-9_.-]+', '-', endpoint) or 'unmatched'
+    return f'{endpoint}__{int(time.time() * 1000)}_{os.getpid()}_{int(duration_ms)}{PROFILE_SUFFIX}'
+
+
+def _directory_full(directory: str) -> bool:
+    try:
+        with os.scandir(directory) as entries:
+            count = sum(1 for entry in entries if entry.name.endswith(PROFILE_SUFFIX))
+    except FileNotFoundError:
+        return False
+    return count >= settings.PROFILING_MAX_FILES
+
+
+class ProfilingMiddleware:
+    """
+    Profil sebagian request dengan cProfile dan simpan hasilnya (pstats) ke PROFILING_DIR
+    
+    Request diprofil jika PROFILING_ENABLED dan:
+    - terpilih secara acak (PROFILING_SAMPLE_RATE, mis. 0.01 = 1%), atau
+    - membawa header `X-Profile-Token` yang cocok dengan PROFILING_HEADER_TOKEN
+    
+    Aman dibiarkan aktif dengan sample rate rendah: request yang tidak terpilih hanya
+    membayar satu random(), maksimal satu request per proses diprofil bersamaan, dan
+    profil baru tidak ditulis lagi jika PROFILING_DIR sudah berisi PROFILING_MAX_FILES
+    file. Gabungkan hasilnya dengan `python manage.py merge_profiles`.
+    """
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+    
+    def __call__(self, request):
+        if not settings.PROFILING_ENABLED or not self._should_profile(request):
+            return self.get_response(request)
+        
+        directory = settings.PROFILING_DIR
+        if _directory_full(directory) or not _active.acquire(blocking=False):
+            return self.get_response(request)
+        
+        try:
+            profiler = cProfile.Profile()
+            start = time.perf_counter()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Profiler lain (debugger, coverage) sudah aktif
+                return self.get_response(request)
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+            duration_ms = (time.perf_counter() - start) * 1000
+        finally:
+            _active.release()
+        
+        match = getattr(request, 'resolver_match', None)
+        endpoint = (match.view_name or match.route) if match else 'unmatched'
+        filename = profile_filename(f'{request.method}-{endpoint}', duration_ms)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, filename)
+            profiler.dump_stats(f'{path}.tmp')
+            os.replace(f'{path}.tmp', path)
+        except OSError:
+            # Gagal menulis profil tidak boleh menggagalkan request
+            return response
+        
+        response['X-Profile-Id'] = filename
+        return response
+    
+    @staticmethod
+    def _should_profile(request) -> bool:
+        token = settings.PROFILING_HEADER_TOKEN
+        header = request.META.get(PROFILE_HEADER)
+        # Bandingkan bytes: compare_digest(str, str) raise TypeError untuk karakter non-ASCII
+        if token and header and hmac.compare_digest(header.encode(), token.encode()):
+            return True
+        return random.random() < settings.PROFILING_SAMPLE_RATE
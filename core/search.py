@@ -0,0 +1,380 @@
+"""
+Full-text search dokumen yang dijalankan di dalam database engine
+
+- SQLite: virtual table FTS5 contentless `documents_fts` (tokenizer unicode61,
+  ranking bm25) + tabel `documents_fts_entries` (document id -> rowid FTS aktif)
+- PostgreSQL: tabel `documents_search` berisi kolom tsvector saja + index GIN
+  (text search config SEARCH_TS_CONFIG, default 'simple'; ranking ts_rank_cd)
+
+Document.content disimpan terkompresi (CompressedTextField) sehingga tidak bisa
+di-index langsung oleh database. Teks polos title + content hanya dipakai untuk
+membangun index saat dokumen disimpan (signal post_save) atau dihapus (post_delete);
+path bulk_create memanggil index_documents() sendiri. Teks polos tidak disimpan
+ulang di tabel search, sehingga penghematan kompresi content tetap berlaku.
+Snippet dibuat dari content dokumen hasil pencarian (sudah di-decompress).
+
+FTS5 contentless (SQLite < 3.43) tidak bisa menghapus baris tanpa teks aslinya:
+dokumen yang diubah mendapat entri baru dan entri lama hanya dilepas dari
+`documents_fts_entries` (tidak ikut hasil pencarian). Entri lama dibuang oleh
+`python manage.py rebuild_search_index`.
+"""
+import html
+import re
+import unicodedata
+from bisect import bisect_left
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from django.conf import settings
+from django.db import connection
+
+
+# Penanda highlight sementara di snippet (di-escape lalu diganti <mark> di Python)
+SNIPPET_START = '\x02'
+SNIPPET_END = '\x03'
+SNIPPET_ELLIPSIS = '…'
+# Panjang snippet (karakter, kira-kira 24 kata) dan jarak maksimal geser ke batas kata
+SNIPPET_CHARS = 160
+SNIPPET_WORD_SLACK = 30
+
+MAX_QUERY_TERMS = 32
+
+_TERM_RE = re.compile(r'\w+')
+_SPACE_RE = re.compile(r'\s+')
+
+
+class SearchHit(NamedTuple):
+    document_id: int
+    score: float
+
+
+def query_terms(query: str) -> List[str]:
+    """
+    Kata unik dari query user
+    
+    Sintaks query engine (operator, tanda kutip, kolom) sengaja diabaikan agar
+    input user tidak bisa menghasilkan syntax error di MATCH / to_tsquery.
+    """
+    terms = []
+    for term in _TERM_RE.findall((query or '').lower()):
+        if term not in terms:
+            terms.append(term)
+    return terms[:MAX_QUERY_TERMS]
+
+
+def format_snippet(snippet: str) -> str:
+    """Escape HTML snippet lalu ubah penanda highlight menjadi <mark>...</mark>"""
+    escaped = html.escape(snippet or '', quote=False)
+    return escaped.replace(SNIPPET_START, '<mark>').replace(SNIPPET_END, '</mark>')
+
+
+def _fold(term: str) -> str:
+    """Buang diakritik (seperti remove_diacritics tokenizer FTS5)"""
+    decomposed = unicodedata.normalize('NFKD', term)
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def _terms_pattern(terms: List[str]) -> Optional[re.Pattern]:
+    variants = set(terms) | {_fold(term) for term in terms}
+    if not variants:
+        return None
+    alternation = '|'.join(re.escape(term) for term in sorted(variants, key=len, reverse=True))
+    return re.compile(rf'(?<!\w)(?:{alternation})(?!\w)', re.IGNORECASE)
+
+
+def build_snippet(text: str, terms: List[str]) -> str:
+    """
+    Potongan teks (~SNIPPET_CHARS karakter) di sekitar kelompok kata query terbanyak,
+    kata yang cocok dibungkus SNIPPET_START / SNIPPET_END
+    """
+    text = text or ''
+    pattern = _terms_pattern(terms)
+    matches = [match.span() for match in pattern.finditer(text)] if pattern else []
+    
+    begin = 0
+    if matches:
+        starts = [start for start, _ in matches]
+        best = max(
+            range(len(starts)),
+            key=lambda i: bisect_left(starts, starts[i] + SNIPPET_CHARS) - i
+        )
+        begin = max(0, starts[best] - SNIPPET_CHARS // 4)
+    end = min(len(text), begin + SNIPPET_CHARS)
+    
+    # Geser ke batas kata terdekat agar kata tidak terpotong
+    limit = max(0, begin - SNIPPET_WORD_SLACK)
+    while begin > limit and not text[begin - 1].isspace():
+        begin -= 1
+    limit = min(len(text), end + SNIPPET_WORD_SLACK)
+    while end < limit and not text[end].isspace():
+        end += 1
+    
+    pieces = []
+    position = begin
+    for start, stop in matches:
+        if start < begin or start >= end:
+            continue
+        pieces += [text[position:start], SNIPPET_START, text[start:stop], SNIPPET_END]
+        position = stop
+    pieces.append(text[position:max(end, position)])
+    
+    snippet = _SPACE_RE.sub(' ', ''.join(pieces)).strip()
+    if begin > 0:
+        snippet = SNIPPET_ELLIPSIS + snippet
+    if end < len(text):
+        snippet += SNIPPET_ELLIPSIS
+    return snippet
+
+
+class SearchBackend:
+    """
+    Backend tanpa full-text search (database selain SQLite/PostgreSQL)
+    
+    Semua operasi index menjadi no-op dan search() selalu kosong.
+    """
+    
+    name = 'none'
+    available = False
+    
+    # Teks yang di-index per dokumen dibatasi (tsvector PostgreSQL maksimal 1 MB)
+    MAX_INDEXED_CHARS = 500_000
+    
+    def create_schema(self, schema_editor):
+        pass
+    
+    def drop_schema(self, schema_editor):
+        pass
+    
+    def index_documents(self, documents: Iterable):
+        pass
+    
+    def remove_documents(self, document_ids: Iterable[int]):
+        pass
+    
+    def clear(self):
+        pass
+    
+    def search(self, query: str, limit: int, offset: int = 0, match_any: bool = False) -> List[SearchHit]:
+        """
+        Cari dokumen, urut dari skor tertinggi
+        
+        Args:
+            query: Query bebas dari user
+            limit / offset: Paging hasil
+            match_any: False = semua kata harus ada (AND), True = salah satu kata (OR)
+        """
+        return []
+    
+    def snippets(self, query: str, texts: Dict[int, str]) -> Dict[int, str]:
+        """
+        Snippet ber-highlight per dokumen dari content yang sudah di-decompress
+        
+        Args:
+            texts: {document_id: content} untuk dokumen di halaman hasil saja
+        """
+        terms = query_terms(query)
+        return {
+            doc_id: build_snippet((text or '')[:self.MAX_INDEXED_CHARS], terms)
+            for doc_id, text in texts.items()
+        }
+    
+    @classmethod
+    def _index_rows(cls, documents: Iterable) -> List[tuple]:
+        return [
+            (doc.pk, doc.title or '', (doc.content or '')[:cls.MAX_INDEXED_CHARS])
+            for doc in documents
+        ]
+
+
+class SQLiteFTS5Backend(SearchBackend):
+    """
+    Full-text search dengan virtual table FTS5 contentless (hanya index, tanpa teks)
+    
+    rowid FTS5 adalah id entri, bukan Document.id: documents_fts_entries menunjuk
+    entri aktif setiap dokumen (lihat docstring modul).
+    """
+    
+    name = 'sqlite_fts5'
+    available = True
+    
+    TABLE = 'documents_fts'
+    ENTRIES_TABLE = 'documents_fts_entries'
+    # Bobot bm25 per kolom: (title, content)
+    TITLE_WEIGHT = 5.0
+    CONTENT_WEIGHT = 1.0
+    
+    def create_schema(self, schema_editor):
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.TABLE} USING fts5("
+            "title, content, content = '', tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            f'CREATE TABLE IF NOT EXISTS {self.ENTRIES_TABLE} ('
+            'document_id integer PRIMARY KEY, entry_id integer NOT NULL UNIQUE)'
+        )
+    
+    def drop_schema(self, schema_editor):
+        schema_editor.execute(f'DROP TABLE IF EXISTS {self.ENTRIES_TABLE}')
+        schema_editor.execute(f'DROP TABLE IF EXISTS {self.TABLE}')
+    
+    def index_documents(self, documents: Iterable):
+        rows = self._index_rows(documents)
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            for doc_id, title, content in rows:
+                cursor.execute(f'INSERT INTO {self.TABLE} (title, content) VALUES (%s, %s)', [title, content])
+                # last_insert_rowid() per koneksi: aman dari writer lain
+                cursor.execute(
+                    f'INSERT INTO {self.ENTRIES_TABLE} (document_id, entry_id) '
+                    'VALUES (%s, last_insert_rowid()) '
+                    'ON CONFLICT (document_id) DO UPDATE SET entry_id = excluded.entry_id',
+                    [doc_id]
+                )
+    
+    def remove_documents(self, document_ids: Iterable[int]):
+        params = [(doc_id,) for doc_id in document_ids]
+        if params:
+            with connection.cursor() as cursor:
+                cursor.executemany(f'DELETE FROM {self.ENTRIES_TABLE} WHERE document_id = %s', params)
+    
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {self.TABLE} ({self.TABLE}) VALUES ('delete-all')")
+            cursor.execute(f'DELETE FROM {self.ENTRIES_TABLE}')
+    
+    def search(self, query: str, limit: int, offset: int = 0, match_any: bool = False) -> List[SearchHit]:
+        terms = query_terms(query)
+        if not terms or limit <= 0:
+            return []
+        # Setiap kata di-quote sebagai string FTS5 (hanya berisi \w, aman dari sintaks MATCH)
+        match = (' OR ' if match_any else ' ').join(f'"{term}"' for term in terms)
+        
+        table = self.TABLE
+        sql = (
+            f'SELECT e.document_id, bm25({table}, {self.TITLE_WEIGHT}, {self.CONTENT_WEIGHT}) AS rank '
+            f'FROM {table} JOIN {self.ENTRIES_TABLE} e ON e.entry_id = {table}.rowid '
+            f'WHERE {table} MATCH %s '
+            'ORDER BY rank, e.document_id DESC LIMIT %s OFFSET %s'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [match, limit, offset])
+            rows = cursor.fetchall()
+        # bm25() bernilai negatif: makin kecil makin relevan
+        return [SearchHit(doc_id, -rank) for doc_id, rank in rows]
+
+
+class PostgresSearchBackend(SearchBackend):
+    """Full-text search dengan kolom tsvector (index GIN) di tabel documents_search"""
+    
+    name = 'postgres_tsvector'
+    available = True
+    
+    TABLE = 'documents_search'
+    HEADLINE_OPTIONS = (
+        f'StartSel={SNIPPET_START}, StopSel={SNIPPET_END}, MaxWords=30, MinWords=10, '
+        f'MaxFragments=2, FragmentDelimiter=" {SNIPPET_ELLIPSIS} "'
+    )
+    
+    def create_schema(self, schema_editor):
+        schema_editor.execute(
+            f'CREATE TABLE IF NOT EXISTS {self.TABLE} ('
+            'document_id bigint PRIMARY KEY REFERENCES documents (id) ON DELETE CASCADE, '
+            'search_vector tsvector NOT NULL)'
+        )
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {self.TABLE}_vector_idx '
+            f'ON {self.TABLE} USING GIN (search_vector)'
+        )
+    
+    def drop_schema(self, schema_editor):
+        schema_editor.execute(f'DROP TABLE IF EXISTS {self.TABLE}')
+    
+    def index_documents(self, documents: Iterable):
+        ts_config = settings.SEARCH_TS_CONFIG
+        rows = [
+            (doc_id, ts_config, title, ts_config, body)
+            for doc_id, title, body in self._index_rows(documents)
+        ]
+        if not rows:
+            return
+        # tsvector dihitung oleh PostgreSQL; judul berbobot A, isi berbobot B
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {self.TABLE} (document_id, search_vector) '
+                'VALUES (%s, '
+                "setweight(to_tsvector(%s::regconfig, %s), 'A') || "
+                "setweight(to_tsvector(%s::regconfig, %s), 'B')) "
+                'ON CONFLICT (document_id) DO UPDATE SET search_vector = EXCLUDED.search_vector',
+                rows
+            )
+    
+    def remove_documents(self, document_ids: Iterable[int]):
+        document_ids = list(document_ids)
+        if document_ids:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'DELETE FROM {self.TABLE} WHERE document_id = ANY(%s)', [document_ids]
+                )
+    
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'TRUNCATE {self.TABLE}')
+    
+    def search(self, query: str, limit: int, offset: int = 0, match_any: bool = False) -> List[SearchHit]:
+        terms = query_terms(query)
+        if not terms or limit <= 0:
+            return []
+        tsquery = (' | ' if match_any else ' & ').join(terms)
+        sql = (
+            'SELECT s.document_id, ts_rank_cd(s.search_vector, q.query) AS rank '
+            f'FROM {self.TABLE} s, to_tsquery(%s::regconfig, %s) AS q(query) '
+            'WHERE s.search_vector @@ q.query '
+            'ORDER BY rank DESC, s.document_id DESC LIMIT %s OFFSET %s'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [settings.SEARCH_TS_CONFIG, tsquery, limit, offset])
+            rows = cursor.fetchall()
+        return [SearchHit(doc_id, float(rank)) for doc_id, rank in rows]
+    
+    def snippets(self, query: str, texts: Dict[int, str]) -> Dict[int, str]:
+        """ts_headline atas content yang dikirim sebagai parameter (hanya halaman hasil)"""
+        terms = query_terms(query)
+        if not terms or not texts:
+            return {doc_id: '' for doc_id in texts}
+        ts_config = settings.SEARCH_TS_CONFIG
+        values = ', '.join(['(%s::bigint, %s::text)'] * len(texts))
+        sql = (
+            'SELECT t.document_id, '
+            'ts_headline(%s::regconfig, t.body, to_tsquery(%s::regconfig, %s), %s) '
+            f'FROM (VALUES {values}) AS t(document_id, body)'
+        )
+        params = [ts_config, ts_config, ' | '.join(terms), self.HEADLINE_OPTIONS]
+        for doc_id, text in texts.items():
+            params += [doc_id, (text or '')[:self.MAX_INDEXED_CHARS]]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return dict(cursor.fetchall())
+
+
+_BACKENDS = {
+    'sqlite': SQLiteFTS5Backend(),
+    'postgresql': PostgresSearchBackend(),
+}
+_NO_BACKEND = SearchBackend()
+
+
+def get_search_backend(using_connection=None) -> SearchBackend:
+    """Backend search sesuai vendor database (default: connection 'default')"""
+    vendor = (using_connection or connection).vendor
+    return _BACKENDS.get(vendor, _NO_BACKEND)
+
+
+def retrieve_document_ids(message: str, limit: int) -> List[int]:
+    """
+    Retrieval konteks chat: id dokumen paling relevan untuk message, urut skor
+    
+    Memakai OR antar kata agar pertanyaan natural tetap menemukan dokumen;
+    ranking (bm25 / ts_rank_cd) mendahulukan dokumen yang cocok dengan lebih banyak kata.
+    """
+    hits = get_search_backend().search(message, limit, match_any=True)
+    return [hit.document_id for hit in hits]
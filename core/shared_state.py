@@ -0,0 +1,62 @@
+"""
+File SQLite untuk state yang dibagi antar worker di host yang sama
+
+Dipakai oleh cache token SSO (core/token_cache.py) dan admission control
+(core/admission.py). Isi file ikut menentukan autentikasi dan kuota, sehingga
+file hanya dipakai jika tidak bisa ditulis user lain:
+
+- Direktori dibuat dengan mode 0700; direktori yang sudah ada harus milik user
+  proses dan tidak writable untuk group/other (file -wal/-shm SQLite dibuat di sini)
+- File dibuat dengan mode 0600 (tanpa mengikuti symlink); file yang sudah ada harus
+  file biasa milik user proses tanpa permission group/other
+"""
+import os
+import sqlite3
+import stat
+
+
+class UnsafeSharedPath(OSError):
+    """Path state bersama bisa diubah user lain, tidak dipakai"""
+
+
+def _check_owner(st: os.stat_result, path: str):
+    if st.st_uid != os.geteuid():
+        raise UnsafeSharedPath(f'{path} bukan milik user proses (uid {st.st_uid})')
+
+
+def ensure_private_dir(directory: str):
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    st = os.stat(directory)
+    _check_owner(st, directory)
+    if st.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        raise UnsafeSharedPath(f'{directory} writable untuk group/other')
+
+
+def ensure_private_file(path: str):
+    """Buat file dengan mode 0600 jika belum ada, lalu validasi owner dan permission"""
+    fd = os.open(path, os.O_RDWR | os.O_CREAT | getattr(os, 'O_NOFOLLOW', 0), 0o600)
+    try:
+        st = os.fstat(fd)
+    finally:
+        os.close(fd)
+    if not stat.S_ISREG(st.st_mode):
+        raise UnsafeSharedPath(f'{path} bukan file biasa')
+    _check_owner(st, path)
+    if st.st_mode & 0o077:
+        raise UnsafeSharedPath(f'{path} punya permission group/other ({stat.filemode(st.st_mode)})')
+
+
+def connect(path: str, timeout: float = 1.0) -> sqlite3.Connection:
+    """
+    Koneksi SQLite (autocommit, WAL) ke file state bersama
+    
+    Raises:
+        UnsafeSharedPath: Direktori atau file bisa diubah user lain
+        OSError: Direktori / file tidak bisa dibuat
+    """
+    ensure_private_dir(os.path.dirname(os.path.abspath(path)))
+    ensure_private_file(path)
+    conn = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
@@ -15,6 +15,24 @@ unauthorized_response = openapi.Response(
     }
 )
 
+too_many_requests_response = openapi.Response(
+    description="Too Many Requests - Batas admission control terlampaui (lihat header Retry-After)",
+    examples={
+        "application/json": {
+            "detail": "Layanan LLM sedang penuh, coba lagi nanti. Expected available in 5 seconds."
+        }
+    }
+)
+
+deadline_exceeded_response = openapi.Response(
+    description="Gateway Timeout - Deadline request habis (REQUEST_DEADLINES / header X-Request-Timeout)",
+    examples={
+        "application/json": {
+            "detail": "Batas waktu request habis sebelum selesai diproses."
+        }
+    }
+)
+
 bad_request_response = openapi.Response(
     description="Bad Request - Validasi gagal",
     examples={
@@ -64,6 +82,10 @@ document_upload_schema = swagger_auto_schema(
                 description='Judul dokumen (opsional, default: nama file)',
                 max_length=500
             ),
+            'tags': openapi.Schema(
+                type=openapi.TYPE_STRING,
+                description='Tags dipisah koma (opsional, maks 20), mis. `laporan,q3,jabar`'
+            ),
         },
     ),
     responses={
@@ -78,7 +100,14 @@ document_upload_schema = swagger_auto_schema(
                         "source_filename": "report.pdf",
                         "mime_type": "application/pdf",
                         "content_length": 15420,
+                        "token_count": 3890,
+                        "structured_token_count": 0,
+                        "line_count": 312,
+                        "sentence_count": 140,
+                        "chunk_count": 2,
+                        "language": "id",
                         "content_preview": "LAPORAN KINERJA...",
+                        "tags": ["laporan", "q3"],
                         "created_at": "2026-01-30T10:15:30.123456Z",
                         "updated_at": "2026-01-30T10:15:30.123456Z"
                     }
@@ -123,18 +152,143 @@ document_upload_schema = swagger_auto_schema(
 )
 
 
+document_bulk_upload_schema = swagger_auto_schema(
+    operation_description="""
+    Upload banyak dokumen dalam satu request.
+
+    Kirim beberapa file dengan field `files` (diulang) dan/atau satu ZIP
+    archive dengan field `archive`. Setiap file diekstrak paralel dan
+    disimpan per batch.
+
+    **Batasan:**
+    - Ukuran maksimal per file: 10 MB (`MAX_UPLOAD_SIZE_MB`)
+    - Jumlah file maksimal: `BULK_UPLOAD_MAX_FILES` (default 500)
+    - Ukuran ZIP maksimal: `BULK_UPLOAD_MAX_ARCHIVE_SIZE_MB` (default 200 MB)
+
+    **Response:**
+    - 201: Semua dokumen berhasil diupload
+    - 207: Sebagian dokumen gagal (lihat `results`)
+    - 400: Validasi gagal
+    - 401: Token tidak valid
+    - 422: Semua dokumen gagal diekstrak
+    """,
+    request_body=openapi.Schema(
+        type=openapi.TYPE_OBJECT,
+        properties={
+            'files': openapi.Schema(
+                type=openapi.TYPE_ARRAY,
+                items=openapi.Schema(type=openapi.TYPE_FILE),
+                description='File dokumen (PDF/DOCX/TXT/XLSX), boleh lebih dari satu'
+            ),
+            'archive': openapi.Schema(
+                type=openapi.TYPE_FILE,
+                description='ZIP archive berisi dokumen'
+            ),
+            'tags': openapi.Schema(
+                type=openapi.TYPE_STRING,
+                description='Tags dipisah koma, dipasang ke semua dokumen yang berhasil diupload'
+            ),
+        },
+    ),
+    responses={
+        207: openapi.Response(
+            description="Sebagian dokumen gagal (201 jika semua berhasil)",
+            examples={
+                "application/json": {
+                    "message": "1 dari 2 dokumen berhasil diupload",
+                    "total": 2,
+                    "succeeded": 1,
+                    "failed": 1,
+                    "results": [
+                        {
+                            "index": 0,
+                            "filename": "laporan_q3_2025.txt",
+                            "status": "success",
+                            "document": {
+                                "id": 10,
+                                "title": "laporan_q3_2025.txt",
+                                "source_filename": "laporan_q3_2025.txt",
+                                "mime_type": "text/plain",
+                                "content_length": 15420,
+                                "content_preview": "LAPORAN KINERJA...",
+                                "tags": ["onboarding"],
+                                "created_at": "2026-01-30T10:15:30Z",
+                                "updated_at": "2026-01-30T10:15:30Z"
+                            }
+                        },
+                        {
+                            "index": 1,
+                            "filename": "scan.pdf",
+                            "status": "failed",
+                            "mime_type": "application/pdf",
+                            "error": "Gagal mengekstrak dokumen: PDF tidak mengandung teks yang bisa diekstrak (mungkin hasil scan)"
+                        }
+                    ]
+                }
+            }
+        ),
+        400: bad_request_response,
+        401: unauthorized_response,
+    },
+    security=[{'Bearer': []}],
+    tags=['Documents']
+)
+
+
 document_list_schema = swagger_auto_schema(
     operation_description="""
-    List semua dokumen milik user yang sedang login.
+    List semua dokumen, terbaru di atas (default 50 per halaman).
     
-    Dokumen diurutkan berdasarkan waktu upload (terbaru di atas).
+    Response hanya berisi metadata + `content_preview` (200 karakter pertama,
+    dihitung saat upload); full content diambil via `GET /api/documents/{id}`.
+    
+    **Pagination (cursor/keyset):**
+    - Kirim `next_cursor` dari response sebagai `cursor` untuk halaman berikutnya
+    - `next_cursor` bernilai null di halaman terakhir
+    - `count` adalah jumlah item di halaman ini (tidak ada query COUNT tambahan)
+    
+    **Field selection:** `fields=id,title,created_at` hanya mengembalikan
+    (dan hanya mengambil dari database) field tersebut.
+    
+    **Filter tag:** `tags=laporan,q3` hanya mengembalikan dokumen yang memiliki
+    salah satu tag tersebut.
+    
+    **Conditional GET:** `ETag` list berasal dari versi corpus, yang naik setiap
+    ada dokumen di-upload, diubah atau dihapus. Kirim `If-None-Match` saat
+    polling; jika corpus tidak berubah response adalah 304 tanpa body.
     """,
+    manual_parameters=[
+        openapi.Parameter(
+            'limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+            description='Jumlah item per halaman (default 50, maks 200)'
+        ),
+        openapi.Parameter(
+            'cursor', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+            description='Cursor dari `next_cursor` halaman sebelumnya'
+        ),
+        openapi.Parameter(
+            'fields', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+            description='Daftar field dipisah koma: id, title, source_filename, mime_type, '
+                        'content_length, token_count, structured_token_count, line_count, '
+                        'sentence_count, chunk_count, language, content_preview, tags, '
+                        'created_at, updated_at'
+        ),
+        openapi.Parameter(
+            'tags', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+            description='Filter tag dipisah koma (dokumen dengan salah satu tag)'
+        ),
+        openapi.Parameter(
+            'If-None-Match', openapi.IN_HEADER, type=openapi.TYPE_STRING,
+            description='ETag dari response sebelumnya'
+        ),
+    ],
     responses={
         200: openapi.Response(
             description="List dokumen berhasil diambil",
             examples={
                 "application/json": {
-                    "count": 3,
+                    "count": 1,
+                    "next_cursor": "WyIyMDI2LTAxLTMwVDEwOjE1OjMwKzAwOjAwIiwxXQ",
                     "documents": [
                         {
                             "id": 1,
@@ -142,7 +296,14 @@ document_list_schema = swagger_auto_schema(
                             "source_filename": "report.pdf",
                             "mime_type": "application/pdf",
                             "content_length": 15420,
+                            "token_count": 3890,
+                            "structured_token_count": 0,
+                            "line_count": 312,
+                            "sentence_count": 140,
+                            "chunk_count": 2,
+                            "language": "id",
                             "content_preview": "Preview...",
+                            "tags": ["laporan", "q3"],
                             "created_at": "2026-01-30T10:15:30Z",
                             "updated_at": "2026-01-30T10:15:30Z"
                         }
@@ -150,6 +311,15 @@ document_list_schema = swagger_auto_schema(
                 }
             }
         ),
+        304: openapi.Response(description="Corpus tidak berubah sejak ETag sebelumnya"),
+        400: openapi.Response(
+            description="Parameter limit, cursor atau fields tidak valid",
+            examples={
+                "application/json": {
+                    "error": "Cursor tidak valid"
+                }
+            }
+        ),
         401: unauthorized_response,
     },
     security=[{'Bearer': []}],
@@ -163,7 +333,17 @@ document_detail_schema = swagger_auto_schema(
     
     Berbeda dengan list endpoint yang hanya menampilkan preview,
     endpoint ini mengembalikan seluruh isi dokumen yang sudah diekstrak.
+    
+    **Conditional GET:** response berisi header `ETag` dan `Last-Modified`
+    (dari `updated_at`). Kirim `If-None-Match` / `If-Modified-Since` saat
+    polling; jika dokumen tidak berubah response adalah 304 tanpa body.
     """,
+    manual_parameters=[
+        openapi.Parameter(
+            'If-None-Match', openapi.IN_HEADER, type=openapi.TYPE_STRING,
+            description='ETag dari response sebelumnya'
+        ),
+    ],
     responses={
         200: openapi.Response(
             description="Detail dokumen",
@@ -176,11 +356,75 @@ document_detail_schema = swagger_auto_schema(
                     "source_filename": "report.pdf",
                     "mime_type": "application/pdf",
                     "content_length": 15420,
+                    "token_count": 3890,
+                    "structured_token_count": 0,
+                    "line_count": 312,
+                    "sentence_count": 140,
+                    "chunk_count": 2,
+                    "language": "id",
+                    "tags": ["laporan", "q3"],
                     "created_at": "2026-01-30T10:15:30Z",
                     "updated_at": "2026-01-30T10:15:30Z"
                 }
             }
         ),
+        304: openapi.Response(description="Dokumen tidak berubah sejak ETag / Last-Modified"),
+        401: unauthorized_response,
+        404: openapi.Response(description="Dokumen tidak ditemukan"),
+    },
+    security=[{'Bearer': []}],
+    tags=['Documents']
+)
+
+
+document_content_range_schema = swagger_auto_schema(
+    operation_description="""
+    Potongan content dokumen, untuk viewer yang hanya menampilkan bagian
+    yang terlihat di layar.
+    
+    Gunakan `offset` + `length` (dalam karakter), atau `chunk` + `length`
+    (chunk ke-N berukuran `length`, dimulai dari 0). Lanjutkan dengan
+    `next_offset` sampai bernilai null. Mendukung `ETag` / `If-None-Match`.
+    """,
+    manual_parameters=[
+        openapi.Parameter(
+            'offset', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+            description='Offset karakter (default 0)'
+        ),
+        openapi.Parameter(
+            'length', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+            description='Jumlah karakter (default 10000, maks 100000)'
+        ),
+        openapi.Parameter(
+            'chunk', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+            description='Nomor chunk (0-based); jika diisi, offset = chunk * length'
+        ),
+    ],
+    responses={
+        200: openapi.Response(
+            description="Potongan content",
+            examples={
+                "application/json": {
+                    "id": 1,
+                    "offset": 10000,
+                    "length": 10000,
+                    "total_length": 154200,
+                    "next_offset": 20000,
+                    "content": "...",
+                    "chunk": 1,
+                    "total_chunks": 16
+                }
+            }
+        ),
+        304: openapi.Response(description="Dokumen tidak berubah sejak ETag sebelumnya"),
+        400: openapi.Response(
+            description="Parameter offset, length atau chunk tidak valid",
+            examples={
+                "application/json": {
+                    "error": "Parameter offset minimal 0"
+                }
+            }
+        ),
         401: unauthorized_response,
         404: openapi.Response(description="Dokumen tidak ditemukan"),
     },
@@ -189,6 +433,192 @@ document_detail_schema = swagger_auto_schema(
 )
 
 
+document_rows_schema = swagger_auto_schema(
+    operation_description="""
+    Halaman rows dari satu sheet dokumen XLSX (dari `structured_data`).
+    
+    Tanpa parameter `sheet`, sheet pertama yang dikembalikan. Field `sheets`
+    berisi daftar sheet beserta jumlah row-nya. Lanjutkan dengan `next_offset`
+    sampai bernilai null. Mendukung `ETag` / `If-None-Match`.
+    """,
+    manual_parameters=[
+        openapi.Parameter(
+            'sheet', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+            description='Nama sheet (default: sheet pertama)'
+        ),
+        openapi.Parameter(
+            'offset', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+            description='Offset row (default 0)'
+        ),
+        openapi.Parameter(
+            'limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+            description='Jumlah row (default 100, maks 1000)'
+        ),
+    ],
+    responses={
+        200: openapi.Response(
+            description="Halaman rows",
+            examples={
+                "application/json": {
+                    "id": 3,
+                    "sheet": "Revenue",
+                    "sheets": [
+                        {"name": "Revenue", "total_rows": 1200},
+                        {"name": "KPI", "total_rows": 12}
+                    ],
+                    "columns": ["Bulan", "Revenue", "Target"],
+                    "offset": 0,
+                    "limit": 2,
+                    "total_rows": 1200,
+                    "next_offset": 2,
+                    "rows": [
+                        ["Jan", 1200000000, 1100000000],
+                        ["Feb", 1250000000, 1150000000]
+                    ]
+                }
+            }
+        ),
+        304: openapi.Response(description="Dokumen tidak berubah sejak ETag sebelumnya"),
+        400: openapi.Response(
+            description="Parameter offset atau limit tidak valid",
+            examples={
+                "application/json": {
+                    "error": "Parameter limit harus berupa angka"
+                }
+            }
+        ),
+        401: unauthorized_response,
+        404: openapi.Response(
+            description="Dokumen, data tabel, atau sheet tidak ditemukan",
+            examples={
+                "application/json": {
+                    "error": "Sheet tidak ditemukan",
+                    "details": {"available_sheets": ["Revenue", "KPI"]}
+                }
+            }
+        ),
+    },
+    security=[{'Bearer': []}],
+    tags=['Documents']
+)
+
+
+document_search_schema = swagger_auto_schema(
+    operation_description="""
+    Full-text search dokumen berdasarkan judul dan isi.
+    
+    Pencarian dan ranking dihitung di database: FTS5 (bm25) di SQLite, tsvector +
+    index GIN (ts_rank_cd) di PostgreSQL. Snippet dibuat dari isi dokumen di halaman
+    hasil (ts_headline di PostgreSQL). Semua kata di `q`
+    harus ada di dokumen; operator/sintaks query diabaikan. Judul berbobot lebih tinggi
+    dari isi. `snippet` sudah di-escape HTML dengan kata yang cocok dibungkus `<mark>`.
+    Lanjutkan dengan `offset=next_offset` sampai bernilai null.
+    """,
+    manual_parameters=[
+        openapi.Parameter(
+            'q', openapi.IN_QUERY, type=openapi.TYPE_STRING, required=True,
+            description='Kata kunci pencarian'
+        ),
+        openapi.Parameter(
+            'offset', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+            description='Offset hasil (default 0)'
+        ),
+        openapi.Parameter(
+            'limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+            description='Jumlah hasil (default 20, maks 100)'
+        ),
+    ],
+    responses={
+        200: openapi.Response(
+            description="Hasil pencarian, urut dari skor tertinggi",
+            examples={
+                "application/json": {
+                    "query": "gangguan jaringan",
+                    "backend": "sqlite_fts5",
+                    "count": 1,
+                    "next_offset": None,
+                    "results": [
+                        {
+                            "id": 7,
+                            "title": "Laporan Insiden Oktober",
+                            "source_filename": "insiden_oktober.pdf",
+                            "mime_type": "application/pdf",
+                            "created_at": "2026-10-01T08:00:00+07:00",
+                            "score": 7.2813,
+                            "snippet": "…total <mark>gangguan</mark> <mark>jaringan</mark> di Jawa Barat turun 12%…"
+                        }
+                    ]
+                }
+            }
+        ),
+        400: openapi.Response(
+            description="Parameter q kosong atau limit/offset tidak valid",
+            examples={
+                "application/json": {
+                    "error": "Parameter q wajib diisi"
+                }
+            }
+        ),
+        401: unauthorized_response,
+        503: openapi.Response(
+            description="Database tidak mendukung full-text search",
+            examples={
+                "application/json": {
+                    "error": "Full-text search tidak tersedia",
+                    "details": "Database mysql belum didukung"
+                }
+            }
+        ),
+    },
+    security=[{'Bearer': []}],
+    tags=['Documents']
+)
+
+
+document_stats_schema = swagger_auto_schema(
+    operation_description="""
+    Statistik corpus dokumen untuk perencanaan konteks dan dashboard kapasitas.
+    
+    Dihitung dari kolom statistik yang disimpan saat ingestion (`token_count`,
+    `line_count`, `sentence_count`, `chunk_count`, `language`), tanpa membaca
+    `content`. `tokens` adalah estimasi heuristik, bukan hasil tokenizer.
+    Mendukung `ETag` / `If-None-Match` (berubah mengikuti versi corpus).
+    """,
+    responses={
+        200: openapi.Response(
+            description="Statistik corpus",
+            examples={
+                "application/json": {
+                    "corpus_version": 42,
+                    "totals": {
+                        "documents": 120,
+                        "characters": 5400000,
+                        "tokens": 1380000,
+                        "structured_tokens": 250000,
+                        "lines": 98000,
+                        "sentences": 61000,
+                        "chunks": 610,
+                        "max_document_tokens": 96000
+                    },
+                    "by_language": [
+                        {"language": "id", "documents": 100, "tokens": 1200000},
+                        {"language": "en", "documents": 20, "tokens": 180000}
+                    ],
+                    "by_mime_type": [
+                        {"mime_type": "application/pdf", "documents": 80, "tokens": 1100000},
+                        {"mime_type": "text/plain", "documents": 40, "tokens": 280000}
+                    ]
+                }
+            }
+        ),
+        304: openapi.Response(description="Corpus tidak berubah sejak ETag sebelumnya"),
+        401: unauthorized_response,
+    },
+    security=[{'Bearer': []}],
+    tags=['Documents']
+)
+
+
 document_delete_schema = swagger_auto_schema(
     operation_description="""
     Hapus dokumen.
@@ -226,17 +656,54 @@ chat_create_schema = swagger_auto_schema(
     4. LLM menjawab dalam Bahasa Indonesia berdasarkan konteks
     5. Jika terdeteksi perlu chart dan data cukup, LLM generate chart dalam format Chart.js
     
+    **Jawaban lokal (tanpa LLM):** pertanyaan sederhana dijawab langsung dari database,
+    mis. "Dokumen apa saja yang ada?", salam/terima kasih, atau "Total Capaian di sheet X".
+    Pertanyaan yang lebih spesifik tetap diteruskan ke LLM (`CHAT_LOCAL_INTENTS`).
+    
     **Payload Simplified:**
     - Hanya perlu kirim `message` saja!
-    - Tidak perlu specify `document_ids` (auto dari DB)
+    - Tidak perlu specify `document_ids` (default: semua dokumen dari DB)
     - Tidak perlu specify `include_chart` (auto-detect dari message)
     - `conversation_id` opsional untuk tracking percakapan
     
+    **Membatasi dokumen konteks (opsional):**
+    - `document_ids`: hanya dokumen dengan ID ini
+    - `tags`: hanya dokumen yang memiliki salah satu tag ini
+    - `date_from` / `date_to`: hanya dokumen yang di-upload dalam rentang tanggal (inklusif)
+    - Filter digabung (AND). Prompt lebih kecil sehingga jawaban lebih cepat; jika tidak ada
+      dokumen yang cocok response adalah 404 tanpa memanggil LLM
+    
+    **Dry-run (`?dry_run=1`):** pipeline dijalankan sampai sebelum panggilan LLM
+    (intent, history, filter/retrieval dokumen, penyusunan prompt) tanpa memanggil
+    DeepSeek dan tanpa menyimpan history. Response berisi estimasi token prompt,
+    alokasi + pemotongan per dokumen, ukuran history, kelayakan context cache dan
+    prediksi biaya (`DEEPSEEK_PRICE_*`). Token adalah estimasi heuristik.
+    `include_messages=1` menyertakan messages lengkap yang akan dikirim.
+    
+    **Deadline:** default 90 detik untuk endpoint ini (`REQUEST_DEADLINES`), bisa
+    diperpendek client lewat header `X-Request-Timeout` (detik). Verifikasi SSO, query
+    database, antrian slot LLM dan panggilan DeepSeek hanya memakai sisa waktunya;
+    jika habis response adalah 504.
+    
     **Tips:**
     - Untuk minta chart, gunakan kata "chart", "grafik", "visualisasi", "perbandingan" di message
     - Contoh: "Buatkan grafik perbandingan target vs capaian NPS"
     - Spesifik dalam pertanyaan untuk hasil lebih akurat
     """,
+    manual_parameters=[
+        openapi.Parameter(
+            'dry_run', openapi.IN_QUERY, type=openapi.TYPE_BOOLEAN,
+            description='1 = rencana prompt tanpa memanggil LLM (estimasi token, alokasi dokumen, biaya)'
+        ),
+        openapi.Parameter(
+            'include_messages', openapi.IN_QUERY, type=openapi.TYPE_BOOLEAN,
+            description='Dengan dry_run=1: sertakan messages lengkap yang akan dikirim ke LLM'
+        ),
+        openapi.Parameter(
+            'X-Request-Timeout', openapi.IN_HEADER, type=openapi.TYPE_NUMBER,
+            description='Deadline request dalam detik (maks REQUEST_DEADLINE_MAX)'
+        ),
+    ],
     request_body=openapi.Schema(
         type=openapi.TYPE_OBJECT,
         required=['message'],
@@ -253,6 +720,30 @@ chat_create_schema = swagger_auto_schema(
                 max_length=100,
                 example='conv-abc-123'
             ),
+            'document_ids': openapi.Schema(
+                type=openapi.TYPE_ARRAY,
+                items=openapi.Schema(type=openapi.TYPE_INTEGER),
+                description='Batasi konteks ke dokumen dengan ID ini (opsional, maks 200)',
+                example=[3, 7]
+            ),
+            'tags': openapi.Schema(
+                type=openapi.TYPE_ARRAY,
+                items=openapi.Schema(type=openapi.TYPE_STRING),
+                description='Batasi konteks ke dokumen dengan salah satu tag ini (opsional)',
+                example=['laporan', 'q3']
+            ),
+            'date_from': openapi.Schema(
+                type=openapi.TYPE_STRING,
+                format=openapi.FORMAT_DATE,
+                description='Dokumen yang di-upload sejak tanggal ini (opsional)',
+                example='2025-07-01'
+            ),
+            'date_to': openapi.Schema(
+                type=openapi.TYPE_STRING,
+                format=openapi.FORMAT_DATE,
+                description='Dokumen yang di-upload sampai tanggal ini, inklusif (opsional)',
+                example='2025-09-30'
+            ),
         },
     ),
     responses={
@@ -276,11 +767,77 @@ chat_create_schema = swagger_auto_schema(
                         },
                         "options": {"responsive": True}
                     }
+                },
+                "application/json (dry_run=1)": {
+                    "dry_run": True,
+                    "llm_call": True,
+                    "intent": "general",
+                    "include_chart": False,
+                    "chart_mode": None,
+                    "corpus_snapshot_id": 12,
+                    "model": "deepseek-chat",
+                    "max_tokens": 4000,
+                    "route": {
+                        "name": "standard",
+                        "model": "deepseek-chat",
+                        "max_tokens": 4000,
+                        "temperature": 0.7,
+                        "reason": "words=18 history=4 intent=general"
+                    },
+                    "prompt": {
+                        "estimated_tokens": 41250,
+                        "characters": 152340,
+                        "system_tokens": 320,
+                        "history_tokens": 410,
+                        "user_prompt_tokens": 40520,
+                        "context_window_tokens": 128000
+                    },
+                    "history": {"messages": 4, "tokens": 410},
+                    "context": {
+                        "max_chars": 150000,
+                        "documents_count": 2,
+                        "truncated": True,
+                        "documents": [
+                            {
+                                "id": 7,
+                                "title": "Laporan Q3 2025",
+                                "source_chars": 210000,
+                                "budget_chars": 75000,
+                                "included_chars": 75043,
+                                "truncated": True,
+                                "source_tokens": 52000,
+                                "included_tokens": 18600
+                            }
+                        ]
+                    },
+                    "cache": {
+                        "eligible": True,
+                        "prefix_tokens": 41230,
+                        "prefix_recently_sent": False,
+                        "expected_cached_tokens": 320
+                    },
+                    "cost": {
+                        "currency": "USD",
+                        "prompt": 0.011471,
+                        "completion_max": 0.00168,
+                        "total_max": 0.013151
+                    },
+                    "warnings": ["context_truncated"]
                 }
             }
         ),
         400: bad_request_response,
         401: unauthorized_response,
+        404: openapi.Response(
+            description="Filter document_ids / tags / tanggal tidak cocok dengan dokumen apa pun",
+            examples={
+                "application/json": {
+                    "error": "Tidak ada dokumen yang cocok dengan filter",
+                    "details": {"tags": ["laporan-2019"]}
+                }
+            }
+        ),
+        429: too_many_requests_response,
         502: openapi.Response(
             description="Error dari LLM API",
             examples={
@@ -290,6 +847,7 @@ chat_create_schema = swagger_auto_schema(
                 }
             }
         ),
+        504: deadline_exceeded_response,
     },
     security=[{'Bearer': []}],
     tags=['Chat']
@@ -298,7 +856,7 @@ chat_create_schema = swagger_auto_schema(
 
 chat_history_schema = swagger_auto_schema(
     operation_description="""
-    List history chat milik user (50 terakhir).
+    List history chat milik user, terbaru di atas (default 50 per halaman).
     
     History mencakup:
     - Pesan user
@@ -306,20 +864,62 @@ chat_history_schema = swagger_auto_schema(
     - Chart data (jika ada)
     - Document IDs yang digunakan
     - Conversation ID (jika ada)
+    
+    **Pagination (cursor/keyset):**
+    - Kirim `next_cursor` dari response sebagai `cursor` untuk halaman berikutnya
+    - `next_cursor` bernilai null di halaman terakhir
+    - `count` adalah jumlah item di halaman ini (tidak ada query COUNT tambahan)
+    
+    **Default ringkas:** hanya preview pesan user + flag `has_chart`; body lengkap
+    diambil via `GET /api/chat/history/{id}`, atau kirim `full=1` untuk menyertakan
+    response_text, chart dan document IDs di setiap item.
     """,
+    manual_parameters=[
+        openapi.Parameter(
+            'limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+            description='Jumlah item per halaman (default 50, maks 200)'
+        ),
+        openapi.Parameter(
+            'cursor', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+            description='Cursor dari `next_cursor` halaman sebelumnya'
+        ),
+        openapi.Parameter(
+            'conversation_id', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+            description='Filter history untuk satu percakapan'
+        ),
+        openapi.Parameter(
+            'full', openapi.IN_QUERY, type=openapi.TYPE_BOOLEAN,
+            description='Sertakan response_text, chart dan document_ids (default ringkas)'
+        ),
+    ],
     responses={
         200: openapi.Response(
             description="History berhasil diambil",
             examples={
                 "application/json": {
-                    "count": 15,
+                    "count": 1,
+                    "next_cursor": "WyIyMDI2LTAxLTMwVDEyOjAwOjAwKzAwOjAwIiwxXQ",
+                    "history": [
+                        {
+                            "id": 1,
+                            "user_message_preview": "Berapa target NPS?",
+                            "has_chart": False,
+                            "conversation_id": "conv-123",
+                            "created_at": "2026-01-30T12:00:00Z"
+                        }
+                    ]
+                },
+                "application/json (full=1)": {
+                    "count": 1,
+                    "next_cursor": None,
                     "history": [
                         {
                             "id": 1,
                             "user_message": "Berapa target NPS?",
                             "response_text": "Target NPS adalah...",
                             "response_chart_json": None,
-                            "document_ids": [1, 2],
+                            "document_ids": None,
+                            "corpus_snapshot": 12,
                             "conversation_id": "conv-123",
                             "created_at": "2026-01-30T12:00:00Z"
                         }
@@ -327,7 +927,43 @@ chat_history_schema = swagger_auto_schema(
                 }
             }
         ),
+        400: openapi.Response(
+            description="Parameter pagination tidak valid",
+            examples={
+                "application/json": {
+                    "error": "Cursor tidak valid"
+                }
+            }
+        ),
+        401: unauthorized_response,
+    },
+    security=[{'Bearer': []}],
+    tags=['Chat']
+)
+
+
+chat_history_detail_schema = swagger_auto_schema(
+    operation_description="""
+    Detail satu chat history milik user, termasuk response text dan chart.
+    """,
+    responses={
+        200: openapi.Response(
+            description="Detail chat history",
+            examples={
+                "application/json": {
+                    "id": 1,
+                    "user_message": "Berapa target NPS?",
+                    "response_text": "Target NPS adalah...",
+                    "response_chart_json": None,
+                    "document_ids": None,
+                    "corpus_snapshot": 12,
+                    "conversation_id": "conv-123",
+                    "created_at": "2026-01-30T12:00:00Z"
+                }
+            }
+        ),
         401: unauthorized_response,
+        404: openapi.Response(description="Chat history tidak ditemukan"),
     },
     security=[{'Bearer': []}],
     tags=['Chat']
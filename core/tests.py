@@ -1,3 +1,1311 @@
-from django.test import TestCase
+import cProfile
+import json
+import os
+import pstats
+import stat
+import tempfile
+import time
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import jwt
+import numpy as np
+import requests
+from cryptography.hazmat.primitives.asymmetric import rsa
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+
+from core import shared_state
+from core.admission import AdmissionRejected, AdmissionStore, admit_llm_call
+from core.authentication import LocalVerificationUnavailable, SSOAuthentication, SSOKeyStore
+from core.chart_builder import (
+    COLUMN_NUMBER, COLUMN_TEXT, ChartBuilder, ChartSpecError, aggregate, is_number, mentioned,
+)
+from core.chat_helper import (
+    INTENT_AGGREGATE, INTENT_CHART, INTENT_GENERAL, INTENT_LISTING, INTENT_SMALLTALK,
+    answer_locally, classify_intent,
+)
+from core.compression import CODEC_LZMA, CODEC_NONE, CODEC_ZLIB, EncodedText, decode_text
+from core.deadline import DeadlineExceeded, DeadlineMiddleware, _db_deadline, _deadline
+from core.deepseek_service import DeepSeekService
+from core.downsampling import (
+    OTHERS_LABEL, bucket_aggregate, downsample_chart, downsample_structured_data, lttb_indices,
+    select_indices,
+)
+from core.llm_routing import (
+    DEFAULT_MAX_TOKENS, ROUTE_ANALYSIS, ROUTE_CHART, ROUTE_DEFAULT, ROUTE_SHORT, ROUTE_STANDARD,
+    escalate_route, parse_route, select_route,
+)
+from core.metrics import ARCHIVE_FILENAME, MetricsRegistry, _write_json, render_text
+from core.profiling import profile_filename
+from core.text_stats import (
+    LANGUAGE_EN, LANGUAGE_ID, LANGUAGE_UNKNOWN, compute_stats, count_sentences, estimate_tokens,
+    structured_data_tokens,
+)
+from core.timing import RequestTimingMiddleware, annotate, current_timings, phase
+from core.token_cache import SharedTokenCache, VerificationUnavailable
+from documents.models import Document
+
+
+TEST_SIGNING_KEY = 'secret-key-for-tests-only-0123456789'
+
+
+def make_token(user_id='user-1'):
+    return jwt.encode({'user_id': user_id, 'exp': 4102444800}, TEST_SIGNING_KEY, algorithm='HS256')
+
+
+def api_client(test, **headers):
+    """Client ter-autentikasi sebagai user-1 (verifikasi SSO di-mock selama test)"""
+    auth = mock.patch('core.authentication.SharedTokenCache.get_or_verify', return_value='user-1')
+    auth.start()
+    test.addCleanup(auth.stop)
+    return Client(HTTP_AUTHORIZATION='Bearer token', **headers)
+
+
+class SharedStateTests(SimpleTestCase):
+    """File state SQLite antar worker hanya dipakai jika privat untuk user proses"""
+    
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.directory = os.path.join(self.tmp.name, 'state')
+    
+    def test_creates_private_directory_and_file(self):
+        path = os.path.join(self.directory, 'state.sqlite3')
+        shared_state.connect(path).close()
+        self.assertEqual(stat.S_IMODE(os.stat(self.directory).st_mode) & 0o077, 0)
+        self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o600)
+    
+    def test_rejects_world_writable_directory(self):
+        os.makedirs(self.directory)
+        os.chmod(self.directory, 0o1777)
+        with self.assertRaises(shared_state.UnsafeSharedPath):
+            shared_state.connect(os.path.join(self.directory, 'state.sqlite3'))
+    
+    def test_rejects_file_readable_by_others(self):
+        os.makedirs(self.directory, mode=0o700)
+        path = os.path.join(self.directory, 'state.sqlite3')
+        with open(path, 'w'):
+            pass
+        os.chmod(path, 0o644)
+        with self.assertRaises(shared_state.UnsafeSharedPath):
+            shared_state.connect(path)
+    
+    def test_rejects_symlink(self):
+        os.makedirs(self.directory, mode=0o700)
+        target = os.path.join(self.directory, 'target.sqlite3')
+        with open(target, 'w'):
+            pass
+        os.chmod(target, 0o600)
+        path = os.path.join(self.directory, 'state.sqlite3')
+        os.symlink(target, path)
+        with self.assertRaises(OSError):
+            shared_state.connect(path)
+    
+    @mock.patch('core.shared_state.os.geteuid', return_value=12345)
+    def test_rejects_file_owned_by_another_user(self, _):
+        with self.assertRaises(shared_state.UnsafeSharedPath):
+            shared_state.connect(os.path.join(self.directory, 'state.sqlite3'))
+
+
+class SharedTokenCacheTests(SimpleTestCase):
+    """Negative caching hanya untuk token yang pasti ditolak"""
+    
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        settings_override = override_settings(
+            SSO_TOKEN_SHARED_CACHE_PATH=os.path.join(self.tmp.name, 'state', 'tokens.sqlite3'),
+            SSO_VERIFY_MODE='remote',
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        SharedTokenCache._local.__dict__.clear()
+        self.addCleanup(SharedTokenCache._local.__dict__.clear)
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.auth = SSOAuthentication()
+        self.token = make_token()
+    
+    def _verify(self, **post):
+        with mock.patch('core.authentication.requests.post', **post):
+            return SharedTokenCache.get_or_verify(self.token, self.auth.verify_token_with_sso)
+    
+    def _sso_status(self, status_code):
+        return {'return_value': mock.Mock(status_code=status_code)}
+    
+    def test_valid_token_is_cached(self):
+        self.assertEqual(self._verify(**self._sso_status(200)), 'user-1')
+        self.assertEqual(self._verify(side_effect=AssertionError('tidak boleh memanggil SSO')), 'user-1')
+    
+    def test_rejected_token_is_cached_as_invalid(self):
+        self.assertIsNone(self._verify(**self._sso_status(401)))
+        self.assertIsNone(self._verify(**self._sso_status(200)))
+    
+    def test_sso_server_error_is_not_cached(self):
+        self.assertIsNone(self._verify(**self._sso_status(503)))
+        self.assertEqual(self._verify(**self._sso_status(200)), 'user-1')
+    
+    def test_sso_timeout_is_not_cached(self):
+        self.assertIsNone(self._verify(side_effect=requests.Timeout()))
+        self.assertEqual(self._verify(**self._sso_status(200)), 'user-1')
+    
+    def test_sso_connection_error_is_not_cached(self):
+        self.assertIsNone(self._verify(side_effect=requests.ConnectionError()))
+        self.assertEqual(self._verify(**self._sso_status(200)), 'user-1')
+    
+    def test_negative_result_is_shared_between_workers(self):
+        self.assertIsNone(self._verify(**self._sso_status(403)))
+        # Worker lain: L1 kosong, hasil dibaca dari file SQLite
+        cache.clear()
+        self.assertIsNone(self._verify(**self._sso_status(200)))
+    
+    @override_settings(SSO_VERIFY_MODE='local', SSO_JWT_ALGORITHMS=['HS256'])
+    def test_local_mode_without_keys_is_not_cached(self):
+        get_key = 'core.authentication.SSOKeyStore.get_key'
+        with mock.patch(get_key, side_effect=LocalVerificationUnavailable):
+            self.assertIsNone(SharedTokenCache.get_or_verify(self.token, self.auth.verify_token_with_sso))
+        with mock.patch(get_key, return_value=TEST_SIGNING_KEY):
+            self.assertEqual(
+                SharedTokenCache.get_or_verify(self.token, self.auth.verify_token_with_sso), 'user-1'
+            )
+    
+    @override_settings(SSO_VERIFY_MODE='local', SSO_JWT_ALGORITHMS=['HS256'])
+    def test_local_mode_invalid_signature_is_cached(self):
+        get_key = 'core.authentication.SSOKeyStore.get_key'
+        with mock.patch(get_key, return_value='kunci-lain-' + TEST_SIGNING_KEY):
+            self.assertIsNone(SharedTokenCache.get_or_verify(self.token, self.auth.verify_token_with_sso))
+        with mock.patch(get_key, return_value=TEST_SIGNING_KEY):
+            self.assertIsNone(SharedTokenCache.get_or_verify(self.token, self.auth.verify_token_with_sso))
+    
+    def test_unsafe_shared_file_falls_back_to_process_cache(self):
+        directory = os.path.join(self.tmp.name, 'state')
+        os.makedirs(directory)
+        os.chmod(directory, 0o777)
+        with self.assertLogs('core.token_cache', 'WARNING'):
+            self.assertIsNone(SharedTokenCache._conn())
+        self.assertEqual(self._verify(**self._sso_status(200)), 'user-1')
+        self.assertFalse(os.path.exists(os.path.join(directory, 'tokens.sqlite3')))
+
+
+def rsa_key_pair(kid):
+    """(private key, JWK dict public key) untuk token RS256 dengan kid tertentu"""
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(private_key.public_key()))
+    jwk.update(kid=kid, alg='RS256', use='sig')
+    return private_key, jwk
+
+
+@override_settings(
+    SSO_JWT_ALGORITHMS=['HS256', 'RS256'],
+    SSO_JWT_SIGNING_KEY=TEST_SIGNING_KEY,
+    SSO_JWT_PUBLIC_KEY='',
+    SSO_JWKS_URL='https://sso.test/.well-known/jwks.json',
+    SSO_JWKS_CACHE_TTL=300,
+    SSO_JWKS_MIN_REFRESH_INTERVAL=30,
+    SSO_JWT_AUDIENCE='',
+    SSO_JWT_ISSUER='',
+)
+class LocalVerificationTests(SimpleTestCase):
+    """Verifikasi JWT lokal (HS*/JWKS), refresh JWKS, rotasi kid dan mode hybrid"""
+    
+    key_1 = rsa_key_pair('kunci-1')
+    key_2 = rsa_key_pair('kunci-2')
+    
+    def setUp(self):
+        for name, value in (('_keys', {}), ('_fetched_at', 0.0), ('_last_attempt', 0.0), ('_refreshing', False)):
+            setattr(SSOKeyStore, name, value)
+            self.addCleanup(setattr, SSOKeyStore, name, value)
+        self.auth = SSOAuthentication()
+    
+    @staticmethod
+    def _rs_token(key_pair, **claims):
+        private_key, jwk = key_pair
+        payload = {'user_id': 'user-1', 'exp': 4102444800, **claims}
+        return jwt.encode(payload, private_key, algorithm='RS256', headers={'kid': jwk['kid']})
+    
+    @staticmethod
+    def _jwks(*key_pairs):
+        response = mock.Mock(status_code=200)
+        response.json.return_value = {'keys': [jwk for _, jwk in key_pairs]}
+        return response
+    
+    def _verify_rs(self, token, *key_pairs):
+        with mock.patch('core.authentication.requests.get', return_value=self._jwks(*key_pairs)) as get:
+            user_id = self.auth.verify_token_locally(token)
+        return user_id, get.call_count
+    
+    def test_hs256_claims(self):
+        def hs_token(**claims):
+            payload = {'user_id': 'user-1', 'exp': 4102444800, **claims}
+            return jwt.encode(payload, TEST_SIGNING_KEY, algorithm='HS256')
+        
+        self.assertEqual(self.auth.verify_token_locally(hs_token()), 'user-1')
+        self.assertIsNone(self.auth.verify_token_locally(hs_token(exp=int(time.time()) - 60)))
+        self.assertIsNone(self.auth.verify_token_locally(hs_token(token_type='refresh')))
+        self.assertIsNone(self.auth.verify_token_locally('bukan-jwt'))
+        with override_settings(SSO_JWT_AUDIENCE='rag'):
+            self.assertIsNone(self.auth.verify_token_locally(hs_token(aud='lain')))
+            self.assertEqual(self.auth.verify_token_locally(hs_token(aud='rag')), 'user-1')
+        with override_settings(SSO_JWT_ALGORITHMS=['RS256']):
+            self.assertIsNone(self.auth.verify_token_locally(hs_token()))
+    
+    def test_jwks_is_fetched_once_and_cached(self):
+        token = self._rs_token(self.key_1)
+        self.assertEqual(self._verify_rs(token, self.key_1), ('user-1', 1))
+        self.assertEqual(self._verify_rs(token, self.key_1), ('user-1', 0))
+        # Ditandatangani kunci lain dengan kid yang sama: signature invalid
+        forged = self._rs_token((self.key_2[0], self.key_1[1]))
+        self.assertEqual(self._verify_rs(forged, self.key_1), (None, 0))
+    
+    def test_unknown_kid_forces_refresh_after_rotation(self):
+        self.assertEqual(self._verify_rs(self._rs_token(self.key_1), self.key_1), ('user-1', 1))
+        SSOKeyStore._last_attempt -= 60
+        # SSO merotasi kunci: kid baru memicu refresh paksa meskipun cache belum expired
+        self.assertEqual(self._verify_rs(self._rs_token(self.key_2), self.key_2), ('user-1', 1))
+    
+    def test_unknown_kid_refresh_is_rate_limited(self):
+        self.assertEqual(self._verify_rs(self._rs_token(self.key_1), self.key_1), ('user-1', 1))
+        with self.assertRaises(LocalVerificationUnavailable):
+            self._verify_rs(self._rs_token(self.key_2), self.key_2)
+        self.assertEqual(SSOKeyStore._keys.keys(), {'kunci-1'})
+    
+    def test_expired_jwks_is_refreshed_in_background(self):
+        token = self._rs_token(self.key_1)
+        self.assertEqual(self._verify_rs(token, self.key_1), ('user-1', 1))
+        SSOKeyStore._fetched_at -= 600
+        
+        fetched = mock.Mock(side_effect=lambda *args, **kwargs: self._jwks(self.key_1, self.key_2))
+        with mock.patch('core.authentication.requests.get', fetched):
+            # Kunci lama tetap dipakai tanpa menunggu refresh
+            self.assertEqual(self.auth.verify_token_locally(token), 'user-1')
+            for _ in range(100):
+                if not SSOKeyStore._refreshing:
+                    break
+                time.sleep(0.01)
+        self.assertEqual(fetched.call_count, 1)
+        self.assertEqual(SSOKeyStore._keys.keys(), {'kunci-1', 'kunci-2'})
+    
+    def test_jwks_outage_keeps_previous_keys(self):
+        self.assertEqual(self._verify_rs(self._rs_token(self.key_1), self.key_1), ('user-1', 1))
+        SSOKeyStore._last_attempt -= 60
+        with mock.patch('core.authentication.requests.get', side_effect=requests.ConnectionError()):
+            with self.assertRaises(LocalVerificationUnavailable):
+                self.auth.verify_token_locally(self._rs_token(self.key_2))
+            self.assertEqual(self.auth.verify_token_locally(self._rs_token(self.key_1)), 'user-1')
+    
+    def test_hybrid_falls_back_to_sso_only_when_keys_are_unavailable(self):
+        token = self._rs_token(self.key_1)
+        with override_settings(SSO_VERIFY_MODE='hybrid'), \
+                mock.patch('core.authentication.requests.get', side_effect=requests.ConnectionError()), \
+                mock.patch('core.authentication.requests.post', return_value=mock.Mock(status_code=200)) as post:
+            self.assertEqual(self.auth.verify_token_with_sso(token), 'user-1')
+            self.assertEqual(post.call_count, 1)
+            
+            # Signature invalid dengan kunci tersedia: ditolak tanpa bertanya ke SSO
+            SSOKeyStore._keys = {'kunci-1': self.key_2[0].public_key()}
+            self.assertIsNone(self.auth.verify_token_with_sso(token))
+            self.assertEqual(post.call_count, 1)
+        
+        SSOKeyStore._keys = {}
+        with override_settings(SSO_VERIFY_MODE='local'), \
+                mock.patch('core.authentication.requests.get', side_effect=requests.ConnectionError()):
+            with self.assertRaises(VerificationUnavailable):
+                self.auth.verify_token_with_sso(token)
+
+
+class PrivateStateMixin:
+    """Direktori privat sementara untuk file state SQLite admission control"""
+    
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.state_dir = os.path.join(self.tmp.name, 'state')
+        settings_override = override_settings(
+            ADMISSION_SHARED_PATH=os.path.join(self.state_dir, 'admission.sqlite3'),
+            REQUEST_TIMING_LOG=False,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        AdmissionStore._local.__dict__.clear()
+        self.addCleanup(AdmissionStore._local.__dict__.clear)
+        auth = mock.patch('core.authentication.SharedTokenCache.get_or_verify', return_value='user-1')
+        auth.start()
+        self.addCleanup(auth.stop)
+        self.client = Client(HTTP_AUTHORIZATION='Bearer token')
+
+
+def deepseek_response(content='{"text": "ok", "chart": null}', usage=None, finish_reason='stop'):
+    response = mock.Mock(status_code=200)
+    response.json.return_value = {
+        'choices': [{'message': {'content': content}, 'finish_reason': finish_reason}],
+        'usage': usage or {'prompt_tokens': 100, 'completion_tokens': 10},
+    }
+    return response
+
+
+class AdmissionControlTests(PrivateStateMixin, TestCase):
+    """Token bucket per user dan slot LLM global (429 + Retry-After)"""
+    
+    @override_settings(ADMISSION_REQUEST_BURST=2, ADMISSION_REQUEST_RATE=0.01)
+    def test_request_bucket_rejects_chat_with_retry_after(self):
+        Document.objects.create(
+            owner_user_id='user-1', title='Laporan', content='Revenue naik.', source_filename='laporan.txt',
+        )
+        payload = {'message': 'Berapa revenue bulan ini?'}
+        for _ in range(2):
+            response = self.client.post('/api/chat/?dry_run=1', payload, content_type='application/json')
+            self.assertEqual(response.status_code, 200)
+        response = self.client.post('/api/chat/?dry_run=1', payload, content_type='application/json')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+    
+    @override_settings(ADMISSION_REQUEST_BURST=2, ADMISSION_REQUEST_RATE=0.01)
+    def test_document_endpoints_are_not_throttled(self):
+        for _ in range(5):
+            self.assertEqual(self.client.get('/api/documents/').status_code, 200)
+    
+    @override_settings(ADMISSION_LLM_TOKEN_BURST=50, ADMISSION_LLM_TOKEN_RATE=0.01)
+    def test_llm_token_quota_rejects_chat_without_calling_llm(self):
+        Document.objects.create(
+            owner_user_id='user-1', title='Laporan', content='Revenue naik tajam. ' * 200,
+            source_filename='laporan.txt',
+        )
+        payload = {'message': 'Berapa revenue bulan ini?'}
+        with mock.patch('core.deepseek_service.DeepSeekService._post', return_value=deepseek_response()) as post:
+            first = self.client.post('/api/chat/', payload, content_type='application/json')
+            second = self.client.post('/api/chat/', payload, content_type='application/json')
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 429)
+        self.assertIn('Retry-After', second)
+        self.assertEqual(post.call_count, 1)
+    
+    @override_settings(ADMISSION_LLM_MAX_CONCURRENCY=1, ADMISSION_LLM_QUEUE_TIMEOUT=0.2)
+    def test_queue_timeout_removes_waiter(self):
+        held = AdmissionStore.acquire_slot(1)
+        self.addCleanup(AdmissionStore.release_slot, held)
+        with self.assertRaises(AdmissionRejected) as raised:
+            with admit_llm_call('user-2', 10, 'standard'):
+                self.fail('slot tidak boleh didapat')
+        self.assertEqual(raised.exception.reason, 'queue_timeout')
+        self.assertEqual(AdmissionStore.llm_status(), {'active': 1, 'waiting': 0})
+    
+    @override_settings(METRICS_ENABLED=True, METRICS_AUTH_TOKEN='', METRICS_DIR='')
+    def test_llm_status_is_exported_in_metrics(self):
+        held = AdmissionStore.acquire_slot(1)
+        self.addCleanup(AdmissionStore.release_slot, held)
+        body = Client().get('/metrics').content.decode()
+        self.assertIn('# TYPE noc_rag_llm_slots_active gauge', body)
+        self.assertIn('noc_rag_llm_slots_active 1\n', body)
+        self.assertIn('noc_rag_llm_queue_waiting 0\n', body)
+    
+    @override_settings(ADMISSION_LLM_MAX_CONCURRENCY=1, ADMISSION_LLM_QUEUE_SIZE=0)
+    def test_queue_full_rejects_immediately(self):
+        held = AdmissionStore.acquire_slot(1)
+        self.addCleanup(AdmissionStore.release_slot, held)
+        with self.assertRaises(AdmissionRejected) as raised:
+            AdmissionStore.acquire_slot(1)
+        self.assertEqual(raised.exception.reason, 'queue_full')
+    
+    def test_unsafe_state_file_is_not_used(self):
+        os.makedirs(self.state_dir)
+        os.chmod(self.state_dir, 0o777)
+        with self.assertLogs('core.admission', 'WARNING'):
+            self.assertEqual(AdmissionStore.take('req:user-1', 1, 1, 0.01), 0)
+        self.assertEqual(AdmissionStore.take('req:user-1', 1, 1, 0.01), 0)
+        self.assertFalse(os.path.exists(os.path.join(self.state_dir, 'admission.sqlite3')))
+
+
+class IntentRouterTests(SimpleTestCase):
+    """Klasifikasi message oleh regex gabungan intent router"""
+    
+    def test_classifies_each_intent(self):
+        cases = {
+            'buatkan grafik capaian per bulan': INTENT_CHART,
+            'total Capaian di sheet FRT': INTENT_AGGREGATE,
+            'dokumen apa saja yang ada?': INTENT_LISTING,
+            'halo, selamat pagi': INTENT_SMALLTALK,
+            'jelaskan isi laporan kuartal tiga': INTENT_GENERAL,
+        }
+        for message, intent in cases.items():
+            with self.subTest(message=message):
+                self.assertEqual(classify_intent(message).intent, intent)
+    
+    def test_specific_phrase_wins_over_aggregate_keyword(self):
+        self.assertEqual(classify_intent('jumlah dokumen berapa?').intent, INTENT_LISTING)
+    
+    def test_chart_keyword_sets_include_chart(self):
+        routed = classify_intent('total capaian, tampilkan dalam grafik')
+        self.assertTrue(routed.include_chart)
+        self.assertIsNone(answer_locally(routed, 'total capaian, tampilkan dalam grafik'))
+
+
+def sheet_data(name, columns, rows):
+    return {'sheets': [{'name': name, 'columns': columns, 'rows': rows}]}
+
+
+class ChartBuilderTests(SimpleTestCase):
+    """Chart.js dibangun di server dari chart spec / heuristik atas structured_data"""
+    
+    def setUp(self):
+        self.documents = [{
+            'id': 7, 'title': 'Penjualan',
+            'structured_data': sheet_data('Omzet', ['Region', 'Bulan', 'Target', 'Actual'], [
+                ['Barat', '2025-01-01', 100, 90],
+                ['Timur', '2025-01-01', 80, 120],
+                ['Barat', '2025-02-01', 110, 95.5],
+                ['Utara', '2025-02-01', 50, None],
+            ]),
+        }]
+    
+    def test_column_types_tolerate_sparse_text(self):
+        sheet = {'columns': ['Nama', 'Nilai', 'Kosong'], 'rows': [
+            ['a', 1, None], ['b', 2, ''], ['c', 3, None], ['d', 4, None], ['e', 'n/a', None],
+        ]}
+        self.assertEqual(ChartBuilder.column_types(sheet), [COLUMN_TEXT, COLUMN_NUMBER, COLUMN_TEXT])
+    
+    def test_build_aggregates_per_label(self):
+        chart = ChartBuilder.build(
+            {'doc_id': '7', 'sheet': 'omzet', 'type': 'BAR', 'x': 'region', 'y': ['Actual'], 'agg': 'sum'},
+            self.documents,
+        )
+        self.assertEqual(chart['type'], 'bar')
+        self.assertEqual(chart['data']['labels'], ['Barat', 'Timur', 'Utara'])
+        self.assertEqual(chart['data']['datasets'][0]['label'], 'Actual')
+        self.assertEqual(chart['data']['datasets'][0]['data'], [185.5, 120, None])
+    
+    def test_build_count_needs_no_y_column(self):
+        chart = ChartBuilder.build({'x': 'Region', 'agg': 'count', 'type': 'pie'}, self.documents)
+        self.assertEqual(chart['data']['datasets'][0]['label'], 'Jumlah')
+        self.assertEqual(chart['data']['datasets'][0]['data'], [2, 1, 1])
+        self.assertEqual(len(chart['data']['datasets'][0]['backgroundColor']), 3)
+    
+    def test_sort_is_case_insensitive_and_keeps_empty_values_last(self):
+        spec = {'x': 'Region', 'y': 'Actual', 'agg': 'max', 'limit': '2'}
+        for sort in ('DESC', ' Desc '):
+            chart = ChartBuilder.build({**spec, 'sort': sort}, self.documents)
+            self.assertEqual(chart['data']['labels'], ['Timur', 'Barat'])
+        chart = ChartBuilder.build({'x': 'Region', 'y': 'Actual', 'agg': 'max', 'sort': 'Asc'}, self.documents)
+        self.assertEqual(chart['data']['labels'], ['Barat', 'Timur', 'Utara'])
+    
+    def test_invalid_spec_raises(self):
+        invalid_specs = [
+            {'y': 'Actual', 'type': 'radar'},
+            {'y': 'Actual', 'agg': 'median'},
+            {'y': 'Region'},
+            {'y': 'Tidak Ada'},
+            {'y': 'Actual', 'sheet': 'Lain'},
+            {'y': 'Actual', 'doc_id': 99},
+            {'y': 'Actual', 'limit': 'banyak'},
+            {'agg': 'sum'},
+        ]
+        for spec in invalid_specs:
+            with self.subTest(spec=spec), self.assertRaises(ChartSpecError):
+                ChartBuilder.build(spec, self.documents)
+    
+    def test_infer_spec_uses_mentioned_columns_and_keywords(self):
+        spec = ChartBuilder.infer_spec('Tampilkan rata-rata target per region', self.documents)
+        self.assertEqual(spec, {
+            'doc_id': 7, 'sheet': 'Omzet', 'type': 'bar', 'x': 'Region', 'y': ['Target'],
+            'agg': 'avg', 'title': 'Omzet',
+        })
+        spec = ChartBuilder.infer_spec('Tren actual per bulan', self.documents)
+        self.assertEqual((spec['type'], spec['x'], spec['y'], spec['agg']), ('line', 'Bulan', ['Actual'], 'sum'))
+        self.assertEqual(ChartBuilder.infer_spec('proporsi', self.documents)['type'], 'pie')
+        self.assertIsNone(ChartBuilder.infer_spec('grafik', [{'id': 1, 'structured_data': None}]))
+    
+    def test_shared_helpers(self):
+        self.assertTrue(is_number(1.5))
+        self.assertFalse(is_number(True))
+        self.assertFalse(is_number('3'))
+        self.assertEqual([aggregate([1, 2.5], agg) for agg in ('sum', 'avg', 'min', 'max', 'count')],
+                         [3.5, 1.75, 1, 2.5, 2])
+        self.assertIsNone(aggregate([], 'sum'))
+        self.assertEqual(mentioned('First Response Time', 'berapa response time?'), 1)
+        self.assertEqual(mentioned('Omzet', 'berapa revenue?'), 0)
+        self.assertEqual(mentioned(None, 'apa saja'), 0)
+    
+    def test_resolve_chart(self):
+        llm_spec = {'sheet': 'Omzet', 'x': 'Region', 'y': ['Target'], 'agg': 'sum', 'type': 'line'}
+        self.assertEqual(ChartBuilder.resolve_chart(llm_spec, 'grafik', self.documents, 'llm')['type'], 'line')
+        
+        # Spec LLM tidak valid: fallback ke heuristik
+        invalid = {'sheet': 'Omzet', 'y': ['Tidak Ada']}
+        chart = ChartBuilder.resolve_chart(invalid, 'grafik target per region', self.documents, 'llm')
+        self.assertEqual(chart['data']['datasets'][0]['label'], 'Target')
+        
+        config = {'type': 'bar', 'data': {'labels': ['a'], 'datasets': []}}
+        self.assertIs(ChartBuilder.resolve_chart(config, 'grafik', self.documents, 'llm'), config)
+        self.assertNotEqual(ChartBuilder.resolve_chart(config, 'grafik', self.documents, 'heuristic'), config)
+        self.assertIsNone(ChartBuilder.resolve_chart('bukan chart', 'grafik', [], 'llm'))
+        self.assertIsNone(ChartBuilder.resolve_chart(None, 'grafik', [], 'heuristic'))
+
+
+class DownsamplingTests(SimpleTestCase):
+    """Reduksi titik chart (LTTB, time-bucket, top-N) dan rows sheet untuk prompt"""
+    
+    def test_lttb_keeps_endpoints_and_peaks(self):
+        x = np.arange(1000, dtype=np.float64)
+        y = np.sin(x / 50)
+        y[437] = 25.0
+        indices = lttb_indices(x, y, 50)
+        self.assertEqual(len(indices), 50)
+        self.assertEqual((indices[0], indices[-1]), (0, 999))
+        self.assertTrue(np.all(np.diff(indices) > 0))
+        self.assertIn(437, indices)
+        np.testing.assert_array_equal(lttb_indices(x[:10], y[:10], 50), np.arange(10))
+    
+    def test_select_indices_respects_max_points_for_many_series(self):
+        x = np.arange(2000, dtype=np.float64)
+        rng = np.random.default_rng(0)
+        series = [rng.normal(size=2000) for _ in range(4)]
+        series[1][::2] = np.nan
+        indices = select_indices(x, series, 100)
+        self.assertLessEqual(len(indices), 100)
+        self.assertEqual((indices[0], indices[-1]), (0, 1999))
+    
+    def test_bucket_aggregate_mean_and_sum_skip_empty_buckets(self):
+        t = np.array([0, 1, 2, 9, 10], dtype=np.float64)
+        y = np.array([1, 3, np.nan, 4, 6], dtype=np.float64)
+        first_index, (means,) = bucket_aggregate(t, [y], 5)
+        np.testing.assert_array_equal(first_index, [0, 2, 3])
+        np.testing.assert_array_equal(means, [2, np.nan, 5])
+        _, (sums,) = bucket_aggregate(t, [y], 5, agg='sum')
+        np.testing.assert_array_equal(sums, [4, np.nan, 10])
+    
+    def test_pie_keeps_top_slices_and_groups_the_rest(self):
+        chart = {
+            'type': 'pie',
+            'data': {
+                'labels': ['a', 'b', 'c', 'd', 'e'],
+                'datasets': [{'data': [5, 40, None, 30, 2.5], 'backgroundColor': ['#1', '#2', '#3', '#4', '#5']}],
+            },
+        }
+        result = downsample_chart(chart, 3)
+        self.assertEqual(result['data']['labels'], ['b', 'd', OTHERS_LABEL])
+        self.assertEqual(result['data']['datasets'][0]['data'], [40, 30, 7.5])
+        self.assertEqual(result['data']['datasets'][0]['backgroundColor'], ['#1', '#2', '#3'])
+        # Input tidak diubah
+        self.assertEqual(len(chart['data']['labels']), 5)
+    
+    def test_bar_with_dates_is_bucketed(self):
+        labels = [f'2025-01-{day:02d}' for day in range(1, 31)]
+        chart = {
+            'type': 'bar',
+            'data': {'labels': labels, 'datasets': [{'label': 'Tiket', 'data': list(range(30))}]},
+        }
+        result = downsample_chart(chart, 3)
+        self.assertEqual(result['data']['labels'], ['2025-01-01', '2025-01-11', '2025-01-21'])
+        self.assertEqual(result['data']['datasets'][0]['data'], [4.5, 14.5, 24.5])
+    
+    def test_line_is_reduced_with_shared_indices(self):
+        labels = [str(i) for i in range(600)]
+        chart = {
+            'type': 'line',
+            'data': {'labels': labels, 'datasets': [
+                {'data': [float(i % 37) for i in range(600)], 'pointRadius': [1] * 600},
+                {'data': [float(i) for i in range(600)]},
+            ]},
+        }
+        result = downsample_chart(chart, 50)
+        kept = result['data']['labels']
+        self.assertLessEqual(len(kept), 50)
+        self.assertEqual((kept[0], kept[-1]), ('0', '599'))
+        for ds in result['data']['datasets']:
+            self.assertEqual(len(ds['data']), len(kept))
+        self.assertEqual(len(result['data']['datasets'][0]['pointRadius']), len(kept))
+        self.assertIs(downsample_chart(chart, 1000), chart)
+    
+    def test_structured_data_rows_are_sampled_per_sheet(self):
+        rows = [[f'2025-01-01T00:{i // 60:02d}:{i % 60:02d}', i % 17, 'catatan'] for i in range(300)]
+        structured_data = {'sheets': [
+            {'name': 'Besar', 'columns': ['Waktu', 'Nilai', 'Catatan'], 'rows': rows},
+            {'name': 'Kecil', 'columns': ['A'], 'rows': [[1], [2]]},
+        ]}
+        result = downsample_structured_data(structured_data, 40)
+        big, small = result['sheets']
+        self.assertEqual((big['total_rows'], big['downsampled']), (300, True))
+        self.assertLessEqual(len(big['rows']), 40)
+        self.assertEqual((big['rows'][0], big['rows'][-1]), (rows[0], rows[-1]))
+        self.assertTrue(all(row in rows for row in big['rows']))
+        self.assertIs(small, structured_data['sheets'][1])
+        self.assertEqual(len(structured_data['sheets'][0]['rows']), 300)
+        self.assertIs(downsample_structured_data(structured_data, 500), structured_data)
+
+
+class TextStatsTests(SimpleTestCase):
+    """Estimasi token dan statistik teks yang dihitung saat ingestion"""
+    
+    def test_estimate_tokens_heuristics(self):
+        cases = {
+            '': 0,
+            'halo': 1,
+            'pendapatan': 2,            # 1 token per 5 huruf
+            '2025': 2,                  # 1 token per 3 digit
+            '你好': 2,                   # 1 token per karakter CJK
+            'naik, turun!': 4,          # tanda baca 1 token
+            'Revenue Q3 2025 = 1.250': 10,
+        }
+        for text, expected in cases.items():
+            with self.subTest(text=text):
+                self.assertEqual(estimate_tokens(text), expected)
+        self.assertEqual(estimate_tokens(None), 0)
+        self.assertEqual(estimate_tokens('kata ' * 1000), 1000)
+    
+    def test_count_sentences(self):
+        self.assertEqual(count_sentences('Satu. Dua! Tiga?'), 3)
+        self.assertEqual(count_sentences('Judul\n\nParagraf tanpa titik'), 2)
+        self.assertEqual(count_sentences('Versi 1.2 rilis.\n\n'), 1)
+        self.assertEqual(count_sentences('   '), 0)
+    
+    def test_compute_stats(self):
+        content = 'Capaian bulan ini adalah yang tertinggi dari tahun lalu.\nTarget untuk bulan depan sudah ditetapkan.'
+        stats = compute_stats(content, {'sheets': [{'name': 'A', 'columns': ['x'], 'rows': [[1]]}]})
+        self.assertEqual(stats['content_length'], len(content))
+        self.assertEqual(stats['token_count'], estimate_tokens(content))
+        self.assertGreater(stats['structured_token_count'], 0)
+        self.assertEqual((stats['line_count'], stats['sentence_count'], stats['chunk_count']), (2, 2, 1))
+        self.assertEqual(stats['language'], LANGUAGE_ID)
+        
+        english = compute_stats('The report of the region is ready and the data for this month will be shared.')
+        self.assertEqual(english['language'], LANGUAGE_EN)
+        self.assertEqual(compute_stats(None), {
+            'content_length': 0, 'token_count': 0, 'structured_token_count': 0, 'line_count': 0,
+            'sentence_count': 0, 'chunk_count': 0, 'language': LANGUAGE_UNKNOWN,
+        })
+        self.assertEqual(compute_stats('x' * 20001)['chunk_count'], 3)
+        self.assertEqual(structured_data_tokens({'bukan': object()}), 0)
+
+
+@override_settings(DOCUMENT_CONTEXT_MAX_LENGTH=1000, DEEPSEEK_PRICE_INPUT_PER_M=1.0,
+                   DEEPSEEK_PRICE_CACHED_INPUT_PER_M=0.1, DEEPSEEK_PRICE_OUTPUT_PER_M=2.0,
+                   DEEPSEEK_CONTEXT_TOKENS=128000)
+class PlanCallTests(SimpleTestCase):
+    """DeepSeekService.plan_call: alokasi konteks, cache prefix dan estimasi biaya tanpa API"""
+    
+    documents = [
+        {'id': 1, 'title': 'Pendek', 'content': 'Capaian naik.', 'token_count': 3, 'structured_token_count': 0},
+        {'id': 2, 'title': 'Panjang', 'content': 'data ' * 400, 'token_count': 400},
+    ]
+    
+    def _plan(self, **kwargs):
+        with mock.patch('core.deepseek_service.requests.post') as post:
+            plan = DeepSeekService.plan_call(message='Berapa capaian?', documents=self.documents, **kwargs)
+        post.assert_not_called()
+        return plan
+    
+    def test_context_allocation_per_document(self):
+        plan = self._plan(corpus_snapshot_id=9)
+        short, long = plan['context']['documents']
+        self.assertEqual((short['id'], short['budget_chars'], short['truncated']), (1, 500, False))
+        self.assertEqual(short['included_chars'], short['source_chars'])
+        self.assertEqual(short['source_tokens'], 3)
+        self.assertTrue(long['truncated'])
+        self.assertEqual(long['source_chars'], 2000)
+        self.assertLess(long['included_chars'], long['source_chars'])
+        self.assertLess(long['included_tokens'], long['source_tokens'])
+        self.assertEqual(plan['context']['documents_count'], 2)
+        self.assertEqual(plan['warnings'], ['context_truncated'])
+        self.assertNotIn('offset', long)
+    
+    def test_prompt_tokens_and_cost(self):
+        plan = self._plan()
+        prompt = plan['prompt']
+        self.assertEqual(
+            prompt['estimated_tokens'],
+            prompt['system_tokens'] + prompt['history_tokens'] + prompt['user_prompt_tokens'],
+        )
+        cached = plan['cache']['expected_cached_tokens']
+        self.assertEqual(cached, prompt['system_tokens'])
+        expected_prompt_cost = ((prompt['estimated_tokens'] - cached) * 1.0 + cached * 0.1) / 1_000_000
+        self.assertAlmostEqual(plan['cost']['prompt'], expected_prompt_cost, places=6)
+        self.assertAlmostEqual(plan['cost']['completion_max'], plan['max_tokens'] * 2.0 / 1_000_000, places=6)
+        self.assertAlmostEqual(
+            plan['cost']['total_max'], plan['cost']['prompt'] + plan['cost']['completion_max'], delta=2e-6
+        )
+        self.assertEqual(plan['route']['model'], plan['model'])
+        self.assertNotIn('messages', plan)
+    
+    def test_recently_sent_prefix_counts_as_cached(self):
+        plan = self._plan(prefix_recently_sent=True)
+        self.assertTrue(plan['cache']['eligible'])
+        self.assertEqual(plan['cache']['expected_cached_tokens'], plan['cache']['prefix_tokens'])
+        
+        # History berubah setiap turn: hanya system prompt yang dianggap ter-cache
+        history = [{'role': 'user', 'content': 'Halo'}, {'role': 'assistant', 'content': 'Hai'}]
+        plan = self._plan(prefix_recently_sent=True, conversation_messages=history, include_messages=True)
+        self.assertEqual(plan['history']['messages'], 2)
+        self.assertEqual(plan['cache']['expected_cached_tokens'], plan['prompt']['system_tokens'])
+        self.assertEqual([m['role'] for m in plan['messages']], ['system', 'user', 'assistant', 'user'])
+    
+    @override_settings(DEEPSEEK_CONTEXT_TOKENS=1000)
+    def test_warns_when_prompt_exceeds_context_window(self):
+        self.assertIn('exceeds_context_window', self._plan()['warnings'])
+
+
+@override_settings(
+    LLM_ROUTING_ENABLED=True, DEEPSEEK_MODEL='deepseek-chat', LLM_SHORT_MAX_WORDS=5,
+    LLM_ANALYSIS_MIN_WORDS=20, LLM_DEEP_HISTORY_MESSAGES=4,
+    LLM_ROUTES={
+        'short': ',500,0.2', 'standard': ',2000,0.7', 'analysis': 'deepseek-reasoner,8000,',
+        'chart': ',6000,0.3',
+    },
+)
+class LLMRoutingTests(SimpleTestCase):
+    """Tabel LLM_ROUTES, klasifikasi query dan eskalasi jawaban terpotong"""
+    
+    def test_parse_route_table_entries(self):
+        route = parse_route('analysis', ' deepseek-reasoner , 8000 , 0.5 ')
+        self.assertEqual((route.model, route.max_tokens, route.temperature), ('deepseek-reasoner', 8000, 0.5))
+        route = parse_route('standard', '')
+        self.assertEqual((route.model, route.max_tokens), ('deepseek-chat', DEFAULT_MAX_TOKENS))
+        for value in ('a,1,0.1,x', 'm,banyak,0.3', 'm,0,0.3', 'm,100,2.5'):
+            with self.subTest(value=value), self.assertRaises(ImproperlyConfigured):
+                parse_route('short', value)
+    
+    def test_select_route_per_query_class(self):
+        cases = [
+            (('Berapa target?', True, 0), ROUTE_CHART),
+            (('Tolong bandingkan dua region', False, 0), ROUTE_ANALYSIS),
+            (('kata ' * 20, False, 0), ROUTE_ANALYSIS),
+            (('Berapa target bulan ini?', False, 0), ROUTE_SHORT),
+            (('Kenapa?', False, 4), ROUTE_STANDARD),
+            (('Berapa target dan capaian region barat bulan lalu?', False, 0), ROUTE_STANDARD),
+        ]
+        for args, expected in cases:
+            with self.subTest(args=args):
+                self.assertEqual(select_route(*args).name, expected)
+        route = select_route('Berapa target?')
+        self.assertEqual((route.model, route.max_tokens, route.temperature), ('deepseek-chat', 500, 0.2))
+        self.assertIn('pertanyaan singkat', route.reason)
+    
+    def test_unconfigured_class_and_disabled_routing_use_default(self):
+        with override_settings(LLM_ROUTES={}):
+            route = select_route('Berapa target?')
+            self.assertEqual((route.name, route.max_tokens), (ROUTE_SHORT, DEFAULT_MAX_TOKENS))
+        with override_settings(LLM_ROUTING_ENABLED=False):
+            self.assertEqual(select_route('Bandingkan region').name, ROUTE_DEFAULT)
+            self.assertIsNone(escalate_route(select_route('Berapa?')))
+    
+    def test_escalate_route_only_to_larger_budget(self):
+        longer = escalate_route(select_route('Berapa target?'))
+        self.assertEqual((longer.name, longer.model, longer.max_tokens), (ROUTE_ANALYSIS, 'deepseek-reasoner', 8000))
+        self.assertIsNone(escalate_route(select_route('Bandingkan region')))
+    
+    def _call(self, *responses):
+        with mock.patch('core.deepseek_service.DeepSeekService._post', side_effect=list(responses)) as post:
+            result = DeepSeekService.call_deepseek(message='Berapa target?', documents=[])
+        return result, [call.args[0] for call in post.call_args_list]
+    
+    def test_truncated_answer_is_retried_once_with_analysis_route(self):
+        truncated = deepseek_response('{"text": "Target bulan', finish_reason='length')
+        (data, error), payloads = self._call(truncated, deepseek_response('{"text": "lengkap", "chart": null}'))
+        self.assertIsNone(error)
+        self.assertEqual(data['text'], 'lengkap')
+        self.assertEqual([p['max_tokens'] for p in payloads], [500, 8000])
+        self.assertEqual(payloads[1]['model'], 'deepseek-reasoner')
+        
+        # Masih terpotong setelah eskalasi: tidak diulang lagi, teks mentah dikembalikan
+        (data, error), payloads = self._call(truncated, truncated)
+        self.assertEqual(len(payloads), 2)
+        self.assertEqual(data, {'text': '{"text": "Target bulan', 'chart': None})
+    
+    def test_no_escalation_when_answer_is_complete_or_time_is_short(self):
+        complete = deepseek_response('{"text": "ok", "chart": null}', finish_reason='length')
+        self.assertEqual(len(self._call(complete)[1]), 1)
+        
+        truncated = deepseek_response('{"text": "pot', finish_reason='length')
+        with mock.patch('core.deepseek_service.remaining', return_value=1.0):
+            (data, _), payloads = self._call(truncated)
+        self.assertEqual(len(payloads), 1)
+        self.assertEqual(data['chart'], None)
+
+
+class LocalAggregateTests(TestCase):
+    """Agregasi satu kolom sheet dijawab dari database tanpa LLM"""
+    
+    def setUp(self):
+        self.frt = Document.objects.create(
+            owner_user_id='user-1', title='KPI Layanan', content='-', source_filename='kpi.xlsx',
+            structured_data=sheet_data('First Response Time', ['Bulan', 'Capaian'], [
+                ['Januari', 10], ['Februari', 20.5], ['Maret', 30],
+            ]),
+        )
+        self.sales = Document.objects.create(
+            owner_user_id='user-1', title='Penjualan', content='-', source_filename='sales.xlsx',
+            structured_data=sheet_data('Penjualan', ['Region', 'Omzet'], [['Barat', 100], ['Timur', 250]]),
+        )
+    
+    def _answer(self, message):
+        return answer_locally(classify_intent(message), message, Document.objects.all())
+    
+    def test_structured_columns_filled_on_save(self):
+        self.assertEqual(self.frt.structured_columns, [
+            {'sheet': 'First Response Time', 'columns': ['Bulan', 'Capaian'], 'numeric': [1]},
+        ])
+    
+    def test_sum_and_row_count(self):
+        response, document_ids = self._answer('total Capaian')
+        self.assertIn('Total Capaian', response['text'])
+        self.assertIn('60,5', response['text'])
+        self.assertEqual(document_ids, [self.frt.id])
+        
+        response, _ = self._answer('berapa baris sheet First Response Time?')
+        self.assertIn('3 baris', response['text'])
+    
+    def test_loads_structured_data_of_target_document_only(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertIsNotNone(self._answer('rata-rata Omzet'))
+        loading = [query['sql'] for query in queries if '"structured_data"' in query['sql']]
+        self.assertEqual(len(loading), 1)
+        self.assertIn(f'"documents"."id" = {self.sales.id}', loading[0])
+    
+    def test_unknown_words_and_unknown_columns_go_to_llm(self):
+        self.assertIsNone(self._answer('total Omzet di Jawa Barat'))
+        self.assertIsNone(self._answer('total Biaya'))
+    
+    def test_ambiguous_column_needs_sheet_name(self):
+        Document.objects.create(
+            owner_user_id='user-1', title='KPI Lama', content='-', source_filename='kpi-lama.xlsx',
+            structured_data=sheet_data('Resolusi Tiket', ['Bulan', 'Capaian'], [['Januari', 5]]),
+        )
+        self.assertIsNone(self._answer('total Capaian'))
+        response, document_ids = self._answer('total Capaian sheet Resolusi Tiket')
+        self.assertIn('5', response['text'])
+        self.assertNotEqual(document_ids, [self.frt.id])
+    
+    @override_settings(ADMISSION_ENABLED=False, REQUEST_TIMING_LOG=False, CHAT_LOG_ASYNC=False)
+    def test_chat_endpoint_answers_without_llm(self):
+        auth = mock.patch('core.authentication.SharedTokenCache.get_or_verify', return_value='user-1')
+        auth.start()
+        self.addCleanup(auth.stop)
+        client = Client(HTTP_AUTHORIZATION='Bearer token')
+        with mock.patch('core.deepseek_service.DeepSeekService._post') as post:
+            response = client.post('/api/chat/', {'message': 'total Omzet'}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('350', response.json()['text'])
+        post.assert_not_called()
+
+
+class CompressedTextFieldTests(TestCase):
+    """Document.content: disimpan terkompresi, dibaca kembali sama persis"""
+    
+    CONTENT = 'Laporan gangguan jaringan — Jawa Barat\n' * 100 + 'Ringkasan: 99,5% uptime ✓'
+    
+    def _stored(self, document):
+        return Document.objects.filter(pk=document.pk).values_list('content', flat=True).get()
+    
+    def test_round_trip_per_codec(self):
+        for codec, prefix in ((CODEC_ZLIB, '\x01'), (CODEC_LZMA, '\x02')):
+            with self.subTest(codec=codec), override_settings(DOCUMENT_CONTENT_COMPRESSION=codec):
+                document = Document.objects.create(
+                    owner_user_id='user-1', title=codec, content=self.CONTENT, source_filename='a.txt'
+                )
+                stored = self._stored(document)
+                self.assertTrue(stored.startswith(prefix))
+                self.assertLess(len(stored), len(self.CONTENT))
+                self.assertEqual(Document.objects.get(pk=document.pk).content, self.CONTENT)
+    
+    @override_settings(DOCUMENT_CONTENT_COMPRESSION=CODEC_ZLIB)
+    def test_decompressed_lazily_and_not_encoded_twice(self):
+        document = Document.objects.create(
+            owner_user_id='user-1', title='a', content=self.CONTENT, source_filename='a.txt'
+        )
+        fetched = Document.objects.get(pk=document.pk)
+        self.assertIsInstance(fetched.__dict__['content'], EncodedText)
+        
+        # Simpan tanpa membaca content: nilai tersimpan tidak di-encode ulang
+        fetched.title = 'b'
+        fetched.save(update_fields=['title', 'content'])
+        self.assertEqual(decode_text(self._stored(document)), self.CONTENT)
+        self.assertEqual(Document.objects.get(pk=document.pk).content, self.CONTENT)
+    
+    def test_plain_and_compressed_rows_coexist(self):
+        with override_settings(DOCUMENT_CONTENT_COMPRESSION=CODEC_LZMA):
+            compressed = Document.objects.create(
+                owner_user_id='user-1', title='lama', content=self.CONTENT, source_filename='a.txt'
+            )
+        with override_settings(DOCUMENT_CONTENT_COMPRESSION=CODEC_NONE):
+            plain = Document.objects.create(
+                owner_user_id='user-1', title='baru', content=self.CONTENT, source_filename='b.txt'
+            )
+        self.assertEqual(self._stored(plain), self.CONTENT)
+        contents = dict(Document.objects.values_list('title', 'content'))
+        self.assertNotEqual(contents['lama'], self.CONTENT)
+        for document in Document.objects.filter(pk__in=[compressed.pk, plain.pk]):
+            self.assertEqual(document.content, self.CONTENT)
+    
+    @override_settings(DOCUMENT_CONTENT_COMPRESSION=CODEC_NONE)
+    def test_plain_text_starting_with_format_char_is_not_misread(self):
+        document = Document.objects.create(
+            owner_user_id='user-1', title='a', content='\x01pendek', source_filename='a.txt'
+        )
+        self.assertNotEqual(self._stored(document), '\x01pendek')
+        self.assertEqual(Document.objects.get(pk=document.pk).content, '\x01pendek')
+
+
+class DeadlineTests(TestCase):
+    """Deadline request: budget per endpoint/header, 504 dari fase LLM, SSO dan DB"""
+    
+    def _with_deadline(self, seconds):
+        token = _deadline.set(time.monotonic() + seconds)
+        self.addCleanup(_deadline.reset, token)
+    
+    @override_settings(REQUEST_DEADLINES={'chat': 90.0}, REQUEST_DEADLINE_DEFAULT=30.0, REQUEST_DEADLINE_MAX=110.0)
+    def test_budget_from_endpoint_header_and_cap(self):
+        def deadline_for(path, **headers):
+            request = RequestFactory().post(path, **headers)
+            request.resolver_match = resolve(path)
+            return DeadlineMiddleware.deadline_for(request)
+        
+        self.assertEqual(deadline_for('/api/chat/'), 90.0)
+        self.assertEqual(deadline_for('/api/documents/'), 30.0)
+        self.assertEqual(deadline_for('/api/chat/', HTTP_X_REQUEST_TIMEOUT='5'), 5.0)
+        self.assertEqual(deadline_for('/api/chat/', HTTP_X_REQUEST_TIMEOUT='600'), 110.0)
+        self.assertEqual(deadline_for('/api/chat/', HTTP_X_REQUEST_TIMEOUT='-1'), 90.0)
+    
+    @override_settings(ADMISSION_ENABLED=False, REQUEST_TIMING_LOG=False, CHAT_LOG_ASYNC=False)
+    def test_llm_timeout_after_deadline_returns_504(self):
+        Document.objects.create(
+            owner_user_id='user-1', title='Laporan', content='Revenue naik.', source_filename='a.txt'
+        )
+        
+        def slow_post(*args, timeout, **kwargs):
+            connect, read = timeout
+            self.assertLessEqual(connect, read)
+            self.assertLessEqual(read, 0.3)
+            time.sleep(read)
+            raise requests.Timeout()
+        
+        with mock.patch('core.authentication.SharedTokenCache.get_or_verify', return_value='user-1'), \
+                mock.patch('core.deepseek_service.requests.post', side_effect=slow_post) as post:
+            response = Client(HTTP_AUTHORIZATION='Bearer token').post(
+                '/api/chat/', {'message': 'Jelaskan revenue'}, content_type='application/json',
+                HTTP_X_REQUEST_TIMEOUT='0.3',
+            )
+        self.assertEqual(response.status_code, 504)
+        self.assertIn('detail', response.json())
+        self.assertEqual(post.call_count, 1)
+    
+    @override_settings(SSO_VERIFY_MODE='remote')
+    def test_sso_timeout_after_deadline_raises_and_is_not_cached(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        SharedTokenCache._local.__dict__.clear()
+        self.addCleanup(SharedTokenCache._local.__dict__.clear)
+        cache.clear()
+        self.addCleanup(cache.clear)
+        auth, token = SSOAuthentication(), make_token()
+        
+        def slow_post(*args, timeout, **kwargs):
+            time.sleep(timeout)
+            raise requests.Timeout()
+        
+        with override_settings(SSO_TOKEN_SHARED_CACHE_PATH=os.path.join(tmp.name, 'state', 'tokens.sqlite3')):
+            self._with_deadline(0.05)
+            with mock.patch('core.authentication.requests.post', side_effect=slow_post):
+                with self.assertRaises(DeadlineExceeded):
+                    SharedTokenCache.get_or_verify(token, auth.verify_token_with_sso)
+            _deadline.set(None)
+            with mock.patch('core.authentication.requests.post', return_value=mock.Mock(status_code=200)):
+                self.assertEqual(SharedTokenCache.get_or_verify(token, auth.verify_token_with_sso), 'user-1')
+    
+    def test_query_after_deadline_is_not_executed(self):
+        executed = []
+        
+        def record(execute, sql, params, many, context):
+            executed.append(sql)
+            return execute(sql, params, many, context)
+        
+        self._with_deadline(-1)
+        with self.assertRaises(DeadlineExceeded) as raised:
+            with connection.execute_wrapper(_db_deadline), connection.execute_wrapper(record):
+                Document.objects.count()
+        self.assertEqual(raised.exception.phase, 'db')
+        self.assertEqual(executed, [])
+    
+    def test_sqlite_query_interrupted_at_deadline(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('progress handler khusus SQLite')
+        slow_sql = (
+            'WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 100000000) '
+            'SELECT count(*) FROM n'
+        )
+        self._with_deadline(0.05)
+        started = time.monotonic()
+        with self.assertRaises(DeadlineExceeded):
+            with connection.execute_wrapper(_db_deadline), connection.cursor() as cursor:
+                cursor.execute(slow_sql)
+        self.assertLess(time.monotonic() - started, 2)
+        
+        # Progress handler dilepas: query berikutnya (tanpa deadline) tetap jalan
+        _deadline.set(None)
+        self.assertEqual(Document.objects.count(), 0)
+    
+    def test_slow_llm_body_is_bounded_by_total_budget(self):
+        def trickle(chunk_size):
+            while True:
+                time.sleep(0.02)
+                yield b' '
+        
+        response = mock.Mock(status_code=200)
+        response.iter_content.side_effect = trickle
+        self._with_deadline(0.1)
+        started = time.monotonic()
+        with mock.patch('core.deepseek_service.requests.post', return_value=response) as post:
+            with self.assertRaises(DeadlineExceeded) as raised:
+                DeepSeekService.call_deepseek(message='Jelaskan revenue', documents=[])
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(raised.exception.phase, 'llm')
+        connect, read = post.call_args.kwargs['timeout']
+        self.assertLessEqual(read, 0.1)
+        self.assertTrue(post.call_args.kwargs['stream'])
+        response.close.assert_called_once()
+    
+    def test_llm_not_called_after_deadline(self):
+        self._with_deadline(-1)
+        with mock.patch('core.deepseek_service.DeepSeekService._post') as post:
+            with self.assertRaises(DeadlineExceeded):
+                DeepSeekService.call_deepseek(message='Jelaskan revenue', documents=[])
+        post.assert_not_called()
+    
+    def test_deadline_outside_drf_returns_504(self):
+        middleware = DeadlineMiddleware(lambda request: HttpResponse('ok'))
+        request = RequestFactory().get('/admin/')
+        response = middleware.process_exception(request, DeadlineExceeded('db'))
+        self.assertEqual(response.status_code, 504)
+        self.assertIn('detail', json.loads(response.content))
+        self.assertIsNone(middleware.process_exception(request, ValueError()))
+
+
+class RequestTimingTests(TestCase):
+    """Fase per request: header Server-Timing, fase db otomatis dan log JSON"""
+    
+    @staticmethod
+    @phase('extract')
+    def _extract():
+        return Document.objects.count()
+    
+    def _view(self, request):
+        with phase('auth'):
+            pass
+        with phase('history'):
+            list(Document.objects.all())
+            list(Document.objects.all())
+        self._extract()
+        annotate(llm_route={'route': 'short'}, method='TIDAK MENIMPA')
+        return HttpResponse('ok', status=201)
+    
+    def _run(self):
+        request = RequestFactory().get('/api/documents/')
+        return RequestTimingMiddleware(self._view)(request)
+    
+    @override_settings(REQUEST_TIMING_HEADER=True, REQUEST_TIMING_LOG=True)
+    def test_server_timing_header_and_json_log(self):
+        with self.assertLogs('core.timing', 'INFO') as logs:
+            response = self._run()
+        
+        names = [part.split(';')[0] for part in response['Server-Timing'].split(', ')]
+        self.assertEqual(names[-1], 'total')
+        self.assertEqual(set(names), {'auth', 'history', 'db', 'extract', 'total'})
+        
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertEqual(
+            (entry['event'], entry['method'], entry['path'], entry['status']),
+            ('request', 'GET', '/api/documents/', 201),
+        )
+        self.assertEqual(entry['phases']['db']['count'], 3)
+        self.assertGreaterEqual(entry['phases']['history']['ms'], 0)
+        self.assertEqual(entry['phases']['extract']['count'], 1)
+        self.assertEqual(entry['llm_route'], {'route': 'short'})
+        self.assertGreaterEqual(entry['duration_ms'], entry['phases']['history']['ms'])
+    
+    @override_settings(REQUEST_TIMING_HEADER=True, REQUEST_TIMING_LOG=False)
+    def test_db_time_is_summed_per_phase(self):
+        with mock.patch('core.timing.time') as clock:
+            clock.perf_counter.side_effect = [i * 0.001 for i in range(100)]
+            response = self._run()
+        phases = dict(part.split(';dur=') for part in response['Server-Timing'].split(', '))
+        # Setiap query 1 ms (dua panggilan perf_counter berurutan)
+        self.assertEqual(float(phases['db']), 3.0)
+    
+    @override_settings(REQUEST_TIMING_HEADER=False, REQUEST_TIMING_LOG=False)
+    def test_disabled_middleware_adds_nothing(self):
+        self.assertNotIn('Server-Timing', self._run())
+    
+    def test_phase_and_annotate_are_noop_outside_request(self):
+        self.assertIsNone(current_timings())
+        with phase('extract'):
+            annotate(ignored=True)
+        self.assertEqual(self._extract(), 0)
+        self.assertIsNone(current_timings())
+
+
+@override_settings(ADMISSION_ENABLED=False, REQUEST_TIMING_LOG=False, PROFILING_ENABLED=True,
+                   PROFILING_SAMPLE_RATE=0.0, PROFILING_HEADER_TOKEN='rahasia')
+class ProfilingTests(TestCase):
+    """ProfilingMiddleware (sampling / header token) dan command merge_profiles"""
+    
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        settings_override = override_settings(PROFILING_DIR=self.tmp.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = api_client(self)
+    
+    def _get(self, **headers):
+        response = self.client.get('/api/documents/', **headers)
+        self.assertEqual(response.status_code, 200)
+        return response
+    
+    def test_sampled_request_writes_profile(self):
+        self.assertNotIn('X-Profile-Id', self._get())
+        with override_settings(PROFILING_SAMPLE_RATE=1.0):
+            profile_id = self._get()['X-Profile-Id']
+        self.assertTrue(profile_id.startswith('GET-document-list__'))
+        self.assertTrue(pstats.Stats(os.path.join(self.tmp.name, profile_id)).total_calls)
+    
+    def test_header_token_forces_profile(self):
+        self.assertIn('X-Profile-Id', self._get(HTTP_X_PROFILE_TOKEN='rahasia'))
+        self.assertNotIn('X-Profile-Id', self._get(HTTP_X_PROFILE_TOKEN='salah'))
+        # Header non-ASCII: token tidak cocok, bukan 500
+        self.assertNotIn('X-Profile-Id', self._get(HTTP_X_PROFILE_TOKEN='rähasia'))
+    
+    @override_settings(PROFILING_SAMPLE_RATE=1.0, PROFILING_MAX_FILES=1)
+    def test_stops_writing_when_directory_full(self):
+        self.assertIn('X-Profile-Id', self._get())
+        self.assertNotIn('X-Profile-Id', self._get())
+    
+    def _write_profile(self, endpoint, duration_ms, functions):
+        profiler = cProfile.Profile()
+        profiler.enable()
+        for function in functions:
+            function()
+        profiler.disable()
+        profiler.dump_stats(os.path.join(self.tmp.name, profile_filename(endpoint, duration_ms)))
+    
+    @staticmethod
+    def _function(filename):
+        namespace = {}
+        exec(compile('def work():\n    return sum(range(100))\n', filename, 'exec'), namespace)
+        return namespace['work']
+    
+    def test_merge_keeps_full_paths_in_output(self):
+        work_a = self._function('/srv/app/module_a/helpers.py')
+        work_b = self._function('/srv/app/module_b/helpers.py')
+        self._write_profile('GET-document-list', 12, [work_a])
+        self._write_profile('POST-chat', 900, [work_a, work_b])
+        output = os.path.join(self.tmp.name, 'merged.pstats')
+        
+        stdout = StringIO()
+        call_command('merge_profiles', '--dir', self.tmp.name, '--output', output, stdout=stdout)
+        self.assertIn('2 profil digabung', stdout.getvalue())
+        self.assertIn('POST-chat', stdout.getvalue())
+        
+        merged = pstats.Stats(output).stats
+        work = {key: value for key, value in merged.items() if key[2] == 'work'}
+        self.assertEqual(
+            {key[0] for key in work}, {'/srv/app/module_a/helpers.py', '/srv/app/module_b/helpers.py'}
+        )
+        self.assertEqual(work[('/srv/app/module_a/helpers.py', 1, 'work')][1], 2)
+    
+    def test_merge_filters_by_endpoint_and_duration(self):
+        self._write_profile('GET-document-list', 12, [])
+        self._write_profile('POST-chat', 900, [])
+        stdout = StringIO()
+        call_command('merge_profiles', '--dir', self.tmp.name, '--min-duration', '100', '--delete', stdout=stdout)
+        self.assertIn('1 profil digabung', stdout.getvalue())
+        self.assertEqual(len(os.listdir(self.tmp.name)), 1)
+
+
+class MetricsTests(SimpleTestCase):
+    """Registry metrics: gabungan snapshot per pid, archive pid mati, format Prometheus"""
+    
+    DEAD_PID = 999999999
+    
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        settings_override = override_settings(METRICS_DIR=self.tmp.name, METRICS_FLUSH_INTERVAL=3600)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.registry = MetricsRegistry()
+        self.addCleanup(setattr, self.registry, '_flusher_pid', None)
+        self.requests = self.registry.counter('test_requests_total', 'Request', ('endpoint',))
+        self.inflight = self.registry.gauge('test_inflight', 'In-flight')
+        self.latency = self.registry.histogram('test_latency_seconds', 'Latensi', buckets=(0.1, 1.0))
+    
+    def _other_process(self, pid, requests_count, inflight):
+        """Snapshot milik proses lain dengan nilai tertentu"""
+        other = MetricsRegistry()
+        other.counter('test_requests_total', 'Request', ('endpoint',)).inc(requests_count, endpoint='chat')
+        other.gauge('test_inflight', 'In-flight').set(inflight)
+        other.histogram('test_latency_seconds', 'Latensi', buckets=(0.1, 1.0)).observe(0.5)
+        _write_json(os.path.join(self.tmp.name, f'metrics_{pid}.json'), other.snapshot())
+    
+    @staticmethod
+    def _samples(collected, name):
+        return {tuple(labels): value for labels, value in collected[name]['samples']}
+    
+    def test_merges_live_process_snapshots(self):
+        self.requests.inc(2, endpoint='chat')
+        self.inflight.set(1)
+        self.latency.observe(0.05)
+        self._other_process(os.getppid(), 3, 4)
+        
+        collected = self.registry.collect()
+        self.assertEqual(self._samples(collected, 'test_requests_total'), {('chat',): 5})
+        self.assertEqual(self._samples(collected, 'test_inflight'), {(): 5})
+        self.assertEqual(self._samples(collected, 'test_latency_seconds')[()], [[1, 1, 0], 0.55, 2])
+    
+    def test_dead_process_is_archived_without_gauges(self):
+        self.requests.inc(1, endpoint='chat')
+        self._other_process(self.DEAD_PID, 10, 7)
+        
+        collected = self.registry.collect()
+        self.assertEqual(self._samples(collected, 'test_requests_total'), {('chat',): 11})
+        self.assertEqual(self._samples(collected, 'test_inflight'), {})
+        self.assertFalse(os.path.exists(os.path.join(self.tmp.name, f'metrics_{self.DEAD_PID}.json')))
+        self.assertTrue(os.path.exists(os.path.join(self.tmp.name, ARCHIVE_FILENAME)))
+        
+        # Counter tidak mundur pada collect berikutnya, dan archive tidak dihitung dua kali
+        self.requests.inc(1, endpoint='chat')
+        self.assertEqual(self._samples(self.registry.collect(), 'test_requests_total'), {('chat',): 12})
+    
+    def test_render_text_format(self):
+        self.requests.inc(endpoint='a"b\nc')
+        self.latency.observe(0.05)
+        self.latency.observe(5)
+        with override_settings(METRICS_DIR=''):
+            text = render_text(self.registry.collect())
+        self.assertIn('# TYPE test_requests_total counter', text)
+        self.assertIn('test_requests_total{endpoint="a\\"b\\nc"} 1', text)
+        self.assertIn('test_latency_seconds_bucket{le="0.1"} 1', text)
+        self.assertIn('test_latency_seconds_bucket{le="1.0"} 1', text)
+        self.assertIn('test_latency_seconds_bucket{le="+Inf"} 2', text)
+        self.assertIn('test_latency_seconds_sum 5.05', text)
+        self.assertIn('test_latency_seconds_count 2', text)
+
+
+@override_settings(METRICS_ENABLED=True, METRICS_AUTH_TOKEN='rahasia', METRICS_DIR='', REQUEST_TIMING_LOG=False)
+class MetricsEndpointTests(SimpleTestCase):
+    """GET /metrics dengan METRICS_AUTH_TOKEN"""
+    
+    def test_requires_bearer_token(self):
+        client = Client()
+        self.assertEqual(client.get('/metrics').status_code, 401)
+        self.assertEqual(client.get('/metrics', HTTP_AUTHORIZATION='Bearer salah').status_code, 401)
+        # Header non-ASCII: 401, bukan 500
+        self.assertEqual(client.get('/metrics', HTTP_AUTHORIZATION='Bearer rähasia').status_code, 401)
+        
+        response = client.get('/metrics', HTTP_AUTHORIZATION='Bearer rahasia')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'# TYPE noc_rag_http_request_duration_seconds histogram', response.content)
@@ -0,0 +1,130 @@
+"""
+Statistik teks dokumen yang dihitung sekali saat ingestion
+
+Dipakai untuk perencanaan konteks dan laporan kapasitas tanpa membaca ulang
+`content`: estimasi token, jumlah baris, kalimat, chunk dan bahasa.
+"""
+import json
+import re
+from typing import Dict, Optional
+
+
+# Ukuran chunk (karakter), sama dengan default `length` GET /api/documents/{id}/content
+CHUNK_CHARS = 10_000
+
+# Deteksi bahasa cukup dari awal dokumen
+LANGUAGE_SAMPLE_WORDS = 2000
+LANGUAGE_MIN_HITS = 5
+
+LANGUAGE_ID = 'id'
+LANGUAGE_EN = 'en'
+LANGUAGE_UNKNOWN = 'und'
+
+STOPWORDS_ID = frozenset({
+    'yang', 'dan', 'di', 'ke', 'dari', 'untuk', 'dengan', 'pada', 'ini', 'itu',
+    'adalah', 'dalam', 'tidak', 'akan', 'atau', 'juga', 'oleh', 'sebagai', 'karena', 'bahwa',
+    'telah', 'dapat', 'lebih', 'sudah', 'serta', 'tersebut', 'bulan', 'tahun', 'sampai', 'hingga',
+})
+STOPWORDS_EN = frozenset({
+    'the', 'and', 'of', 'to', 'in', 'is', 'for', 'with', 'on', 'that',
+    'this', 'are', 'be', 'by', 'as', 'was', 'from', 'or', 'at', 'an',
+    'it', 'not', 'have', 'has', 'will', 'which', 'were', 'been', 'their', 'than',
+})
+
+# Kelompok token kasar: angka, huruf (per kata), karakter CJK, tanda baca / simbol
+_CJK = '\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af'
+_PIECE_RE = re.compile(rf'(\d+)|([^\W\d_{_CJK}]+)|([{_CJK}])|([^\w\s]|_)')
+_WORD_RE = re.compile(r'[^\W\d_]+')
+# Tanda akhir kalimat ikut menelan paragraf kosong setelahnya (tidak dihitung dua kali)
+_SENTENCE_END_RE = re.compile(r'[.!?]+(?:\s*\n\s*\n|(?=\s|$))|\n\s*\n')
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """
+    Estimasi jumlah token BPE tanpa tokenizer (dependency-free, deterministik)
+    
+    Heuristik: kata ~1 token per 5 huruf (minimal 1), angka 1 token per 3 digit,
+    karakter CJK dan tanda baca masing-masing 1 token. Perkiraan kasar: cukup untuk
+    budgeting konteks dan perbandingan antar dokumen, bukan untuk billing.
+    """
+    if not text:
+        return 0
+    tokens = 0
+    for match in _PIECE_RE.finditer(text):
+        group = match.lastindex
+        length = match.end() - match.start()
+        if group == 1:
+            tokens += (length + 2) // 3
+        elif group == 2:
+            tokens += 1 + (length - 1) // 5
+        else:
+            tokens += 1
+    return tokens
+
+
+def count_lines(text: Optional[str]) -> int:
+    if not text:
+        return 0
+    return text.count('\n') + (0 if text.endswith('\n') else 1)
+
+
+def count_sentences(text: Optional[str]) -> int:
+    """Jumlah kalimat (diakhiri . ! ? atau paragraf kosong), minimal 1 untuk teks tidak kosong"""
+    if not text or not text.strip():
+        return 0
+    count = last_end = 0
+    for match in _SENTENCE_END_RE.finditer(text):
+        count += 1
+        last_end = match.end()
+    # Sisa teks setelah tanda akhir kalimat terakhir juga dihitung satu kalimat
+    if text[last_end:].strip():
+        count += 1
+    return max(count, 1)
+
+
+def count_chunks(text: Optional[str], chunk_chars: int = CHUNK_CHARS) -> int:
+    if not text:
+        return 0
+    return -(-len(text) // chunk_chars)
+
+
+def detect_language(text: Optional[str]) -> str:
+    """Bahasa dominan ('id', 'en' atau 'und') dari frekuensi stopword di awal teks"""
+    if not text:
+        return LANGUAGE_UNKNOWN
+    id_hits = en_hits = 0
+    for index, match in enumerate(_WORD_RE.finditer(text)):
+        if index >= LANGUAGE_SAMPLE_WORDS:
+            break
+        word = match.group().lower()
+        if word in STOPWORDS_ID:
+            id_hits += 1
+        elif word in STOPWORDS_EN:
+            en_hits += 1
+    if max(id_hits, en_hits) < LANGUAGE_MIN_HITS:
+        return LANGUAGE_UNKNOWN
+    return LANGUAGE_ID if id_hits >= en_hits else LANGUAGE_EN
+
+
+def structured_data_tokens(structured_data) -> int:
+    """Estimasi token structured_data dalam format yang disuntikkan ke prompt (JSON ASCII)"""
+    if not structured_data:
+        return 0
+    try:
+        return estimate_tokens(json.dumps(structured_data, ensure_ascii=True))
+    except (TypeError, ValueError):
+        return 0
+
+
+def compute_stats(content: Optional[str], structured_data=None) -> Dict[str, object]:
+    """Semua statistik dokumen, dengan key sama seperti field Document"""
+    content = content or ''
+    return {
+        'content_length': len(content),
+        'token_count': estimate_tokens(content),
+        'structured_token_count': structured_data_tokens(structured_data),
+        'line_count': count_lines(content),
+        'sentence_count': count_sentences(content),
+        'chunk_count': count_chunks(content),
+        'language': detect_language(content),
+    }
@@ -0,0 +1,172 @@
+"""
+Instrumentasi waktu per request: span fase, header Server-Timing dan log JSON
+"""
+import json
+import logging
+import time
+from contextlib import ContextDecorator
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.db import connection
+from django.utils.functional import LazyObject
+
+
+logger = logging.getLogger('core.timing')
+
+_current: ContextVar[Optional['RequestTimings']] = ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    """
+    Kumpulan durasi fase selama satu request
+    
+    Fase dengan nama sama (mis. 'db' untuk setiap query) dijumlahkan dan dihitung.
+    """
+    
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: Dict[str, list] = {}
+        # Field tambahan untuk log JSON request (lihat annotate())
+        self.fields: Dict[str, object] = {}
+    
+    def add(self, name: str, duration_ms: float):
+        entry = self.phases.get(name)
+        if entry is None:
+            self.phases[name] = [duration_ms, 1]
+        else:
+            entry[0] += duration_ms
+            entry[1] += 1
+    
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+    
+    def server_timing(self, total_ms: float) -> str:
+        """Nilai header Server-Timing, mis. 'auth;dur=1.2, llm;dur=830.4, total;dur=845.0'"""
+        parts = [f'{name};dur={duration:.1f}' for name, (duration, _) in self.phases.items()]
+        parts.append(f'total;dur={total_ms:.1f}')
+        return ', '.join(parts)
+    
+    def as_dict(self) -> Dict[str, Dict[str, float]]:
+        return {
+            name: {'ms': round(duration, 2), 'count': count}
+            for name, (duration, count) in self.phases.items()
+        }
+
+
+class phase(ContextDecorator):
+    """
+    Catat durasi satu fase ke request yang sedang berjalan
+    
+    Bisa dipakai sebagai context manager maupun decorator:
+        
+        with phase('history'):
+            ...
+        
+        @phase('extract')
+        def extract(...):
+            ...
+    
+    Di luar request yang diinstrumentasi (management command, worker process pool)
+    fase tidak dicatat dan overhead-nya hanya satu lookup ContextVar.
+    """
+    
+    def __init__(self, name: str):
+        self.name = name
+        self._timings = None
+        self._start = 0.0
+    
+    def _recreate_cm(self):
+        # Instance baru per pemanggilan agar decorator aman dipakai bersamaan antar thread
+        return phase(self.name)
+    
+    def __enter__(self):
+        self._timings = _current.get()
+        if self._timings is not None:
+            self._start = time.perf_counter()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        if self._timings is not None:
+            self._timings.add(self.name, (time.perf_counter() - self._start) * 1000)
+        return False
+
+
+def current_timings() -> Optional[RequestTimings]:
+    """Timings request yang sedang berjalan (None di luar request)"""
+    return _current.get()
+
+
+def annotate(**fields):
+    """
+    Tambahkan field ke log JSON request yang sedang berjalan
+    
+    Contoh: annotate(llm_route={...}). Field tidak menimpa key bawaan log
+    (event, method, path, ...). Di luar request tidak melakukan apa pun.
+    """
+    timings = _current.get()
+    if timings is not None:
+        timings.fields.update(fields)
+
+
+def _db_timer(execute, sql, params, many, context):
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings = _current.get()
+        if timings is not None:
+            timings.add('db', (time.perf_counter() - start) * 1000)
+
+
+class RequestTimingMiddleware:
+    """
+    Middleware pencatat fase per request
+    
+    - Semua query database otomatis dicatat sebagai fase 'db'
+    - Fase dari phase() (auth, history, llm, extract, ...) ditambahkan ke header
+      Server-Timing (REQUEST_TIMING_HEADER) agar terlihat di DevTools browser
+    - Satu baris log JSON per request ke logger 'core.timing' (REQUEST_TIMING_LOG)
+    """
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+    
+    def __call__(self, request):
+        if not (settings.REQUEST_TIMING_HEADER or settings.REQUEST_TIMING_LOG):
+            return self.get_response(request)
+        
+        timings = RequestTimings()
+        token = _current.set(timings)
+        try:
+            with connection.execute_wrapper(_db_timer):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        
+        total_ms = timings.total_ms()
+        if settings.REQUEST_TIMING_HEADER:
+            response['Server-Timing'] = timings.server_timing(total_ms)
+        if settings.REQUEST_TIMING_LOG:
+            self._log(request, response, timings, total_ms)
+        return response
+    
+    @staticmethod
+    def _log(request, response, timings, total_ms):
+        user = getattr(request, 'user', None)
+        if isinstance(user, LazyObject):
+            # User session Django yang belum dievaluasi: jangan picu query hanya untuk log
+            user = None
+        entry = {
+            'event': 'request',
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'user_id': getattr(user, 'user_id', None),
+            'duration_ms': round(total_ms, 2),
+            'phases': timings.as_dict(),
+        }
+        for name, value in timings.fields.items():
+            entry.setdefault(name, value)
+        logger.info(json.dumps(entry, default=str))
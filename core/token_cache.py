@@ -0,0 +1,259 @@
+"""
+Cache hasil verifikasi token SSO yang dipakai bersama oleh semua worker
+"""
+import hashlib
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Callable, Optional, Tuple
+
+import jwt
+from django.conf import settings
+from django.core.cache import cache
+
+from core import shared_state
+from core.deadline import budget
+from core.metrics import CACHE_REQUESTS
+
+
+logger = logging.getLogger('core.token_cache')
+
+# Penanda token invalid di cache (negative caching)
+INVALID = ''
+
+_MISSING = object()
+
+
+class VerificationUnavailable(Exception):
+    """
+    Token tidak bisa diverifikasi saat ini (SSO tidak bisa dihubungi, 5xx, kunci
+    verifikasi tidak tersedia); berbeda dari token yang ditolak, hasilnya tidak di-cache
+    """
+
+
+class SharedTokenCache:
+    """
+    Cache 2 tingkat untuk hasil verifikasi token:
+    - L1: Django cache (LocMemCache, per proses)
+    - L2: file SQLite (WAL) di SSO_TOKEN_SHARED_CACHE_PATH, dipakai bersama
+      oleh semua worker gunicorn di host yang sama
+    
+    Key = SHA-256 dari token lengkap. TTL token valid dibatasi claim `exp`;
+    token yang pasti ditolak di-cache singkat (SSO_TOKEN_NEGATIVE_TTL), sedangkan
+    kegagalan verifikasi (VerificationUnavailable) tidak di-cache. Verifikasi token
+    baru bersifat single-flight: request paralel dengan token yang sama (antar
+    thread maupun antar worker) menunggu hasil satu verifikasi saja.
+    """
+    
+    _local = threading.local()
+    _inflight_lock = threading.Lock()
+    _inflight = {}
+    
+    @staticmethod
+    def token_key(token: str) -> str:
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+    
+    @staticmethod
+    def _l1_key(key: str) -> str:
+        return f'sso_token_{key}'
+    
+    @classmethod
+    def _conn(cls) -> Optional[sqlite3.Connection]:
+        """
+        Koneksi SQLite per thread (dibuat ulang setelah fork)
+        
+        None jika tier shared dinonaktifkan atau file tidak aman (bisa ditulis user lain):
+        isi file menentukan user_id sebuah token, sehingga hanya L1 yang dipakai.
+        """
+        path = settings.SSO_TOKEN_SHARED_CACHE_PATH
+        if not path:
+            return None
+        
+        if getattr(cls._local, 'pid', None) == os.getpid() and getattr(cls._local, 'path', None) == path:
+            return cls._local.conn
+        
+        try:
+            conn = shared_state.connect(path)
+        except OSError as e:
+            logger.warning('Shared token cache dinonaktifkan: %s', e)
+            conn = None
+        else:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS sso_tokens ('
+                'key TEXT PRIMARY KEY, user_id TEXT NOT NULL, expires_at REAL NOT NULL)'
+            )
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS sso_inflight ('
+                'key TEXT PRIMARY KEY, expires_at REAL NOT NULL)'
+            )
+        cls._local.conn = conn
+        cls._local.pid = os.getpid()
+        cls._local.path = path
+        return conn
+    
+    @classmethod
+    def _shared_get(cls, key: str) -> Tuple[object, float]:
+        """Returns (user_id atau INVALID atau _MISSING, sisa TTL)"""
+        try:
+            conn = cls._conn()
+            if conn is None:
+                return (_MISSING, 0)
+            row = conn.execute(
+                'SELECT user_id, expires_at FROM sso_tokens WHERE key = ?', (key,)
+            ).fetchone()
+        except sqlite3.Error:
+            return (_MISSING, 0)
+        
+        if row is None:
+            return (_MISSING, 0)
+        remaining = row[1] - time.time()
+        if remaining <= 0:
+            return (_MISSING, 0)
+        return (row[0], remaining)
+    
+    @classmethod
+    def _shared_set(cls, key: str, user_id: str, ttl: float):
+        try:
+            conn = cls._conn()
+            if conn is None:
+                return
+            now = time.time()
+            conn.execute(
+                'INSERT OR REPLACE INTO sso_tokens (key, user_id, expires_at) VALUES (?, ?, ?)',
+                (key, user_id, now + ttl)
+            )
+            # Bersihkan entry expired sesekali
+            if random.random() < 0.01:
+                conn.execute('DELETE FROM sso_tokens WHERE expires_at < ?', (now,))
+                conn.execute('DELETE FROM sso_inflight WHERE expires_at < ?', (now,))
+        except sqlite3.Error:
+            pass
+    
+    @classmethod
+    def _claim(cls, key: str) -> bool:
+        """Klaim lease verifikasi antar worker; True jika worker ini yang verifikasi"""
+        try:
+            conn = cls._conn()
+            if conn is None:
+                return True
+            now = time.time()
+            lease = settings.SSO_TOKEN_SINGLE_FLIGHT_WAIT
+            cursor = conn.execute(
+                'INSERT INTO sso_inflight (key, expires_at) VALUES (?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET expires_at = excluded.expires_at '
+                'WHERE sso_inflight.expires_at < ?',
+                (key, now + lease, now)
+            )
+            return cursor.rowcount == 1
+        except sqlite3.Error:
+            return True
+    
+    @classmethod
+    def _release(cls, key: str):
+        try:
+            conn = cls._conn()
+            if conn is not None:
+                conn.execute('DELETE FROM sso_inflight WHERE key = ?', (key,))
+        except sqlite3.Error:
+            pass
+    
+    @staticmethod
+    def _ttl_for(token: str, user_id: Optional[str]) -> float:
+        if not user_id:
+            return settings.SSO_TOKEN_NEGATIVE_TTL
+        
+        ttl = settings.SSO_TOKEN_CACHE_TTL
+        try:
+            exp = jwt.decode(token, options={'verify_signature': False}).get('exp')
+        except jwt.DecodeError:
+            exp = None
+        if isinstance(exp, (int, float)):
+            ttl = min(ttl, exp - time.time())
+        return ttl
+    
+    @classmethod
+    def lookup(cls, key: str):
+        """Cek L1 lalu L2; returns user_id, INVALID, atau _MISSING"""
+        value = cache.get(cls._l1_key(key), _MISSING)
+        if value is not _MISSING:
+            return value
+        
+        value, remaining = cls._shared_get(key)
+        if value is not _MISSING:
+            cache.set(cls._l1_key(key), value, remaining)
+        return value
+    
+    @classmethod
+    def store(cls, key: str, token: str, user_id: Optional[str]):
+        ttl = cls._ttl_for(token, user_id)
+        if ttl <= 0:
+            return
+        value = user_id or INVALID
+        cache.set(cls._l1_key(key), value, ttl)
+        cls._shared_set(key, value, ttl)
+    
+    @classmethod
+    def get_or_verify(cls, token: str, verify: Callable[[str], Optional[str]]) -> Optional[str]:
+        """
+        Ambil hasil verifikasi dari cache, atau verifikasi (single-flight) lalu simpan
+        
+        Args:
+            verify: Mengembalikan user_id, None jika token ditolak (di-cache sebagai
+                invalid), atau raise VerificationUnavailable (tidak di-cache)
+        
+        Returns:
+            user_id (str) jika valid, None jika tidak valid atau tidak bisa diverifikasi
+        """
+        key = cls.token_key(token)
+        
+        value = cls.lookup(key)
+        CACHE_REQUESTS.inc(cache='sso_token', result='miss' if value is _MISSING else 'hit')
+        if value is not _MISSING:
+            return value or None
+        
+        # Single-flight antar thread di proses yang sama
+        with cls._inflight_lock:
+            event = cls._inflight.get(key)
+            leader = event is None
+            if leader:
+                event = threading.Event()
+                cls._inflight[key] = event
+        
+        if not leader:
+            event.wait(budget(settings.SSO_TOKEN_SINGLE_FLIGHT_WAIT, 'sso'))
+            value = cls.lookup(key)
+            if value is not _MISSING:
+                return value or None
+            try:
+                return verify(token)
+            except VerificationUnavailable:
+                return None
+        
+        claimed = False
+        try:
+            # Single-flight antar worker: tunggu worker lain yang sedang verifikasi
+            claimed = cls._claim(key)
+            if not claimed:
+                wait_until = time.monotonic() + budget(settings.SSO_TOKEN_SINGLE_FLIGHT_WAIT, 'sso')
+                while time.monotonic() < wait_until:
+                    time.sleep(0.02)
+                    value, remaining = cls._shared_get(key)
+                    if value is not _MISSING:
+                        cache.set(cls._l1_key(key), value, remaining)
+                        return value or None
+            
+            try:
+                user_id = verify(token)
+            except VerificationUnavailable:
+                return None
+            cls.store(key, token, user_id)
+            return user_id
+        finally:
+            if claimed:
+                cls._release(key)
+            with cls._inflight_lock:
+                cls._inflight.pop(key, None)
+            event.set()
@@ -1,4 +1,37 @@
-from django.shortcuts import render
+"""
+Views core: endpoint /metrics (format Prometheus)
 
-# Core app tidak memiliki views
-# Views ada di documents dan chat apps
+Endpoint dokumen dan chat ada di app documents dan chat.
+"""
+import hmac
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.views.decorators.http import require_GET
+
+from core.admission import llm_status_metrics
+from core.metrics import registry, render_text
+
+
+@require_GET
+def metrics_view(request):
+    """
+    GET /metrics
+    
+    Jika METRICS_AUTH_TOKEN diset, scraper wajib mengirim `Authorization: Bearer <token>`.
+    """
+    if not settings.METRICS_ENABLED:
+        raise Http404
+    
+    if settings.METRICS_AUTH_TOKEN:
+        expected = f'Bearer {settings.METRICS_AUTH_TOKEN}'.encode()
+        # Bandingkan bytes: compare_digest(str, str) raise TypeError untuk karakter non-ASCII
+        if not hmac.compare_digest(request.META.get('HTTP_AUTHORIZATION', '').encode(), expected):
+            return HttpResponse('Unauthorized', status=401, content_type='text/plain')
+    
+    collected = registry.collect()
+    collected.update(llm_status_metrics())
+    return HttpResponse(
+        render_text(collected),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
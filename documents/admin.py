@@ -1,22 +1,44 @@
 from django.contrib import admin
-from .models import Document
+from .models import CorpusSnapshot, Document, Tag
 
 
 @admin.register(Document)
 class DocumentAdmin(admin.ModelAdmin):
-    list_display = ['id', 'title', 'owner_user_id', 'source_filename', 'mime_type', 'content_length', 'created_at']
-    list_filter = ['mime_type', 'created_at']
+    list_display = ['id', 'title', 'owner_user_id', 'source_filename', 'mime_type', 'content_length', 'token_count', 'language', 'created_at']
+    list_filter = ['mime_type', 'language', 'tags', 'created_at']
     search_fields = ['title', 'source_filename', 'owner_user_id', 'content']
-    readonly_fields = ['created_at', 'updated_at', 'content_length']
+    readonly_fields = [
+        'created_at', 'updated_at', 'content_length', 'token_count', 'structured_token_count',
+        'line_count', 'sentence_count', 'chunk_count', 'language',
+    ]
+    filter_horizontal = ['tags']
     
     fieldsets = (
         ('Informasi Dasar', {
-            'fields': ('owner_user_id', 'title', 'source_filename', 'mime_type')
+            'fields': ('owner_user_id', 'title', 'source_filename', 'mime_type', 'tags')
         }),
         ('Konten', {
             'fields': ('content', 'content_length')
         }),
+        ('Statistik', {
+            'fields': (
+                'token_count', 'structured_token_count', 'line_count',
+                'sentence_count', 'chunk_count', 'language'
+            )
+        }),
         ('Timestamp', {
             'fields': ('created_at', 'updated_at')
         }),
     )
+
+
+@admin.register(Tag)
+class TagAdmin(admin.ModelAdmin):
+    list_display = ['id', 'name', 'created_at']
+    search_fields = ['name']
+
+
+@admin.register(CorpusSnapshot)
+class CorpusSnapshotAdmin(admin.ModelAdmin):
+    list_display = ['id', 'version', 'document_count', 'content_hash', 'created_at']
+    readonly_fields = ['content_hash', 'version', 'document_ids', 'document_count', 'created_at']
@@ -0,0 +1,27 @@
+"""
+Cache per proses untuk payload detail dokumen yang sudah di-render dan sheet
+structured_data untuk endpoint rows
+"""
+from django.conf import settings
+
+from core.http_cache import ResponseCache
+
+
+document_detail_cache = ResponseCache(
+    max_entries=settings.DOCUMENT_DETAIL_CACHE_SIZE,
+    max_bytes=settings.DOCUMENT_DETAIL_CACHE_MAX_MB * 1024 * 1024,
+    name='document_detail'
+)
+
+# Nilai: list sheet structured_data yang sudah di-parse (tidak di-render ulang per halaman)
+document_rows_cache = ResponseCache(
+    max_entries=settings.DOCUMENT_ROWS_CACHE_SIZE,
+    max_bytes=settings.DOCUMENT_ROWS_CACHE_MAX_MB * 1024 * 1024,
+    name='document_rows'
+)
+
+
+def invalidate_document(document_id: int):
+    """Buang semua cache per proses untuk satu dokumen"""
+    document_detail_cache.invalidate(document_id)
+    document_rows_cache.invalidate(document_id)
@@ -0,0 +1,107 @@
+"""
+Django management command untuk mengonversi Document.content ke format kompresi lain
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Case, Value, When
+
+from core.compression import CODECS, CODEC_NONE, detect_codec, encode_text, get_codec
+from documents.models import Document
+
+
+class Command(BaseCommand):
+    help = 'Kompres (atau dekompres) Document.content yang sudah ada secara batch'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--codec',
+            type=str,
+            default=None,
+            choices=[CODEC_NONE, *CODECS],
+            help='Codec target (default: settings DOCUMENT_CONTENT_COMPRESSION). '
+                 'Gunakan "none" untuk mengembalikan ke teks biasa.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Jumlah dokumen per batch (default: 500)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Hitung estimasi penghematan tanpa menulis ke DB'
+        )
+
+    def handle(self, *args, **options):
+        codec = options['codec'] or get_codec()
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+
+        if batch_size <= 0:
+            raise CommandError('--batch-size harus > 0')
+
+        content_field = Document._meta.get_field('content')
+        started = time.monotonic()
+        last_id = 0
+        scanned = converted = 0
+        bytes_before = bytes_after = 0
+
+        while True:
+            # Keyset pagination by id: stabil dan tidak melambat di tabel besar
+            rows = list(
+                Document.objects.filter(id__gt=last_id)
+                .order_by('id')
+                .values_list('id', 'content')[:batch_size]
+            )
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            scanned += len(rows)
+
+            updates = []
+            for doc_id, stored in rows:
+                if detect_codec(stored) == codec:
+                    continue
+                encoded = encode_text(content_field.to_python(stored), codec)
+                if encoded == stored:
+                    continue
+                bytes_before += len(stored.encode('utf-8'))
+                bytes_after += len(encoded.encode('utf-8'))
+                updates.append((doc_id, encoded))
+
+            if updates and not dry_run:
+                with transaction.atomic():
+                    Document.objects.filter(id__in=[doc_id for doc_id, _ in updates]).update(
+                        content=Case(
+                            *[
+                                When(id=doc_id, then=Value(encoded, output_field=content_field))
+                                for doc_id, encoded in updates
+                            ],
+                            output_field=content_field,
+                        )
+                    )
+            converted += len(updates)
+
+            self.stdout.write(f'  ... scanned {scanned}, converted {converted}')
+
+        elapsed = time.monotonic() - started
+        saved = bytes_before - bytes_after
+        prefix = '[dry-run] ' if dry_run else ''
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'\n✓ {prefix}{converted} of {scanned} documents converted to "{codec}" '
+                f'in {elapsed:.2f}s'
+            )
+        )
+        if converted:
+            ratio = bytes_before / bytes_after if bytes_after else 0
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'Content size: {bytes_before / 1_000_000:.2f} MB -> '
+                    f'{bytes_after / 1_000_000:.2f} MB '
+                    f'(saved {saved / 1_000_000:.2f} MB, ratio {ratio:.1f}x)'
+                )
+            )
@@ -0,0 +1,431 @@
+"""
+Django management command untuk generate corpus dokumen sintetis (capacity testing)
+"""
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.document_extractor import DocumentExtractor
+from core.search import get_search_backend
+from documents.models import CorpusVersion, Document
+
+
+MIME_TYPES = {
+    'txt': 'text/plain',
+    'pdf': 'application/pdf',
+    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+COMPANIES = [
+    'PT ARNATECH INDONESIA', 'PT NUSANTARA DIGITAL', 'PT SINAR DATA UTAMA',
+    'PT MEGA SOLUSI TEKNOLOGI', 'PT CAHAYA INFORMATIKA', 'PT KARYA CLOUD NUSANTARA',
+]
+REGIONS = [
+    'Jawa Barat', 'Jawa Timur', 'Jawa Tengah', 'DKI Jakarta', 'Banten',
+    'Sumatera Utara', 'Sumatera Selatan', 'Kalimantan Timur', 'Sulawesi Selatan', 'Bali',
+]
+QUARTERS = {
+    1: ['Januari', 'Februari', 'Maret'],
+    2: ['April', 'Mei', 'Juni'],
+    3: ['Juli', 'Agustus', 'September'],
+    4: ['Oktober', 'November', 'Desember'],
+}
+ROMAN = ['I', 'II', 'III', 'IV', 'V', 'VI', 'VII', 'VIII', 'IX', 'X']
+KPIS = [
+    ('Net Promoter Score (NPS)', 60, 90, ''),
+    ('Customer Satisfaction Index (CSI)', 75, 95, '%'),
+    ('Customer Retention Rate', 85, 97, '%'),
+    ('Employee Satisfaction Score', 65, 90, ''),
+    ('Churn Rate', 3, 12, '%'),
+    ('First Response Time (menit)', 5, 45, ''),
+]
+REPORT_KINDS = [
+    'LAPORAN KINERJA TRIWULAN', 'LAPORAN OPERASIONAL TRIWULAN',
+    'ANALISIS PASAR & KOMPETITOR', 'LAPORAN KEUANGAN TRIWULAN',
+]
+NARRATIVE = [
+    'Kinerja {region} menunjukkan tren {trend} dibanding periode sebelumnya.',
+    'Program perbaikan layanan pelanggan di {region} berjalan {effect}.',
+    'Focus area berikutnya untuk {region}: {focus}.',
+    'Pertumbuhan revenue didorong oleh peningkatan customer acquisition sebesar {pct}%.',
+    'Upselling berhasil di {pct}% existing customers pada periode ini.',
+    'Churn rate menurun ke {small}% dari sebelumnya {bigger}%.',
+    'Replikasi best practices {region} ke regional lain direkomendasikan.',
+]
+TRENDS = ['positif', 'stabil', 'fluktuatif', 'menurun', 'meningkat signifikan']
+EFFECTS = ['efektif', 'cukup efektif', 'belum optimal', 'sesuai rencana']
+FOCUS = [
+    'customer support response time', 'onboarding klien baru',
+    'retensi klien enterprise', 'efisiensi biaya operasional', 'kualitas jaringan',
+]
+
+
+def _parse_mix(value: str) -> Dict[str, int]:
+    """
+    Parse format mix, contoh: "txt:60,xlsx:25,docx:10,pdf:5"
+    """
+    mix = {}
+    for part in value.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        fmt, _, weight = part.partition(':')
+        fmt = fmt.strip().lower()
+        if fmt not in MIME_TYPES:
+            raise CommandError(f'Format tidak dikenal: {fmt} (pilihan: {", ".join(MIME_TYPES)})')
+        try:
+            mix[fmt] = int(weight or 1)
+        except ValueError:
+            raise CommandError(f'Bobot format tidak valid: {part}')
+    if not mix or sum(mix.values()) <= 0:
+        raise CommandError('Format mix kosong')
+    return mix
+
+
+def _kpi_section(rng: random.Random, letter: str, months: List[str], year: int) -> List[str]:
+    name, low, high, unit = rng.choice(KPIS)
+    lines = [f'{letter}. {name}', '', 'Regional Breakdown:', '']
+    for region in rng.sample(REGIONS, rng.randint(2, 4)):
+        lines.append(region.upper())
+        for month in months:
+            target = rng.randint(low, high)
+            actual = target + rng.randint(-4, 4)
+            gap = actual - target
+            if gap > 0:
+                status = 'Melampaui Target'
+            elif gap == 0:
+                status = 'Tercapai'
+            elif gap >= -1:
+                status = 'Hampir Tercapai'
+            else:
+                status = 'Belum Tercapai'
+            lines += [
+                f'Bulan {month} {year}:',
+                f'- Target: {target}{unit}',
+                f'- Capaian: {actual}{unit}',
+                f'- Gap: {gap:+d}',
+                f'- Status: {status}',
+                '',
+            ]
+    return lines
+
+
+def _revenue_section(rng: random.Random, letter: str, months: List[str], year: int) -> List[str]:
+    lines = [f'{letter}. Revenue Growth (dalam miliar Rupiah)', '']
+    total_target = total_actual = 0.0
+    for month in months:
+        target = round(rng.uniform(8, 20), 1)
+        actual = round(target * rng.uniform(0.9, 1.15), 1)
+        total_target += target
+        total_actual += actual
+        lines += [
+            f'{month} {year}:',
+            f'- Target: {target}',
+            f'- Actual: {actual}',
+            f'- Growth: {(actual - target) / target * 100:+.1f}%',
+            '',
+        ]
+    lines += [
+        'Total:',
+        f'- Target: {total_target:.1f}',
+        f'- Actual: {total_actual:.1f}',
+        f'- Achievement: {total_actual / total_target * 100:.1f}%',
+        '',
+    ]
+    return lines
+
+
+def _narrative(rng: random.Random) -> str:
+    small = round(rng.uniform(3, 8), 1)
+    return rng.choice(NARRATIVE).format(
+        region=rng.choice(REGIONS),
+        trend=rng.choice(TRENDS),
+        effect=rng.choice(EFFECTS),
+        focus=rng.choice(FOCUS),
+        pct=rng.randint(5, 35),
+        small=small,
+        bigger=round(small + rng.uniform(1, 4), 1),
+    )
+
+
+def generate_report_text(rng: random.Random, target_chars: int) -> Dict[str, str]:
+    """
+    Generate teks laporan bisnis berbahasa Indonesia (mirip sample_documents/)
+    """
+    company = rng.choice(COMPANIES)
+    kind = rng.choice(REPORT_KINDS)
+    year = rng.randint(2023, 2026)
+    quarter = rng.randint(1, 4)
+    months = QUARTERS[quarter]
+    title = f'{kind.title()} Q{quarter} {year}'
+
+    lines = [
+        f'{kind} {ROMAN[quarter - 1]} {year}',
+        company,
+        '',
+        '==============================================',
+        '',
+        'I. RINGKASAN EKSEKUTIF',
+        '',
+        ' '.join(_narrative(rng) for _ in range(3)),
+        '',
+        'II. KEY PERFORMANCE INDICATORS (KPI)',
+        '',
+    ]
+
+    section = 0
+    size = sum(len(line) + 1 for line in lines)
+    while size < target_chars:
+        letter = chr(ord('A') + section % 26)
+        if section % 3 == 2:
+            block = _revenue_section(rng, letter, months, year)
+        else:
+            block = _kpi_section(rng, letter, months, year)
+        block += [_narrative(rng), '']
+        lines += block
+        size += sum(len(line) + 1 for line in block)
+        section += 1
+
+    lines += [
+        '---',
+        'Disusun oleh: Tim Analisis Bisnis',
+        f'Periode: Q{quarter} {year} ({months[0]} - {months[-1]} {year})',
+    ]
+    return {'title': title, 'content': '\n'.join(lines)}
+
+
+def generate_workbook(rng: random.Random, rows_per_sheet: int) -> Dict:
+    """
+    Generate structured_data XLSX (format sama dengan DocumentExtractor._extract_xlsx)
+    """
+    year = rng.randint(2023, 2026)
+    sheets = []
+    for name, low, high, _ in rng.sample(KPIS, rng.randint(1, 3)):
+        columns = ['Tanggal', 'Regional', 'Target', 'Capaian']
+        rows = []
+        for day in range(rows_per_sheet):
+            month = 1 + (day // 28) % 12
+            target = rng.randint(low, high)
+            rows.append([
+                f'{year}-{month:02d}-{day % 28 + 1:02d}',
+                rng.choice(REGIONS),
+                target,
+                target + rng.randint(-5, 5),
+            ])
+        sheets.append({'name': name.split(' (')[0][:31], 'columns': columns, 'rows': rows})
+    return {'format': 'xlsx', 'sheets': sheets}
+
+
+def generate_document(args) -> Dict:
+    """
+    Generate satu dokumen (dipanggil di process pool, harus top-level & picklable)
+
+    Args:
+        args: Tuple (index, fmt, seed, avg_chars, xlsx_rows)
+    """
+    index, fmt, seed, avg_chars, xlsx_rows = args
+    rng = random.Random(seed * 1_000_003 + index)
+
+    if fmt == 'xlsx':
+        structured_data = generate_workbook(rng, max(1, int(xlsx_rows * rng.uniform(0.5, 1.5))))
+        content = '\n'.join(
+            DocumentExtractor.summarize_sheet(sheet) for sheet in structured_data['sheets']
+        )
+        title = f'Data KPI Harian {structured_data["sheets"][0]["rows"][0][0][:4]}'
+    else:
+        structured_data = None
+        report = generate_report_text(rng, max(200, int(avg_chars * rng.uniform(0.5, 1.5))))
+        title, content = report['title'], report['content']
+
+    return {
+        'title': title,
+        'content': DocumentExtractor._normalize_text(content),
+        'structured_data': structured_data,
+        'source_filename': f'synthetic_{index:06d}.{fmt}',
+        'mime_type': MIME_TYPES[fmt],
+    }
+
+
+def write_document_file(output_dir: str, doc: Dict) -> str:
+    """
+    Tulis dokumen sintetis sebagai file asli (untuk benchmark upload/ekstraksi)
+    """
+    path = os.path.join(output_dir, doc['source_filename'])
+    fmt = doc['source_filename'].rsplit('.', 1)[-1]
+
+    if fmt == 'txt':
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(doc['content'])
+    elif fmt == 'docx':
+        import docx
+        document = docx.Document()
+        for line in doc['content'].split('\n'):
+            document.add_paragraph(line)
+        document.save(path)
+    elif fmt == 'xlsx':
+        import openpyxl
+        wb = openpyxl.Workbook()
+        wb.remove(wb.active)
+        for sheet in doc['structured_data']['sheets']:
+            ws = wb.create_sheet(sheet['name'])
+            ws.append(sheet['columns'])
+            for row in sheet['rows']:
+                ws.append(row)
+        wb.save(path)
+    else:
+        raise CommandError(f'Menulis file {fmt} tidak didukung (gunakan tanpa --output-dir)')
+    return path
+
+
+class Command(BaseCommand):
+    help = 'Generate corpus dokumen sintetis (ukuran dan format mix bisa diatur) untuk capacity testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--count',
+            type=int,
+            default=1000,
+            help='Jumlah dokumen yang di-generate (default: 1000)'
+        )
+        parser.add_argument(
+            '--user-id',
+            type=str,
+            default='bench-user-001',
+            help='User ID untuk ownership dokumen (default: bench-user-001)'
+        )
+        parser.add_argument(
+            '--formats',
+            type=str,
+            default='txt:60,xlsx:20,docx:15,pdf:5',
+            help='Format mix dengan bobot, contoh: txt:60,xlsx:20,docx:15,pdf:5'
+        )
+        parser.add_argument(
+            '--avg-chars',
+            type=int,
+            default=8000,
+            help='Rata-rata panjang teks dokumen non-XLSX (default: 8000, variasi ±50%%)'
+        )
+        parser.add_argument(
+            '--xlsx-rows',
+            type=int,
+            default=200,
+            help='Rata-rata jumlah row per sheet XLSX (default: 200)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Jumlah dokumen per bulk_create (default: 500)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Jumlah proses generator paralel (default: jumlah CPU)'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Random seed agar corpus reproducible (default: 42)'
+        )
+        parser.add_argument(
+            '--output-dir',
+            type=str,
+            default=None,
+            help='Tulis file asli (txt/docx/xlsx) ke direktori ini alih-alih insert ke DB'
+        )
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Hapus semua dokumen existing milik --user-id sebelum generate'
+        )
+
+    def handle(self, *args, **options):
+        count = options['count']
+        user_id = options['user_id']
+        batch_size = max(1, options['batch_size'])
+        workers = max(1, options['workers'])
+        output_dir = options['output_dir']
+        mix = _parse_mix(options['formats'])
+
+        if count <= 0:
+            raise CommandError('--count harus > 0')
+        if output_dir and 'pdf' in mix:
+            raise CommandError('Format pdf hanya didukung untuk insert ke DB (tanpa --output-dir)')
+
+        if options['clear'] and not output_dir:
+            deleted, _ = Document.objects.filter(owner_user_id=user_id).delete()
+            self.stdout.write(
+                self.style.WARNING(f'Deleted {deleted} existing documents for user {user_id}')
+            )
+
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+
+        # Format per dokumen ditentukan di awal agar deterministik terhadap --seed
+        rng = random.Random(options['seed'])
+        formats = rng.choices(list(mix), weights=list(mix.values()), k=count)
+        tasks = [
+            (i, fmt, options['seed'], options['avg_chars'], options['xlsx_rows'])
+            for i, fmt in enumerate(formats)
+        ]
+
+        started = time.monotonic()
+        created = 0
+        total_chars = 0
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            chunksize = max(1, min(64, batch_size // workers))
+            generated = pool.map(generate_document, tasks, chunksize=chunksize)
+
+            batch = []
+            for doc in generated:
+                total_chars += len(doc['content'])
+                if output_dir:
+                    write_document_file(output_dir, doc)
+                    created += 1
+                    continue
+
+                document = Document(
+                    owner_user_id=user_id,
+                    title=doc['title'],
+                    content=doc['content'],
+                    structured_data=doc['structured_data'],
+                    source_filename=doc['source_filename'],
+                    mime_type=doc['mime_type'],
+                )
+                # bulk_create tidak memanggil save(): preview + statistik teks dihitung di sini
+                document.refresh_stats()
+                batch.append(document)
+                if len(batch) >= batch_size:
+                    Document.objects.bulk_create(batch, batch_size=batch_size)
+                    get_search_backend().index_documents(batch)
+                    created += len(batch)
+                    batch = []
+                    self.stdout.write(f'  ... {created}/{count}')
+
+            if batch:
+                Document.objects.bulk_create(batch, batch_size=batch_size)
+                get_search_backend().index_documents(batch)
+                created += len(batch)
+
+        if created and not output_dir:
+            # bulk_create tidak memicu post_save
+            CorpusVersion.bump()
+
+        elapsed = time.monotonic() - started
+        target = output_dir or f'database (user {user_id})'
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'\n✓ Generated {created} documents ({total_chars / 1_000_000:.1f}M chars) '
+                f'to {target} in {elapsed:.2f}s ({created / max(elapsed, 1e-9):.0f} docs/s)'
+            )
+        )
+        mix_summary = ', '.join(f'{fmt}={formats.count(fmt)}' for fmt in mix)
+        self.stdout.write(self.style.SUCCESS(f'Format mix: {mix_summary}'))
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.14 on 2026-10-19 09:37
+
+import core.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0002_add_structured_data'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='document',
+            name='content',
+            field=core.fields.CompressedTextField(help_text='Teks hasil ekstraksi dokumen (dikompresi sesuai DOCUMENT_CONTENT_COMPRESSION)'),
+        ),
+    ]
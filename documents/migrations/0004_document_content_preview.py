@@ -0,0 +1,46 @@
+# Generated by Django 5.0.14 on 2026-10-19 09:42
+
+from django.db import migrations, models
+
+
+PREVIEW_LENGTH = 200
+BATCH_SIZE = 500
+
+
+def backfill_content_preview(apps, schema_editor):
+    Document = apps.get_model('documents', 'Document')
+    last_id = 0
+    while True:
+        batch = list(
+            Document.objects.filter(id__gt=last_id).order_by('id').only('id', 'content')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        last_id = batch[-1].id
+        for document in batch:
+            content = document.content or ''
+            preview = content[:PREVIEW_LENGTH]
+            if len(content) > PREVIEW_LENGTH:
+                preview += '...'
+            document.content_preview = preview
+        Document.objects.bulk_update(batch, ['content_preview'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0003_compress_content'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='content_preview',
+            field=models.CharField(blank=True, default='', help_text='Preview konten (200 karakter pertama), diisi saat ingestion', max_length=203),
+        ),
+        migrations.RunPython(backfill_content_preview, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(fields=['-created_at', '-id'], name='documents_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.0.14 on 2026-10-19 09:45
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0004_document_content_preview'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CorpusVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'corpus_version',
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.0.14 on 2026-10-19 10:05
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0005_corpus_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CorpusSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64, unique=True)),
+                ('version', models.BigIntegerField(default=0, help_text='CorpusVersion.version saat snapshot dibuat')),
+                ('document_ids', models.JSONField(default=list)),
+                ('document_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'corpus_snapshots',
+                'ordering': ['-id'],
+            },
+        ),
+    ]
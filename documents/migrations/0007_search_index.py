@@ -0,0 +1,37 @@
+from django.db import migrations
+
+from core.search import get_search_backend
+
+
+def create_search_index(apps, schema_editor):
+    """Buat tabel full-text search (FTS5 / tsvector) lalu index dokumen yang sudah ada"""
+    backend = get_search_backend(schema_editor.connection)
+    backend.create_schema(schema_editor)
+    
+    Document = apps.get_model('documents', 'Document')
+    last_id = 0
+    while True:
+        batch = list(
+            Document.objects.filter(id__gt=last_id)
+            .order_by('id')
+            .only('id', 'title', 'content')[:200]
+        )
+        if not batch:
+            break
+        last_id = batch[-1].id
+        backend.index_documents(batch)
+
+
+def drop_search_index(apps, schema_editor):
+    get_search_backend(schema_editor.connection).drop_schema(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0006_corpus_snapshot'),
+    ]
+    
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
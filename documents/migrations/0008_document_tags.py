@@ -0,0 +1,31 @@
+# Generated by Django 5.0.14 on 2026-10-19 10:13
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0007_search_index'),
+    ]
+    
+    operations = [
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'document_tags',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='tags',
+            field=models.ManyToManyField(blank=True, db_table='document_tag_links', related_name='documents', to='documents.tag'),
+        ),
+    ]
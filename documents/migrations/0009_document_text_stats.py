@@ -0,0 +1,71 @@
+# Generated by Django 5.0.14 on 2026-10-19 10:17
+
+from django.db import migrations, models
+
+from core.text_stats import compute_stats
+
+
+def fill_text_stats(apps, schema_editor):
+    """Hitung statistik teks untuk dokumen yang sudah ada (batch, keyset by id)"""
+    Document = apps.get_model('documents', 'Document')
+    fields = list(compute_stats(''))
+    last_id = 0
+    while True:
+        batch = list(
+            Document.objects.filter(id__gt=last_id)
+            .order_by('id')
+            .only('id', 'content', 'structured_data')[:200]
+        )
+        if not batch:
+            break
+        last_id = batch[-1].id
+        for document in batch:
+            for name, value in compute_stats(document.content, document.structured_data).items():
+                setattr(document, name, value)
+        Document.objects.bulk_update(batch, fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0008_document_tags'),
+    ]
+    
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='chunk_count',
+            field=models.IntegerField(default=0, help_text='Jumlah chunk 10.000 karakter (GET /api/documents/{id}/content?chunk=)'),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='language',
+            field=models.CharField(blank=True, default='', help_text='Bahasa dominan: id, en, atau und (tidak diketahui)', max_length=8),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='line_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='sentence_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='structured_token_count',
+            field=models.IntegerField(default=0, help_text='Estimasi token structured_data saat disuntikkan ke prompt (JSON)'),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='token_count',
+            field=models.IntegerField(default=0, help_text='Estimasi jumlah token content (heuristik, tanpa tokenizer)'),
+        ),
+        migrations.AlterField(
+            model_name='document',
+            name='content_length',
+            field=models.IntegerField(blank=True, help_text='Panjang konten dalam karakter', null=True),
+        ),
+        migrations.RunPython(fill_text_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.0.14 on 2026-10-19 10:45
+
+from django.db import migrations, models
+
+from core.chart_builder import ChartBuilder
+
+
+def fill_structured_columns(apps, schema_editor):
+    """Isi indeks kolom untuk dokumen yang punya structured_data (batch, keyset by id)"""
+    Document = apps.get_model('documents', 'Document')
+    last_id = 0
+    while True:
+        batch = list(
+            Document.objects.filter(id__gt=last_id, structured_data__isnull=False)
+            .order_by('id')
+            .only('id', 'structured_data')[:200]
+        )
+        if not batch:
+            break
+        last_id = batch[-1].id
+        for document in batch:
+            document.structured_columns = ChartBuilder.column_index(document.structured_data)
+        Document.objects.bulk_update(batch, ['structured_columns'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0009_document_text_stats'),
+    ]
+    
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='structured_columns',
+            field=models.JSONField(blank=True, help_text='Nama sheet, kolom dan kolom angka structured_data (tanpa rows), diisi saat ingestion', null=True),
+        ),
+        migrations.RunPython(fill_structured_columns, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+from django.db import migrations
+
+from core.search import get_search_backend
+
+
+def rebuild_search_index(apps, schema_editor):
+    """
+    Ganti tabel search lama (berisi salinan teks polos) dengan index tanpa teks:
+    FTS5 contentless di SQLite, kolom tsvector saja di PostgreSQL
+    """
+    backend = get_search_backend(schema_editor.connection)
+    backend.drop_schema(schema_editor)
+    backend.create_schema(schema_editor)
+    
+    Document = apps.get_model('documents', 'Document')
+    last_id = 0
+    while True:
+        batch = list(
+            Document.objects.filter(id__gt=last_id)
+            .order_by('id')
+            .only('id', 'title', 'content')[:200]
+        )
+        if not batch:
+            break
+        last_id = batch[-1].id
+        backend.index_documents(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0010_document_structured_columns'),
+    ]
+    
+    operations = [
+        migrations.RunPython(rebuild_search_index, migrations.RunPython.noop),
+    ]
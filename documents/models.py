@@ -1,27 +1,127 @@
+import hashlib
+import re
+from typing import Iterable, List, Union
+
 from django.db import models
+from django.db.models import F
 from django.utils import timezone
 
+from core.chart_builder import ChartBuilder
+from core.fields import CompressedTextField
+from core.text_stats import compute_stats, structured_data_tokens
+
+
+class Tag(models.Model):
+    """
+    Tag dokumen (nama dinormalisasi: lowercase, spasi dirapikan)
+    
+    Relasi ke dokumen lewat tabel M2M `document_tag_links` yang ter-index di kedua
+    kolom, sehingga filter dokumen per tag cukup lookup index, bukan scan content.
+    """
+    
+    MAX_LENGTH = 50
+    MAX_PER_DOCUMENT = 20
+    
+    name = models.CharField(max_length=MAX_LENGTH, unique=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        db_table = 'document_tags'
+        ordering = ['name']
+    
+    @staticmethod
+    def normalize(name: str) -> str:
+        return re.sub(r'\s+', ' ', str(name)).strip().lower()
+    
+    @classmethod
+    def parse(cls, value: Union[str, Iterable[str], None]) -> List[str]:
+        """Nama tag unik ter-normalisasi dari string dipisah koma atau list"""
+        if not value:
+            return []
+        if isinstance(value, str):
+            value = value.split(',')
+        names = []
+        for name in map(cls.normalize, value):
+            if name and name not in names:
+                names.append(name)
+        return names
+    
+    @classmethod
+    def resolve(cls, names: Iterable[str]) -> List['Tag']:
+        """Ambil tag berdasarkan nama (dibuat jika belum ada)"""
+        names = cls.parse(names)
+        if not names:
+            return []
+        cls.objects.bulk_create([cls(name=name) for name in names], ignore_conflicts=True)
+        return list(cls.objects.filter(name__in=names))
+    
+    def __str__(self):
+        return self.name
+
 
 class Document(models.Model):
     """Model untuk menyimpan dokumen yang di-upload"""
     
+    PREVIEW_LENGTH = 200
+    
     owner_user_id = models.CharField(
         max_length=255,
         help_text="User ID dari SSO token (untuk audit/ownership)"
     )
     title = models.CharField(max_length=500)
-    content = models.TextField(help_text="Teks hasil ekstraksi dokumen")
+    content = CompressedTextField(
+        help_text="Teks hasil ekstraksi dokumen (dikompresi sesuai DOCUMENT_CONTENT_COMPRESSION)"
+    )
+    content_preview = models.CharField(
+        max_length=PREVIEW_LENGTH + 3,
+        blank=True,
+        default='',
+        help_text="Preview konten (200 karakter pertama), diisi saat ingestion"
+    )
     structured_data = models.JSONField(
         blank=True,
         null=True,
         help_text="Data terstruktur (misalnya tabel dari Excel)"
     )
+    structured_columns = models.JSONField(
+        blank=True,
+        null=True,
+        help_text="Nama sheet, kolom dan kolom angka structured_data (tanpa rows), diisi saat ingestion"
+    )
     source_filename = models.CharField(max_length=500)
     mime_type = models.CharField(max_length=100, blank=True, null=True)
+    tags = models.ManyToManyField(
+        Tag,
+        blank=True,
+        related_name='documents',
+        db_table='document_tag_links'
+    )
     content_length = models.IntegerField(
         blank=True, 
         null=True,
-        help_text="Panjang konten dalam bytes"
+        help_text="Panjang konten dalam karakter"
+    )
+    # Statistik teks (core/text_stats.py), dihitung saat ingestion / content berubah
+    # agar perencanaan konteks dan laporan kapasitas tidak perlu membaca content
+    token_count = models.IntegerField(
+        default=0,
+        help_text="Estimasi jumlah token content (heuristik, tanpa tokenizer)"
+    )
+    structured_token_count = models.IntegerField(
+        default=0,
+        help_text="Estimasi token structured_data saat disuntikkan ke prompt (JSON)"
+    )
+    line_count = models.IntegerField(default=0)
+    sentence_count = models.IntegerField(default=0)
+    chunk_count = models.IntegerField(
+        default=0,
+        help_text="Jumlah chunk 10.000 karakter (GET /api/documents/{id}/content?chunk=)"
+    )
+    language = models.CharField(
+        max_length=8,
+        blank=True,
+        default='',
+        help_text="Bahasa dominan: id, en, atau und (tidak diketahui)"
     )
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
@@ -31,7 +131,164 @@ class Document(models.Model):
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['owner_user_id', '-created_at']),
+            models.Index(fields=['-created_at', '-id'], name='documents_created_id_idx'),
         ]
     
+    @classmethod
+    def build_preview(cls, content):
+        """Buat preview konten (PREVIEW_LENGTH karakter pertama + '...')"""
+        if not content:
+            return ''
+        preview = content[:cls.PREVIEW_LENGTH]
+        if len(content) > cls.PREVIEW_LENGTH:
+            preview += "..."
+        return preview
+    
+    @classmethod
+    def ids_with_any_tag(cls, tag_names: Iterable[str]):
+        """Subquery id dokumen yang memiliki salah satu tag (dipakai sebagai filter id__in)"""
+        return cls.tags.through.objects.filter(
+            tag__name__in=Tag.parse(tag_names)
+        ).values('document_id')
+    
+    def refresh_stats(self, fields=('content', 'structured_data')) -> List[str]:
+        """
+        Hitung ulang preview, statistik teks dan indeks kolom dari content / structured_data
+        
+        Field sumber yang deferred (tidak ter-load) dilewati.
+        
+        Returns:
+            Nama field yang diperbarui
+        """
+        deferred = self.get_deferred_fields()
+        values = {}
+        if 'content' in fields and 'content' not in deferred:
+            values = compute_stats(self.content)
+            values['content_preview'] = self.build_preview(self.content)
+            del values['structured_token_count']
+        if 'structured_data' in fields and 'structured_data' not in deferred:
+            values['structured_token_count'] = structured_data_tokens(self.structured_data)
+            values['structured_columns'] = ChartBuilder.column_index(self.structured_data)
+        for name, value in values.items():
+            setattr(self, name, value)
+        return list(values)
+    
+    def save(self, *args, **kwargs):
+        # Sinkronkan preview dan statistik untuk field sumber yang ikut disimpan
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            self.refresh_stats()
+        else:
+            updated = self.refresh_stats(fields=set(update_fields))
+            if updated:
+                kwargs['update_fields'] = {*update_fields, *updated}
+        super().save(*args, **kwargs)
+    
     def __str__(self):
         return f"{self.title} ({self.source_filename})"
+
+
+class CorpusVersion(models.Model):
+    """
+    Counter versi corpus dokumen (satu row, id=1)
+    
+    Naik setiap ada dokumen dibuat, diubah atau dihapus. Dipakai sebagai
+    validator (ETag / Last-Modified) untuk list dokumen.
+    """
+    
+    SINGLETON_ID = 1
+    
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        db_table = 'corpus_version'
+    
+    @classmethod
+    def current(cls):
+        """Ambil row versi corpus (dibuat jika belum ada)"""
+        obj, _ = cls.objects.get_or_create(pk=cls.SINGLETON_ID)
+        return obj
+    
+    @classmethod
+    def bump(cls):
+        """Naikkan versi corpus secara atomic"""
+        now = timezone.now()
+        updated = cls.objects.filter(pk=cls.SINGLETON_ID).update(
+            version=F('version') + 1,
+            updated_at=now
+        )
+        if not updated:
+            cls.objects.get_or_create(
+                pk=cls.SINGLETON_ID,
+                defaults={'version': 1, 'updated_at': now}
+            )
+    
+    def __str__(self):
+        return f"Corpus v{self.version}"
+
+
+class CorpusSnapshot(models.Model):
+    """
+    Snapshot himpunan dokumen yang menjadi konteks chat
+    
+    Diidentifikasi oleh hash SHA-256 dari pasangan (id, updated_at) semua dokumen,
+    sehingga corpus yang sama selalu memakai snapshot yang sama. Snapshot baru dibuat
+    saat chat pertama setelah dokumen berubah; ChatLog dan prompt cukup mereferensikan
+    id snapshot, bukan seluruh daftar id dokumen.
+    """
+    
+    CACHE_SIZE = 64
+    _cache = {}
+    
+    content_hash = models.CharField(max_length=64, unique=True)
+    version = models.BigIntegerField(
+        default=0,
+        help_text="CorpusVersion.version saat snapshot dibuat"
+    )
+    document_ids = models.JSONField(default=list)
+    document_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        db_table = 'corpus_snapshots'
+        ordering = ['-id']
+    
+    @staticmethod
+    def compute_hash(entries) -> str:
+        """Hash dari iterable (id, updated_at) yang sudah diurutkan berdasarkan id"""
+        digest = hashlib.sha256()
+        for doc_id, updated_at in entries:
+            digest.update(f'{doc_id}:{updated_at.timestamp():.6f};'.encode('ascii'))
+        return digest.hexdigest()
+    
+    @classmethod
+    def for_documents(cls, documents) -> 'CorpusSnapshot':
+        """
+        Snapshot untuk dokumen yang sudah di-load (dibuat jika belum ada)
+        
+        Snapshot bersifat immutable sehingga di-cache per proses berdasarkan hash;
+        cache hit tidak membutuhkan query sama sekali.
+        """
+        entries = sorted((doc.id, doc.updated_at) for doc in documents)
+        content_hash = cls.compute_hash(entries)
+        
+        snapshot = cls._cache.get(content_hash)
+        if snapshot is not None:
+            return snapshot
+        
+        snapshot, _ = cls.objects.get_or_create(
+            content_hash=content_hash,
+            defaults={
+                'version': lambda: CorpusVersion.current().version,
+                'document_ids': [doc_id for doc_id, _ in entries],
+                'document_count': len(entries),
+            }
+        )
+        if len(cls._cache) >= cls.CACHE_SIZE:
+            cls._cache.clear()
+        cls._cache[content_hash] = snapshot
+        return snapshot
+    
+    def __str__(self):
+        return f"Snapshot {self.id} ({self.document_count} dokumen, v{self.version})"
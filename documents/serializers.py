@@ -2,7 +2,22 @@
 Serializers untuk Document API
 """
 from rest_framework import serializers
-from .models import Document
+from .models import Document, Tag
+
+
+def validate_tag_names(value):
+    """Parse tags (string dipisah koma atau list) menjadi list nama ter-normalisasi"""
+    names = Tag.parse(value)
+    if len(names) > Tag.MAX_PER_DOCUMENT:
+        raise serializers.ValidationError(
+            f"Jumlah tag melebihi batas maksimal {Tag.MAX_PER_DOCUMENT}"
+        )
+    too_long = [name for name in names if len(name) > Tag.MAX_LENGTH]
+    if too_long:
+        raise serializers.ValidationError(
+            f"Panjang tag maksimal {Tag.MAX_LENGTH} karakter: {', '.join(too_long)}"
+        )
+    return names
 
 
 class DocumentUploadSerializer(serializers.Serializer):
@@ -17,7 +32,7 @@ class DocumentUploadSerializer(serializers.Serializer):
     tags = serializers.CharField(
         required=False,
         allow_blank=True,
-        help_text="Tags dipisah koma (opsional untuk POC)"
+        help_text="Tags dipisah koma (opsional), mis. `laporan,q3,jabar`"
     )
     
     def validate_file(self, value):
@@ -33,12 +48,85 @@ class DocumentUploadSerializer(serializers.Serializer):
         
         return value
 
+    def validate_tags(self, value):
+        return validate_tag_names(value)
+
+
+class DocumentBulkUploadSerializer(serializers.Serializer):
+    """Serializer untuk bulk upload (banyak file dan/atau ZIP archive)"""
+    
+    files = serializers.ListField(
+        child=serializers.FileField(),
+        required=False,
+        allow_empty=True,
+        help_text="Beberapa file dokumen (field `files` diulang)"
+    )
+    archive = serializers.FileField(
+        required=False,
+        help_text="ZIP archive berisi dokumen"
+    )
+    tags = serializers.CharField(
+        required=False,
+        allow_blank=True,
+        help_text="Tags dipisah koma, dipasang ke semua dokumen yang berhasil diupload"
+    )
+    
+    def validate_files(self, value):
+        """Validasi jumlah dan ukuran setiap file"""
+        from django.conf import settings
+        
+        if len(value) > settings.BULK_UPLOAD_MAX_FILES:
+            raise serializers.ValidationError(
+                f"Jumlah file melebihi batas maksimal {settings.BULK_UPLOAD_MAX_FILES}"
+            )
+        
+        max_size = settings.MAX_UPLOAD_SIZE_MB * 1024 * 1024
+        for uploaded_file in value:
+            if uploaded_file.size > max_size:
+                raise serializers.ValidationError(
+                    f"Ukuran file {uploaded_file.name} melebihi batas maksimal "
+                    f"{settings.MAX_UPLOAD_SIZE_MB} MB"
+                )
+        
+        return value
+    
+    def validate_archive(self, value):
+        """Validasi ukuran dan format ZIP"""
+        import zipfile
+        from django.conf import settings
+        
+        max_size = settings.BULK_UPLOAD_MAX_ARCHIVE_SIZE_MB * 1024 * 1024
+        if value.size > max_size:
+            raise serializers.ValidationError(
+                f"Ukuran archive melebihi batas maksimal {settings.BULK_UPLOAD_MAX_ARCHIVE_SIZE_MB} MB"
+            )
+        
+        if not zipfile.is_zipfile(value):
+            raise serializers.ValidationError("Archive harus berupa file ZIP")
+        value.seek(0)
+        
+        return value
+    
+    def validate_tags(self, value):
+        return validate_tag_names(value)
+    
+    def validate(self, attrs):
+        if not attrs.get('files') and not attrs.get('archive'):
+            raise serializers.ValidationError(
+                "Kirim minimal satu file (`files`) atau ZIP archive (`archive`)"
+            )
+        return attrs
+
 
 class DocumentSerializer(serializers.ModelSerializer):
-    """Serializer untuk list dan detail dokumen"""
+    """
+    Serializer untuk list dan detail dokumen
     
-    # Jangan expose content_length yang terlalu besar
-    content_preview = serializers.SerializerMethodField()
+    Menerima kwarg `fields` (list nama field) untuk membatasi field yang
+    di-serialize, misalnya dari query param `?fields=id,title`.
+    """
+    
+    tags = serializers.SlugRelatedField(many=True, read_only=True, slug_field='name')
     
     class Meta:
         model = Document
@@ -48,25 +136,31 @@ class DocumentSerializer(serializers.ModelSerializer):
             'source_filename',
             'mime_type',
             'content_length',
+            'token_count',
+            'structured_token_count',
+            'line_count',
+            'sentence_count',
+            'chunk_count',
+            'language',
             'content_preview',
+            'tags',
             'created_at',
             'updated_at'
         ]
         read_only_fields = fields
     
-    def get_content_preview(self, obj):
-        """Return preview konten (200 karakter pertama)"""
-        if obj.content:
-            preview = obj.content[:200]
-            if len(obj.content) > 200:
-                preview += "..."
-            return preview
-        return ""
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
 
 
 class DocumentDetailSerializer(serializers.ModelSerializer):
     """Serializer untuk detail dokumen dengan full content"""
     
+    tags = serializers.SlugRelatedField(many=True, read_only=True, slug_field='name')
+    
     class Meta:
         model = Document
         fields = [
@@ -78,6 +172,13 @@ class DocumentDetailSerializer(serializers.ModelSerializer):
             'source_filename',
             'mime_type',
             'content_length',
+            'token_count',
+            'structured_token_count',
+            'line_count',
+            'sentence_count',
+            'chunk_count',
+            'language',
+            'tags',
             'created_at',
             'updated_at'
         ]
@@ -0,0 +1,55 @@
+"""
+Signal handlers: naikkan versi corpus, invalidasi cache dokumen dan sinkronkan
+index full-text search saat dokumen berubah
+"""
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.search import get_search_backend
+from .cache import invalidate_document
+from .models import CorpusVersion, Document
+
+
+SEARCH_INDEXED_FIELDS = {'title', 'content'}
+
+
+@receiver(post_save, sender=Document)
+def document_saved(sender, instance, update_fields=None, **kwargs):
+    invalidate_document(instance.pk)
+    CorpusVersion.bump()
+    if update_fields is None or SEARCH_INDEXED_FIELDS & set(update_fields):
+        get_search_backend().index_documents([instance])
+
+
+@receiver(m2m_changed, sender=Document.tags.through)
+def document_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == 'pre_clear':
+        # tag.documents.clear() tidak mengirim pk_set: simpan id dokumen sebelum dihapus
+        instance._cleared_document_ids = list(instance.documents.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    # reverse=True: perubahan dari sisi Tag (tag.documents.add(...))
+    if not reverse:
+        document_ids = [instance.pk]
+    elif action == 'post_clear':
+        document_ids = getattr(instance, '_cleared_document_ids', [])
+    else:
+        document_ids = list(pk_set or ())
+    # Tag ikut di response detail: updated_at dinaikkan agar ETag / Last-Modified berubah
+    # (update() tidak memicu post_save, cache dokumen diinvalidasi di bawah)
+    now = timezone.now()
+    Document.objects.filter(pk__in=document_ids).update(updated_at=now)
+    if not reverse:
+        instance.updated_at = now
+    for document_id in document_ids:
+        invalidate_document(document_id)
+    CorpusVersion.bump()
+
+
+@receiver(post_delete, sender=Document)
+def document_deleted(sender, instance, **kwargs):
+    invalidate_document(instance.pk)
+    CorpusVersion.bump()
+    get_search_backend().remove_documents([instance.pk])
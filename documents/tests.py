@@ -1,3 +1,632 @@
-from django.test import TestCase
+import io
+import os
+import tempfile
+import zipfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection
+from django.test import Client, TestCase, override_settings
+from django.utils import timezone
+
+from core.bulk_ingest import BulkIngestService
+from core.document_extractor import DocumentExtractor
+from core.metrics import registry
+from core.search import SNIPPET_ELLIPSIS, build_snippet, retrieve_document_ids
+
+from .cache import document_detail_cache, document_rows_cache
+from .models import CorpusSnapshot, CorpusVersion, Document, Tag
+
+
+@override_settings(ADMISSION_ENABLED=False, REQUEST_TIMING_LOG=False)
+class DocumentAPITestCase(TestCase):
+    """Client ter-autentikasi (verifikasi SSO di-mock) untuk endpoint /api/documents/"""
+    
+    def setUp(self):
+        super().setUp()
+        auth = mock.patch('core.authentication.SharedTokenCache.get_or_verify', return_value='user-1')
+        auth.start()
+        self.addCleanup(auth.stop)
+        self.client = Client(HTTP_AUTHORIZATION='Bearer token')
+        document_detail_cache.clear()
+        self.addCleanup(document_detail_cache.clear)
+        document_rows_cache.clear()
+        self.addCleanup(document_rows_cache.clear)
+    
+    @staticmethod
+    def create_document(title='Laporan', content='Isi laporan bulanan.', **fields):
+        return Document.objects.create(
+            owner_user_id='user-1', title=title, content=content,
+            source_filename=f'{title}.txt', **fields
+        )
+
+
+class DocumentDetailCacheTests(DocumentAPITestCase):
+    """Conditional GET dan cache body detail dokumen"""
+    
+    def _get(self, document, **headers):
+        return self.client.get(f'/api/documents/{document.pk}/', **headers)
+    
+    def test_unchanged_document_returns_304(self):
+        document = self.create_document()
+        etag = self._get(document)['ETag']
+        self.assertEqual(self._get(document, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+    
+    def test_saved_document_invalidates_etag_and_cached_body(self):
+        document = self.create_document()
+        etag = self._get(document)['ETag']
+        self.assertIsNotNone(document_detail_cache.get(document.pk, document.updated_at))
+        
+        document.title = 'Laporan revisi'
+        document.save()
+        self.assertNotIn(document.pk, document_detail_cache._entries)
+        
+        response = self._get(document, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['title'], 'Laporan revisi')
+    
+    def test_tag_change_invalidates_etag_and_cached_body(self):
+        document = self.create_document()
+        etag = self._get(document)['ETag']
+        
+        document.tags.add(Tag.objects.create(name='keuangan'))
+        response = self._get(document, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['tags'], ['keuangan'])
+        
+        etag = response['ETag']
+        Tag.objects.get(name='keuangan').documents.clear()
+        response = self._get(document, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['tags'], [])
+    
+    def test_deleted_document_is_evicted(self):
+        document = self.create_document()
+        self._get(document)
+        document_id = document.pk
+        
+        document.delete()
+        self.assertNotIn(document_id, document_detail_cache._entries)
+        self.assertEqual(self.client.get(f'/api/documents/{document_id}/').status_code, 404)
+    
+    def test_non_numeric_id_returns_404(self):
+        self.assertEqual(self.client.get('/api/documents/abc/').status_code, 404)
+
+
+class DocumentRangeTests(DocumentAPITestCase):
+    """GET /api/documents/{id}/content dan /rows: potongan content dan halaman rows sheet"""
+    
+    CONTENT = ''.join(chr(ord('a') + i % 26) for i in range(2500))
+    
+    def _content(self, document, **params):
+        return self.client.get(f'/api/documents/{document.pk}/content/', params)
+    
+    def _rows(self, document, **params):
+        return self.client.get(f'/api/documents/{document.pk}/rows/', params)
+    
+    def _sheet_document(self):
+        return self.create_document(structured_data={'sheets': [
+            {'name': 'Q1', 'columns': ['bulan', 'nilai'], 'rows': [[f'b{i}', i] for i in range(25)]},
+            {'name': 'Q2', 'columns': ['bulan'], 'rows': [['x']]},
+        ]})
+    
+    def test_content_by_offset_and_chunk(self):
+        document = self.create_document(content=self.CONTENT)
+        body = self._content(document, offset=2000, length=300).json()
+        self.assertEqual(body['content'], self.CONTENT[2000:2300])
+        self.assertEqual((body['total_length'], body['next_offset']), (2500, 2300))
+        
+        body = self._content(document, chunk=2, length=1000).json()
+        self.assertEqual(body['content'], self.CONTENT[2000:])
+        self.assertEqual((body['chunk'], body['total_chunks'], body['next_offset']), (2, 3, None))
+        
+        self.assertEqual(self._content(document, offset=-1).status_code, 400)
+        self.assertEqual(self.client.get('/api/documents/999999/content/').status_code, 404)
+    
+    def test_compressed_content_is_sliced_after_decoding(self):
+        with override_settings(DOCUMENT_CONTENT_COMPRESSION='zlib', DOCUMENT_CONTENT_COMPRESSION_MIN_LENGTH=0):
+            document = self.create_document(content=self.CONTENT)
+        body = self._content(document, offset=10, length=20).json()
+        self.assertEqual((body['content'], body['total_length']), (self.CONTENT[10:30], 2500))
+    
+    def test_content_conditional_get(self):
+        document = self.create_document(content=self.CONTENT)
+        etag = self._content(document)['ETag']
+        response = self.client.get(f'/api/documents/{document.pk}/content/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+    
+    def test_rows_pages_and_sheets(self):
+        document = self._sheet_document()
+        body = self._rows(document, offset=20, limit=10).json()
+        self.assertEqual(body['sheet'], 'Q1')
+        self.assertEqual(body['rows'], [[f'b{i}', i] for i in range(20, 25)])
+        self.assertEqual((body['total_rows'], body['next_offset']), (25, None))
+        self.assertEqual(body['sheets'], [{'name': 'Q1', 'total_rows': 25}, {'name': 'Q2', 'total_rows': 1}])
+        
+        body = self._rows(document, sheet='Q2').json()
+        self.assertEqual((body['columns'], body['rows']), (['bulan'], [['x']]))
+        
+        response = self._rows(document, sheet='Q9')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json()['details']['available_sheets'], ['Q1', 'Q2'])
+        self.assertEqual(self._rows(self.create_document(title='Memo')).status_code, 404)
+        self.assertEqual(self._rows(document, limit=0).status_code, 400)
+    
+    def test_rows_parses_structured_data_once_per_version(self):
+        document = self._sheet_document()
+        self.assertEqual(self._rows(document, limit=10).json()['next_offset'], 10)
+        with self.assertNumQueries(1):
+            # Hanya query validator (updated_at); sheet diambil dari cache
+            body = self._rows(document, offset=10, limit=10).json()
+        self.assertEqual(body['rows'][0], ['b10', 10])
+        
+        document.structured_data = {'sheets': [{'name': 'Baru', 'columns': ['a'], 'rows': [[1]]}]}
+        document.save()
+        self.assertEqual(self._rows(document).json()['sheet'], 'Baru')
+
+
+class DocumentListTests(DocumentAPITestCase):
+    """GET /api/documents/: keyset cursor, projection fields dan filter tag"""
+    
+    def setUp(self):
+        super().setUp()
+        now = timezone.now()
+        self.documents = [
+            # Dua dokumen dengan created_at sama: urutan ditentukan id
+            self.create_document(title=f'Dokumen {i}', created_at=now - timedelta(minutes=min(i, 3)))
+            for i in range(5)
+        ]
+    
+    def _pages(self, **params):
+        ids, cursor = [], None
+        while True:
+            query = dict(params, **({'cursor': cursor} if cursor else {}))
+            body = self.client.get('/api/documents/', query).json()
+            ids.extend(item['id'] for item in body['documents'])
+            cursor = body['next_cursor']
+            if cursor is None:
+                return ids
+    
+    def test_cursor_walks_all_documents_newest_first(self):
+        expected = [
+            document.id for document in
+            sorted(self.documents, key=lambda document: (document.created_at, document.id), reverse=True)
+        ]
+        self.assertEqual(self._pages(limit=2), expected)
+    
+    def test_fields_projection(self):
+        body = self.client.get('/api/documents/', {'fields': 'id,title', 'limit': 1}).json()
+        self.assertEqual(set(body['documents'][0]), {'id', 'title'})
+        
+        response = self.client.get('/api/documents/', {'fields': 'id,content'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['details']['invalid_fields'], ['content'])
+    
+    def test_tag_filter(self):
+        tag = Tag.objects.create(name='q3')
+        self.documents[1].tags.add(tag)
+        self.documents[3].tags.add(tag)
+        self.assertEqual(
+            self._pages(limit=1, tags='q3,lainnya'), [self.documents[1].id, self.documents[3].id]
+        )
+    
+    def test_invalid_cursor_or_limit_returns_400(self):
+        for params in ({'cursor': 'bukan-cursor'}, {'limit': '-1'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get('/api/documents/', params).status_code, 400)
+
+
+class DocumentSearchTests(DocumentAPITestCase):
+    """GET /api/documents/search/: index ikut save/delete, ranking, snippet dan paging"""
+    
+    def _search(self, **params):
+        return self.client.get('/api/documents/search/', params)
+    
+    def _ids(self, **params):
+        return [item['id'] for item in self._search(**params).json()['results']]
+    
+    def test_matches_all_terms_title_ranked_first(self):
+        in_title = self.create_document(title='Gangguan jaringan', content='Ringkasan insiden jaringan.')
+        in_content = self.create_document(title='Laporan', content='Terjadi gangguan pada jaringan inti.')
+        self.create_document(title='Lain', content='Gangguan listrik saja.')
+        self.assertEqual(self._ids(q='gangguan jaringan'), [in_title.id, in_content.id])
+    
+    def test_snippet_is_escaped_and_highlighted(self):
+        self.create_document(content='Tag <b>bukan html</b> dan kata gangguan di sini.')
+        snippet = self._search(q='gangguan').json()['results'][0]['snippet']
+        self.assertIn('<mark>gangguan</mark>', snippet)
+        self.assertIn('&lt;b&gt;', snippet)
+    
+    def test_index_follows_update_and_delete(self):
+        document = self.create_document(content='Isi lama tentang router.')
+        document.content = 'Isi baru tentang switch.'
+        document.save()
+        self.assertEqual(self._ids(q='router'), [])
+        self.assertEqual(self._ids(q='switch'), [document.id])
+        
+        document.delete()
+        self.assertEqual(self._ids(q='switch'), [])
+    
+    @override_settings(DOCUMENT_CONTENT_COMPRESSION='zlib', DOCUMENT_CONTENT_COMPRESSION_MIN_LENGTH=0)
+    def test_compressed_content_is_searchable(self):
+        document = self.create_document(content='Konten terkompresi tentang latency tinggi.')
+        self.assertEqual(self._ids(q='latency'), [document.id])
+    
+    def test_offset_paging(self):
+        documents = [self.create_document(title=f'Dok {i}', content='insiden') for i in range(3)]
+        first = self._search(q='insiden', limit=2).json()
+        self.assertEqual(first['next_offset'], 2)
+        second = self._search(q='insiden', limit=2, offset=2).json()
+        self.assertIsNone(second['next_offset'])
+        self.assertEqual(
+            sorted(item['id'] for item in first['results'] + second['results']),
+            [document.id for document in documents],
+        )
+    
+    def test_query_syntax_is_ignored_and_missing_query_rejected(self):
+        document = self.create_document(content='Insiden gangguan.')
+        self.assertEqual(self._ids(q='"gangguan* (insiden:'), [document.id])
+        self.assertEqual(self._search(q='  ').status_code, 400)
+    
+    def test_chat_retrieval_matches_any_term(self):
+        document = self.create_document(content='Laporan uptime jaringan.')
+        self.create_document(content='Catatan rapat.')
+        self.assertEqual(retrieve_document_ids('berapa uptime bulan ini?', 5), [document.id])
+
+    def test_snippet_taken_around_matches_in_long_content(self):
+        document = self.create_document(content='Pembuka laporan. ' * 100 + 'Akar masalah: gangguan jaringan inti.')
+        snippet = self._search(q='gangguan').json()['results'][0]['snippet']
+        self.assertTrue(snippet.startswith(SNIPPET_ELLIPSIS))
+        self.assertIn('<mark>gangguan</mark> jaringan inti.', snippet)
+        self.assertEqual(document.content.count('gangguan'), 1)
+    
+    def test_build_snippet_without_match_starts_at_beginning(self):
+        self.assertEqual(build_snippet('Isi singkat.', ['lain']), 'Isi singkat.')
+        self.assertEqual(
+            build_snippet('Status Gangguan:\n  selesai', ['gangguan']),
+            'Status \x02Gangguan\x03: selesai',
+        )
+    
+    def test_index_does_not_store_plain_text(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('tabel FTS5 khusus SQLite')
+        self.create_document(title='Rahasia', content='Isi yang hanya boleh ada terkompresi.')
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE name LIKE 'documents_fts%'")
+            tables = {row[0] for row in cursor.fetchall()}
+            self.assertNotIn('documents_fts_content', tables)
+            cursor.execute('SELECT title, content FROM documents_fts')
+            self.assertEqual(cursor.fetchall(), [(None, None)])
+    
+    def test_rebuild_drops_stale_entries(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('entri FTS5 contentless khusus SQLite')
+        document = self.create_document(content='Isi lama.')
+        document.content = 'Isi baru.'
+        document.save()
+        
+        def entries():
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT count(*) FROM documents_fts')
+                return cursor.fetchone()[0]
+        
+        self.assertEqual(entries(), 2)
+        call_command('rebuild_search_index', stdout=io.StringIO())
+        self.assertEqual(entries(), 1)
+        self.assertEqual(self._ids(q='baru'), [document.id])
+    
+    def test_database_error_is_not_reported_as_bad_query(self):
+        self.create_document(content='Insiden.')
+        client = Client(HTTP_AUTHORIZATION='Bearer token', raise_request_exception=False)
+        error = OperationalError('database is locked: /srv/data/db.sqlite3')
+        with mock.patch('core.search.SQLiteFTS5Backend.search', side_effect=error):
+            response = client.get('/api/documents/search/', {'q': 'insiden'})
+        self.assertEqual(response.status_code, 500)
+        self.assertNotIn(b'db.sqlite3', response.content)
+
+
+def zip_upload(members, name='dokumen.zip'):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as zf:
+        for filename, data in members.items():
+            zf.writestr(filename, data)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='application/zip')
+
+
+def text_upload(name, text):
+    return SimpleUploadedFile(name, text.encode('utf-8'), content_type='text/plain')
+
+
+class DocumentStatsTests(DocumentAPITestCase):
+    """GET /api/documents/stats/: total dari kolom statistik, breakdown, dan validator corpus"""
+    
+    def test_totals_and_breakdown(self):
+        indonesian = self.create_document(
+            content='Laporan ini adalah ringkasan dari capaian yang sudah dicapai dan akan dievaluasi.'
+        )
+        english = self.create_document(
+            title='Report', content='This is the summary of the results that were reached and will be reviewed.',
+            mime_type='application/pdf',
+        )
+        response = self.client.get('/api/documents/stats/')
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        
+        documents = [indonesian, english]
+        self.assertEqual(body['totals']['documents'], 2)
+        self.assertEqual(body['totals']['tokens'], sum(doc.token_count for doc in documents))
+        self.assertEqual(body['totals']['characters'], sum(doc.content_length for doc in documents))
+        self.assertEqual(body['totals']['max_document_tokens'], max(doc.token_count for doc in documents))
+        self.assertEqual(
+            {row['language']: row['documents'] for row in body['by_language']}, {'id': 1, 'en': 1}
+        )
+        tokens = [row['tokens'] for row in body['by_mime_type']]
+        self.assertEqual(tokens, sorted(tokens, reverse=True))
+    
+    def test_empty_corpus_reports_zero(self):
+        body = self.client.get('/api/documents/stats/').json()
+        self.assertEqual(set(body['totals'].values()), {0})
+        self.assertEqual(body['by_language'], [])
+    
+    def test_etag_follows_corpus_version(self):
+        self.create_document()
+        etag = self.client.get('/api/documents/stats/')['ETag']
+        self.assertEqual(self.client.get('/api/documents/stats/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.create_document(title='Baru')
+        response = self.client.get('/api/documents/stats/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['totals']['documents'], 2)
+
+
+class DocumentUploadTests(DocumentAPITestCase):
+    """POST /api/documents/: tags disimpan di relasi M2M (nama ter-normalisasi, dipakai ulang)"""
+    
+    def _upload(self, name, text, **data):
+        return self.client.post('/api/documents/', {'file': text_upload(name, text), **data})
+    
+    def test_tags_are_normalized_and_linked(self):
+        response = self._upload('a.txt', 'Laporan kuartal tiga.', tags='Laporan, Q3 ,laporan')
+        self.assertEqual(response.status_code, 201)
+        document = Document.objects.get()
+        self.assertEqual(sorted(document.tags.values_list('name', flat=True)), ['laporan', 'q3'])
+        self.assertEqual(sorted(response.json()['document']['tags']), ['laporan', 'q3'])
+    
+    def test_existing_tags_are_reused(self):
+        self._upload('a.txt', 'Isi a.', tags='laporan,q3')
+        self._upload('b.txt', 'Isi b.', tags='Q3,  Wilayah   Barat')
+        self.assertEqual(
+            list(Tag.objects.values_list('name', flat=True)), ['laporan', 'q3', 'wilayah barat']
+        )
+        self.assertEqual(
+            sorted(Document.objects.filter(tags__name='q3').values_list('title', flat=True)),
+            ['a.txt', 'b.txt'],
+        )
+    
+    def test_upload_without_tags_creates_no_links(self):
+        self.assertEqual(self._upload('a.txt', 'Isi a.').status_code, 201)
+        self.assertFalse(Document.tags.through.objects.exists())
+
+
+class BulkUploadTests(DocumentAPITestCase):
+    """POST /api/documents/bulk/: hasil per file, status 201/207/422/400"""
+    
+    def setUp(self):
+        super().setUp()
+        BulkIngestService.shutdown()
+        self.addCleanup(BulkIngestService.shutdown)
+    
+    def _upload(self, **data):
+        return self.client.post('/api/documents/bulk/', data)
+    
+    def test_all_files_succeed_with_tags(self):
+        response = self._upload(
+            files=[text_upload('a.txt', 'Laporan pertama.'), text_upload('b.txt', 'Laporan kedua.')],
+            tags='laporan',
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['succeeded'], 2)
+        self.assertEqual(
+            sorted(Document.objects.filter(tags__name='laporan').values_list('title', flat=True)),
+            ['a.txt', 'b.txt'],
+        )
+    
+    def test_zip_with_unsupported_and_empty_members_is_partial(self):
+        archive = zip_upload({
+            'laporan/isi.txt': 'Isi laporan bulanan.',
+            'laporan/kosong.txt': '   ',
+            'gambar.png': b'\x89PNG\r\n\x1a\n' + b'\x00' * 64,
+            '__MACOSX/laporan/._isi.txt': 'metadata',
+            '.DS_Store': 'metadata',
+        })
+        response = self._upload(archive=archive)
+        self.assertEqual(response.status_code, 207)
+        body = response.json()
+        self.assertEqual((body['total'], body['succeeded'], body['failed']), (3, 1, 2))
+        statuses = {item['filename']: item['status'] for item in body['results']}
+        self.assertEqual(statuses, {
+            'laporan/isi.txt': 'success', 'laporan/kosong.txt': 'failed', 'gambar.png': 'failed',
+        })
+        self.assertEqual(Document.objects.count(), 1)
+    
+    def test_oversized_member_is_rejected_while_streaming(self):
+        archive = zip_upload({'besar.txt': 'x' * 5000, 'kecil.txt': 'Isi kecil.'})
+        with mock.patch.object(BulkIngestService, '_max_file_size', return_value=1000):
+            response = self._upload(archive=archive)
+        self.assertEqual(response.status_code, 207)
+        failed = [item for item in response.json()['results'] if item['status'] == 'failed']
+        self.assertEqual([item['filename'] for item in failed], ['besar.txt'])
+        self.assertIn('melebihi batas', failed[0]['error'])
+    
+    @override_settings(BULK_UPLOAD_MAX_FILES=1)
+    def test_members_over_file_limit_fail(self):
+        response = self._upload(archive=zip_upload({'a.txt': 'Isi a.', 'b.txt': 'Isi b.'}))
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.json()['results'][1]['status'], 'failed')
+    
+    def test_all_failed_returns_422(self):
+        response = self._upload(archive=zip_upload({'kosong.txt': ''}))
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Document.objects.count(), 0)
+    
+    def test_invalid_archive_returns_400(self):
+        archive = SimpleUploadedFile('rusak.zip', b'bukan zip', content_type='application/zip')
+        response = self._upload(archive=archive)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('archive', response.json()['details'])
+    
+    def test_archive_without_documents_returns_400(self):
+        response = self._upload(archive=zip_upload({'__MACOSX/._a.txt': 'metadata'}))
+        self.assertEqual(response.status_code, 400)
+    
+    @override_settings(BULK_UPLOAD_MAX_WORKERS=2)
+    def test_extraction_pool_is_reused_per_worker(self):
+        self._upload(files=[text_upload('a.txt', 'Isi a.')])
+        pool = BulkIngestService._pool
+        self._upload(files=[text_upload('b.txt', 'Isi b.')])
+        self.assertIs(BulkIngestService._pool, pool)
+        
+        with override_settings(BULK_UPLOAD_MAX_WORKERS=3):
+            self._upload(files=[text_upload('c.txt', 'Isi c.')])
+        self.assertIsNot(BulkIngestService._pool, pool)
+        self.assertEqual(Document.objects.count(), 3)
+    
+    def test_failed_batch_is_rolled_back(self):
+        version = CorpusVersion.current().version
+        with mock.patch('core.search.SQLiteFTS5Backend.index_documents', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self._upload(files=[text_upload('a.txt', 'Isi a.')], tags='laporan')
+        self.assertEqual(Document.objects.count(), 0)
+        self.assertEqual(Document.tags.through.objects.count(), 0)
+        self.assertEqual(CorpusVersion.current().version, version)
+    
+    def test_extraction_does_not_flush_metrics_per_file(self):
+        with tempfile.TemporaryDirectory() as workdir:
+            path = os.path.join(workdir, 'a.txt')
+            with open(path, 'w') as fh:
+                fh.write('Isi a.')
+            with mock.patch('core.metrics.registry.flush') as flush:
+                self.assertEqual(DocumentExtractor.extract_path(path)[1], 'Isi a.')
+        flush.assert_not_called()
+    
+    def test_extraction_process_flushes_metrics_once_at_exit(self):
+        with mock.patch('core.document_extractor.mp_util.Finalize') as finalize:
+            DocumentExtractor.init_worker_process()
+        finalize.assert_called_once_with(None, registry.flush, exitpriority=10)
+    
+    @override_settings(BULK_UPLOAD_EXECUTOR='process', BULK_UPLOAD_MAX_WORKERS=1)
+    def test_process_pool_extracts_without_forking_worker(self):
+        response = self._upload(files=[text_upload('a.txt', 'Isi a.')])
+        self.assertEqual(response.status_code, 201)
+        self.assertNotEqual(BulkIngestService._pool._mp_context.get_start_method(), 'fork')
+
+
+class GenerateCorpusTests(TestCase):
+    """Smoke test management command generate_corpus dengan format mix campuran"""
+    
+    MIX = 'txt:2,xlsx:1,docx:1,pdf:1'
+    
+    def _generate(self, **options):
+        options = {
+            'count': 15, 'formats': self.MIX, 'avg_chars': 400, 'xlsx_rows': 6, 'batch_size': 4,
+            'workers': 2, 'seed': 7, 'user_id': 'bench-user', **options,
+        }
+        stdout = io.StringIO()
+        call_command('generate_corpus', stdout=stdout, **options)
+        return stdout.getvalue()
+    
+    def test_generates_mixed_corpus_into_database(self):
+        version = CorpusVersion.current().version
+        output = self._generate()
+        self.assertIn('Generated 15 documents', output)
+        
+        documents = list(Document.objects.filter(owner_user_id='bench-user').order_by('source_filename'))
+        self.assertEqual(len(documents), 15)
+        extensions = {document.source_filename.rsplit('.', 1)[-1] for document in documents}
+        self.assertEqual(extensions, {'txt', 'xlsx', 'docx', 'pdf'})
+        for document in documents:
+            self.assertTrue(document.content)
+            self.assertGreater(document.token_count, 0)
+            is_xlsx = document.source_filename.endswith('.xlsx')
+            self.assertEqual(bool(document.structured_data), is_xlsx)
+            if is_xlsx:
+                self.assertTrue(document.structured_data['sheets'][0]['rows'])
+        self.assertGreater(CorpusVersion.current().version, version)
+        # Index full-text search ikut dibangun untuk dokumen hasil bulk_create
+        self.assertTrue(retrieve_document_ids('target', 50))
+        
+        # Seed sama: corpus identik
+        titles = [document.title for document in documents]
+        self._generate(clear=True)
+        regenerated = Document.objects.filter(owner_user_id='bench-user').order_by('source_filename')
+        self.assertEqual([document.title for document in regenerated], titles)
+    
+    def test_writes_files_to_output_dir(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            self._generate(formats='txt:1,xlsx:1,docx:1', count=6, output_dir=output_dir)
+            files = sorted(os.listdir(output_dir))
+            self.assertEqual(len(files), 6)
+            self.assertLessEqual({name.rsplit('.', 1)[-1] for name in files}, {'txt', 'xlsx', 'docx'})
+            for name in files:
+                content_type, content, error, _ = DocumentExtractor.extract_path(os.path.join(output_dir, name))
+                self.assertIsNone(error, name)
+                self.assertTrue(content)
+        self.assertFalse(Document.objects.exists())
+    
+    def test_invalid_options(self):
+        for options in ({'formats': 'txt:1,csv:1'}, {'formats': 'txt:x'}, {'count': 0},
+                        {'output_dir': tempfile.gettempdir()}):
+            with self.subTest(options=options), self.assertRaises(CommandError):
+                self._generate(**options)
+
+
+class CorpusSnapshotTests(TestCase):
+    """Snapshot corpus: hash stabil, dipakai ulang, dan baru setelah dokumen berubah"""
+    
+    def setUp(self):
+        CorpusSnapshot._cache.clear()
+        self.addCleanup(CorpusSnapshot._cache.clear)
+        self.documents = [
+            DocumentAPITestCase.create_document(title=f'Laporan {i}') for i in range(3)
+        ]
+    
+    def test_hash_is_stable_and_order_independent(self):
+        first = CorpusSnapshot.for_documents(self.documents)
+        CorpusSnapshot._cache.clear()
+        reloaded = list(Document.objects.order_by('-id'))
+        second = CorpusSnapshot.for_documents(reloaded)
+        
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(len(first.content_hash), 64)
+        self.assertEqual(first.document_ids, sorted(doc.id for doc in self.documents))
+        self.assertEqual(first.document_count, 3)
+        self.assertEqual(CorpusSnapshot.objects.count(), 1)
+    
+    def test_existing_snapshot_is_reused_without_queries(self):
+        snapshot = CorpusSnapshot.for_documents(self.documents)
+        with self.assertNumQueries(0):
+            self.assertIs(CorpusSnapshot.for_documents(self.documents), snapshot)
+        
+        # Cache proses kosong (worker lain): row yang sama diambil dari database
+        CorpusSnapshot._cache.clear()
+        with self.assertNumQueries(1):
+            self.assertEqual(CorpusSnapshot.for_documents(self.documents).pk, snapshot.pk)
+    
+    def test_document_update_creates_new_snapshot(self):
+        before = CorpusSnapshot.for_documents(self.documents)
+        
+        changed = self.documents[0]
+        changed.title = 'Laporan revisi'
+        changed.save()
+        after = CorpusSnapshot.for_documents(self.documents)
+        
+        self.assertNotEqual(after.pk, before.pk)
+        self.assertNotEqual(after.content_hash, before.content_hash)
+        self.assertEqual(after.document_ids, before.document_ids)
+        self.assertGreater(after.version, before.version)
+        
+        subset = CorpusSnapshot.for_documents(self.documents[1:])
+        self.assertEqual(subset.document_count, 2)
+        self.assertEqual(CorpusSnapshot.objects.count(), 3)
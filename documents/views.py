@@ -1,24 +1,45 @@
 """
 Views untuk Document API
 """
+import json
+
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
+from django.db import connection, transaction
+from django.db.models import CharField, Count, Max, Sum, TextField, prefetch_related_objects
+from django.db.models.functions import Cast, Length, Substr
+from django.http import Http404, HttpResponse
 from django.shortcuts import get_object_or_404
 
-from .models import Document
+from .cache import document_detail_cache, document_rows_cache, invalidate_document
+from .models import CorpusVersion, Document, Tag
 from .serializers import (
     DocumentUploadSerializer,
+    DocumentBulkUploadSerializer,
     DocumentSerializer,
     DocumentDetailSerializer
 )
 from core.authentication import SSOAuthentication
 from core.document_extractor import DocumentExtractor
+from core.bulk_ingest import BulkIngestService
+from core.compression import is_encoded
+from core.http_cache import conditional_response, make_etag, set_validators
+from core.metrics import UPLOAD_BYTES, UPLOAD_FILES
+from core.pagination import InvalidPaginationParam, paginate_keyset, parse_limit, parse_offset
+from core.search import format_snippet, get_search_backend
+from core.timing import phase
 from core.swagger_schemas import (
     document_upload_schema,
+    document_bulk_upload_schema,
     document_list_schema,
     document_detail_schema,
+    document_content_range_schema,
+    document_rows_schema,
+    document_search_schema,
+    document_stats_schema,
     document_delete_schema
 )
 
@@ -29,14 +50,29 @@ class DocumentViewSet(viewsets.ViewSet):
     
     Endpoints:
     - POST /api/documents - Upload dokumen
+    - POST /api/documents/bulk - Upload banyak dokumen / ZIP archive
     - GET /api/documents - List dokumen
+    - GET /api/documents/search?q= - Full-text search dokumen (ranked + snippet)
+    - GET /api/documents/stats - Statistik corpus (token, karakter, chunk) dari metadata
     - GET /api/documents/{id} - Detail dokumen
+    - GET /api/documents/{id}/content - Potongan content (offset/length atau chunk)
+    - GET /api/documents/{id}/rows - Halaman rows satu sheet XLSX
     - DELETE /api/documents/{id} - Hapus dokumen
     """
     
     authentication_classes = [SSOAuthentication]
     permission_classes = [IsAuthenticated]
     
+    DEFAULT_LIMIT = 50
+    MAX_LIMIT = 200
+    DEFAULT_CONTENT_LENGTH = 10000
+    MAX_CONTENT_LENGTH = 100000
+    DEFAULT_ROWS_LIMIT = 100
+    MAX_ROWS_LIMIT = 1000
+    DEFAULT_SEARCH_LIMIT = 20
+    MAX_SEARCH_LIMIT = 100
+    SEARCH_RESULT_FIELDS = ['id', 'title', 'source_filename', 'mime_type', 'created_at']
+    
     @document_upload_schema
     def create(self, request):
         """
@@ -54,6 +90,9 @@ class DocumentViewSet(viewsets.ViewSet):
         
         uploaded_file = serializer.validated_data['file']
         title = serializer.validated_data.get('title', '')
+        tags = serializer.validated_data.get('tags', [])
+        UPLOAD_BYTES.inc(uploaded_file.size, endpoint='single')
+        UPLOAD_FILES.inc(endpoint='single')
         
         # Jika title tidak diberikan, gunakan filename
         if not title:
@@ -93,15 +132,18 @@ class DocumentViewSet(viewsets.ViewSet):
             )
         
         # Simpan ke database
-        document = Document.objects.create(
-            owner_user_id=request.user.user_id,
-            title=title,
-            content=extracted_text,
-            source_filename=uploaded_file.name,
-            mime_type=mime_type,
-            content_length=len(extracted_text),
-            structured_data=structured_data
-        )
+        with phase('save'), transaction.atomic():
+            document = Document.objects.create(
+                owner_user_id=request.user.user_id,
+                title=title,
+                content=extracted_text,
+                source_filename=uploaded_file.name,
+                mime_type=mime_type,
+                content_length=len(extracted_text),
+                structured_data=structured_data
+            )
+            if tags:
+                document.tags.set(Tag.resolve(tags))
         
         # Kembalikan response
         response_serializer = DocumentSerializer(document)
@@ -113,23 +155,250 @@ class DocumentViewSet(viewsets.ViewSet):
             status=status.HTTP_201_CREATED
         )
     
+    @document_bulk_upload_schema
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk_upload(self, request):
+        """
+        Upload banyak dokumen sekaligus (multi-file dan/atau ZIP)
+        
+        POST /api/documents/bulk
+        """
+        serializer = DocumentBulkUploadSerializer(data=request.data)
+        
+        if not serializer.is_valid():
+            return Response(
+                {"error": "Validasi gagal", "details": serializer.errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        files = serializer.validated_data.get('files', [])
+        archive = serializer.validated_data.get('archive')
+        uploads = list(files) + ([archive] if archive else [])
+        UPLOAD_BYTES.inc(sum(upload.size for upload in uploads), endpoint='bulk')
+        UPLOAD_FILES.inc(len(uploads), endpoint='bulk')
+        
+        results = BulkIngestService.ingest(
+            files=files,
+            archive=archive,
+            owner_user_id=request.user.user_id,
+            tags=serializer.validated_data.get('tags', [])
+        )
+        
+        if not results:
+            return Response(
+                {"error": "Archive tidak berisi dokumen"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # Serialize dokumen yang berhasil dibuat (tags di-prefetch sekali untuk semua dokumen)
+        prefetch_related_objects(
+            [item['document'] for item in results if item.get('document') is not None], 'tags'
+        )
+        for item in results:
+            document = item.pop('document', None)
+            if document is not None:
+                item['document'] = DocumentSerializer(document).data
+        
+        succeeded = sum(1 for item in results if item['status'] == 'success')
+        failed = len(results) - succeeded
+        
+        if failed == 0:
+            response_status = status.HTTP_201_CREATED
+        elif succeeded == 0:
+            response_status = status.HTTP_422_UNPROCESSABLE_ENTITY
+        else:
+            response_status = status.HTTP_207_MULTI_STATUS
+        
+        return Response(
+            {
+                "message": f"{succeeded} dari {len(results)} dokumen berhasil diupload",
+                "total": len(results),
+                "succeeded": succeeded,
+                "failed": failed,
+                "results": results
+            },
+            status=response_status
+        )
+    
     @document_list_schema
     def list(self, request):
         """
         List semua dokumen (global)
         
-        GET /api/documents
+        GET /api/documents?limit=50&cursor=...&fields=id,title&tags=laporan,q3
         """
+        try:
+            limit = parse_limit(
+                request.query_params.get('limit'), self.DEFAULT_LIMIT, self.MAX_LIMIT
+            )
+        except InvalidPaginationParam as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        allowed_fields = DocumentSerializer.Meta.fields
+        fields = allowed_fields
+        fields_param = request.query_params.get('fields')
+        if fields_param:
+            fields = [name.strip() for name in fields_param.split(',') if name.strip()]
+            invalid = [name for name in fields if name not in allowed_fields]
+            if invalid or not fields:
+                return Response(
+                    {
+                        "error": "Parameter fields tidak valid",
+                        "details": {
+                            "invalid_fields": invalid,
+                            "allowed_fields": allowed_fields
+                        }
+                    },
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        
+        # List berubah hanya jika versi corpus naik: polling tanpa perubahan -> 304
+        corpus = CorpusVersion.current()
+        etag = make_etag('corpus', corpus.version)
+        not_modified = conditional_response(request, etag, corpus.updated_at)
+        if not_modified is not None:
+            return not_modified
+        
         # POC: dokumen bersifat global (RAG global), semua user bisa mengakses
-        documents = Document.objects.all()
+        # Hanya ambil kolom yang di-serialize (tanpa content dan structured_data);
+        # created_at selalu diambil untuk cursor. tags (M2M) di-prefetch terpisah
+        columns = [name for name in fields if name != 'tags']
+        documents = Document.objects.only('id', 'created_at', *columns)
+        if 'tags' in fields:
+            documents = documents.prefetch_related('tags')
         
-        serializer = DocumentSerializer(documents, many=True)
+        # Filter tag (dokumen yang memiliki salah satu tag), lewat index tabel relasi
+        tag_names = Tag.parse(request.query_params.get('tags'))
+        if tag_names:
+            documents = documents.filter(id__in=Document.ids_with_any_tag(tag_names))
+        
+        try:
+            page, next_cursor = paginate_keyset(
+                documents, request.query_params.get('cursor'), limit
+            )
+        except InvalidPaginationParam as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        with phase('serialize'):
+            serializer = DocumentSerializer(page, many=True, fields=fields)
+            data = serializer.data
+        
+        response = Response({
+            "count": len(page),
+            "next_cursor": next_cursor,
+            "documents": data
+        })
+        return set_validators(response, etag, corpus.updated_at)
+    
+    @document_search_schema
+    @action(detail=False, methods=['get'], url_path='search')
+    def search(self, request):
+        """
+        Full-text search dokumen (matching, ranking dan snippet dihitung oleh database)
+        
+        GET /api/documents/search?q=gangguan+jaringan&limit=20&offset=0
+        """
+        query = (request.query_params.get('q') or '').strip()
+        if not query:
+            return Response(
+                {"error": "Parameter q wajib diisi"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            limit = parse_limit(
+                request.query_params.get('limit'), self.DEFAULT_SEARCH_LIMIT, self.MAX_SEARCH_LIMIT
+            )
+            offset = parse_offset(request.query_params.get('offset'))
+        except InvalidPaginationParam as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        backend = get_search_backend()
+        if not backend.available:
+            return Response(
+                {
+                    "error": "Full-text search tidak tersedia",
+                    "details": f"Database {connection.vendor} belum didukung"
+                },
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+        
+        # Kata query sudah di-quote oleh backend (tidak ada syntax error dari input user):
+        # error database di sini adalah gangguan server, bukan kesalahan query
+        with phase('search'):
+            # Ambil satu hasil ekstra untuk mengetahui apakah masih ada halaman berikutnya
+            hits = backend.search(query, limit + 1, offset)
+        
+        has_more = len(hits) > limit
+        hits = hits[:limit]
+        
+        # Metadata + content dokumen di halaman hasil dalam satu query; content
+        # di-decompress hanya untuk membuat snippet (tidak ikut di response)
+        documents = Document.objects.only(*self.SEARCH_RESULT_FIELDS, 'content').in_bulk(
+            [hit.document_id for hit in hits]
+        )
+        hits = [hit for hit in hits if hit.document_id in documents]
+        with phase('snippet'):
+            snippets = backend.snippets(
+                query, {hit.document_id: documents[hit.document_id].content for hit in hits}
+            )
+        results = DocumentSerializer(
+            [documents[hit.document_id] for hit in hits], many=True, fields=self.SEARCH_RESULT_FIELDS
+        ).data
+        for item, hit in zip(results, hits):
+            item['score'] = round(hit.score, 4)
+            item['snippet'] = format_snippet(snippets.get(hit.document_id, ''))
         
         return Response({
-            "count": documents.count(),
-            "documents": serializer.data
+            "query": query,
+            "backend": backend.name,
+            "count": len(results),
+            "next_offset": offset + limit if has_more else None,
+            "results": results
         })
     
+    @document_stats_schema
+    @action(detail=False, methods=['get'], url_path='stats')
+    def stats(self, request):
+        """
+        Statistik corpus untuk perencanaan kapasitas (hanya kolom metadata, tanpa content)
+        
+        GET /api/documents/stats
+        """
+        corpus = CorpusVersion.current()
+        etag = make_etag('corpus-stats', corpus.version)
+        not_modified = conditional_response(request, etag, corpus.updated_at)
+        if not_modified is not None:
+            return not_modified
+        
+        totals = Document.objects.aggregate(
+            documents=Count('id'),
+            characters=Sum('content_length'),
+            tokens=Sum('token_count'),
+            structured_tokens=Sum('structured_token_count'),
+            lines=Sum('line_count'),
+            sentences=Sum('sentence_count'),
+            chunks=Sum('chunk_count'),
+            max_document_tokens=Max('token_count'),
+        )
+        totals = {name: value or 0 for name, value in totals.items()}
+        
+        def breakdown(field):
+            return [
+                {field: row[field] or '', 'documents': row['documents'], 'tokens': row['tokens'] or 0}
+                for row in Document.objects.order_by().values(field).annotate(
+                    documents=Count('id'), tokens=Sum('token_count')
+                ).order_by('-tokens')
+            ]
+        
+        response = Response({
+            "corpus_version": corpus.version,
+            "totals": totals,
+            "by_language": breakdown('language'),
+            "by_mime_type": breakdown('mime_type'),
+        })
+        return set_validators(response, etag, corpus.updated_at)
+    
     @document_detail_schema
     def retrieve(self, request, pk=None):
         """
@@ -138,10 +407,198 @@ class DocumentViewSet(viewsets.ViewSet):
         GET /api/documents/{id}
         """
         # POC: dokumen bersifat global, tidak dibatasi per user
-        document = get_object_or_404(Document, pk=pk)
+        updated_at, etag = self._document_validators(pk)
+        not_modified = conditional_response(request, etag, updated_at)
+        if not_modified is not None:
+            return not_modified
+        
+        # Key cache = id int, sama dengan key invalidasi di documents/signals.py
+        document_id = int(pk)
+        body = document_detail_cache.get(document_id, updated_at)
+        if body is None:
+            with phase('render'):
+                document = get_object_or_404(Document.objects.prefetch_related('tags'), pk=document_id)
+                body = JSONRenderer().render(DocumentDetailSerializer(document).data)
+                document_detail_cache.set(document_id, document.updated_at, body)
+        
+        response = HttpResponse(body, content_type='application/json')
+        return set_validators(response, etag, updated_at)
+    
+    @document_content_range_schema
+    @action(detail=True, methods=['get'], url_path='content')
+    def content_range(self, request, pk=None):
+        """
+        Potongan content dokumen berdasarkan offset karakter atau nomor chunk
+        
+        GET /api/documents/{id}/content?offset=0&length=10000
+        GET /api/documents/{id}/content?chunk=2&length=10000
+        """
+        try:
+            length = parse_limit(
+                request.query_params.get('length'),
+                self.DEFAULT_CONTENT_LENGTH,
+                self.MAX_CONTENT_LENGTH
+            )
+            chunk = request.query_params.get('chunk')
+            if chunk not in (None, ''):
+                chunk = parse_offset(chunk, 'chunk')
+                offset = chunk * length
+            else:
+                chunk = None
+                offset = parse_offset(request.query_params.get('offset'))
+        except InvalidPaginationParam as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        updated_at, etag = self._document_validators(pk)
+        not_modified = conditional_response(request, etag, updated_at)
+        if not_modified is not None:
+            return not_modified
+        
+        # Potong di database agar hanya range yang diminta yang ditransfer;
+        # content terkompresi harus di-decode utuh lalu dipotong di Python
+        row = Document.objects.filter(pk=pk).annotate(
+            format_char=Substr('content', 1, 1, output_field=CharField()),
+            part=Substr('content', offset + 1, length, output_field=CharField()),
+            total_length=Length('content'),
+        ).values_list('format_char', 'part', 'total_length').first()
+        if row is None:
+            raise Http404
+        format_char, part, total_length = row
+        
+        if is_encoded(format_char):
+            content = Document.objects.only('id', 'content').get(pk=pk).content
+            part = content[offset:offset + length]
+            total_length = len(content)
+        
+        part = part or ''
+        end = offset + len(part)
+        data = {
+            "id": int(pk),
+            "offset": offset,
+            "length": len(part),
+            "total_length": total_length,
+            "next_offset": end if end < total_length else None,
+            "content": part
+        }
+        if chunk is not None:
+            data["chunk"] = chunk
+            data["total_chunks"] = -(-total_length // length)
+        
+        return set_validators(Response(data), etag, updated_at)
+    
+    @document_rows_schema
+    @action(detail=True, methods=['get'], url_path='rows')
+    def rows(self, request, pk=None):
+        """
+        Halaman rows dari satu sheet (dokumen XLSX)
+        
+        GET /api/documents/{id}/rows?sheet=Sheet1&offset=0&limit=100
+        """
+        try:
+            limit = parse_limit(
+                request.query_params.get('limit'), self.DEFAULT_ROWS_LIMIT, self.MAX_ROWS_LIMIT
+            )
+            offset = parse_offset(request.query_params.get('offset'))
+        except InvalidPaginationParam as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        updated_at, etag = self._document_validators(pk)
+        not_modified = conditional_response(request, etag, updated_at)
+        if not_modified is not None:
+            return not_modified
+        
+        sheets = self._sheets(int(pk), updated_at)
+        if not sheets:
+            return Response(
+                {"error": "Dokumen tidak memiliki data tabel (sheet)"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        sheet_name = request.query_params.get('sheet')
+        if sheet_name:
+            sheet = next((item for item in sheets if item.get('name') == sheet_name), None)
+            if sheet is None:
+                return Response(
+                    {
+                        "error": "Sheet tidak ditemukan",
+                        "details": {"available_sheets": [item.get('name') for item in sheets]}
+                    },
+                    status=status.HTTP_404_NOT_FOUND
+                )
+        else:
+            sheet = sheets[0]
+        
+        all_rows = sheet.get('rows') or []
+        page = all_rows[offset:offset + limit]
+        end = offset + len(page)
+        
+        response = Response({
+            "id": int(pk),
+            "sheet": sheet.get('name'),
+            "sheets": [
+                {"name": item.get('name'), "total_rows": len(item.get('rows') or [])}
+                for item in sheets
+            ],
+            "columns": sheet.get('columns', []),
+            "offset": offset,
+            "limit": limit,
+            "total_rows": len(all_rows),
+            "next_offset": end if end < len(all_rows) else None,
+            "rows": page
+        })
+        return set_validators(response, etag, updated_at)
+    
+    @staticmethod
+    def _document_validators(pk):
+        """
+        Ambil updated_at dokumen (tanpa load content) dan ETag-nya
+        
+        Perubahan tag ikut menaikkan updated_at (documents/signals.py), sehingga ETag
+        berubah setiap kali isi response detail berubah.
+        
+        Raises:
+            Http404 jika dokumen tidak ada atau id bukan angka
+        """
+        try:
+            pk = int(pk)
+        except (TypeError, ValueError):
+            raise Http404
+        updated_at = Document.objects.filter(pk=pk).values_list('updated_at', flat=True).first()
+        if updated_at is None:
+            invalidate_document(pk)
+            raise Http404
+        
+        etag = make_etag('doc', pk, int(updated_at.timestamp() * 1_000_000))
+        return updated_at, etag
+    
+    @staticmethod
+    def _sheets(document_id: int, updated_at) -> list:
+        """
+        Sheet structured_data dokumen, di-cache per proses dengan versi updated_at
+        
+        Halaman berikutnya dari dokumen yang sama dipotong dari list yang sudah di-parse,
+        tanpa membaca dan mem-parse ulang seluruh structured_data dari database.
+        
+        Raises:
+            Http404 jika dokumen tidak ada
+        """
+        sheets = document_rows_cache.get(document_id, updated_at)
+        if sheets is not None:
+            return sheets
+        
+        # JSON mentah (tanpa content): panjangnya dipakai sebagai ukuran entry cache
+        row = Document.objects.filter(pk=document_id).annotate(
+            raw_structured_data=Cast('structured_data', TextField())
+        ).values_list('updated_at', 'raw_structured_data').first()
+        if row is None:
+            raise Http404
+        current_updated_at, raw = row
         
-        serializer = DocumentDetailSerializer(document)
-        return Response(serializer.data)
+        with phase('parse'):
+            structured_data = json.loads(raw) if raw else None
+        sheets = (structured_data if isinstance(structured_data, dict) else {}).get('sheets') or []
+        document_rows_cache.set(document_id, current_updated_at, sheets, size=len(raw or ''))
+        return sheets
     
     @document_delete_schema
     def destroy(self, request, pk=None):
@@ -1,9 +1,12 @@
 """
 Gunicorn configuration file for NOC RAG POC
 """
+import glob
 import multiprocessing
 import os
 
+from decouple import config
+
 # Bind address
 bind = "127.0.0.1:8000"
 
@@ -36,3 +39,20 @@ max_requests_jitter = 50  # Randomize restart to prevent all workers restarting
 limit_request_line = 4096
 limit_request_fields = 100
 limit_request_field_size = 8190
+
+
+def on_starting(server):
+    """Hapus snapshot metrics dari run sebelumnya (METRICS_DIR, lihat core/metrics.py)"""
+    metrics_dir = config('METRICS_DIR', default='')
+    if not metrics_dir:
+        return
+    for path in glob.glob(os.path.join(metrics_dir, 'metrics_*.json')):
+        os.remove(path)
+
+
+def worker_exit(server, worker):
+    """Flush antrian ChatLog yang belum ditulis dan hentikan pool ekstraksi bulk upload"""
+    from chat.log_writer import chat_log_writer
+    from core.bulk_ingest import BulkIngestService
+    chat_log_writer.stop()
+    BulkIngestService.shutdown()